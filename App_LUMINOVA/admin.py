@@ -1,10 +1,12 @@
 # TP_LUMINOVA-main/App_LUMINOVA/admin.py
 
 
+from django import forms
 from django.contrib import admin, messages
 
 from .models import (  # Usando tus nombres actuales para EstadoOrden y SectorAsignado
     AuditoriaAcceso,
+    AuditoriaAccesoArchivada,
     CategoriaInsumo,
     CategoriaProductoTerminado,
     Cliente,
@@ -12,8 +14,11 @@ from .models import (  # Usando tus nombres actuales para EstadoOrden y SectorAs
     EstadoOrden,
     Fabricante,
     Factura,
+    HistorialOVArchivado,
     Insumo,
+    ItemOrdenCompra,
     ItemOrdenVenta,
+    MovimientoStock,
     OfertaProveedor,
     Orden,
     OrdenProduccion,
@@ -24,6 +29,32 @@ from .models import (  # Usando tus nombres actuales para EstadoOrden y SectorAs
     RolDescripcion,
     SectorAsignado,
 )
+from .services.compra_services import (
+    ajustar_cantidad_en_pedido,
+    cambiar_estado_ocs,
+    pedido_por_insumo,
+)
+from .services.estado_services import Estados
+from .services.produccion_services import (
+    TransicionOPInvalida,
+    cambiar_estado_op,
+    cambiar_estado_ops,
+    maquina_estados_op,
+)
+from .services.stock_services import registrar_ajuste_stock
+
+
+class KardexAdminMixin:
+    """Registra en el kardex los cambios de stock hechos desde el admin."""
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            registrar_ajuste_stock(obj, None, usuario=request.user, referencia="Admin")
+        elif "stock" in form.changed_data:
+            registrar_ajuste_stock(
+                obj, form.initial.get("stock"), usuario=request.user, referencia="Admin"
+            )
 
 
 class OfertaProveedorInline(admin.TabularInline):  # O admin.StackedInline
@@ -33,6 +64,7 @@ class OfertaProveedorInline(admin.TabularInline):  # O admin.StackedInline
         "proveedor",
         "precio_unitario_compra",
         "tiempo_entrega_estimado_dias",
+        "multiplo_pedido",
         "fecha_actualizacion_precio",
     )
     autocomplete_fields = ["proveedor"]
@@ -49,7 +81,7 @@ class ComponenteProductoInline(admin.TabularInline):
 
 
 @admin.register(ProductoTerminado)
-class ProductoTerminadoAdmin(admin.ModelAdmin):
+class ProductoTerminadoAdmin(KardexAdminMixin, admin.ModelAdmin):
     list_display = ("descripcion", "categoria", "stock", "precio_unitario", "modelo")
     list_filter = ("categoria",)
     search_fields = ("descripcion", "modelo")
@@ -58,14 +90,16 @@ class ProductoTerminadoAdmin(admin.ModelAdmin):
 
 
 @admin.register(Insumo)
-class InsumoAdmin(admin.ModelAdmin):
+class InsumoAdmin(KardexAdminMixin, admin.ModelAdmin):
     list_display = (
         "descripcion",
         "categoria",
         "stock",
+        "punto_reorden",
         "fabricante",
         "mostrar_ofertas_resumen",
     )  # 'mostrar_ofertas_resumen' es el nombre del método
+    list_editable = ("punto_reorden",)
     list_filter = ("categoria", "fabricante")
     search_fields = ("descripcion", "fabricante", "categoria__nombre")
     autocomplete_fields = ["categoria"]
@@ -118,8 +152,29 @@ class OrdenVentaAdmin(admin.ModelAdmin):
     readonly_fields = ("fecha_creacion", "total_ov")
 
 
+class OrdenProduccionAdminForm(forms.ModelForm):
+    class Meta:
+        model = OrdenProduccion
+        fields = "__all__"
+
+    def clean_estado_op(self):
+        nuevo_estado = self.cleaned_data.get("estado_op")
+        if (
+            self.instance.pk
+            and nuevo_estado
+            and not maquina_estados_op.permite(
+                self.initial.get("estado_op"), nuevo_estado.id
+            )
+        ):
+            raise forms.ValidationError(
+                "La OP no puede pasar del estado actual a este estado."
+            )
+        return nuevo_estado
+
+
 @admin.register(OrdenProduccion)
 class OrdenProduccionAdmin(admin.ModelAdmin):
+    form = OrdenProduccionAdminForm
     list_display = (
         "numero_op",
         "producto_a_producir",
@@ -143,6 +198,59 @@ class OrdenProduccionAdmin(admin.ModelAdmin):
     ]
     readonly_fields = ("fecha_solicitud",)
 
+    actions = [
+        "marcar_en_proceso",
+        "marcar_pausada",
+        "marcar_completada",
+        "marcar_cancelada",
+    ]
+
+    def save_model(self, request, obj, form, change):
+        if not (change and "estado_op" in form.changed_data and obj.estado_op):
+            super().save_model(request, obj, form, change)
+            return
+        # El cambio de estado pasa por el motor para aplicar stock, lotes e historial.
+        nuevo_estado = obj.estado_op
+        obj.estado_op_id = form.initial.get("estado_op")
+        super().save_model(request, obj, form, change)
+        try:
+            cambiar_estado_op(obj, nuevo_estado, usuario=request.user)
+        except TransicionOPInvalida as e:
+            self.message_user(request, str(e), messages.ERROR)
+
+    def _cambiar_estado(self, request, queryset, nombre_estado):
+        try:
+            resultado = cambiar_estado_ops(queryset, nombre_estado, usuario=request.user)
+        except EstadoOrden.DoesNotExist:
+            self.message_user(
+                request, f"El estado '{nombre_estado}' no está configurado.", messages.ERROR
+            )
+            return
+        if resultado.actualizadas:
+            self.message_user(
+                request,
+                f"{len(resultado.actualizadas)} órdenes de producción pasaron a '{nombre_estado}'.",
+                messages.SUCCESS,
+            )
+        for _, motivo in resultado.rechazadas:
+            self.message_user(request, motivo, messages.WARNING)
+
+    @admin.action(description='Pasar seleccionadas a "En Proceso"')
+    def marcar_en_proceso(self, request, queryset):
+        self._cambiar_estado(request, queryset, Estados.EN_PROCESO)
+
+    @admin.action(description='Pasar seleccionadas a "Pausada"')
+    def marcar_pausada(self, request, queryset):
+        self._cambiar_estado(request, queryset, Estados.PAUSADA)
+
+    @admin.action(description='Pasar seleccionadas a "Completada"')
+    def marcar_completada(self, request, queryset):
+        self._cambiar_estado(request, queryset, Estados.COMPLETADA)
+
+    @admin.action(description='Pasar seleccionadas a "Cancelada"')
+    def marcar_cancelada(self, request, queryset):
+        self._cambiar_estado(request, queryset, Estados.CANCELADA)
+
     @admin.display(description="Estado")
     def get_estado_op_nombre(self, obj):
         return obj.estado_op.nombre if obj.estado_op else "-"
@@ -197,6 +305,48 @@ admin.site.register(Fabricante)
 # admin.site.register(Orden) # Descomenta y configura si quieres 'Orden' en el admin
 
 
+class ItemOrdenCompraInlineForm(forms.ModelForm):
+    class Meta:
+        model = ItemOrdenCompra
+        fields = "__all__"
+
+    def clean_cantidad(self):
+        # cantidad_recibida es de solo lectura en el inline, así que el admin
+        # no valida la restricción de la base; sin esto sería un error 500.
+        cantidad = self.cleaned_data.get("cantidad")
+        recibida = self.instance.cantidad_recibida or 0
+        if cantidad is not None and cantidad < recibida:
+            raise forms.ValidationError(
+                f"No puede ser menor a lo ya recibido ({recibida})."
+            )
+        return cantidad
+
+
+class ItemOrdenCompraInline(admin.TabularInline):
+    model = ItemOrdenCompra
+    form = ItemOrdenCompraInlineForm
+    extra = 0
+    autocomplete_fields = ["insumo"]
+    fields = ("insumo", "cantidad", "precio_unitario_compra", "cantidad_recibida", "subtotal")
+    readonly_fields = ("cantidad_recibida", "subtotal")
+    verbose_name_plural = "Ítems de la Orden de Compra"
+
+    # Fuera de Borrador las líneas son lo que se pidió al proveedor: solo lectura.
+    def _lineas_editables(self, orden):
+        return orden is None or orden.estado == "BORRADOR"
+
+    def get_readonly_fields(self, request, obj=None):
+        if self._lineas_editables(obj):
+            return self.readonly_fields
+        return self.fields
+
+    def has_add_permission(self, request, obj=None):
+        return self._lineas_editables(obj) and super().has_add_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return self._lineas_editables(obj) and super().has_delete_permission(request, obj)
+
+
 # Si quieres un admin más detallado para Orden (Órdenes de Compra)
 @admin.register(Orden)
 class OrdenAdmin(admin.ModelAdmin):
@@ -219,8 +369,24 @@ class OrdenAdmin(admin.ModelAdmin):
     )
     autocomplete_fields = ["proveedor", "insumo_principal"]
     readonly_fields = ("fecha_creacion", "total_orden_compra")
-
-    actions = ["marcar_como_enviada_a_proveedor", "marcar_como_en_transito_y_notificar"]
+    inlines = [ItemOrdenCompraInline]
+
+    def save_model(self, request, obj, form, change):
+        # Las líneas antes de guardar (la señal de Orden puede tocar la
+        # principal), para llevar la diferencia a cantidad_en_pedido.
+        form.pedido_antes = pedido_por_insumo(obj) if change else {}
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.actualizar_total()
+        ajustar_cantidad_en_pedido(form.pedido_antes, pedido_por_insumo(form.instance))
+
+    actions = [
+        "marcar_como_aprobada",
+        "marcar_como_enviada_a_proveedor",
+        "marcar_como_en_transito_y_notificar",
+    ]
 
     def get_readonly_fields(self, request, obj=None):
         # Hacer que ciertos campos sean editables solo en estados específicos
@@ -241,47 +407,34 @@ class OrdenAdmin(admin.ModelAdmin):
                 )
         return tuple(readonly)
 
+    def _cambiar_estado(self, request, queryset, nuevo_estado):
+        resultado = cambiar_estado_ocs(queryset, nuevo_estado)
+        if resultado.actualizadas:
+            self.message_user(
+                request,
+                f'{len(resultado.actualizadas)} órdenes de compra pasaron a "{dict(Orden.ESTADO_ORDEN_COMPRA_CHOICES)[nuevo_estado]}".',
+                messages.SUCCESS,
+            )
+        for numero, motivo in resultado.rechazadas:
+            self.message_user(request, f"{numero}: {motivo}", messages.WARNING)
+
+    @admin.action(description='Marcar seleccionadas como "Aprobada"')
+    def marcar_como_aprobada(self, request, queryset):
+        self._cambiar_estado(request, queryset, "APROBADA")
+
     @admin.action(
         description='Marcar seleccionadas como "Gestionada (Enviada a Proveedor)"'
     )
     def marcar_como_enviada_a_proveedor(self, request, queryset):
-        # Filtra solo las que están en estado 'Aprobada'
-        actualizadas = queryset.filter(estado="APROBADA").update(
-            estado="ENVIADA_PROVEEDOR"
-        )
-        self.message_user(
-            request,
-            f"{actualizadas} órdenes de compra han sido marcadas como enviadas al proveedor.",
-            messages.SUCCESS,
-        )
+        # Solo pasan las que están en estado 'Aprobada'.
+        self._cambiar_estado(request, queryset, "ENVIADA_PROVEEDOR")
 
     @admin.action(
         description='Marcar seleccionadas como "En Tránsito" (requiere tracking)'
     )
     def marcar_como_en_transito_y_notificar(self, request, queryset):
-        # Filtra las que están listas para pasar a tránsito y tienen un tracking asignado
-        listas_para_transito = (
-            queryset.filter(estado="ENVIADA_PROVEEDOR")
-            .exclude(numero_tracking__exact="")
-            .exclude(numero_tracking__isnull=True)
-        )
-
-        actualizadas = listas_para_transito.update(estado="EN_TRANSITO")
-
-        if actualizadas > 0:
-            self.message_user(
-                request,
-                f'{actualizadas} órdenes de compra han sido marcadas como "En Tránsito".',
-                messages.SUCCESS,
-            )
-
-        fallidas = queryset.count() - actualizadas
-        if fallidas > 0:
-            self.message_user(
-                request,
-                f'{fallidas} órdenes no se actualizaron. Asegúrese de que estén en estado "Gestionada" y tengan un número de tracking guardado antes de ejecutar esta acción.',
-                messages.WARNING,
-            )
+        # Solo pasan las enviadas al proveedor que tienen un tracking asignado.
+        self._cambiar_estado(request, queryset, "EN_TRANSITO")
 
     fieldsets = (
         (None, {"fields": ("numero_orden", "tipo", "estado")}),
@@ -315,3 +468,46 @@ class LoteProductoTerminadoAdmin(admin.ModelAdmin):
     list_display = ("producto", "op_asociada", "cantidad", "enviado", "fecha_creacion")
     list_filter = ("enviado", "producto")
     search_fields = ("producto__descripcion", "op_asociada__numero_op")
+
+
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(admin.ModelAdmin):
+    list_display = ("fecha", "tipo", "insumo", "producto_terminado", "cantidad", "referencia", "usuario")
+    list_filter = ("tipo", "fecha")
+    search_fields = ("insumo__descripcion", "producto_terminado__descripcion", "referencia")
+    date_hierarchy = "fecha"
+    list_select_related = ("insumo", "producto_terminado", "usuario")
+
+    # El kardex es de solo lectura: las correcciones se hacen con movimientos de ajuste.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class ArchivoSoloLecturaAdmin(admin.ModelAdmin):
+    # El archivo lo escribe solo el comando `archivar_historial`.
+    exclude = ("datos",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(HistorialOVArchivado)
+class HistorialOVArchivadoAdmin(ArchivoSoloLecturaAdmin):
+    list_display = ("orden_venta", "cantidad_eventos", "primer_evento", "ultimo_evento", "fecha_archivado")
+    search_fields = ("orden_venta__numero_ov",)
+    list_select_related = ("orden_venta",)
+
+
+@admin.register(AuditoriaAccesoArchivada)
+class AuditoriaAccesoArchivadaAdmin(ArchivoSoloLecturaAdmin):
+    list_display = ("fecha", "cantidad_registros", "inicios_sesion", "usuarios_distintos", "fecha_archivado")
+    date_hierarchy = "fecha"
@@ -0,0 +1,356 @@
+"""
+Recorrido de las rutas con nombre de los módulos de URLs de cada área, como
+cada rol, midiendo consultas SQL, latencia y memoria pico por petición.
+
+Lo usan el comando `benchmark_vistas` (que compara contra la línea base
+guardada en `vistas_base.json`) y `BenchmarkVistasTests`, que falla si
+alguna vista pasa a hacer más consultas que las registradas.
+"""
+
+import gc
+import json
+import logging
+import math
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from django.contrib.auth.models import Group
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver, reverse
+
+from ..models import (
+    CategoriaInsumo,
+    CategoriaProductoTerminado,
+    Cliente,
+    Fabricante,
+    Factura,
+    LoteProductoTerminado,
+    OfertaProveedor,
+    Orden,
+    ProductoTerminado,
+    Reportes,
+)
+from ..services.estado_services import Estados
+from ..services.mrp_services import ops_abiertas
+from ..urls import admin_urls, compras_urls, deposito_urls, produccion_urls, ventas_urls
+
+BASE_VISTAS = Path(__file__).with_name("vistas_base.json")
+
+MODULOS_URL = (ventas_urls, compras_urls, produccion_urls, deposito_urls, admin_urls)
+
+# Objeto de referencia para cada parámetro de ruta con nombre propio.
+OBJETO_POR_PARAMETRO = {
+    "ov_id": "orden_venta",
+    "cliente_id": "cliente",
+    "factura_id": "factura",
+    "oc_id": "orden_compra",
+    "op_id": "orden_produccion",
+    "insumo_id": "insumo",
+    "proveedor_id": "proveedor",
+    "lote_id": "lote",
+    "reporte_id": "reporte",
+    "rol_id": "rol",
+}
+
+# Las rutas de las vistas genéricas usan `pk`/`id`: el objeto sale del prefijo del nombre.
+OBJETO_POR_PREFIJO = (
+    ("proveedor_", "proveedor"),
+    ("fabricante_", "fabricante"),
+    ("categoria_i_", "categoria_insumo"),
+    ("categoria_pt_", "categoria_producto"),
+    ("insumo_", "insumo"),
+    ("producto_terminado_", "producto"),
+    ("editar_usuario", "usuario"),
+    ("eliminar_usuario", "usuario"),
+)
+
+# Parámetros GET que las vistas AJAX leen de la query string.
+CONSULTA_POR_RUTA = {
+    "ajax_get_oferta_proveedor": ("insumo_id", "proveedor_id"),
+    "ajax_get_proveedores_for_insumo": ("insumo_id",),
+    "get_rol_data_ajax": ("rol_id",),
+    "get_permisos_rol_ajax": ("rol_id",),
+}
+
+# Una latencia por debajo de este margen sobre la base no se considera regresión (ruido).
+MARGEN_LATENCIA_MS = 10.0
+
+
+@dataclass(frozen=True)
+class Ruta:
+    nombre: str
+    modulo: str
+    parametros: tuple
+
+
+@dataclass
+class Medicion:
+    ruta: str
+    rol: str
+    url: str
+    estado: int
+    consultas: int
+    p50_ms: float
+    p95_ms: float
+    memoria_kb: float = None
+
+
+def _patrones(patrones):
+    for patron in patrones:
+        if isinstance(patron, URLResolver):
+            yield from _patrones(patron.url_patterns)
+        elif isinstance(patron, URLPattern) and patron.name:
+            yield patron
+
+
+def rutas_nombradas():
+    """Rutas con nombre de MODULOS_URL, sin repetir nombres (vale la primera)."""
+    rutas = {}
+    for modulo in MODULOS_URL:
+        for patron in _patrones(modulo.urlpatterns):
+            if patron.name not in rutas:
+                rutas[patron.name] = Ruta(
+                    nombre=patron.name,
+                    modulo=modulo.__name__.rsplit(".", 1)[-1],
+                    parametros=tuple(patron.pattern.converters),
+                )
+    return list(rutas.values())
+
+
+def objetos_de_referencia(usuarios):
+    """
+    Un objeto representativo de cada tipo para completar los parámetros de
+    las rutas: el de menor id entre los que tienen datos para mostrar.
+    """
+    orden_venta_con_factura = Factura.objects.order_by("id").values_list(
+        "orden_venta_id", flat=True
+    )
+    orden_compra = Orden.objects.filter(items_oc__isnull=False).order_by("id").first()
+    oferta = OfertaProveedor.objects.order_by("id").first()
+    return {
+        "orden_venta": orden_venta_con_factura.first(),
+        "cliente": Cliente.objects.order_by("id").values_list("id", flat=True).first(),
+        "factura": Factura.objects.order_by("id").values_list("id", flat=True).first(),
+        "orden_compra": orden_compra.id if orden_compra else None,
+        "numero_orden_desglose": orden_compra.numero_orden if orden_compra else None,
+        "orden_produccion": ops_abiertas()
+        .exclude(estado_op__nombre=Estados.PENDIENTE)
+        .order_by("id")
+        .values_list("id", flat=True)
+        .first(),
+        "insumo": oferta.insumo_id if oferta else None,
+        "proveedor": oferta.proveedor_id if oferta else None,
+        # Preferentemente uno pendiente, pero con los datos viejos cerrados puede no haberlo.
+        "lote": LoteProductoTerminado.objects.order_by("enviado", "id")
+        .values_list("id", flat=True)
+        .first(),
+        "reporte": Reportes.objects.order_by("resuelto", "id")
+        .values_list("id", flat=True)
+        .first(),
+        "fabricante": Fabricante.objects.order_by("id").values_list("id", flat=True).first(),
+        "categoria_insumo": CategoriaInsumo.objects.order_by("id")
+        .values_list("id", flat=True)
+        .first(),
+        "categoria_producto": CategoriaProductoTerminado.objects.order_by("id")
+        .values_list("id", flat=True)
+        .first(),
+        "producto": ProductoTerminado.objects.order_by("id").values_list("id", flat=True).first(),
+        "usuario": usuarios["ventas"].id,
+        "rol": Group.objects.filter(name="ventas").values_list("id", flat=True).first(),
+    }
+
+
+def _objeto_para(ruta, parametro):
+    if parametro in OBJETO_POR_PARAMETRO:
+        return OBJETO_POR_PARAMETRO[parametro]
+    if parametro == "numero_orden_desglose":
+        return parametro
+    for prefijo, objeto in OBJETO_POR_PREFIJO:
+        if ruta.nombre.startswith(prefijo):
+            return objeto
+    raise KeyError(f"No se sabe con qué completar '{parametro}' en la ruta '{ruta.nombre}'.")
+
+
+def url_de(ruta, objetos):
+    """URL a pedir para la ruta (con su query string), o None si falta el objeto."""
+    kwargs = {p: objetos[_objeto_para(ruta, p)] for p in ruta.parametros}
+    if any(valor is None for valor in kwargs.values()):
+        return None
+    url = reverse(f"App_LUMINOVA:{ruta.nombre}", kwargs=kwargs)
+    consulta = [
+        f"{p}={objetos[OBJETO_POR_PARAMETRO[p]]}"
+        for p in CONSULTA_POR_RUTA.get(ruta.nombre, ())
+    ]
+    return f"{url}?{'&'.join(consulta)}" if consulta else url
+
+
+@contextmanager
+def _revertido():
+    # Algunas vistas escriben aun por GET: cada petición deja la base como estaba.
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (sin interpolar) de una lista no vacía."""
+    ordenados = sorted(valores)
+    return ordenados[max(math.ceil(p / 100 * len(ordenados)) - 1, 0)]
+
+
+def medir_ruta(cliente, url, repeticiones=5, memoria=True):
+    """Pide `url` una vez para calentar cachés y después `repeticiones` veces más."""
+    with _revertido():
+        cliente.get(url)
+
+    consultas, duraciones = 0, []
+    # Como timeit: sin pausas del recolector de basura dentro de las mediciones.
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeticiones):
+            with _revertido(), CaptureQueriesContext(connection) as ctx:
+                inicio = time.perf_counter()
+                respuesta = cliente.get(url)
+                duraciones.append((time.perf_counter() - inicio) * 1000)
+            consultas = max(consultas, len(ctx.captured_queries))
+    finally:
+        gc.enable()
+
+    memoria_kb = None
+    if memoria:
+        # Pasada aparte: tracemalloc hace mucho más lentas las que se cronometran.
+        tracemalloc.start()
+        try:
+            with _revertido():
+                cliente.get(url)
+            memoria_kb = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+
+    return respuesta.status_code, consultas, duraciones, memoria_kb
+
+
+def medir_rutas(usuarios, repeticiones=5, memoria=True, rutas=None, roles=None):
+    """
+    Recorre las rutas (todas las de `rutas_nombradas()` si no se indican) con
+    el usuario de cada rol de `usuarios` ({rol: User}).
+
+    Returns:
+        Lista de Medicion; las rutas sin objeto de referencia se omiten.
+    """
+    objetos = objetos_de_referencia(usuarios)
+    rutas = rutas_nombradas() if rutas is None else rutas
+    mediciones = []
+    # Los 403/405/500 esperables no se loguean en cada repetición.
+    logger_peticiones = logging.getLogger("django.request")
+    nivel_anterior = logger_peticiones.level
+    logger_peticiones.setLevel(logging.CRITICAL)
+    # Que los contadores de notificaciones no venzan a mitad del recorrido y
+    # sumen una consulta en una ruta cualquiera. Los PDFs que guardan las rutas
+    # de facturas van a un MEDIA_ROOT temporal: la base se revierte y quedarían
+    # huérfanos en el real.
+    try:
+        with tempfile.TemporaryDirectory() as media, override_settings(
+            NOTIFICACIONES_CACHE_TTL=None, MEDIA_ROOT=media
+        ):
+            for rol, usuario in usuarios.items():
+                if roles and rol not in roles:
+                    continue
+                mediciones += _medir_como(usuario, rol, rutas, objetos, repeticiones, memoria)
+    finally:
+        logger_peticiones.setLevel(nivel_anterior)
+    return mediciones
+
+
+def _medir_como(usuario, rol, rutas, objetos, repeticiones, memoria):
+    cliente = Client(raise_request_exception=False)
+    cliente.force_login(usuario)
+    mediciones = []
+    for ruta in rutas:
+        url = url_de(ruta, objetos)
+        if url is None:
+            continue
+        estado, consultas, duraciones, memoria_kb = medir_ruta(
+            cliente, url, repeticiones, memoria
+        )
+        mediciones.append(
+            Medicion(
+                ruta=ruta.nombre,
+                rol=rol,
+                url=url,
+                estado=estado,
+                consultas=consultas,
+                p50_ms=round(percentil(duraciones, 50), 2),
+                p95_ms=round(percentil(duraciones, 95), 2),
+                memoria_kb=None if memoria_kb is None else round(memoria_kb, 1),
+            )
+        )
+    return mediciones
+
+
+def resultados_a_dict(mediciones, **parametros):
+    """Estructura de la línea base: {'rutas': {ruta: {rol: medición}}} más los parámetros."""
+    rutas = {}
+    for medicion in mediciones:
+        datos = asdict(medicion)
+        rutas.setdefault(datos.pop("ruta"), {})[datos.pop("rol")] = datos
+    return {**parametros, "rutas": rutas}
+
+
+def cargar_base(ruta=BASE_VISTAS):
+    with open(ruta, encoding="utf-8") as archivo:
+        return json.load(archivo)
+
+
+def guardar_resultados(datos, ruta):
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        json.dump(datos, archivo, ensure_ascii=False, indent=2, sort_keys=True)
+        archivo.write("\n")
+
+
+def excesos(mediciones, base, tolerancia_latencia=None, tolerancia_memoria=None):
+    """
+    Compara contra la línea base. Las consultas no pueden superar las de la
+    base; la latencia p95 y la memoria pico, solo si se pasa su tolerancia
+    (factor sobre la base: 2.0 admite hasta el doble).
+
+    Returns:
+        Lista de mensajes, uno por presupuesto excedido (vacía si todo está bien).
+    """
+    mensajes = []
+    for m in mediciones:
+        previa = base["rutas"].get(m.ruta, {}).get(m.rol)
+        clave = f"{m.ruta} [{m.rol}]"
+        if previa is None:
+            mensajes.append(f"{clave}: sin línea base; regenerala con --actualizar-base.")
+            continue
+        if m.estado != previa["estado"]:
+            mensajes.append(f"{clave}: respondió {m.estado}, la base registra {previa['estado']}.")
+        if m.consultas > previa["consultas"]:
+            mensajes.append(
+                f"{clave}: {m.consultas} consultas, el presupuesto es {previa['consultas']}."
+            )
+        if tolerancia_latencia is not None:
+            limite = max(
+                previa["p95_ms"] * tolerancia_latencia, previa["p95_ms"] + MARGEN_LATENCIA_MS
+            )
+            if m.p95_ms > limite:
+                mensajes.append(f"{clave}: p95 de {m.p95_ms} ms, el límite es {limite:.1f} ms.")
+        if (
+            tolerancia_memoria is not None
+            and m.memoria_kb is not None
+            and previa.get("memoria_kb") is not None
+            and m.memoria_kb > previa["memoria_kb"] * tolerancia_memoria
+        ):
+            mensajes.append(
+                f"{clave}: memoria pico de {m.memoria_kb} KB, "
+                f"el límite es {previa['memoria_kb'] * tolerancia_memoria:.1f} KB."
+            )
+    return mensajes
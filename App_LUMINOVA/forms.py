@@ -1,9 +1,10 @@
 import logging
-from datetime import timedelta, timezone
+from datetime import datetime, time, timedelta, timezone
 
 from django import apps, forms
-from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import Group, Permission, User
 from django.db.models import Q
+from django.utils.timezone import make_aware
 
 from .models import (
     CategoriaInsumo,
@@ -23,6 +24,9 @@ from .models import (
     SectorAsignado,
 )
 
+from .services.auditoria_services import ACCION_CIERRE_SESION, ACCION_INICIO_SESION
+from .services.document_services import sugerir_siguiente_numero_documento
+
 logger = logging.getLogger(__name__)
 
 
@@ -215,9 +219,10 @@ class OrdenVentaForm(forms.ModelForm):
             self.fields["estado"].required = False  # No se envía, la vista lo asigna
 
             # El numero_ov se sugiere en la vista ventas_crear_ov_view y se pasa como initial.
-            # Podríamos hacerlo readonly aquí también si siempre viene de initial.
+            # El número definitivo lo reserva la vista al guardar (ver clean_numero_ov).
             if self.initial.get("numero_ov"):
                 self.fields["numero_ov"].widget.attrs["readonly"] = True
+            self.fields["numero_ov"].required = False
 
         else:  # EDICIÓN DE OV EXISTENTE
             # Hacer numero_ov siempre readonly después de la creación
@@ -239,6 +244,126 @@ class OrdenVentaForm(forms.ModelForm):
         if not self.fields["estado"].widget.attrs.get("disabled"):
             self.fields["estado"].empty_label = None
 
+    def clean_numero_ov(self):
+        if self.instance.pk:
+            return self.cleaned_data.get("numero_ov")
+        # En la creación el número mostrado es solo una sugerencia: la vista
+        # reserva el definitivo desde la secuencia de documentos.
+        return ""
+
+
+class FiltroOrdenVentaForm(forms.Form):
+    estado = forms.ChoiceField(
+        choices=[("", "Todos los estados")] + OrdenVenta.ESTADO_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select form-select-sm"}),
+    )
+    cliente = forms.ModelChoiceField(
+        queryset=Cliente.objects.order_by("nombre"),
+        required=False,
+        empty_label="Todos los clientes",
+        widget=forms.Select(attrs={"class": "form-select form-select-sm"}),
+    )
+    fecha_desde = forms.DateField(
+        required=False,
+        label="Desde",
+        widget=forms.DateInput(attrs={"class": "form-control form-control-sm", "type": "date"}),
+    )
+    fecha_hasta = forms.DateField(
+        required=False,
+        label="Hasta",
+        widget=forms.DateInput(attrs={"class": "form-control form-control-sm", "type": "date"}),
+    )
+
+    def filtrar(self, queryset):
+        """Aplica los filtros válidos al QuerySet de OVs."""
+        if not self.is_valid():
+            return queryset
+        datos = self.cleaned_data
+        if datos.get("estado"):
+            queryset = queryset.filter(estado=datos["estado"])
+        if datos.get("cliente"):
+            queryset = queryset.filter(cliente=datos["cliente"])
+        # Rangos sobre el campo (no sobre __date) para que usen el índice.
+        if datos.get("fecha_desde"):
+            desde = make_aware(datetime.combine(datos["fecha_desde"], time.min))
+            queryset = queryset.filter(fecha_creacion__gte=desde)
+        if datos.get("fecha_hasta"):
+            hasta = make_aware(datetime.combine(datos["fecha_hasta"] + timedelta(days=1), time.min))
+            queryset = queryset.filter(fecha_creacion__lt=hasta)
+        return queryset
+
+
+class FiltroAuditoriaForm(forms.Form):
+    usuario = forms.ModelChoiceField(
+        queryset=User.objects.order_by("username"),
+        required=False,
+        empty_label="Todos los usuarios",
+        widget=forms.Select(attrs={"class": "form-select form-select-sm"}),
+    )
+    accion = forms.ChoiceField(
+        choices=[("", "Todas las acciones")]
+        + [(a, a) for a in (ACCION_INICIO_SESION, ACCION_CIERRE_SESION)],
+        required=False,
+        widget=forms.Select(attrs={"class": "form-select form-select-sm"}),
+    )
+    ip_address = forms.GenericIPAddressField(
+        required=False,
+        label="IP",
+        widget=forms.TextInput(attrs={"class": "form-control form-control-sm", "placeholder": "IP"}),
+    )
+    fecha_desde = forms.DateField(
+        required=False,
+        label="Desde",
+        widget=forms.DateInput(attrs={"class": "form-control form-control-sm", "type": "date"}),
+    )
+    fecha_hasta = forms.DateField(
+        required=False,
+        label="Hasta",
+        widget=forms.DateInput(attrs={"class": "form-control form-control-sm", "type": "date"}),
+    )
+
+    def filtrar(self, queryset):
+        """Aplica los filtros válidos al QuerySet de AuditoriaAcceso."""
+        if not self.is_valid():
+            return queryset
+        datos = self.cleaned_data
+        if datos.get("usuario"):
+            queryset = queryset.filter(usuario=datos["usuario"])
+        if datos.get("accion"):
+            queryset = queryset.filter(accion=datos["accion"])
+        if datos.get("ip_address"):
+            queryset = queryset.filter(ip_address=datos["ip_address"])
+        # Rangos sobre el campo (no sobre __date) para que usen el índice.
+        if datos.get("fecha_desde"):
+            desde = make_aware(datetime.combine(datos["fecha_desde"], time.min))
+            queryset = queryset.filter(fecha_hora__gte=desde)
+        if datos.get("fecha_hasta"):
+            hasta = make_aware(datetime.combine(datos["fecha_hasta"] + timedelta(days=1), time.min))
+            queryset = queryset.filter(fecha_hora__lt=hasta)
+        return queryset
+
+
+class ExportacionDocumentosForm(forms.Form):
+    tipo = forms.ChoiceField(
+        choices=[("facturas", "Facturas"), ("ops", "Órdenes de trabajo (OPs abiertas)")]
+    )
+    formato = forms.ChoiceField(
+        choices=[("zip", "ZIP (un PDF por documento)"), ("pdf", "Un solo PDF")],
+        initial="zip",
+        required=False,
+    )
+    fecha_desde = forms.DateField(required=False, label="Desde")
+    fecha_hasta = forms.DateField(required=False, label="Hasta")
+
+    def clean(self):
+        datos = super().clean()
+        desde, hasta = datos.get("fecha_desde"), datos.get("fecha_hasta")
+        if desde and hasta and desde > hasta:
+            raise forms.ValidationError("La fecha 'desde' no puede ser posterior a 'hasta'.")
+        datos["formato"] = datos.get("formato") or "zip"
+        return datos
+
 
 # Formulario para actualizar una OP (usado en la vista de detalle de OP)
 class OrdenProduccionUpdateForm(forms.ModelForm):
@@ -397,14 +522,11 @@ class FacturaForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Sugerir N° de Factura
-        last_factura = Factura.objects.order_by("id").last()
-        next_factura_number = (
-            f"FACT-{str(last_factura.id + 1).zfill(5)}"
-            if last_factura
-            else "FACT-00001"
+        # Sugerir N° de Factura (el definitivo se reserva al guardar)
+        self.fields["numero_factura"].initial = sugerir_siguiente_numero_documento(
+            Factura, "FACT", "numero_factura"
         )
-        self.fields["numero_factura"].initial = next_factura_number
+        self.fields["numero_factura"].required = False
 
         # Hacer que el campo sea de solo lectura para el usuario
         self.fields["numero_factura"].widget.attrs["readonly"] = True
@@ -412,6 +534,10 @@ class FacturaForm(forms.ModelForm):
             "class"
         ] = "form-control-plaintext text-muted"
 
+    def clean_numero_factura(self):
+        # El número lo asigna ventas_generar_factura_view desde la secuencia.
+        return ""
+
 
 class OrdenCompraForm(forms.ModelForm):
     class Meta:
@@ -482,14 +608,13 @@ class OrdenCompraForm(forms.ModelForm):
         self.fields["numero_orden"].widget.attrs[
             "class"
         ] = "form-control-plaintext mb-3 text-muted"
-        if is_new_instance and not self.initial.get("numero_orden"):
-            last_oc = Orden.objects.filter(tipo="compra").order_by("id").last()
-            next_id = (last_oc.id + 1) if last_oc else 1
-            next_oc_number = f"OC-{str(next_id).zfill(5)}"
-            while Orden.objects.filter(numero_orden=next_oc_number).exists():
-                next_id += 1
-                next_oc_number = f"OC-{str(next_id).zfill(5)}"
-            self.initial["numero_orden"] = next_oc_number
+        if is_new_instance:
+            # Solo sugerencia: compras_crear_oc_view reserva el número definitivo.
+            if not self.initial.get("numero_orden"):
+                self.initial["numero_orden"] = sugerir_siguiente_numero_documento(
+                    Orden, "OC", "numero_orden"
+                )
+            self.fields["numero_orden"].required = False
 
         # --- Configuración de Insumo Principal ---
         if self.insumo_fijo:
@@ -575,7 +700,9 @@ class OrdenCompraForm(forms.ModelForm):
     def clean_numero_orden(self):
         numero_orden = self.cleaned_data.get("numero_orden")
         instance = getattr(self, "instance", None)
-        if instance and instance.pk and instance.numero_orden == numero_orden:
+        if not (instance and instance.pk):
+            return ""
+        if instance.numero_orden == numero_orden:
             return numero_orden
         if Orden.objects.filter(numero_orden=numero_orden).exists():
             raise forms.ValidationError(
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from App_LUMINOVA.services.historial_services import (
+    archivar_auditoria,
+    archivar_historial_ov,
+    fecha_corte,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve el historial de OVs y la auditoría de accesos anteriores a N "
+        "meses a las tablas de archivo comprimidas (un registro por OV y uno "
+        "por día de auditoría), para que las tablas de uso diario no crezcan "
+        "sin límite. Lo archivado se sigue consultando con "
+        "historial_services.historial_ov / historial_accesos. Conviene "
+        "programarlo (ej: cron mensual)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--meses",
+            type=int,
+            default=12,
+            help="Antigüedad a partir de la cual se archiva (default: 12).",
+        )
+        parser.add_argument(
+            "--solo",
+            choices=["historial", "auditoria"],
+            help="Archiva solo una de las dos tablas.",
+        )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=500,
+            help="OVs por transacción al archivar el historial (default: 500).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Solo informa cuánto se archivaría.",
+        )
+
+    def handle(self, *args, **options):
+        if options["meses"] < 1:
+            raise CommandError("--meses debe ser mayor a cero.")
+        if options["lote"] < 1:
+            raise CommandError("--lote debe ser mayor a cero.")
+
+        corte = fecha_corte(options["meses"])
+        dry_run = options["dry_run"]
+        verbo = "se archivarían" if dry_run else "archivados"
+        self.stdout.write(f"Archivando registros anteriores al {timezone.localtime(corte):%d/%m/%Y}.")
+
+        if options["solo"] != "auditoria":
+            resultado = archivar_historial_ov(corte, lote=options["lote"], dry_run=dry_run)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Historial de OVs: {resultado.registros} eventos {verbo} "
+                    f"({resultado.grupos} OVs)."
+                )
+            )
+        if options["solo"] != "historial":
+            resultado = archivar_auditoria(corte, dry_run=dry_run)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Auditoría de accesos: {resultado.registros} registros {verbo} "
+                    f"({resultado.grupos} días)."
+                )
+            )
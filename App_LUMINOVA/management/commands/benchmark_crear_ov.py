@@ -0,0 +1,108 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from App_LUMINOVA.models import (
+    CategoriaProductoTerminado,
+    Cliente,
+    EstadoOrden,
+    ItemOrdenVenta,
+    OrdenProduccion,
+    OrdenVenta,
+    ProductoTerminado,
+)
+from App_LUMINOVA.services.document_services import generar_siguiente_numero_documento
+from App_LUMINOVA.services.estado_services import Estados, estados
+from App_LUMINOVA.services.venta_services import crear_orden_venta
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de creación de una OV grande: compara el servicio masivo "
+        "crear_orden_venta con la creación fila por fila (save() + señales). "
+        "Todo se ejecuta dentro de una transacción que se revierte al final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lineas", type=int, default=500)
+        parser.add_argument("--productos", type=int, default=50)
+
+    def handle(self, *args, **options):
+        lineas = options["lineas"]
+        cantidad_productos = options["productos"]
+
+        try:
+            with transaction.atomic():
+                lineas_ov, cliente = self._preparar_datos(lineas, cantidad_productos)
+
+                masivo = self._medir(
+                    lambda: crear_orden_venta(cliente=cliente, lineas=lineas_ov)
+                )
+                por_fila = self._medir(
+                    lambda: self._crear_fila_por_fila(cliente, lineas_ov)
+                )
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"OV de {lineas} líneas ({cantidad_productos} productos distintos)")
+        for nombre, (consultas, duracion) in (
+            ("crear_orden_venta (masivo)", masivo),
+            ("fila por fila (save + señales)", por_fila),
+        ):
+            self.stdout.write(f"  {nombre:<32} {consultas:>6} consultas  {duracion * 1000:9.1f} ms")
+        self.stdout.write(self.style.SUCCESS("Benchmark de creación de OV OK (datos revertidos)."))
+
+    def _medir(self, funcion):
+        with CaptureQueriesContext(connection) as ctx:
+            inicio = time.perf_counter()
+            with transaction.atomic():
+                funcion()
+            duracion = time.perf_counter() - inicio
+        return len(ctx.captured_queries), duracion
+
+    def _preparar_datos(self, lineas, cantidad_productos):
+        EstadoOrden.objects.get_or_create(nombre="Pendiente")
+        cliente = Cliente.objects.create(nombre="__benchmark_crear_ov__")
+        categoria = CategoriaProductoTerminado.objects.create(nombre="__benchmark_crear_ov__")
+        productos = ProductoTerminado.objects.bulk_create(
+            ProductoTerminado(
+                descripcion=f"Producto benchmark {i}", categoria=categoria, precio_unitario=10
+            )
+            for i in range(cantidad_productos)
+        )
+        lineas_ov = [
+            {"producto": productos[i % cantidad_productos].id, "cantidad": 1 + i % 7}
+            for i in range(lineas)
+        ]
+        return lineas_ov, cliente
+
+    def _crear_fila_por_fila(self, cliente, lineas_ov):
+        """Referencia: una inserción por fila, con numeración y señales por OP."""
+        estado_op = estados.obtener(Estados.PENDIENTE)
+        ov = OrdenVenta.objects.create(
+            numero_ov=generar_siguiente_numero_documento(OrdenVenta, "OV", "numero_ov"),
+            cliente=cliente,
+        )
+        for linea in lineas_ov:
+            producto = ProductoTerminado.objects.get(id=linea["producto"])
+            ItemOrdenVenta.objects.create(
+                orden_venta=ov,
+                producto_terminado=producto,
+                cantidad=linea["cantidad"],
+                precio_unitario_venta=producto.precio_unitario,
+            )
+            OrdenProduccion.objects.create(
+                numero_op=generar_siguiente_numero_documento(OrdenProduccion, "OP", "numero_op"),
+                orden_venta_origen=ov,
+                producto_a_producir=producto,
+                cantidad_a_producir=linea["cantidad"],
+                estado_op=estado_op,
+            )
+        ov.actualizar_total()
@@ -0,0 +1,249 @@
+import json
+import logging
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, connections, transaction
+from django.db.models import F
+
+from App_LUMINOVA.models import Cliente, Insumo, ProductoTerminado
+from App_LUMINOVA.services.datos_sinteticos_services import generar_datos_sinteticos
+from App_LUMINOVA.services.stock_services import StockInsuficienteError, descontar_insumos
+from App_LUMINOVA.services.venta_services import crear_orden_venta
+from App_LUMINOVA.utils import atomic_inmediato
+from Proyecto_LUMINOVA.bases_de_datos import PERFILES_SQLITE, opciones_sqlite
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de escritores concurrentes: varios hilos simulan peticiones "
+        "de ventas (crear una OV) y de depósito (descontar insumos), cada una "
+        "leyendo antes de escribir dentro de la transacción de la vista. En "
+        "SQLite compara el perfil 'basico' (PRAGMA por defecto, BEGIN DEFERRED, "
+        "una conexión por petición) con el 'optimizado' (WAL, busy_timeout, "
+        "BEGIN IMMEDIATE, conexiones persistentes), cada uno sobre una copia de "
+        "la misma base temporal con datos sintéticos. Con otro motor (ej: "
+        "LUMINOVA_DB_MOTOR=postgresql) corre una vez sobre una base de test con "
+        "los mismos datos. --salida acumula los resultados de varias corridas "
+        "en un JSON para compararlos entre motores."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hilos", type=int, default=8)
+        parser.add_argument("--operaciones", type=int, default=40, help="Peticiones por hilo.")
+        parser.add_argument("--escala", type=float, default=1, help="Escala de los datos sintéticos.")
+        parser.add_argument("--semilla", type=int, default=0)
+        parser.add_argument(
+            "--perfiles",
+            nargs="+",
+            default=["basico", "optimizado"],
+            choices=sorted(PERFILES_SQLITE),
+            help="Perfiles SQLite a comparar (se ignora con otros motores).",
+        )
+        parser.add_argument(
+            "--salida",
+            help="JSON donde se acumulan los resultados, por perfil o motor.",
+        )
+
+    def handle(self, *args, **options):
+        if options["hilos"] < 1 or options["operaciones"] < 1:
+            raise CommandError("--hilos y --operaciones deben ser mayores a cero.")
+
+        # Los on_commit que fallan con "database is locked" se cuentan en la
+        # comparación; no hace falta un traceback por cada uno.
+        logger_on_commit = logging.getLogger("django.db.backends.base")
+        nivel_anterior = logger_on_commit.level
+        logger_on_commit.setLevel(logging.CRITICAL)
+        try:
+            if connection.vendor == "sqlite":
+                resultados = self._comparar_perfiles_sqlite(options)
+            else:
+                resultados = self._correr_en_base_temporal(options)
+        finally:
+            logger_on_commit.setLevel(nivel_anterior)
+
+        if options["salida"]:
+            resultados = self._acumular(options["salida"], resultados)
+        self._imprimir(resultados, options)
+
+    def _preparar_datos(self, options):
+        datos = generar_datos_sinteticos(escala=options["escala"], semilla=options["semilla"])
+        # Stock de sobra: medimos contención, no faltantes.
+        Insumo.objects.update(stock=F("stock") + 1_000_000)
+        self.stdout.write(
+            f"Datos sintéticos (escala {options['escala']:g}): {datos['insumos']} "
+            f"insumos, {datos['productos']} productos, {datos['clientes']} clientes."
+        )
+
+    def _comparar_perfiles_sqlite(self, options):
+        config = connection.settings_dict
+        original = {clave: config[clave] for clave in ("NAME", "OPTIONS", "CONN_MAX_AGE")}
+        resultados = {}
+        try:
+            with tempfile.TemporaryDirectory() as directorio:
+                plantilla = Path(directorio) / "plantilla.sqlite3"
+                self._usar_base(plantilla, "basico")
+                call_command("migrate", verbosity=0, interactive=False)
+                self._preparar_datos(options)
+                connections.close_all()
+
+                for perfil in options["perfiles"]:
+                    base = Path(directorio) / f"{perfil}.sqlite3"
+                    shutil.copyfile(plantilla, base)
+                    self._usar_base(base, perfil)
+                    resultados[f"sqlite {perfil}"] = self._correr(
+                        atomic_inmediato if perfil == "optimizado" else transaction.atomic,
+                        options,
+                    )
+                    connections.close_all()
+        finally:
+            config.update(original)
+            connections.close_all()
+        return resultados
+
+    def _correr_en_base_temporal(self, options):
+        """Crea una base de test (sin tocar la configurada), la carga y mide."""
+        nombre_original = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self._preparar_datos(options)
+            # Fuera de SQLite atomic_inmediato es un atomic común.
+            return {connection.vendor: self._correr(atomic_inmediato, options)}
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+    def _acumular(self, archivo, resultados):
+        try:
+            with open(archivo, encoding="utf-8") as f:
+                acumulados = json.load(f)
+        except FileNotFoundError:
+            acumulados = {}
+        acumulados.update(resultados)
+        with open(archivo, "w", encoding="utf-8") as f:
+            json.dump(acumulados, f, indent=2, sort_keys=True)
+            f.write("\n")
+        return acumulados
+
+    def _usar_base(self, nombre, perfil):
+        """
+        Apunta la conexión 'default' a otro archivo y perfil. Los hilos crean
+        sus conexiones a partir de este mismo diccionario de settings.
+        """
+        connections.close_all()
+        connection.settings_dict.update(
+            NAME=str(nombre),
+            OPTIONS=opciones_sqlite(PERFILES_SQLITE[perfil]["pragmas"]),
+            CONN_MAX_AGE=PERFILES_SQLITE[perfil]["conn_max_age"],
+        )
+
+    def _correr(self, transaccion, options):
+        """
+        `transaccion` envuelve cada petición como lo haría la vista: antes
+        @transaction.atomic (BEGIN DEFERRED), ahora @atomic_en_escrituras, que
+        para un POST usa atomic_inmediato.
+        """
+        clientes = list(Cliente.objects.values_list("id", flat=True))
+        productos = list(ProductoTerminado.objects.values_list("id", flat=True))
+        insumos = list(Insumo.objects.values_list("id", flat=True))
+        connections.close_all()
+
+        latencias = []
+        errores = []
+        lock = threading.Lock()
+        barrera = threading.Barrier(options["hilos"])
+
+        def venta(i):
+            with transaccion():
+                cliente = Cliente.objects.get(id=clientes[i % len(clientes)])
+                lineas = [
+                    {"producto": productos[(i + k) % len(productos)], "cantidad": 1 + k}
+                    for k in range(3)
+                ]
+                crear_orden_venta(cliente, lineas)
+
+        def despacho(i):
+            with transaccion():
+                elegidos = [insumos[(i + k) % len(insumos)] for k in range(4)]
+                stock = dict(Insumo.objects.filter(id__in=elegidos).values_list("id", "stock"))
+                descontar_insumos(
+                    {insumo_id: 1 for insumo_id in elegidos if stock[insumo_id] > 0},
+                    referencia="benchmark",
+                )
+
+        def trabajador(numero):
+            operacion = venta if numero % 2 == 0 else despacho
+            propias = []
+            fallidas = []
+            barrera.wait()
+            try:
+                for i in range(options["operaciones"]):
+                    inicio = time.perf_counter()
+                    try:
+                        operacion(numero * options["operaciones"] + i)
+                        propias.append(time.perf_counter() - inicio)
+                    except (OperationalError, StockInsuficienteError) as e:
+                        fallidas.append(str(e))
+                    # Fin de la "petición": con CONN_MAX_AGE=0 se cierra la conexión.
+                    close_old_connections()
+            finally:
+                connection.close()
+                with lock:
+                    latencias.extend(propias)
+                    errores.extend(fallidas)
+
+        inicio = time.perf_counter()
+        hilos = [threading.Thread(target=trabajador, args=(n,)) for n in range(options["hilos"])]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        latencias.sort()
+        return {
+            "exitosas": len(latencias),
+            "errores": len(errores),
+            "primer_error": errores[0] if errores else "",
+            "duracion": duracion,
+            "p50_ms": statistics.median(latencias) * 1000 if latencias else 0,
+            "p95_ms": latencias[int(len(latencias) * 0.95) - 1] * 1000 if latencias else 0,
+        }
+
+    def _imprimir(self, resultados, options):
+        total = options["hilos"] * options["operaciones"]
+        self.stdout.write(
+            f"Hilos: {options['hilos']} | Peticiones por perfil: {total} "
+            "(mitad ventas, mitad depósito)"
+        )
+        self.stdout.write(
+            f"{'perfil':<18} {'exitosas':>8} {'errores':>8} {'seg':>7} "
+            f"{'ops/s':>8} {'p50 ms':>8} {'p95 ms':>8}"
+        )
+        for perfil, r in resultados.items():
+            self.stdout.write(
+                f"{perfil:<18} {r['exitosas']:>8} {r['errores']:>8} {r['duracion']:>7.2f} "
+                f"{r['exitosas'] / r['duracion']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f}"
+            )
+        for perfil, r in resultados.items():
+            if r["errores"]:
+                self.stdout.write(
+                    self.style.WARNING(f"{perfil}: {r['errores']} peticiones fallaron: {r['primer_error']}")
+                )
+        referencia = resultados.get("sqlite basico")
+        if referencia and referencia["exitosas"]:
+            antes = referencia["exitosas"] / referencia["duracion"]
+            for perfil, r in resultados.items():
+                if perfil != "sqlite basico":
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            f"Throughput {perfil} / sqlite basico: "
+                            f"{r['exitosas'] / r['duracion'] / antes:.2f}x"
+                        )
+                    )
@@ -0,0 +1,94 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+
+from App_LUMINOVA.models import OrdenProduccion, SecuenciaDocumento
+from App_LUMINOVA.services.document_services import reservar_numeros_documento
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de contención de la secuencia de documentos: varios hilos "
+        "reservan números en paralelo y se verifica que no haya duplicados ni huecos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hilos", type=int, default=8)
+        parser.add_argument("--iteraciones", type=int, default=50)
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=30,
+            help="Números reservados por llamada (ej: las líneas de una OV).",
+        )
+        parser.add_argument(
+            "--prefijo",
+            default="BENCH",
+            help="Prefijo temporal usado durante el benchmark; se elimina al terminar.",
+        )
+
+    def handle(self, *args, **options):
+        hilos = options["hilos"]
+        iteraciones = options["iteraciones"]
+        lote = options["lote"]
+        prefijo = options["prefijo"]
+
+        if SecuenciaDocumento.objects.filter(prefijo=prefijo).exists():
+            raise CommandError(f"Ya existe una secuencia con el prefijo '{prefijo}'.")
+
+        # Inicializamos la secuencia antes de lanzar los hilos.
+        SecuenciaDocumento.objects.create(prefijo=prefijo, ultimo_valor=0)
+
+        reservados = []
+        errores = []
+        lock = threading.Lock()
+
+        def trabajador():
+            try:
+                for _ in range(iteraciones):
+                    with transaction.atomic():
+                        numeros = reservar_numeros_documento(
+                            OrdenProduccion, prefijo, "numero_op", lote
+                        )
+                    with lock:
+                        reservados.extend(numeros)
+            except OperationalError as e:
+                with lock:
+                    errores.append(str(e))
+            finally:
+                connection.close()
+
+        try:
+            inicio = time.perf_counter()
+            threads = [threading.Thread(target=trabajador) for _ in range(hilos)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            duracion = time.perf_counter() - inicio
+        finally:
+            SecuenciaDocumento.objects.filter(prefijo=prefijo).delete()
+
+        esperados = hilos * iteraciones * lote
+        valores = sorted(int(n.split("-")[-1]) for n in reservados)
+        duplicados = len(valores) - len(set(valores))
+        sin_huecos = valores == list(range(1, len(valores) + 1))
+        llamadas = hilos * iteraciones
+
+        self.stdout.write(f"Hilos: {hilos} | Reservas: {llamadas} | Lote: {lote}")
+        self.stdout.write(
+            f"Números reservados: {len(valores)} de {esperados} en {duracion:.3f}s "
+            f"({llamadas / duracion:.1f} reservas/s, "
+            f"{duracion / llamadas * 1000:.2f} ms por reserva)"
+        )
+        self.stdout.write(f"Duplicados: {duplicados} | Secuencia sin huecos: {sin_huecos}")
+
+        if errores:
+            self.stdout.write(
+                self.style.WARNING(f"{len(errores)} hilos fallaron: {errores[0]}")
+            )
+        if duplicados or not sin_huecos:
+            raise CommandError("La secuencia entregó números duplicados o con huecos.")
+        self.stdout.write(self.style.SUCCESS("Benchmark de numeración OK."))
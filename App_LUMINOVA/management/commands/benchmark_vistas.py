@@ -0,0 +1,145 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from App_LUMINOVA.benchmarks.vistas import (
+    BASE_VISTAS,
+    cargar_base,
+    excesos,
+    guardar_resultados,
+    medir_rutas,
+    resultados_a_dict,
+    rutas_nombradas,
+)
+from App_LUMINOVA.services.datos_sinteticos_services import generar_datos_sinteticos
+
+
+class Command(BaseCommand):
+    help = (
+        "Recorre todas las rutas con nombre de ventas, compras, producción, "
+        "depósito y administración como el usuario de cada rol, sobre una base "
+        "temporal con datos sintéticos, y mide consultas SQL, latencia p50/p95 "
+        "y memoria pico por petición. Con --verificar falla si se excede el "
+        "presupuesto de la línea base; con --actualizar-base la reescribe."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--escala",
+            type=float,
+            help="Escala de los datos sintéticos (default: la de la línea base, o 1).",
+        )
+        parser.add_argument("--semilla", type=int, default=0)
+        parser.add_argument("--repeticiones", type=int, default=5)
+        parser.add_argument("--rutas", nargs="+", help="Medir solo estas rutas (por nombre).")
+        parser.add_argument("--roles", nargs="+", help="Medir solo con estos roles.")
+        parser.add_argument("--base", default=str(BASE_VISTAS), help="Archivo de la línea base.")
+        parser.add_argument("--salida", help="Guarda los resultados en este JSON.")
+        parser.add_argument("--actualizar-base", action="store_true")
+        parser.add_argument("--verificar", action="store_true")
+        parser.add_argument(
+            "--tolerancia-latencia",
+            type=float,
+            help=(
+                "Factor máximo sobre el p95 de la base con --verificar (ej: 2.0). Solo "
+                "tiene sentido contra una base generada en la misma máquina, así que "
+                "por defecto no se controla."
+            ),
+        )
+        parser.add_argument(
+            "--tolerancia-memoria",
+            type=float,
+            default=1.5,
+            help="Factor máximo sobre la memoria pico de la base con --verificar (default: 1.5).",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeticiones"] < 1:
+            raise CommandError("--repeticiones debe ser mayor a cero.")
+        if options["actualizar_base"] and (options["rutas"] or options["roles"]):
+            raise CommandError("--actualizar-base regenera la base completa: no use --rutas ni --roles.")
+        base = None
+        if options["verificar"] or options["escala"] is None:
+            try:
+                base = cargar_base(options["base"])
+            except FileNotFoundError:
+                if options["verificar"]:
+                    raise CommandError(f"No existe la línea base {options['base']}.")
+        escala = options["escala"] or (base["escala"] if base else 1)
+        if base and options["verificar"] and escala != base["escala"]:
+            raise CommandError(
+                f"La línea base se generó con escala {base['escala']}; "
+                "las consultas solo son comparables con la misma escala."
+            )
+
+        rutas = rutas_nombradas()
+        if options["rutas"]:
+            desconocidas = set(options["rutas"]) - {r.nombre for r in rutas}
+            if desconocidas:
+                raise CommandError(f"Rutas desconocidas: {', '.join(sorted(desconocidas))}.")
+            rutas = [r for r in rutas if r.nombre in options["rutas"]]
+
+        mediciones = self._medir_en_base_temporal(rutas, escala, options)
+        self._imprimir(mediciones)
+
+        datos = resultados_a_dict(
+            mediciones,
+            escala=escala,
+            semilla=options["semilla"],
+            repeticiones=options["repeticiones"],
+            generado=timezone.now().isoformat(timespec="seconds"),
+        )
+        if options["salida"]:
+            guardar_resultados(datos, options["salida"])
+        if options["actualizar_base"]:
+            guardar_resultados(datos, options["base"])
+            self.stdout.write(self.style.SUCCESS(f"Línea base actualizada en {options['base']}."))
+
+        if options["verificar"]:
+            problemas = excesos(
+                mediciones,
+                base,
+                tolerancia_latencia=options["tolerancia_latencia"],
+                tolerancia_memoria=options["tolerancia_memoria"],
+            )
+            if problemas:
+                for problema in problemas:
+                    self.stderr.write(f"  {problema}")
+                raise CommandError(f"{len(problemas)} presupuestos excedidos.")
+            self.stdout.write(self.style.SUCCESS("Todas las rutas dentro del presupuesto."))
+
+    def _medir_en_base_temporal(self, rutas, escala, options):
+        """Crea una base de test, la carga con datos sintéticos, mide y la destruye."""
+        nombre_original = connection.settings_dict["NAME"]
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            cache.clear()
+            datos = generar_datos_sinteticos(escala=escala, semilla=options["semilla"])
+            self.stdout.write(
+                f"Datos sintéticos (escala {escala}): {datos['ordenes_venta']} OVs, "
+                f"{datos['ordenes_compra']} OCs, {datos['insumos']} insumos."
+            )
+            return medir_rutas(
+                datos["usuarios"],
+                repeticiones=options["repeticiones"],
+                rutas=rutas,
+                roles=options["roles"],
+            )
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+
+    def _imprimir(self, mediciones):
+        self.stdout.write(
+            f"{'ruta':<44} {'rol':<14} {'estado':>6} {'consultas':>9} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'mem KB':>9}"
+        )
+        for m in mediciones:
+            memoria = "-" if m.memoria_kb is None else f"{m.memoria_kb:.0f}"
+            self.stdout.write(
+                f"{m.ruta:<44} {m.rol:<14} {m.estado:>6} {m.consultas:>9} "
+                f"{m.p50_ms:>8.1f} {m.p95_ms:>8.1f} {memoria:>9}"
+            )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from App_LUMINOVA.services.stock_services import cerrar_saldos_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera un corte de saldos del kardex de stock a partir del corte "
+        "anterior y los movimientos nuevos. Conviene programarlo (ej: cron "
+        "diario) para que las consultas de stock a una fecha solo recorran "
+        "los movimientos posteriores al último corte."
+    )
+
+    def handle(self, *args, **options):
+        corte = cerrar_saldos_stock()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Corte {corte.id} generado al {timezone.localtime(corte.fecha):%d/%m/%Y %H:%M} "
+                f"(hasta el movimiento {corte.ultimo_movimiento_id}, "
+                f"{corte.saldos.count()} saldos)."
+            )
+        )
@@ -0,0 +1,50 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from App_LUMINOVA.services.stock_services import ajustar_diferencias, conciliar_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el stock actual de insumos y productos terminados con el saldo "
+        "del kardex (último corte + movimientos posteriores) e informa las "
+        "diferencias. Con --ajustar agrega los movimientos que las corrigen."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ajustar",
+            action="store_true",
+            help="Registra un movimiento de ajuste por cada diferencia encontrada.",
+        )
+        parser.add_argument("--usuario", help="Usuario que figura en los ajustes.")
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options["usuario"]:
+            usuario = User.objects.filter(username=options["usuario"]).first()
+            if usuario is None:
+                raise CommandError(f"El usuario '{options['usuario']}' no existe.")
+
+        diferencias = conciliar_stock()
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS("El kardex coincide con el stock actual."))
+            return
+
+        for d in diferencias:
+            tipo = d.articulo._meta.verbose_name
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{tipo} #{d.articulo.id} '{d.articulo.descripcion}': stock {d.stock}, "
+                    f"kardex {d.saldo_kardex} (diferencia {d.diferencia:+d})"
+                )
+            )
+
+        if not options["ajustar"]:
+            raise CommandError(
+                f"{len(diferencias)} artículos no coinciden con el kardex (use --ajustar para corregirlos)."
+            )
+        ajustar_diferencias(diferencias, usuario=usuario)
+        self.stdout.write(
+            self.style.SUCCESS(f"Se registraron {len(diferencias)} movimientos de ajuste.")
+        )
@@ -0,0 +1,63 @@
+import shutil
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from App_LUMINOVA.services.pdf_services import (
+    TIPOS_EXPORTACION,
+    exportar_pdf_unico,
+    exportar_zip,
+    facturas_para_exportar,
+    ordenes_para_exportar,
+)
+
+
+def _fecha(valor):
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f"Fecha inválida '{valor}' (use AAAA-MM-DD).")
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta en lote los PDFs de las facturas (por fecha de emisión) o las "
+        "órdenes de trabajo de las OPs abiertas (por inicio planificado), como "
+        "un ZIP con un PDF por documento o un único PDF. Los PDFs se "
+        "renderizan en un pool de procesos; las facturas que ya tienen su PDF "
+        "guardado se leen del disco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("tipo", choices=TIPOS_EXPORTACION)
+        parser.add_argument("salida", help="Ruta del archivo .zip o .pdf a generar.")
+        parser.add_argument("--desde", type=_fecha, help="Fecha inicial (AAAA-MM-DD).")
+        parser.add_argument("--hasta", type=_fecha, help="Fecha final, inclusive (AAAA-MM-DD).")
+        parser.add_argument("--formato", choices=["zip", "pdf"], default="zip")
+        parser.add_argument(
+            "--procesos",
+            type=int,
+            help="Procesos para renderizar (default: hasta 4 según los CPUs; 1 = sin pool).",
+        )
+
+    def handle(self, *args, **options):
+        if options["procesos"] is not None and options["procesos"] < 1:
+            raise CommandError("--procesos debe ser mayor a cero.")
+
+        buscar = facturas_para_exportar if options["tipo"] == "facturas" else ordenes_para_exportar
+        documentos = buscar(options["desde"], options["hasta"])
+        cantidad = documentos.count()
+        if not cantidad:
+            raise CommandError("No hay documentos para exportar con esos filtros.")
+
+        with open(options["salida"], "wb") as archivo:
+            if options["formato"] == "pdf":
+                with exportar_pdf_unico(options["tipo"], documentos) as pdf:
+                    shutil.copyfileobj(pdf, archivo)
+            else:
+                for parte in exportar_zip(options["tipo"], documentos, options["procesos"]):
+                    archivo.write(parte)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{cantidad} documentos exportados a {options['salida']}.")
+        )
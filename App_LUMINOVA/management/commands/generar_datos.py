@@ -0,0 +1,88 @@
+import time
+from dataclasses import fields, replace
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from App_LUMINOVA.services.datos_sinteticos_services import (
+    Volumenes,
+    generar_datos_sinteticos,
+)
+
+
+def _fecha(valor):
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f"Fecha inválida '{valor}' (use AAAA-MM-DD).")
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga datos sintéticos en la base configurada: catálogos, insumos con "
+        "ofertas de proveedores, productos con BOM, clientes, y años de OVs, "
+        "OPs, lotes, reportes, facturas, historial, OCs y auditoría, con el "
+        "kardex de stock que corresponde, todo con bulk_create por lotes. Con la misma --semilla y --hasta sobre la misma "
+        "base genera exactamente los mismos datos. Pensado para benchmarks y "
+        "planificación de capacidad: no lo corra contra una base productiva."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--escala",
+            type=float,
+            default=1,
+            help="Factor sobre los volúmenes por defecto (ej: 1000 ≈ un millón de filas).",
+        )
+        parser.add_argument("--semilla", type=int, default=0)
+        parser.add_argument(
+            "--hasta",
+            type=_fecha,
+            help="Fecha de los documentos más recientes (AAAA-MM-DD, default: hoy).",
+        )
+        for campo in fields(Volumenes):
+            parser.add_argument(
+                f"--{campo.name.replace('_', '-')}",
+                type=int,
+                dest=campo.name,
+                help=f"Fija este volumen (default a escala 1: {campo.default}).",
+            )
+
+    def handle(self, *args, **options):
+        if options["escala"] <= 0:
+            raise CommandError("--escala debe ser mayor a cero.")
+        fijados = {
+            campo.name: options[campo.name]
+            for campo in fields(Volumenes)
+            if options[campo.name] is not None
+        }
+        if any(valor < 0 for valor in fijados.values()):
+            raise CommandError("Los volúmenes no pueden ser negativos.")
+
+        # Los volúmenes fijados explícitamente no se escalan.
+        volumenes = replace(Volumenes().escalar(options["escala"]), **fijados)
+        self.stdout.write(
+            f"Generando unas {volumenes.filas_estimadas:,} filas "
+            f"(escala {options['escala']:g}, semilla {options['semilla']})..."
+        )
+
+        inicio = time.perf_counter()
+        creados = generar_datos_sinteticos(
+            volumenes=volumenes,
+            escala=1,
+            semilla=options["semilla"],
+            hasta=options["hasta"],
+            progreso=self.stdout.write if options["verbosity"] > 1 else None,
+        )
+        duracion = time.perf_counter() - inicio
+
+        creados.pop("usuarios")
+        total = sum(creados.values())
+        for entidad, cantidad in creados.items():
+            self.stdout.write(f"  {entidad:<22} {cantidad:>10,}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{total:,} filas creadas en {duracion:.1f} s "
+                f"({total / max(duracion, 1e-9):,.0f} filas/s)."
+            )
+        )
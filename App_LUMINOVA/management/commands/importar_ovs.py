@@ -0,0 +1,97 @@
+import csv
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from App_LUMINOVA.services.estado_services import Estados, estados
+from App_LUMINOVA.services.importacion_services import (
+    ArchivoImportacionError,
+    importar_ordenes_venta,
+    leer_filas_archivo,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa Órdenes de Venta desde un CSV o XLSX. Columnas: referencia, "
+        "cliente (nombre o id), producto (descripción o id), cantidad y, "
+        "opcionalmente, precio_unitario y notas. Las filas de una misma OV "
+        "comparten referencia y deben venir consecutivas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Ruta al archivo .csv o .xlsx.")
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=1000,
+            help="Líneas aproximadas por transacción (default: 1000).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Solo valida el archivo; no crea ninguna OV.",
+        )
+        parser.add_argument(
+            "--reporte",
+            help="Ruta del CSV donde escribir los errores por fila.",
+        )
+        parser.add_argument("--usuario", help="Usuario que figura en el historial de las OVs.")
+        parser.add_argument("--encoding", default="utf-8-sig")
+        parser.add_argument("--delimitador", default=",")
+
+    def handle(self, *args, **options):
+        if options["lote"] < 1:
+            raise CommandError("--lote debe ser mayor a cero.")
+        if not estados.existe(Estados.PENDIENTE):
+            raise CommandError("Falta configurar el estado de OP 'Pendiente'.")
+
+        usuario = None
+        if options["usuario"]:
+            usuario = User.objects.filter(username=options["usuario"]).first()
+            if usuario is None:
+                raise CommandError(f"El usuario '{options['usuario']}' no existe.")
+
+        dry_run = options["dry_run"]
+
+        def informar_progreso(resultado):
+            self.stdout.write(
+                f"  {resultado.filas_leidas} filas leídas, "
+                f"{resultado.ovs_creadas} OVs {'válidas' if dry_run else 'creadas'}, "
+                f"{len(resultado.errores)} errores"
+            )
+
+        try:
+            resultado = importar_ordenes_venta(
+                leer_filas_archivo(
+                    options["archivo"], options["encoding"], options["delimitador"]
+                ),
+                lote=options["lote"],
+                dry_run=dry_run,
+                usuario=usuario,
+                al_procesar_lote=informar_progreso,
+            )
+        except (ArchivoImportacionError, OSError, UnicodeDecodeError) as e:
+            raise CommandError(str(e))
+
+        if options["reporte"]:
+            with open(options["reporte"], "w", newline="", encoding="utf-8") as archivo:
+                escritor = csv.writer(archivo)
+                escritor.writerow(["fila", "referencia", "error"])
+                escritor.writerows(sorted(resultado.errores))
+        else:
+            for fila, referencia, mensaje in sorted(resultado.errores)[:50]:
+                self.stdout.write(self.style.WARNING(f"Fila {fila} [{referencia}]: {mensaje}"))
+            if len(resultado.errores) > 50:
+                self.stdout.write(
+                    f"... y {len(resultado.errores) - 50} errores más (use --reporte)."
+                )
+
+        accion = "válidas (dry-run, no se guardó nada)" if dry_run else "creadas"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Filas leídas: {resultado.filas_leidas} | OVs {accion}: "
+                f"{resultado.ovs_creadas} ({resultado.lineas_creadas} líneas) | "
+                f"Filas con error: {len(resultado.errores)}"
+            )
+        )
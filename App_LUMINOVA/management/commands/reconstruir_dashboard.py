@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from App_LUMINOVA.services.dashboard_services import SECCIONES, refrescar_dashboard_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula el snapshot del dashboard de administración. Las secciones "
+        "que cambiaron se recalculan al leerlas; este comando rehace todas, por "
+        "ejemplo tras cargas masivas hechas por fuera de la aplicación."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--secciones",
+            nargs="+",
+            choices=SECCIONES,
+            help="Secciones a recalcular (por defecto, todas).",
+        )
+
+    def handle(self, *args, **options):
+        secciones = options["secciones"] or SECCIONES
+        refrescar_dashboard_snapshot(secciones)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Snapshot del dashboard recalculado: {', '.join(secciones)}."
+            )
+        )
@@ -0,0 +1,56 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from App_LUMINOVA.models import Factura
+from App_LUMINOVA.services.pdf_services import (
+    VERSION_PLANTILLA_FACTURA,
+    guardar_pdf_factura,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Vuelve a renderizar los PDFs guardados de las facturas. Por defecto "
+        "solo los que faltan o se generaron con una versión anterior de la "
+        "plantilla (VERSION_PLANTILLA_FACTURA); con --todas, todos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--todas", action="store_true", help="Regenera todas las facturas."
+        )
+        parser.add_argument(
+            "--verificar-archivos",
+            action="store_true",
+            help="Regenera también las que figuran generadas pero cuyo archivo no está.",
+        )
+        parser.add_argument("facturas", nargs="*", help="Números de factura puntuales.")
+
+    def handle(self, *args, **options):
+        facturas = Factura.objects.select_related("orden_venta__cliente").order_by("id")
+        if options["facturas"]:
+            facturas = facturas.filter(numero_factura__in=options["facturas"])
+        elif not options["todas"] and not options["verificar_archivos"]:
+            facturas = facturas.filter(
+                Q(pdf_sha256="") | ~Q(pdf_version=VERSION_PLANTILLA_FACTURA)
+            )
+
+        regeneradas = 0
+        for factura in facturas.iterator(chunk_size=200):
+            if (
+                options["verificar_archivos"]
+                and not options["todas"]
+                and factura.pdf_version == VERSION_PLANTILLA_FACTURA
+                and factura.ruta_pdf
+                and default_storage.exists(factura.ruta_pdf)
+            ):
+                continue
+            guardar_pdf_factura(factura)
+            regeneradas += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"PDFs regenerados: {regeneradas} (plantilla versión {VERSION_PLANTILLA_FACTURA})."
+            )
+        )
@@ -3,6 +3,26 @@ from django.urls import reverse
 
 from .models import PasswordChangeRequired
 
+# Clave de sesión donde se cachea si el usuario debe cambiar su contraseña.
+SESSION_KEY_CAMBIO_PASSWORD = "luminova_debe_cambiar_password"
+
+
+def debe_cambiar_password(request):
+    """
+    Indica si el usuario debe cambiar su contraseña. La consulta se hace una
+    sola vez por sesión; el resultado queda guardado en la propia sesión.
+    """
+    requerido = request.session.get(SESSION_KEY_CAMBIO_PASSWORD)
+    if requerido is None:
+        requerido = PasswordChangeRequired.objects.filter(user=request.user).exists()
+        request.session[SESSION_KEY_CAMBIO_PASSWORD] = requerido
+    return requerido
+
+
+def marcar_password_cambiado(request):
+    """Invalida la marca cacheada en la sesión tras cambiar la contraseña."""
+    request.session[SESSION_KEY_CAMBIO_PASSWORD] = False
+
 
 class PasswordChangeMiddleware:
     def __init__(self, get_response):
@@ -13,28 +33,25 @@ class PasswordChangeMiddleware:
         ]
 
     def __call__(self, request):
-        # Primero, procesamos la solicitud para obtener la respuesta.
-        # Esto permite que otras partes de Django (como la sesión) se carguen.
-        response = self.get_response(request)
-
-        # El middleware solo actúa si el usuario está autenticado y no es superusuario
-        # (los superusuarios pueden necesitar acceso total para depurar)
-        if not request.user.is_authenticated or request.user.is_superuser:
-            return response
+        # La comprobación se hace ANTES de ejecutar la vista, así no se
+        # desperdicia su trabajo cuando terminamos redirigiendo.
+        if self._requiere_redireccion(request):
+            return redirect("App_LUMINOVA:change_password")
+        return self.get_response(request)
 
+    def _requiere_redireccion(self, request):
         # Ignorar peticiones para archivos estáticos/media y para el panel de admin de Django
         if request.path_info.startswith(("/static/", "/media/", "/admin/")):
-            return response
+            return False
 
         # Si el usuario está en una de las páginas permitidas, no hacemos nada más
         if request.path_info in self.allowed_paths:
-            return response
+            return False
 
-        # La comprobación clave: ¿Necesita cambiar la contraseña?
-        if PasswordChangeRequired.objects.filter(user=request.user).exists():
-            # Si está aquí, significa que intentó acceder a una página no permitida.
-            # Lo redirigimos forzosamente.
-            return redirect("App_LUMINOVA:change_password")
+        # El middleware solo actúa si el usuario está autenticado y no es superusuario
+        # (los superusuarios pueden necesitar acceso total para depurar)
+        if not request.user.is_authenticated or request.user.is_superuser:
+            return False
 
-        # Si no se cumple ninguna de las condiciones de redirección, devolvemos la respuesta original.
-        return response
+        # La comprobación clave: ¿Necesita cambiar la contraseña? (cacheado en la sesión)
+        return debe_cambiar_password(request)
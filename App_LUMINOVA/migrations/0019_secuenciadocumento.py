@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("App_LUMINOVA", "0018_passwordchangerequired"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SecuenciaDocumento",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("prefijo", models.CharField(max_length=10, unique=True)),
+                ("ultimo_valor", models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Secuencia de Documento",
+                "verbose_name_plural": "Secuencias de Documentos",
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("App_LUMINOVA", "0019_secuenciadocumento"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DashboardSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("ops_con_problemas_count", models.PositiveIntegerField(default=0)),
+                (
+                    "solicitudes_insumos_pendientes_count",
+                    models.PositiveIntegerField(default=0),
+                ),
+                ("ocs_para_aprobar_count", models.PositiveIntegerField(default=0)),
+                ("acciones_actualizado", models.DateTimeField(blank=True, null=True)),
+                ("insumos_criticos", models.JSONField(blank=True, default=list)),
+                ("stock_actualizado", models.DateTimeField(blank=True, null=True)),
+                (
+                    "total_luminarias_ensambladas",
+                    models.PositiveIntegerField(default=0),
+                ),
+                ("ops_a_tiempo", models.PositiveIntegerField(default=0)),
+                ("ops_con_retraso", models.PositiveIntegerField(default=0)),
+                ("tasa_cumplimiento", models.FloatField(default=0)),
+                (
+                    "rendimiento_actualizado",
+                    models.DateTimeField(blank=True, null=True),
+                ),
+                ("ultima_ov_pk", models.PositiveIntegerField(blank=True, null=True)),
+                ("ultima_ov_numero", models.CharField(blank=True, max_length=20)),
+                ("ultima_ov_fecha", models.DateTimeField(blank=True, null=True)),
+                (
+                    "ultima_op_completada_pk",
+                    models.PositiveIntegerField(blank=True, null=True),
+                ),
+                (
+                    "ultima_op_completada_numero",
+                    models.CharField(blank=True, max_length=20),
+                ),
+                (
+                    "ultima_op_completada_fecha",
+                    models.DateTimeField(blank=True, null=True),
+                ),
+                ("ultimo_reporte_numero", models.CharField(blank=True, max_length=20)),
+                ("ultimo_reporte_fecha", models.DateTimeField(blank=True, null=True)),
+                ("actividad_actualizado", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Snapshot del Dashboard",
+                "verbose_name_plural": "Snapshots del Dashboard",
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("App_LUMINOVA", "0020_dashboardsnapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="insumo",
+            name="punto_reorden",
+            field=models.PositiveIntegerField(
+                default=15000,
+                help_text="Con stock por debajo de este valor el insumo se considera crítico.",
+                verbose_name="Punto de Reorden",
+            ),
+        ),
+    ]
@@ -0,0 +1,216 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def registrar_saldos_iniciales(apps, schema_editor):
+    """El kardex arranca con el stock actual de cada artículo como saldo inicial."""
+    Insumo = apps.get_model("App_LUMINOVA", "Insumo")
+    ProductoTerminado = apps.get_model("App_LUMINOVA", "ProductoTerminado")
+    MovimientoStock = apps.get_model("App_LUMINOVA", "MovimientoStock")
+
+    movimientos = [
+        MovimientoStock(insumo_id=pk, cantidad=stock, tipo="SALDO_INICIAL")
+        for pk, stock in Insumo.objects.exclude(stock=0).values_list("id", "stock")
+    ]
+    movimientos += [
+        MovimientoStock(producto_terminado_id=pk, cantidad=stock, tipo="SALDO_INICIAL")
+        for pk, stock in ProductoTerminado.objects.exclude(stock=0).values_list(
+            "id", "stock"
+        )
+    ]
+    MovimientoStock.objects.bulk_create(movimientos, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("App_LUMINOVA", "0021_insumo_punto_reorden"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CorteStock",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "fecha",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+                ("ultimo_movimiento_id", models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Corte de Stock",
+                "verbose_name_plural": "Cortes de Stock",
+                "ordering": ["-fecha"],
+            },
+        ),
+        migrations.CreateModel(
+            name="MovimientoStock",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cantidad", models.IntegerField()),
+                (
+                    "tipo",
+                    models.CharField(
+                        choices=[
+                            ("SALDO_INICIAL", "Saldo Inicial"),
+                            ("RECEPCION_OC", "Recepción de OC"),
+                            ("ENVIO_OP", "Envío de Insumos a OP"),
+                            ("PRODUCCION", "Ingreso por Producción"),
+                            ("ENVIO_LOTE", "Envío de Lote"),
+                            ("AJUSTE", "Ajuste Manual"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "referencia",
+                    models.CharField(
+                        blank=True,
+                        help_text="Ej: número de OC, OP o lote.",
+                        max_length=50,
+                    ),
+                ),
+                ("fecha", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "insumo",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="movimientos_stock",
+                        to="App_LUMINOVA.insumo",
+                    ),
+                ),
+                (
+                    "producto_terminado",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="movimientos_stock",
+                        to="App_LUMINOVA.productoterminado",
+                    ),
+                ),
+                (
+                    "usuario",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Movimiento de Stock",
+                "verbose_name_plural": "Movimientos de Stock",
+                "ordering": ["-id"],
+                "indexes": [
+                    models.Index(
+                        fields=["insumo", "fecha"],
+                        name="App_LUMINOV_insumo__215d17_idx",
+                    ),
+                    models.Index(
+                        fields=["producto_terminado", "fecha"],
+                        name="App_LUMINOV_product_d72aad_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.CheckConstraint(
+                        condition=models.Q(
+                            models.Q(
+                                ("insumo__isnull", False),
+                                ("producto_terminado__isnull", True),
+                            ),
+                            models.Q(
+                                ("insumo__isnull", True),
+                                ("producto_terminado__isnull", False),
+                            ),
+                            _connector="OR",
+                        ),
+                        name="movimientostock_un_solo_articulo",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="SaldoStock",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("stock", models.IntegerField()),
+                (
+                    "corte",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="saldos",
+                        to="App_LUMINOVA.cortestock",
+                    ),
+                ),
+                (
+                    "insumo",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="App_LUMINOVA.insumo",
+                    ),
+                ),
+                (
+                    "producto_terminado",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="App_LUMINOVA.productoterminado",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Saldo de Stock",
+                "verbose_name_plural": "Saldos de Stock",
+                "indexes": [
+                    models.Index(
+                        fields=["insumo", "corte"],
+                        name="App_LUMINOV_insumo__6056e6_idx",
+                    ),
+                    models.Index(
+                        fields=["producto_terminado", "corte"],
+                        name="App_LUMINOV_product_bc867d_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(registrar_saldos_iniciales, migrations.RunPython.noop),
+    ]
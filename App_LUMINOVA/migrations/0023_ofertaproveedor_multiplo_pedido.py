@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("App_LUMINOVA", "0022_movimientos_stock"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ofertaproveedor",
+            name="multiplo_pedido",
+            field=models.PositiveIntegerField(
+                default=1,
+                help_text="El proveedor solo vende en múltiplos de esta cantidad (cajas, rollos).",
+                verbose_name="Múltiplo de Pedido",
+            ),
+        ),
+    ]
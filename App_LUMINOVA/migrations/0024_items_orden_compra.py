@@ -0,0 +1,103 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def crear_lineas_desde_insumo_principal(apps, schema_editor):
+    """Cada OC existente pasa a tener una línea con su insumo y cantidad principal."""
+    Orden = apps.get_model("App_LUMINOVA", "Orden")
+    ItemOrdenCompra = apps.get_model("App_LUMINOVA", "ItemOrdenCompra")
+
+    recibidas = ("RECIBIDA_TOTAL", "COMPLETADA")
+    lineas = []
+    for oc_id, insumo_id, cantidad, precio, estado in Orden.objects.filter(
+        insumo_principal__isnull=False, cantidad_principal__gt=0
+    ).values_list(
+        "id", "insumo_principal_id", "cantidad_principal", "precio_unitario_compra", "estado"
+    ):
+        precio = precio or 0
+        lineas.append(
+            ItemOrdenCompra(
+                orden_id=oc_id,
+                insumo_id=insumo_id,
+                cantidad=cantidad,
+                cantidad_recibida=cantidad if estado in recibidas else 0,
+                precio_unitario_compra=precio,
+                subtotal=cantidad * precio,
+            )
+        )
+    ItemOrdenCompra.objects.bulk_create(lineas, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("App_LUMINOVA", "0023_ofertaproveedor_multiplo_pedido"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ItemOrdenCompra",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cantidad", models.PositiveIntegerField()),
+                ("cantidad_recibida", models.PositiveIntegerField(default=0)),
+                (
+                    "precio_unitario_compra",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=10,
+                        verbose_name="Precio Unit. Compra",
+                    ),
+                ),
+                (
+                    "subtotal",
+                    models.DecimalField(
+                        decimal_places=2, default=0, editable=False, max_digits=12
+                    ),
+                ),
+                (
+                    "insumo",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="items_oc",
+                        to="App_LUMINOVA.insumo",
+                    ),
+                ),
+                (
+                    "orden",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="items_oc",
+                        to="App_LUMINOVA.orden",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Ítem de Orden de Compra",
+                "verbose_name_plural": "Ítems de Órdenes de Compra",
+                "constraints": [
+                    models.CheckConstraint(
+                        condition=models.Q(
+                            ("cantidad_recibida__lte", models.F("cantidad"))
+                        ),
+                        name="itemordencompra_recibido_no_supera_pedido",
+                    )
+                ],
+                "unique_together": {("orden", "insumo")},
+            },
+        ),
+        migrations.RunPython(
+            crear_lineas_desde_insumo_principal, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:59
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("App_LUMINOVA", "0024_items_orden_compra"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="auditoriaacceso",
+            name="fecha_hora",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name="auditoriaacceso",
+            index=models.Index(
+                fields=["fecha_hora", "usuario"], name="App_LUMINOV_fecha_h_a8b7a9_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="auditoriaacceso",
+            index=models.Index(
+                fields=["usuario", "fecha_hora"], name="App_LUMINOV_usuario_17c7b8_idx"
+            ),
+        ),
+    ]
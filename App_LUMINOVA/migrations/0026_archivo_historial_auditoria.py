@@ -0,0 +1,97 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:01
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("App_LUMINOVA", "0025_indices_auditoria_acceso"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuditoriaAccesoArchivada",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fecha", models.DateField(unique=True)),
+                ("cantidad_registros", models.PositiveIntegerField(default=0)),
+                ("inicios_sesion", models.PositiveIntegerField(default=0)),
+                ("usuarios_distintos", models.PositiveIntegerField(default=0)),
+                ("datos", models.BinaryField()),
+                (
+                    "fecha_archivado",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "verbose_name": "Auditoría de Acceso Archivada",
+                "verbose_name_plural": "Auditorías de Acceso Archivadas",
+                "ordering": ["-fecha"],
+            },
+        ),
+        migrations.CreateModel(
+            name="HistorialOVArchivado",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cantidad_eventos", models.PositiveIntegerField(default=0)),
+                ("primer_evento", models.DateTimeField()),
+                ("ultimo_evento", models.DateTimeField()),
+                (
+                    "ultimo_tipo_evento",
+                    models.CharField(blank=True, max_length=50, null=True),
+                ),
+                ("datos", models.BinaryField()),
+                (
+                    "fecha_archivado",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "verbose_name": "Historial de OV Archivado",
+                "verbose_name_plural": "Historiales de OV Archivados",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="historialov",
+            index=models.Index(
+                fields=["orden_venta", "fecha_evento"],
+                name="App_LUMINOV_orden_v_36d7ce_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="historialov",
+            index=models.Index(
+                fields=["fecha_evento"], name="App_LUMINOV_fecha_e_592a19_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="historialovarchivado",
+            name="orden_venta",
+            field=models.OneToOneField(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="historial_archivado",
+                to="App_LUMINOVA.ordenventa",
+            ),
+        ),
+    ]
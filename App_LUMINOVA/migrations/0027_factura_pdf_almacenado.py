@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("App_LUMINOVA", "0026_archivo_historial_auditoria"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="factura",
+            name="pdf_generado",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="factura",
+            name="pdf_sha256",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="factura",
+            name="pdf_version",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("App_LUMINOVA", "0027_factura_pdf_almacenado"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="insumo",
+            index=models.Index(
+                condition=models.Q(("stock__lt", models.F("punto_reorden"))),
+                fields=["stock"],
+                name="insumo_bajo_reorden_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="loteproductoterminado",
+            index=models.Index(
+                condition=models.Q(("enviado", False)),
+                fields=["fecha_creacion"],
+                name="lote_pt_pendiente_fecha_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="orden",
+            index=models.Index(
+                fields=["tipo", "fecha_creacion"], name="App_LUMINOV_tipo_f356e6_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="orden",
+            index=models.Index(
+                fields=["tipo", "estado", "fecha_creacion"],
+                name="App_LUMINOV_tipo_6328bf_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ordenproduccion",
+            index=models.Index(
+                fields=["estado_op", "fecha_solicitud"],
+                name="App_LUMINOV_estado__1df307_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ordenproduccion",
+            index=models.Index(
+                fields=["estado_op", "fecha_fin_real"],
+                name="App_LUMINOV_estado__c39d2e_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ordenventa",
+            index=models.Index(
+                fields=["fecha_creacion", "id"], name="App_LUMINOV_fecha_c_675223_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ordenventa",
+            index=models.Index(
+                fields=["estado", "fecha_creacion", "id"],
+                name="App_LUMINOV_estado_6bacc7_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reportes",
+            index=models.Index(
+                condition=models.Q(("resuelto", False)),
+                fields=["orden_produccion_asociada"],
+                name="reporte_abierto_op_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reportes",
+            index=models.Index(
+                condition=models.Q(("resuelto", False)),
+                fields=["fecha"],
+                name="reporte_abierto_fecha_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reportes",
+            index=models.Index(
+                condition=models.Q(("resuelto", True)),
+                fields=["fecha_resolucion"],
+                name="reporte_resuelto_fecha_idx",
+            ),
+        ),
+    ]
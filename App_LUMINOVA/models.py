@@ -75,6 +75,10 @@ class Fabricante(models.Model):
         return self.nombre
 
 
+# Punto de reorden que reciben los insumos si no se les configura otro.
+PUNTO_REORDEN_POR_DEFECTO = 15000
+
+
 class Insumo(models.Model):
     descripcion = models.CharField(max_length=255)
     categoria = models.ForeignKey(
@@ -92,6 +96,24 @@ class Insumo(models.Model):
     cantidad_en_pedido = models.PositiveIntegerField(
         default=0, verbose_name="Cantidad en Pedido", blank=True, null=True
     )
+    punto_reorden = models.PositiveIntegerField(
+        default=PUNTO_REORDEN_POR_DEFECTO,
+        verbose_name="Punto de Reorden",
+        help_text="Con stock por debajo de este valor el insumo se considera crítico.",
+    )
+
+    class Meta:
+        # Índice parcial: solo los insumos críticos (stock < punto_reorden),
+        # que son los que cuentan las notificaciones y lista el dashboard
+        # ordenados por stock. Una comparación entre dos columnas no puede
+        # usar un índice común; el parcial la resuelve y queda chico.
+        indexes = [
+            models.Index(
+                fields=["stock"],
+                condition=models.Q(stock__lt=models.F("punto_reorden")),
+                name="insumo_bajo_reorden_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.descripcion
@@ -111,6 +133,11 @@ class OfertaProveedor(models.Model):
     tiempo_entrega_estimado_dias = models.IntegerField(
         default=0, verbose_name="Tiempo de Entrega Estimado (días)"
     )
+    multiplo_pedido = models.PositiveIntegerField(
+        default=1,
+        verbose_name="Múltiplo de Pedido",
+        help_text="El proveedor solo vende en múltiplos de esta cantidad (cajas, rollos).",
+    )
     fecha_actualizacion_precio = models.DateTimeField(
         default=timezone.now, verbose_name="Última Actualización del Precio"
     )
@@ -183,6 +210,14 @@ class OrdenVenta(models.Model):
     )
     notas = models.TextField(blank=True, null=True)
 
+    class Meta:
+        # La lista de OVs pagina por clave (fecha_creacion, id), con o sin
+        # filtro por estado; el dashboard toma la última OV por fecha.
+        indexes = [
+            models.Index(fields=["fecha_creacion", "id"]),
+            models.Index(fields=["estado", "fecha_creacion", "id"]),
+        ]
+
     def __str__(self):
         return f"OV: {self.numero_ov} - {self.cliente.nombre}"
 
@@ -264,6 +299,15 @@ class OrdenProduccion(models.Model):
     )
     notas = models.TextField(null=True, blank=True, verbose_name="Notas")
 
+    class Meta:
+        # Las listas de OPs filtran por estado y ordenan por fecha_solicitud
+        # (producción, solicitudes de insumos del depósito); el rendimiento
+        # del dashboard filtra las completadas por fecha_fin_real.
+        indexes = [
+            models.Index(fields=["estado_op", "fecha_solicitud"]),
+            models.Index(fields=["estado_op", "fecha_fin_real"]),
+        ]
+
     def get_estado_op_display(self):
         if self.estado_op:
             return self.estado_op.nombre
@@ -306,6 +350,28 @@ class Reportes(models.Model):
         related_name="reportes_originados_aqui",
     )
 
+    class Meta:
+        # Parciales por "resuelto": los reportes abiertos son pocos y son los
+        # que cuenta la notificación de OPs con problemas y lista la pestaña
+        # de abiertos (por fecha); la de resueltos ordena por fecha_resolucion.
+        indexes = [
+            models.Index(
+                fields=["orden_produccion_asociada"],
+                condition=models.Q(resuelto=False),
+                name="reporte_abierto_op_idx",
+            ),
+            models.Index(
+                fields=["fecha"],
+                condition=models.Q(resuelto=False),
+                name="reporte_abierto_fecha_idx",
+            ),
+            models.Index(
+                fields=["fecha_resolucion"],
+                condition=models.Q(resuelto=True),
+                name="reporte_resuelto_fecha_idx",
+            ),
+        ]
+
     def __str__(self):
         op_num = (
             self.orden_produccion_asociada.numero_op
@@ -328,6 +394,17 @@ class Factura(models.Model):
     total_facturado = models.DecimalField(
         max_digits=12, decimal_places=2
     )  # Aumentado max_digits
+    # PDF ya renderizado, guardado en MEDIA_ROOT bajo el SHA-256 de su contenido.
+    # pdf_version es la versión de la plantilla con la que se generó.
+    pdf_sha256 = models.CharField(max_length=64, blank=True, editable=False)
+    pdf_version = models.PositiveSmallIntegerField(default=0, editable=False)
+    pdf_generado = models.DateTimeField(null=True, blank=True, editable=False)
+
+    @property
+    def ruta_pdf(self):
+        if not self.pdf_sha256:
+            return None
+        return f"facturas/{self.pdf_sha256[:2]}/{self.pdf_sha256}.pdf"
 
     def __str__(self):
         return f"Factura {self.numero_factura} para OV {self.orden_venta.numero_ov}"
@@ -346,10 +423,20 @@ class RolDescripcion(models.Model):
 class AuditoriaAcceso(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     accion = models.CharField(max_length=255)
-    fecha_hora = models.DateTimeField(auto_now_add=True)
+    # Default y no auto_now_add: los registros se insertan en lote después
+    # del login y tienen que conservar la hora del evento, no la del INSERT.
+    fecha_hora = models.DateTimeField(default=timezone.now)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(null=True, blank=True)
 
+    class Meta:
+        # La auditoría se recorre por fecha (keyset sobre fecha_hora, id) y se
+        # filtra por usuario; sin estos índices cada página escanea la tabla.
+        indexes = [
+            models.Index(fields=["fecha_hora", "usuario"]),
+            models.Index(fields=["usuario", "fecha_hora"]),
+        ]
+
     def __str__(self):
         user_display = (
             self.usuario.username if self.usuario else "Usuario Desconocido/Eliminado"
@@ -412,6 +499,14 @@ class Orden(models.Model):
     numero_tracking = models.CharField(max_length=50, null=True, blank=True)
     notas = models.TextField(blank=True, null=True)
 
+    class Meta:
+        # Compras lista por tipo y fecha; los contadores, el seguimiento y la
+        # recepción del depósito filtran además por estado.
+        indexes = [
+            models.Index(fields=["tipo", "fecha_creacion"]),
+            models.Index(fields=["tipo", "estado", "fecha_creacion"]),
+        ]
+
     def __str__(self):
         return f"OC: {self.numero_orden} - Proveedor: {self.proveedor.nombre}"
 
@@ -429,6 +524,48 @@ class Orden(models.Model):
             )
         super().save(*args, **kwargs)
 
+    def actualizar_total(self):
+        """Total como suma de las líneas; no pasa por save() para no recalcularlo."""
+        nuevo_total = self.items_oc.aggregate(total=models.Sum("subtotal"))["total"] or 0
+        if self.total_orden_compra != nuevo_total:
+            self.total_orden_compra = nuevo_total
+            Orden.objects.filter(pk=self.pk).update(total_orden_compra=nuevo_total)
+
+
+class ItemOrdenCompra(models.Model):
+    orden = models.ForeignKey(Orden, on_delete=models.CASCADE, related_name="items_oc")
+    insumo = models.ForeignKey(Insumo, on_delete=models.PROTECT, related_name="items_oc")
+    cantidad = models.PositiveIntegerField()
+    cantidad_recibida = models.PositiveIntegerField(default=0)
+    precio_unitario_compra = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0, verbose_name="Precio Unit. Compra"
+    )
+    subtotal = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False
+    )
+
+    class Meta:
+        unique_together = ("orden", "insumo")
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(cantidad_recibida__lte=models.F("cantidad")),
+                name="itemordencompra_recibido_no_supera_pedido",
+            )
+        ]
+        verbose_name = "Ítem de Orden de Compra"
+        verbose_name_plural = "Ítems de Órdenes de Compra"
+
+    @property
+    def pendiente(self):
+        return self.cantidad - self.cantidad_recibida
+
+    def save(self, *args, **kwargs):
+        self.subtotal = self.cantidad * self.precio_unitario_compra
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.insumo.descripcion} en OC {self.orden.numero_orden}"
+
 
 class LoteProductoTerminado(models.Model):
     producto = models.ForeignKey(
@@ -441,6 +578,17 @@ class LoteProductoTerminado(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     enviado = models.BooleanField(default=False)
 
+    class Meta:
+        # El depósito lista los lotes sin enviar del más nuevo al más viejo.
+        # Parcial: los enviados se acumulan para siempre y nunca se listan.
+        indexes = [
+            models.Index(
+                fields=["fecha_creacion"],
+                condition=models.Q(enviado=False),
+                name="lote_pt_pendiente_fecha_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Lote de {self.producto.descripcion} - OP {self.op_asociada.numero_op} ({self.cantidad})"
 
@@ -463,6 +611,12 @@ class HistorialOV(models.Model):
 
     class Meta:
         ordering = ["-fecha_evento"]  # Ordenar del más reciente al más antiguo
+        # La línea de tiempo de una OV se lee por (orden_venta, fecha_evento);
+        # el archivado recorre por fecha_evento.
+        indexes = [
+            models.Index(fields=["orden_venta", "fecha_evento"]),
+            models.Index(fields=["fecha_evento"]),
+        ]
         verbose_name = "Historial de Orden de Venta"
         verbose_name_plural = "Historiales de Órdenes de Venta"
 
@@ -483,3 +637,215 @@ class PasswordChangeRequired(models.Model):
 
     def __str__(self):
         return f"El usuario {self.user.username} debe cambiar su contraseña."
+
+
+class SecuenciaDocumento(models.Model):
+    """
+    Contador por prefijo (OV, OP, RP, OC, FACT) usado para numerar documentos.
+    Se incrementa de forma atómica dentro de la transacción que crea el documento,
+    por lo que un rollback también devuelve los números reservados.
+    """
+
+    prefijo = models.CharField(max_length=10, unique=True)
+    ultimo_valor = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Secuencia de Documento"
+        verbose_name_plural = "Secuencias de Documentos"
+
+    def __str__(self):
+        return f"{self.prefijo}: {self.ultimo_valor}"
+
+
+class DashboardSnapshot(models.Model):
+    """
+    Métricas precalculadas del dashboard de administración (una única fila).
+    Las señales de los modelos que alimentan cada tarjeta la marcan como
+    desactualizada; se recalcula por separado en la próxima lectura y guarda
+    cuándo se calculó por última vez.
+    """
+
+    # Tarjeta: Acciones Urgentes
+    ops_con_problemas_count = models.PositiveIntegerField(default=0)
+    solicitudes_insumos_pendientes_count = models.PositiveIntegerField(default=0)
+    ocs_para_aprobar_count = models.PositiveIntegerField(default=0)
+    acciones_actualizado = models.DateTimeField(null=True, blank=True)
+
+    # Tarjeta: Stock Crítico (lista de {id, descripcion, stock, porcentaje_stock})
+    insumos_criticos = models.JSONField(default=list, blank=True)
+    stock_actualizado = models.DateTimeField(null=True, blank=True)
+
+    # Tarjeta: Producción (Últimos 30 días)
+    total_luminarias_ensambladas = models.PositiveIntegerField(default=0)
+    ops_a_tiempo = models.PositiveIntegerField(default=0)
+    ops_con_retraso = models.PositiveIntegerField(default=0)
+    tasa_cumplimiento = models.FloatField(default=0)
+    rendimiento_actualizado = models.DateTimeField(null=True, blank=True)
+
+    # Tarjeta: Actividad Reciente (datos copiados para no hacer joins al leer)
+    ultima_ov_pk = models.PositiveIntegerField(null=True, blank=True)
+    ultima_ov_numero = models.CharField(max_length=20, blank=True)
+    ultima_ov_fecha = models.DateTimeField(null=True, blank=True)
+    ultima_op_completada_pk = models.PositiveIntegerField(null=True, blank=True)
+    ultima_op_completada_numero = models.CharField(max_length=20, blank=True)
+    ultima_op_completada_fecha = models.DateTimeField(null=True, blank=True)
+    ultimo_reporte_numero = models.CharField(max_length=20, blank=True)
+    ultimo_reporte_fecha = models.DateTimeField(null=True, blank=True)
+    actividad_actualizado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Snapshot del Dashboard"
+        verbose_name_plural = "Snapshots del Dashboard"
+
+    def __str__(self):
+        return f"Snapshot del Dashboard #{self.pk}"
+
+
+class MovimientoStock(models.Model):
+    """
+    Kardex de stock: una fila por cada entrada o salida de un insumo o de un
+    producto terminado. Solo se agregan filas; los errores se corrigen con un
+    movimiento de ajuste, nunca editando o borrando.
+    """
+
+    TIPO_CHOICES = [
+        ("SALDO_INICIAL", "Saldo Inicial"),
+        ("RECEPCION_OC", "Recepción de OC"),
+        ("ENVIO_OP", "Envío de Insumos a OP"),
+        ("PRODUCCION", "Ingreso por Producción"),
+        ("ENVIO_LOTE", "Envío de Lote"),
+        ("AJUSTE", "Ajuste Manual"),
+    ]
+
+    insumo = models.ForeignKey(
+        Insumo,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="movimientos_stock",
+    )
+    producto_terminado = models.ForeignKey(
+        ProductoTerminado,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="movimientos_stock",
+    )
+    # Positiva para entradas, negativa para salidas.
+    cantidad = models.IntegerField()
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    referencia = models.CharField(
+        max_length=50, blank=True, help_text="Ej: número de OC, OP o lote."
+    )
+    fecha = models.DateTimeField(default=timezone.now)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        ordering = ["-id"]
+        verbose_name = "Movimiento de Stock"
+        verbose_name_plural = "Movimientos de Stock"
+        indexes = [
+            models.Index(fields=["insumo", "fecha"]),
+            models.Index(fields=["producto_terminado", "fecha"]),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(insumo__isnull=False, producto_terminado__isnull=True)
+                | models.Q(insumo__isnull=True, producto_terminado__isnull=False),
+                name="movimientostock_un_solo_articulo",
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValidationError("Los movimientos de stock no se pueden modificar.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError("Los movimientos de stock no se pueden eliminar.")
+
+    def __str__(self):
+        articulo = self.insumo or self.producto_terminado
+        return f"{self.get_tipo_display()} {self.cantidad:+d} - {articulo}"
+
+
+class CorteStock(models.Model):
+    """
+    Cierre periódico de saldos. Guarda hasta qué movimiento incluye, así que el
+    stock a una fecha es el saldo del último corte anterior más los
+    movimientos posteriores a él.
+    """
+
+    fecha = models.DateTimeField(default=timezone.now, db_index=True)
+    ultimo_movimiento_id = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-fecha"]
+        verbose_name = "Corte de Stock"
+        verbose_name_plural = "Cortes de Stock"
+
+    def __str__(self):
+        return f"Corte de stock {self.fecha:%d/%m/%Y %H:%M}"
+
+
+class SaldoStock(models.Model):
+    corte = models.ForeignKey(CorteStock, on_delete=models.CASCADE, related_name="saldos")
+    insumo = models.ForeignKey(Insumo, on_delete=models.CASCADE, null=True, blank=True)
+    producto_terminado = models.ForeignKey(
+        ProductoTerminado, on_delete=models.CASCADE, null=True, blank=True
+    )
+    stock = models.IntegerField()
+
+    class Meta:
+        verbose_name = "Saldo de Stock"
+        verbose_name_plural = "Saldos de Stock"
+        indexes = [
+            models.Index(fields=["insumo", "corte"]),
+            models.Index(fields=["producto_terminado", "corte"]),
+        ]
+
+    def __str__(self):
+        return f"{self.insumo or self.producto_terminado}: {self.stock}"
+
+
+class HistorialOVArchivado(models.Model):
+    """
+    Eventos de HistorialOV ya archivados de una OV, comprimidos en un solo
+    registro (JSON + zlib) junto con un resumen. Ver `archivar_historial`.
+    """
+
+    orden_venta = models.OneToOneField(
+        OrdenVenta, on_delete=models.CASCADE, related_name="historial_archivado"
+    )
+    cantidad_eventos = models.PositiveIntegerField(default=0)
+    primer_evento = models.DateTimeField()
+    ultimo_evento = models.DateTimeField()
+    ultimo_tipo_evento = models.CharField(max_length=50, blank=True, null=True)
+    datos = models.BinaryField()
+    fecha_archivado = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Historial de OV Archivado"
+        verbose_name_plural = "Historiales de OV Archivados"
+
+    def __str__(self):
+        return f"{self.orden_venta.numero_ov}: {self.cantidad_eventos} eventos archivados"
+
+
+class AuditoriaAccesoArchivada(models.Model):
+    """Registros de AuditoriaAcceso de un día, comprimidos, con sus totales."""
+
+    fecha = models.DateField(unique=True)
+    cantidad_registros = models.PositiveIntegerField(default=0)
+    inicios_sesion = models.PositiveIntegerField(default=0)
+    usuarios_distintos = models.PositiveIntegerField(default=0)
+    datos = models.BinaryField()
+    fecha_archivado = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-fecha"]
+        verbose_name = "Auditoría de Acceso Archivada"
+        verbose_name_plural = "Auditorías de Acceso Archivadas"
+
+    def __str__(self):
+        return f"Accesos del {self.fecha:%d/%m/%Y}: {self.cantidad_registros} registros"
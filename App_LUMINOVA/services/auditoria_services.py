@@ -0,0 +1,158 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, connections, transaction
+
+from ..models import AuditoriaAcceso
+
+logger = logging.getLogger(__name__)
+
+ACCION_INICIO_SESION = "Inicio de sesión"
+ACCION_CIERRE_SESION = "Cierre de sesión"
+
+CONFIGURACION_DEFAULT = {
+    "ASINCRONA": True,
+    "TAMANO_LOTE": 50,
+    "INTERVALO": 2.0,
+    "MAXIMO_PENDIENTES": 10000,
+}
+
+
+def _configuracion():
+    return {**CONFIGURACION_DEFAULT, **getattr(settings, "AUDITORIA_ESCRITURA", {})}
+
+
+class EscritorAuditoria:
+    """
+    Acumula registros de AuditoriaAcceso en memoria y los inserta en lotes
+    desde un hilo propio, así el login no espera un INSERT sobre una tabla
+    que crece sin límite.
+
+    El hilo se despierta cada INTERVALO segundos o cuando hay TAMANO_LOTE
+    registros pendientes, lo que ocurra primero. Lo que quede en memoria se
+    vuelca al terminar el proceso; un corte abrupto (kill -9) puede perder
+    como mucho los registros de los últimos segundos.
+
+    Si la base no responde, el lote vuelve a la cola y se reintenta en el
+    próximo ciclo; la cola no pasa de MAXIMO_PENDIENTES (se descartan los
+    más viejos). Si falla por un registro inválido, el lote se guarda de a
+    uno y sólo se pierde ese registro.
+    """
+
+    def __init__(self):
+        self._pendientes = []
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._hilo = None
+        self._pid = None
+
+    def registrar(self, usuario, accion, ip_address=None, user_agent=""):
+        registro = AuditoriaAcceso(
+            usuario=usuario, accion=accion, ip_address=ip_address, user_agent=user_agent
+        )
+        configuracion = _configuracion()
+        if not configuracion["ASINCRONA"]:
+            registro.save()
+            return
+
+        with self._lock:
+            self._pendientes.append(registro)
+            lote_completo = len(self._pendientes) >= configuracion["TAMANO_LOTE"]
+        self._asegurar_hilo()
+        if lote_completo:
+            self._despertar.set()
+
+    def vaciar(self):
+        """Inserta todos los registros pendientes en un solo bulk_create."""
+        with self._lock:
+            lote, self._pendientes = self._pendientes, []
+        if not lote:
+            return 0
+        try:
+            # Todo o nada: un reintento no debe duplicar la parte ya insertada.
+            with transaction.atomic():
+                AuditoriaAcceso.objects.bulk_create(lote, batch_size=500)
+            return len(lote)
+        except (OperationalError, InterfaceError):
+            logger.exception(
+                "Base no disponible; %d registros de auditoría vuelven a la cola.", len(lote)
+            )
+            self._reencolar(lote)
+            return 0
+        except Exception:
+            logger.exception(
+                "Falló el lote de %d registros de auditoría; se guardan de a uno.", len(lote)
+            )
+        return self._guardar_de_a_uno(lote)
+
+    def _guardar_de_a_uno(self, lote):
+        guardados = 0
+        for posicion, registro in enumerate(lote):
+            registro.pk = None
+            try:
+                with transaction.atomic():
+                    registro.save(force_insert=True)
+            except (OperationalError, InterfaceError):
+                logger.exception("Base no disponible; se reencolan los registros de auditoría restantes.")
+                self._reencolar(lote[posicion:])
+                break
+            except Exception:
+                logger.exception("Se descarta un registro de auditoría inválido (%s).", registro.accion)
+                continue
+            guardados += 1
+        return guardados
+
+    def _reencolar(self, lote):
+        maximo = _configuracion()["MAXIMO_PENDIENTES"]
+        with self._lock:
+            # Lo fallido va adelante para conservar el orden de los eventos.
+            self._pendientes = lote + self._pendientes
+            sobrantes = len(self._pendientes) - maximo
+            if sobrantes > 0:
+                del self._pendientes[:sobrantes]
+        if sobrantes > 0:
+            logger.error("Cola de auditoría llena; se descartan %d registros antiguos.", sobrantes)
+
+    @property
+    def pendientes(self):
+        with self._lock:
+            return len(self._pendientes)
+
+    def _asegurar_hilo(self):
+        # Tras un fork (gunicorn --preload) el hilo del proceso padre no existe.
+        if self._hilo is not None and self._pid == os.getpid() and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is None or self._pid != os.getpid() or not self._hilo.is_alive():
+                self._pid = os.getpid()
+                self._hilo = threading.Thread(
+                    target=self._ciclo, name="escritor-auditoria", daemon=True
+                )
+                self._hilo.start()
+
+    def _ciclo(self):
+        while True:
+            self._despertar.wait(_configuracion()["INTERVALO"])
+            self._despertar.clear()
+            if self.pendientes:
+                self.vaciar()
+                # La conexión es propia de este hilo; no se deja abierta entre
+                # lotes (ni rota, si el lote falló).
+                connections.close_all()
+
+
+escritor_auditoria = EscritorAuditoria()
+atexit.register(escritor_auditoria.vaciar)
+
+
+def registrar_acceso(usuario, accion, ip_address=None, user_agent=""):
+    """Encola un evento de auditoría; se escribe en el próximo lote."""
+    escritor_auditoria.registrar(usuario, accion, ip_address, user_agent)
+
+
+def vaciar_auditoria():
+    """Fuerza la escritura de lo pendiente (tests, comandos, apagado)."""
+    return escritor_auditoria.vaciar()
@@ -0,0 +1,543 @@
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.db.models import Case, F, IntegerField, Q, QuerySet, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from ..models import (
+    Insumo,
+    ItemOrdenCompra,
+    MovimientoStock,
+    OfertaProveedor,
+    Orden,
+)
+from ..utils import atomic_inmediato, bloquear_en_orden
+from .dashboard_services import (
+    SECCION_ACCIONES,
+    SECCION_STOCK,
+    marcar_dashboard_desactualizado,
+)
+from .document_services import reservar_numeros_documento
+from .mrp_services import calcular_necesidades_mrp
+from .notification_services import invalidar_contadores_notificaciones
+from .stock_services import registrar_movimientos
+
+NOTA_OC_SUGERIDA = "Generada por la sugerencia automática de compras."
+
+# Estado desde el que se llega a cada estado del circuito de aprobación y
+# envío de una OC. Recepción y cancelación siguen su propio camino.
+TRANSICIONES_OC = {
+    "APROBADA": "BORRADOR",
+    "ENVIADA_PROVEEDOR": "APROBADA",
+    "EN_TRANSITO": "ENVIADA_PROVEEDOR",
+}
+
+# Estados en los que se puede registrar mercadería recibida.
+ESTADOS_OC_EN_RECEPCION = ("EN_TRANSITO", "RECIBIDA_PARCIAL")
+
+# Estados en los que todavía se editan el insumo y la cantidad principal.
+ESTADOS_OC_EDITABLES = ("BORRADOR", "APROBADA")
+
+# Lo que además tiene que cumplir una OC para entrar a cada estado.
+REQUISITOS_TRANSICION_OC = {
+    "APROBADA": (
+        Q(insumo_principal__isnull=False, cantidad_principal__gt=0),
+        "No tiene insumo o cantidad cargados.",
+    ),
+    "EN_TRANSITO": (
+        Q(numero_tracking__isnull=False) & ~Q(numero_tracking=""),
+        "No tiene número de tracking.",
+    ),
+}
+
+
+@dataclass
+class PropuestaOC:
+    insumo: Insumo
+    oferta: OfertaProveedor
+    faltante: int
+    cantidad: int  # faltante redondeado al múltiplo de pedido de la oferta
+    fecha_necesaria: object  # date, o None si solo hay que reponer el punto de reorden
+    fecha_estimada_entrega: object
+    orden: Orden = None  # la OC creada, una vez generada
+
+    @property
+    def atrasada(self):
+        """Ninguna oferta llega a tiempo; se eligió la más rápida."""
+        return (
+            self.fecha_necesaria is not None
+            and self.fecha_estimada_entrega > self.fecha_necesaria
+        )
+
+    @property
+    def total(self):
+        return self.cantidad * self.oferta.precio_unitario_compra
+
+
+@dataclass
+class SugerenciaCompras:
+    propuestas: list = field(default_factory=list)
+    sin_oferta: list = field(default_factory=list)  # Insumos con faltante y sin proveedor
+
+    @property
+    def total(self):
+        return sum(p.total for p in self.propuestas)
+
+
+class TransicionOCInvalida(ValueError):
+    """El estado pedido no forma parte del circuito de aprobación y envío."""
+
+
+@dataclass
+class ResultadoCambioEstadoOC:
+    actualizadas: list = field(default_factory=list)  # números de OC
+    rechazadas: list = field(default_factory=list)  # [(numero_orden, motivo)]
+
+
+class RecepcionOCError(ValueError):
+    """La recepción no se registró; `errores` lista cada problema encontrado."""
+
+    def __init__(self, errores):
+        self.errores = errores
+        super().__init__(" ".join(errores))
+
+
+@dataclass
+class ResultadoRecepcionOC:
+    recibido: dict  # {ItemOrdenCompra: cantidad recibida ahora}
+    nuevo_estado: str
+
+    @property
+    def completa(self):
+        return self.nuevo_estado == "COMPLETADA"
+
+
+def insumos_con_oc(estados_oc):
+    """ids de los insumos con alguna línea en una OC en `estados_oc` (para usar como subconsulta)."""
+    return ItemOrdenCompra.objects.filter(
+        orden__tipo="compra", orden__estado__in=estados_oc
+    ).values("insumo_id")
+
+
+def _redondear_a_multiplo(cantidad, multiplo):
+    multiplo = max(multiplo or 1, 1)
+    return -(-cantidad // multiplo) * multiplo
+
+
+def _elegir_oferta(ofertas, plazo_dias):
+    """
+    La más barata entre las que entregan dentro del plazo, o la más rápida si
+    ninguna llega a tiempo. `ofertas` viene ordenada por precio.
+    """
+    if not ofertas:
+        return None
+    if plazo_dias is None:
+        return ofertas[0]
+    for oferta in ofertas:
+        if oferta.tiempo_entrega_estimado_dias <= plazo_dias:
+            return oferta
+    return min(
+        ofertas, key=lambda o: (o.tiempo_entrega_estimado_dias, o.precio_unitario_compra)
+    )
+
+
+def _faltantes_por_insumo(hoy):
+    """
+    {insumo_id: (insumo, faltante, fecha_necesaria)} de los insumos que, una
+    vez cubiertas las OPs abiertas con el stock y lo ya pedido, quedan por
+    debajo de su punto de reorden. Se saltean los que ya tienen un borrador
+    de OC: ese pedido lo está armando alguien de Compras.
+    """
+    con_borrador = set(
+        insumos_con_oc(["BORRADOR"]).values_list("insumo_id", flat=True)
+    )
+    faltantes = {}
+
+    necesidades = calcular_necesidades_mrp()
+    for insumo_id, necesidad in necesidades.items():
+        faltante = necesidad.insumo.punto_reorden - (necesidad.disponible - necesidad.bruto)
+        if faltante > 0 and insumo_id not in con_borrador:
+            fecha = None
+            if necesidad.neto:
+                fecha = necesidad.fecha_primer_faltante or hoy
+            faltantes[insumo_id] = (necesidad.insumo, faltante, fecha)
+
+    # Los insumos sin demanda de OPs solo se reponen hasta el punto de reorden.
+    sin_demanda = (
+        Insumo.objects.exclude(id__in=con_borrador.union(necesidades))
+        .annotate(disponible=F("stock") + Coalesce(F("cantidad_en_pedido"), 0))
+        .filter(disponible__lt=F("punto_reorden"))
+        .select_related("categoria")
+    )
+    for insumo in sin_demanda:
+        faltantes[insumo.id] = (insumo, insumo.punto_reorden - insumo.disponible, None)
+    return faltantes
+
+
+def sugerir_ordenes_compra(hoy=None):
+    """
+    Propone una OC por cada insumo con faltante neto, sin guardar nada.
+
+    Para cada insumo se toma la oferta más barata cuyo tiempo de entrega
+    llega antes de la fecha en que las OPs abiertas se quedan sin él (las
+    reposiciones de punto de reorden no tienen fecha y van a la más barata),
+    y la cantidad se redondea hacia arriba al múltiplo de pedido de la oferta.
+
+    Returns:
+        SugerenciaCompras con las propuestas, ordenadas por proveedor e
+        insumo, y los insumos con faltante que no tienen ninguna oferta.
+    """
+    hoy = hoy or timezone.localdate()
+    faltantes = _faltantes_por_insumo(hoy)
+
+    ofertas_por_insumo = {}
+    for oferta in (
+        OfertaProveedor.objects.filter(insumo_id__in=list(faltantes))
+        .select_related("proveedor")
+        .order_by("precio_unitario_compra", "tiempo_entrega_estimado_dias", "proveedor__nombre")
+    ):
+        ofertas_por_insumo.setdefault(oferta.insumo_id, []).append(oferta)
+
+    sugerencia = SugerenciaCompras()
+    for insumo_id, (insumo, faltante, fecha_necesaria) in faltantes.items():
+        plazo = (fecha_necesaria - hoy).days if fecha_necesaria else None
+        oferta = _elegir_oferta(ofertas_por_insumo.get(insumo_id, []), plazo)
+        if oferta is None:
+            sugerencia.sin_oferta.append(insumo)
+            continue
+        sugerencia.propuestas.append(
+            PropuestaOC(
+                insumo=insumo,
+                oferta=oferta,
+                faltante=faltante,
+                cantidad=_redondear_a_multiplo(faltante, oferta.multiplo_pedido),
+                fecha_necesaria=fecha_necesaria,
+                fecha_estimada_entrega=hoy
+                + timedelta(days=oferta.tiempo_entrega_estimado_dias),
+            )
+        )
+    sugerencia.propuestas.sort(
+        key=lambda p: (p.oferta.proveedor.nombre, p.insumo.descripcion)
+    )
+    sugerencia.sin_oferta.sort(key=lambda i: i.descripcion)
+    return sugerencia
+
+
+def generar_ordenes_compra_sugeridas(hoy=None):
+    """
+    Crea en Borrador todas las OCs de `sugerir_ordenes_compra` y suma sus
+    cantidades a `cantidad_en_pedido`, en una única transacción y con una
+    cantidad fija de sentencias (una reserva de números, un bulk_create y un
+    UPDATE), sin importar cuántos insumos falten.
+
+    Returns:
+        SugerenciaCompras; cada propuesta lleva la OC creada en `orden`.
+    """
+    with atomic_inmediato():
+        sugerencia = sugerir_ordenes_compra(hoy)
+        propuestas = sugerencia.propuestas
+        if not propuestas:
+            return sugerencia
+
+        numeros = reservar_numeros_documento(
+            Orden, "OC", "numero_orden", len(propuestas)
+        )
+        ordenes = [
+            Orden(
+                numero_orden=numero,
+                tipo="compra",
+                estado="BORRADOR",
+                proveedor=p.oferta.proveedor,
+                insumo_principal=p.insumo,
+                cantidad_principal=p.cantidad,
+                precio_unitario_compra=p.oferta.precio_unitario_compra,
+                # bulk_create no pasa por Orden.save(), que es quien lo calcula.
+                total_orden_compra=p.total,
+                fecha_estimada_entrega=p.fecha_estimada_entrega,
+                notas=NOTA_OC_SUGERIDA,
+            )
+            for p, numero in zip(propuestas, numeros)
+        ]
+        Orden.objects.bulk_create(ordenes)
+        for propuesta, orden in zip(propuestas, ordenes):
+            propuesta.orden = orden
+        ItemOrdenCompra.objects.bulk_create(
+            ItemOrdenCompra(
+                orden=p.orden,
+                insumo=p.insumo,
+                cantidad=p.cantidad,
+                precio_unitario_compra=p.oferta.precio_unitario_compra,
+                subtotal=p.total,
+            )
+            for p in propuestas
+        )
+
+        Insumo.objects.filter(id__in=[p.insumo.id for p in propuestas]).update(
+            cantidad_en_pedido=Coalesce(F("cantidad_en_pedido"), 0)
+            + Case(
+                *[When(id=p.insumo.id, then=Value(p.cantidad)) for p in propuestas],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+
+    # bulk_create y update() no disparan señales.
+    invalidar_contadores_notificaciones()
+    marcar_dashboard_desactualizado(SECCION_ACCIONES, SECCION_STOCK)
+    return sugerencia
+
+
+def cambiar_estado_ocs(ordenes, nuevo_estado):
+    """
+    Pasa un conjunto de OCs a `nuevo_estado` y reporta, fila por fila, las
+    que no pueden: las que no están en el estado previo del circuito o no
+    cumplen el requisito del nuevo estado (ej. tracking para 'En Tránsito').
+
+    La validación es una sola consulta y la actualización un único UPDATE
+    condicionado al estado de origen, así que una OC que otro usuario movió
+    en el medio no se pisa: queda entre las rechazadas.
+
+    Args:
+        ordenes: QuerySet de Orden o iterable de ids.
+        nuevo_estado: 'APROBADA', 'ENVIADA_PROVEEDOR' o 'EN_TRANSITO'.
+
+    Returns:
+        ResultadoCambioEstadoOC.
+
+    Raises:
+        TransicionOCInvalida: Si `nuevo_estado` no está en TRANSICIONES_OC.
+    """
+    if nuevo_estado not in TRANSICIONES_OC:
+        raise TransicionOCInvalida(
+            f"No se pueden pasar OCs en bloque al estado '{nuevo_estado}'."
+        )
+    origen = TRANSICIONES_OC[nuevo_estado]
+    requisito, motivo_requisito = REQUISITOS_TRANSICION_OC.get(nuevo_estado, (None, ""))
+    cumple_requisito = Value(True)
+    if requisito is not None:
+        cumple_requisito = Case(When(requisito, then=Value(True)), default=Value(False))
+    etiquetas = dict(Orden.ESTADO_ORDEN_COMPRA_CHOICES)
+    if not isinstance(ordenes, QuerySet):
+        ordenes = Orden.objects.filter(id__in=list(ordenes))
+
+    resultado = ResultadoCambioEstadoOC()
+    validas = {}
+    with atomic_inmediato():
+        for oc_id, numero, estado, cumple in (
+            ordenes.filter(tipo="compra")
+            .annotate(cumple=cumple_requisito)
+            .order_by("numero_orden")
+            .values_list("id", "numero_orden", "estado", "cumple")
+        ):
+            if estado != origen:
+                resultado.rechazadas.append(
+                    (
+                        numero,
+                        f"Está en '{etiquetas.get(estado, estado)}'; debe estar en "
+                        f"'{etiquetas[origen]}'.",
+                    )
+                )
+            elif not cumple:
+                resultado.rechazadas.append((numero, motivo_requisito))
+            else:
+                validas[oc_id] = numero
+
+        if validas:
+            a_actualizar = Orden.objects.filter(id__in=list(validas), estado=origen)
+            if requisito is not None:
+                a_actualizar = a_actualizar.filter(requisito)
+            actualizadas = a_actualizar.update(estado=nuevo_estado)
+            if actualizadas != len(validas):
+                for oc_id in Orden.objects.filter(id__in=list(validas)).exclude(
+                    estado=nuevo_estado
+                ).values_list("id", flat=True):
+                    resultado.rechazadas.append(
+                        (validas.pop(oc_id), "Cambió de estado mientras se procesaba.")
+                    )
+            resultado.actualizadas = sorted(validas.values())
+
+    if resultado.actualizadas:
+        # update() no dispara post_save.
+        invalidar_contadores_notificaciones()
+        marcar_dashboard_desactualizado(SECCION_ACCIONES)
+    return resultado
+
+
+def sincronizar_linea_principal(orden):
+    """
+    Mantiene la única línea de una OC de un solo insumo (las que crea y edita
+    el formulario) igual a su insumo, cantidad y precio principal. Las OCs
+    con varias líneas no se tocan: se editan línea por línea.
+    """
+    lineas = list(orden.items_oc.all()[:2])
+    if len(lineas) > 1:
+        return
+    precio = orden.precio_unitario_compra or 0
+    if lineas:
+        ItemOrdenCompra.objects.filter(id=lineas[0].id).update(
+            insumo_id=orden.insumo_principal_id,
+            cantidad=orden.cantidad_principal,
+            precio_unitario_compra=precio,
+            subtotal=orden.cantidad_principal * precio,
+        )
+    else:
+        ItemOrdenCompra.objects.create(
+            orden=orden,
+            insumo_id=orden.insumo_principal_id,
+            cantidad=orden.cantidad_principal,
+            precio_unitario_compra=precio,
+        )
+    orden.actualizar_total()
+
+
+def pedido_por_insumo(orden):
+    """{insumo_id: cantidad total} de las líneas de la OC (vacío si no está guardada)."""
+    if orden.pk is None:
+        return {}
+    return dict(
+        orden.items_oc.order_by()
+        .values("insumo_id")
+        .annotate(total=Sum("cantidad"))
+        .values_list("insumo_id", "total")
+    )
+
+
+def ajustar_cantidad_en_pedido(antes, despues):
+    """
+    Suma a `cantidad_en_pedido` la diferencia entre dos `pedido_por_insumo`
+    de la misma OC (líneas agregadas, cambiadas o borradas), en un solo UPDATE.
+    """
+    diferencias = {
+        insumo_id: despues.get(insumo_id, 0) - antes.get(insumo_id, 0)
+        for insumo_id in antes.keys() | despues.keys()
+    }
+    diferencias = {insumo_id: d for insumo_id, d in diferencias.items() if d}
+    if not diferencias:
+        return
+    Insumo.objects.filter(id__in=diferencias).update(
+        cantidad_en_pedido=Greatest(
+            Coalesce(F("cantidad_en_pedido"), 0)
+            + Case(
+                *[When(id=insumo_id, then=Value(d)) for insumo_id, d in diferencias.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            Value(0),
+        )
+    )
+
+
+def recibir_orden_compra(orden, cantidades=None, usuario=None):
+    """
+    Registra la llegada de mercadería de una OC en tránsito o recibida en
+    parte: suma al stock, descuenta de `cantidad_en_pedido`, deja los
+    movimientos en el kardex y pasa la OC a 'Recibida Parcialmente' o
+    'Completada' según quede algo pendiente.
+
+    Usa una cantidad fija de sentencias sin importar cuántas líneas tenga la
+    OC: un UPDATE de las líneas condicionado a que lo recibido no supere lo
+    pedido (así dos recepciones simultáneas no cuentan dos veces lo mismo),
+    un UPDATE de los insumos y un INSERT en el kardex.
+
+    Args:
+        orden: La Orden de compra.
+        cantidades: {item_id: cantidad recibida}. None recibe todo lo pendiente.
+        usuario: Quien registra la recepción.
+
+    Returns:
+        ResultadoRecepcionOC.
+
+    Raises:
+        RecepcionOCError: Con todos los problemas encontrados; no se registra nada.
+    """
+    if orden.estado not in ESTADOS_OC_EN_RECEPCION:
+        raise RecepcionOCError(
+            [f"La OC {orden.numero_orden} no está en tránsito ni recibida en parte."]
+        )
+
+    with atomic_inmediato():
+        lineas = {linea.id: linea for linea in orden.items_oc.select_related("insumo")}
+        if cantidades is None:
+            cantidades = {item_id: linea.pendiente for item_id, linea in lineas.items()}
+
+        errores = []
+        a_recibir = {}
+        for item_id, cantidad in cantidades.items():
+            linea = lineas.get(item_id)
+            if linea is None:
+                errores.append(f"La línea {item_id} no pertenece a la OC {orden.numero_orden}.")
+            elif cantidad < 0:
+                errores.append(f"'{linea.insumo.descripcion}': la cantidad no puede ser negativa.")
+            elif cantidad > linea.pendiente:
+                errores.append(
+                    f"'{linea.insumo.descripcion}': se reciben {cantidad} pero quedan "
+                    f"{linea.pendiente} pendientes."
+                )
+            elif cantidad:
+                a_recibir[linea] = cantidad
+        if errores:
+            raise RecepcionOCError(errores)
+        if not a_recibir:
+            raise RecepcionOCError(["No se indicó ninguna cantidad a recibir."])
+
+        condicion = Q()
+        for linea, cantidad in a_recibir.items():
+            condicion |= Q(id=linea.id, cantidad_recibida__lte=F("cantidad") - cantidad)
+        actualizadas = ItemOrdenCompra.objects.filter(condicion, orden=orden).update(
+            cantidad_recibida=F("cantidad_recibida")
+            + Case(
+                *[When(id=linea.id, then=Value(c)) for linea, c in a_recibir.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+        if actualizadas != len(a_recibir):
+            raise RecepcionOCError(
+                [
+                    f"Se registró otra recepción de la OC {orden.numero_orden} "
+                    "mientras tanto. Vuelva a cargar las cantidades."
+                ]
+            )
+
+        # Un insumo aparece una sola vez por OC, así que la línea define su cantidad.
+        insumos = Insumo.objects.filter(id__in=[linea.insumo_id for linea in a_recibir])
+        bloquear_en_orden(insumos)
+        por_insumo = Case(
+            *[When(id=linea.insumo_id, then=Value(c)) for linea, c in a_recibir.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        insumos.update(
+            stock=F("stock") + por_insumo,
+            # Las OCs cargadas antes de sumar a 'en pedido' al crearse no lo
+            # dejan en negativo.
+            cantidad_en_pedido=Greatest(
+                Coalesce(F("cantidad_en_pedido"), 0) - por_insumo, Value(0)
+            ),
+        )
+        registrar_movimientos(
+            MovimientoStock(
+                insumo_id=linea.insumo_id,
+                cantidad=cantidad,
+                tipo="RECEPCION_OC",
+                referencia=orden.numero_orden,
+                usuario=usuario,
+            )
+            for linea, cantidad in a_recibir.items()
+        )
+
+        pendiente = orden.items_oc.filter(cantidad_recibida__lt=F("cantidad")).exists()
+        nuevo_estado = "RECIBIDA_PARCIAL" if pendiente else "COMPLETADA"
+        if not Orden.objects.filter(
+            id=orden.id, estado__in=ESTADOS_OC_EN_RECEPCION
+        ).update(estado=nuevo_estado):
+            raise RecepcionOCError(
+                [f"La OC {orden.numero_orden} cambió de estado mientras se procesaba."]
+            )
+        orden.estado = nuevo_estado
+
+    # update() no dispara señales.
+    invalidar_contadores_notificaciones()
+    marcar_dashboard_desactualizado(SECCION_ACCIONES, SECCION_STOCK)
+    return ResultadoRecepcionOC(recibido=a_recibir, nuevo_estado=nuevo_estado)
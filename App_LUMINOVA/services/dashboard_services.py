@@ -0,0 +1,206 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from ..models import DashboardSnapshot, Insumo, OrdenProduccion, OrdenVenta, Reportes
+from ..utils import atomic_inmediato
+from .estado_services import Estados, estados
+from .notification_services import calcular_contadores_notificaciones
+
+SNAPSHOT_PK = 1
+
+SECCION_ACCIONES = "acciones"
+SECCION_STOCK = "stock"
+SECCION_RENDIMIENTO = "rendimiento"
+SECCION_ACTIVIDAD = "actividad"
+SECCIONES = (SECCION_ACCIONES, SECCION_STOCK, SECCION_RENDIMIENTO, SECCION_ACTIVIDAD)
+
+# Momento del último cambio confirmado que afecta a cada sección.
+CACHE_KEY_CAMBIO_SECCION = "luminova:dashboard:cambio:{}"
+
+DIAS_RENDIMIENTO = 30
+CANTIDAD_INSUMOS_CRITICOS = 5
+
+
+def _calcular_acciones():
+    # Reutiliza la consulta única de los contadores de notificaciones.
+    contadores = calcular_contadores_notificaciones()
+    return {
+        "ops_con_problemas_count": contadores["ops_con_problemas_count"],
+        "solicitudes_insumos_pendientes_count": contadores["solicitudes_insumos_count"],
+        "ocs_para_aprobar_count": contadores["ocs_para_aprobar_count"],
+    }
+
+
+def _calcular_stock():
+    insumos = Insumo.objects.filter(stock__lt=F("punto_reorden")).order_by("stock")[
+        :CANTIDAD_INSUMOS_CRITICOS
+    ]
+    insumos_criticos = []
+    for insumo_id, descripcion, stock, punto_reorden in insumos.values_list(
+        "id", "descripcion", "stock", "punto_reorden"
+    ):
+        porcentaje_stock = int((stock / punto_reorden) * 100) if punto_reorden > 0 else 0
+        insumos_criticos.append(
+            {
+                "id": insumo_id,
+                "descripcion": descripcion,
+                "stock": stock,
+                "porcentaje_stock": min(100, porcentaje_stock),
+            }
+        )
+    return {"insumos_criticos": insumos_criticos}
+
+
+def _calcular_rendimiento():
+    hace_30_dias = timezone.now() - timedelta(days=DIAS_RENDIMIENTO)
+    resumen = OrdenProduccion.objects.filter(
+        estado_op_id__in=estados.ids(Estados.COMPLETADA),
+        fecha_fin_real__gte=hace_30_dias,
+    ).aggregate(
+        total_luminarias=Sum("cantidad_a_producir"),
+        total_ops=Count("id"),
+        a_tiempo=Count("id", filter=Q(fecha_fin_real__date__lte=F("fecha_fin_planificada"))),
+    )
+    total_ops = resumen["total_ops"]
+    ops_a_tiempo = resumen["a_tiempo"]
+    return {
+        "total_luminarias_ensambladas": resumen["total_luminarias"] or 0,
+        "ops_a_tiempo": ops_a_tiempo,
+        "ops_con_retraso": total_ops - ops_a_tiempo,
+        "tasa_cumplimiento": (ops_a_tiempo / total_ops * 100) if total_ops > 0 else 0,
+    }
+
+
+def _calcular_actividad():
+    ultima_ov = (
+        OrdenVenta.objects.order_by("-fecha_creacion")
+        .values("id", "numero_ov", "fecha_creacion")
+        .first()
+    )
+    ultima_op = (
+        OrdenProduccion.objects.filter(
+            estado_op_id__in=estados.ids(Estados.COMPLETADA),
+            fecha_fin_real__isnull=False,
+        )
+        .order_by("-fecha_fin_real")
+        .values("id", "numero_op", "fecha_fin_real")
+        .first()
+    )
+    ultimo_reporte = (
+        Reportes.objects.order_by("-fecha").values("n_reporte", "fecha").first()
+    )
+    return {
+        "ultima_ov_pk": ultima_ov["id"] if ultima_ov else None,
+        "ultima_ov_numero": ultima_ov["numero_ov"] if ultima_ov else "",
+        "ultima_ov_fecha": ultima_ov["fecha_creacion"] if ultima_ov else None,
+        "ultima_op_completada_pk": ultima_op["id"] if ultima_op else None,
+        "ultima_op_completada_numero": ultima_op["numero_op"] if ultima_op else "",
+        "ultima_op_completada_fecha": ultima_op["fecha_fin_real"] if ultima_op else None,
+        "ultimo_reporte_numero": ultimo_reporte["n_reporte"] if ultimo_reporte else "",
+        "ultimo_reporte_fecha": ultimo_reporte["fecha"] if ultimo_reporte else None,
+    }
+
+
+CALCULOS_POR_SECCION = {
+    SECCION_ACCIONES: _calcular_acciones,
+    SECCION_STOCK: _calcular_stock,
+    SECCION_RENDIMIENTO: _calcular_rendimiento,
+    SECCION_ACTIVIDAD: _calcular_actividad,
+}
+
+
+def refrescar_dashboard_snapshot(secciones=None):
+    """
+    Recalcula las secciones indicadas (todas si es None) y las guarda en la
+    fila del snapshot junto con su marca de tiempo.
+    """
+    secciones = SECCIONES if secciones is None else tuple(secciones)
+    # Se toma antes de consultar: un cambio confirmado durante el cálculo
+    # queda marcado como posterior y se recalcula en la próxima lectura.
+    ahora = timezone.now()
+    valores = {}
+    for seccion in secciones:
+        valores.update(CALCULOS_POR_SECCION[seccion]())
+        valores[f"{seccion}_actualizado"] = ahora
+
+    # update_or_create lee y después escribe: tomamos el lock de escritura de entrada.
+    with atomic_inmediato():
+        snapshot, _ = DashboardSnapshot.objects.update_or_create(
+            pk=SNAPSHOT_PK, defaults=valores
+        )
+    return snapshot
+
+
+def secciones_desactualizadas(snapshot):
+    """
+    Secciones del snapshot con un cambio posterior a su último cálculo, o
+    calculadas hace más de DASHBOARD_SNAPSHOT_TTL segundos. El vencimiento
+    cubre las marcas que no llegan (caché propia de otro proceso, caché
+    reiniciada) y la ventana de 30 días de producción, que avanza sola.
+    """
+    claves = {CACHE_KEY_CAMBIO_SECCION.format(seccion): seccion for seccion in SECCIONES}
+    cambios = cache.get_many(list(claves))
+    ttl = getattr(settings, "DASHBOARD_SNAPSHOT_TTL", 300)
+    limite = timezone.now() - timedelta(seconds=ttl) if ttl is not None else None
+
+    desactualizadas = []
+    for clave, seccion in claves.items():
+        actualizado = getattr(snapshot, f"{seccion}_actualizado")
+        cambio = cambios.get(clave)
+        if (
+            actualizado is None
+            or (limite is not None and actualizado < limite)
+            or (cambio is not None and cambio >= actualizado)
+        ):
+            desactualizadas.append(seccion)
+    return desactualizadas
+
+
+def obtener_dashboard_snapshot():
+    """
+    Lee el snapshot y recalcula antes solo las secciones desactualizadas; si
+    todavía no existe, lo construye completo.
+    """
+    snapshot = DashboardSnapshot.objects.filter(pk=SNAPSHOT_PK).first()
+    if snapshot is None:
+        return refrescar_dashboard_snapshot()
+    secciones = secciones_desactualizadas(snapshot)
+    if secciones:
+        snapshot = refrescar_dashboard_snapshot(secciones)
+    return snapshot
+
+
+def marcar_dashboard_desactualizado(*secciones):
+    """
+    Anota en la caché que las secciones cambiaron, cuando se confirme la
+    transacción actual (o en el momento, si no hay una abierta). No consulta
+    ni escribe el snapshot: quien escribe no paga el recálculo ni se
+    serializa en su fila, que se actualiza en la próxima lectura.
+
+    Varias señales dentro de la misma transacción (ej: guardar muchas OPs) se
+    agrupan en una sola escritura a la caché: el primer callback que corre
+    consume todas las pendientes y el resto no hace nada.
+    """
+    conexion = transaction.get_connection()
+    pendientes = getattr(conexion, "_dashboard_secciones_pendientes", None)
+    if pendientes is None:
+        pendientes = conexion._dashboard_secciones_pendientes = set()
+    pendientes.update(secciones)
+
+    def _marcar_pendientes():
+        ahora = timezone.now()
+        marcas = {
+            CACHE_KEY_CAMBIO_SECCION.format(seccion): ahora
+            for seccion in SECCIONES
+            if seccion in pendientes
+        }
+        pendientes.clear()
+        if marcas:
+            cache.set_many(marcas, None)
+
+    transaction.on_commit(_marcar_pendientes, robust=True)
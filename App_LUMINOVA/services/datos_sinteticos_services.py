@@ -0,0 +1,736 @@
+import random
+from contextlib import contextmanager
+from dataclasses import dataclass, fields, replace
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import (
+    AuditoriaAcceso,
+    CategoriaInsumo,
+    CategoriaProductoTerminado,
+    Cliente,
+    ComponenteProducto,
+    EstadoOrden,
+    Fabricante,
+    Factura,
+    HistorialOV,
+    Insumo,
+    ItemOrdenCompra,
+    ItemOrdenVenta,
+    LoteProductoTerminado,
+    MovimientoStock,
+    OfertaProveedor,
+    Orden,
+    OrdenProduccion,
+    OrdenVenta,
+    ProductoTerminado,
+    Proveedor,
+    Reportes,
+    RolDescripcion,
+    SectorAsignado,
+)
+from .auditoria_services import ACCION_CIERRE_SESION, ACCION_INICIO_SESION
+from .dashboard_services import SECCIONES, marcar_dashboard_desactualizado
+from .document_services import reservar_numeros_documento
+from .estado_services import Estados, estados, sectores
+from .notification_services import invalidar_contadores_notificaciones
+from .venta_services import descripcion_creacion_op, descripcion_creacion_ov
+
+# Un usuario por rol; el nombre del grupo es el que esperan es_admin / es_admin_o_rol.
+ROLES = ("administrador", "ventas", "compras", "produccion", "deposito")
+SECTORES = ("Grupo A", "Grupo B", "Grupo C", "Grupo D")
+CONTRASENA_SINTETICA = "luminova-sintetico"
+
+# Documentos por transacción; también es el batch_size de los bulk_create.
+TAMANO_LOTE = 1000
+
+# Estado de la OP que corresponde a cada estado de OV.
+ESTADO_OP_POR_ESTADO_OV = {
+    "PENDIENTE": Estados.PENDIENTE,
+    "CONFIRMADA": Estados.PLANIFICADA,
+    "INSUMOS_SOLICITADOS": Estados.INSUMOS_SOLICITADOS,
+    "PRODUCCION_INICIADA": Estados.PRODUCCION_INICIADA,
+    "PRODUCCION_CON_PROBLEMAS": Estados.PAUSADA,
+    "LISTA_ENTREGA": Estados.LISTA_PARA_ENTREGA,
+    "COMPLETADA": Estados.COMPLETADA,
+    "CANCELADA": Estados.CANCELADA,
+}
+ESTADOS_OV_EN_CURSO = [
+    "PENDIENTE",
+    "CONFIRMADA",
+    "INSUMOS_SOLICITADOS",
+    "PRODUCCION_INICIADA",
+    "PRODUCCION_CON_PROBLEMAS",
+    "LISTA_ENTREGA",
+]
+ESTADOS_OC_EN_CURSO = [
+    "BORRADOR",
+    "APROBADA",
+    "ENVIADA_PROVEEDOR",
+    "CONFIRMADA_PROVEEDOR",
+    "EN_TRANSITO",
+    "RECIBIDA_PARCIAL",
+]
+# Antigüedad a partir de la cual un documento ya está cerrado (como en producción).
+DIAS_DOCUMENTO_ABIERTO = 45
+TIPOS_PROBLEMA = ("Falta de insumos", "Falla de máquina", "Calidad", "Personal")
+
+
+@dataclass(frozen=True)
+class Volumenes:
+    """Cantidad de filas a generar por entidad (a escala 1)."""
+
+    categorias_insumo: int = 6
+    categorias_producto: int = 4
+    fabricantes: int = 5
+    proveedores: int = 8
+    insumos: int = 60
+    ofertas_por_insumo: int = 2
+    productos: int = 12
+    componentes_por_producto: int = 4
+    clientes: int = 20
+    ordenes_venta: int = 60
+    lineas_por_ov: int = 3
+    ordenes_compra: int = 24
+    lineas_por_oc: int = 3
+    reportes: int = 10
+    accesos: int = 200
+    dias: int = 730  # período que cubren los documentos, hasta la fecha de referencia
+
+    # No crecen con la escala: catálogos chicos, cantidades por documento y el período.
+    FIJOS = (
+        "categorias_insumo",
+        "categorias_producto",
+        "ofertas_por_insumo",
+        "componentes_por_producto",
+        "lineas_por_ov",
+        "lineas_por_oc",
+        "dias",
+    )
+
+    def escalar(self, factor):
+        """Mismos volúmenes multiplicados por `factor`, salvo los de FIJOS."""
+        return replace(
+            self,
+            **{
+                f.name: max(1, round(getattr(self, f.name) * factor))
+                for f in fields(self)
+                if f.name not in self.FIJOS
+            },
+        )
+
+    @property
+    def filas_estimadas(self):
+        """Orden de magnitud de las filas a insertar (para mostrar antes de empezar)."""
+        lineas_ov = self.ordenes_venta * self.lineas_por_ov
+        return (
+            self.insumos * (1 + self.ofertas_por_insumo)
+            + self.productos * (1 + self.componentes_por_producto)
+            + self.clientes
+            + self.insumos + self.productos  # saldo inicial en el kardex
+            + self.ordenes_venta * 3  # OV, evento de creación y factura/cierre
+            + lineas_ov * 6  # ítem, OP, evento de la OP, lote y sus movimientos de stock
+            + self.ordenes_compra * 2 * self.lineas_por_oc  # línea y su recepción
+            + self.ordenes_compra
+            + self.reportes
+            + self.accesos
+        )
+
+
+@contextmanager
+def _fechas_explicitas(*campos):
+    """
+    auto_now_add pisa la fecha también en bulk_create; para cargar historia
+    de años atrás se desactiva mientras dura el bloque.
+    """
+    anteriores = [(campo, campo.auto_now_add) for campo in campos]
+    for campo, _ in anteriores:
+        campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, valor in anteriores:
+            campo.auto_now_add = valor
+
+
+def _asegurar_catalogos():
+    EstadoOrden.objects.bulk_create(
+        [
+            EstadoOrden(nombre=valor)
+            for nombre, valor in vars(Estados).items()
+            if nombre.isupper() and isinstance(valor, str)
+        ],
+        ignore_conflicts=True,
+    )
+    SectorAsignado.objects.bulk_create(
+        [SectorAsignado(nombre=nombre) for nombre in SECTORES], ignore_conflicts=True
+    )
+    # bulk_create no dispara la señal que recarga los registros en memoria.
+    estados.invalidar()
+    sectores.invalidar()
+
+
+def _crear_usuarios():
+    usuarios = {}
+    contrasena = None
+    for rol in ROLES:
+        grupo, creado = Group.objects.get_or_create(name=rol)
+        if creado:
+            RolDescripcion.objects.create(group=grupo, descripcion=f"Rol {rol} (datos sintéticos)")
+        usuario, creado = User.objects.get_or_create(
+            username=f"{rol}_sintetico", defaults={"first_name": rol.capitalize()}
+        )
+        if creado:
+            # Un solo hash para todos: cada uno cuesta cientos de milisegundos.
+            contrasena = contrasena or make_password(CONTRASENA_SINTETICA)
+            usuario.password = contrasena
+            usuario.save(update_fields=["password"])
+            usuario.groups.add(grupo)
+        usuarios[rol] = usuario
+    return usuarios
+
+
+def _lotes(total):
+    tamano = TAMANO_LOTE
+    for inicio in range(0, total, tamano):
+        yield range(inicio, min(inicio + tamano, total))
+
+
+class GeneradorDatos:
+    """
+    Arma los datos en memoria de a TAMANO_LOTE documentos y los inserta con
+    bulk_create, cada lote en su propia transacción. Todos los valores salen
+    de un único `random.Random(semilla)` consumido siempre en el mismo orden,
+    así que el resultado no depende del tamaño de lote.
+    """
+
+    def __init__(self, volumenes, semilla, hasta, progreso=None):
+        self.v = volumenes
+        self.rnd = random.Random(semilla)
+        self.hasta = hasta
+        self.desde = hasta - timedelta(days=volumenes.dias)
+        self.progreso = progreso or (lambda mensaje: None)
+        # Evita chocar con los nombres únicos de una carga anterior en la misma base.
+        self.sufijo = f"{semilla}-{Cliente.objects.count()}"
+        self.creados = {}
+
+    def _contar(self, entidad, cantidad):
+        self.creados[entidad] = self.creados.get(entidad, 0) + cantidad
+
+    def _fecha(self, indice, total):
+        # Documentos repartidos a lo largo del período, en orden: el número más
+        # bajo es el más antiguo, como con la numeración real.
+        paso = (self.hasta - self.desde) / max(total, 1)
+        return self.desde + paso * (indice + self.rnd.random())
+
+    def _antiguedad(self, fecha):
+        return (self.hasta - fecha).days
+
+    def _registrar_movimientos(self, movimientos):
+        """
+        Kardex de los documentos generados. El stock de cada artículo ya se
+        actualizó en memoria con las mismas cantidades, así que siempre
+        coincide con el saldo del kardex.
+        """
+        movimientos = [m for m in movimientos if m.cantidad]
+        MovimientoStock.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE)
+        self._contar("movimientos_stock", len(movimientos))
+
+    # --- Maestros ---
+
+    def maestros(self):
+        rnd, v, sufijo = self.rnd, self.v, self.sufijo
+        with transaction.atomic():
+            self.categorias_insumo = CategoriaInsumo.objects.bulk_create(
+                CategoriaInsumo(nombre=f"Categoría insumo {i} [{sufijo}]")
+                for i in range(v.categorias_insumo)
+            )
+            self.categorias_producto = CategoriaProductoTerminado.objects.bulk_create(
+                CategoriaProductoTerminado(nombre=f"Categoría producto {i} [{sufijo}]")
+                for i in range(v.categorias_producto)
+            )
+            fabricantes = Fabricante.objects.bulk_create(
+                Fabricante(nombre=f"Fabricante {i} [{sufijo}]") for i in range(v.fabricantes)
+            )
+            self.proveedores = Proveedor.objects.bulk_create(
+                Proveedor(
+                    nombre=f"Proveedor {i} [{sufijo}]",
+                    contacto=f"Contacto {i}",
+                    email=f"proveedor{i}@ejemplo.com",
+                )
+                for i in range(v.proveedores)
+            )
+            self.insumos = Insumo.objects.bulk_create(
+                (
+                    Insumo(
+                        descripcion=f"Insumo {i:06d}",
+                        categoria=rnd.choice(self.categorias_insumo),
+                        fabricante=rnd.choice(fabricantes),
+                        stock=rnd.randrange(0, 40000),
+                        punto_reorden=rnd.choice((5000, 10000, 15000)),
+                    )
+                    for i in range(v.insumos)
+                ),
+                batch_size=TAMANO_LOTE,
+            )
+            self.ofertas = [
+                OfertaProveedor(
+                    insumo=insumo,
+                    proveedor=proveedor,
+                    precio_unitario_compra=Decimal(rnd.randrange(50, 5000)) / 100,
+                    tiempo_entrega_estimado_dias=rnd.randrange(1, 30),
+                    multiplo_pedido=rnd.choice((1, 1, 10, 50)),
+                )
+                for insumo in self.insumos
+                for proveedor in rnd.sample(
+                    self.proveedores, min(v.ofertas_por_insumo, len(self.proveedores))
+                )
+            ]
+            OfertaProveedor.objects.bulk_create(self.ofertas, batch_size=TAMANO_LOTE)
+
+            self.productos = ProductoTerminado.objects.bulk_create(
+                (
+                    ProductoTerminado(
+                        descripcion=f"Producto {i:05d}",
+                        categoria=rnd.choice(self.categorias_producto),
+                        precio_unitario=Decimal(rnd.randrange(1000, 90000)) / 100,
+                        stock=rnd.randrange(0, 200),
+                        modelo=f"M-{i:05d}",
+                    )
+                    for i in range(v.productos)
+                ),
+                batch_size=TAMANO_LOTE,
+            )
+            componentes = ComponenteProducto.objects.bulk_create(
+                (
+                    ComponenteProducto(
+                        producto_terminado=producto,
+                        insumo=insumo,
+                        cantidad_necesaria=rnd.randrange(1, 6),
+                    )
+                    for producto in self.productos
+                    for insumo in rnd.sample(
+                        self.insumos, min(v.componentes_por_producto, len(self.insumos))
+                    )
+                ),
+                batch_size=TAMANO_LOTE,
+            )
+            # El stock sorteado es el saldo al inicio del período; las
+            # recepciones y los lotes generados después se suman a él.
+            self._registrar_movimientos(
+                MovimientoStock(
+                    **{campo: articulo},
+                    cantidad=articulo.stock,
+                    tipo="SALDO_INICIAL",
+                    fecha=self.desde,
+                )
+                for campo, articulos in (
+                    ("insumo", self.insumos),
+                    ("producto_terminado", self.productos),
+                )
+                for articulo in articulos
+            )
+            self.insumos_por_id = {insumo.id: insumo for insumo in self.insumos}
+            self.clientes = Cliente.objects.bulk_create(
+                (
+                    Cliente(
+                        nombre=f"Cliente {i:06d} [{sufijo}]",
+                        email=f"cliente{i}.{sufijo}@ejemplo.com",
+                        direccion=f"Calle {i} {rnd.randrange(1, 9999)}",
+                    )
+                    for i in range(v.clientes)
+                ),
+                batch_size=TAMANO_LOTE,
+            )
+
+        self._contar("categorias", len(self.categorias_insumo) + len(self.categorias_producto))
+        self._contar("fabricantes", len(fabricantes))
+        self._contar("proveedores", len(self.proveedores))
+        self._contar("insumos", len(self.insumos))
+        self._contar("ofertas", len(self.ofertas))
+        self._contar("productos", len(self.productos))
+        self._contar("componentes", len(componentes))
+        self._contar("clientes", len(self.clientes))
+        self.progreso(
+            f"Maestros: {len(self.insumos)} insumos, {len(self.productos)} productos, "
+            f"{len(self.clientes)} clientes."
+        )
+
+    # --- Ventas y producción ---
+
+    def _estado_ov(self, fecha):
+        rnd = self.rnd
+        if self._antiguedad(fecha) > DIAS_DOCUMENTO_ABIERTO:
+            return "CANCELADA" if rnd.random() < 0.08 else "COMPLETADA"
+        if rnd.random() < 0.15:
+            return rnd.choice(("COMPLETADA", "CANCELADA"))
+        return rnd.choice(ESTADOS_OV_EN_CURSO)
+
+    def _orden_produccion(self, item, estado_op, sector):
+        """OP de un ítem de OV, con las fechas que corresponden a su estado."""
+        orden = item.orden_venta
+        op = OrdenProduccion(
+            orden_venta_origen=orden,
+            producto_a_producir=item.producto_terminado,
+            cantidad_a_producir=item.cantidad,
+            estado_op=estado_op,
+            fecha_solicitud=orden.fecha_creacion,
+        )
+        if estado_op.nombre != Estados.PENDIENTE:
+            op.sector_asignado_op = sector
+            op.fecha_inicio_planificada = (orden.fecha_creacion + timedelta(days=2)).date()
+            op.fecha_fin_planificada = op.fecha_inicio_planificada + timedelta(days=7)
+        if estado_op.nombre in (Estados.LISTA_PARA_ENTREGA, Estados.COMPLETADA):
+            op.fecha_inicio_real = orden.fecha_creacion + timedelta(days=3)
+            op.fecha_fin_real = orden.fecha_creacion + timedelta(days=8)
+        return op
+
+    def ventas(self, usuarios):
+        v = self.v
+        con_reporte = set(self.rnd.sample(range(v.ordenes_venta), min(v.reportes, v.ordenes_venta)))
+        campos_fecha = (
+            HistorialOV._meta.get_field("fecha_evento"),
+            LoteProductoTerminado._meta.get_field("fecha_creacion"),
+        )
+        with _fechas_explicitas(*campos_fecha):
+            for indices in _lotes(v.ordenes_venta):
+                with transaction.atomic():
+                    self._lote_ventas(indices, con_reporte, usuarios)
+                self.progreso(f"Órdenes de venta: {indices.stop}/{v.ordenes_venta}")
+
+    def _lote_ventas(self, indices, con_reporte, usuarios):
+        # Todos los valores al azar de una OV se sortean juntos, en el bucle
+        # por OV: así la secuencia no depende de dónde cortan los lotes.
+        rnd, v = self.rnd, self.v
+        sectores_disponibles = sectores.todos()
+        ordenes, items, ops, lotes, reportes, historial = [], [], [], [], [], []
+        facturables, sorteos_reporte = [], []
+        numeros_ov = reservar_numeros_documento(OrdenVenta, "OV", "numero_ov", len(indices))
+        for indice, numero_ov in zip(indices, numeros_ov):
+            fecha = self._fecha(indice, v.ordenes_venta)
+            orden = OrdenVenta(
+                numero_ov=numero_ov,
+                cliente=rnd.choice(self.clientes),
+                fecha_creacion=fecha,
+                estado=self._estado_ov(fecha),
+                total_ov=Decimal("0.00"),
+            )
+            estado_op = estados.obtener(ESTADO_OP_POR_ESTADO_OV[orden.estado])
+            for producto in rnd.sample(self.productos, min(v.lineas_por_ov, len(self.productos))):
+                cantidad = rnd.randrange(1, 20)
+                item = ItemOrdenVenta(
+                    orden_venta=orden,
+                    producto_terminado=producto,
+                    cantidad=cantidad,
+                    precio_unitario_venta=producto.precio_unitario,
+                    subtotal=cantidad * producto.precio_unitario,
+                )
+                orden.total_ov += item.subtotal
+                items.append(item)
+                ops.append(
+                    self._orden_produccion(item, estado_op, rnd.choice(sectores_disponibles))
+                )
+            ordenes.append(orden)
+            if orden.estado in ("LISTA_ENTREGA", "COMPLETADA"):
+                facturables.append(orden)
+            if indice in con_reporte:
+                sorteos_reporte.append((orden, rnd.choice(TIPOS_PROBLEMA), rnd.random() < 0.3))
+
+        OrdenVenta.objects.bulk_create(ordenes, batch_size=TAMANO_LOTE)
+        ItemOrdenVenta.objects.bulk_create(items, batch_size=TAMANO_LOTE)
+
+        numeros_op = reservar_numeros_documento(OrdenProduccion, "OP", "numero_op", len(ops))
+        for op, numero_op in zip(ops, numeros_op):
+            op.numero_op = numero_op
+            if op.fecha_fin_real:
+                lotes.append(
+                    LoteProductoTerminado(
+                        producto=op.producto_a_producir,
+                        op_asociada=op,
+                        cantidad=op.cantidad_a_producir,
+                        fecha_creacion=op.fecha_fin_real,
+                        enviado=op.estado_op.nombre == Estados.COMPLETADA,
+                    )
+                )
+        OrdenProduccion.objects.bulk_create(ops, batch_size=TAMANO_LOTE)
+        LoteProductoTerminado.objects.bulk_create(lotes, batch_size=TAMANO_LOTE)
+        self._movimientos_lotes(lotes)
+
+        # Los mismos eventos que registran las señales y las vistas.
+        for orden in ordenes:
+            historial.append(
+                HistorialOV(
+                    orden_venta=orden,
+                    fecha_evento=orden.fecha_creacion,
+                    descripcion=descripcion_creacion_ov(orden),
+                )
+            )
+        for op in ops:
+            historial.append(
+                HistorialOV(
+                    orden_venta=op.orden_venta_origen,
+                    fecha_evento=op.fecha_solicitud,
+                    descripcion=descripcion_creacion_op(op),
+                    realizado_por=usuarios["ventas"],
+                )
+            )
+
+        primera_op = {}
+        for op in ops:
+            primera_op.setdefault(op.orden_venta_origen_id, op)
+        numeros_rp = reservar_numeros_documento(
+            Reportes, "RP", "n_reporte", len(sorteos_reporte)
+        )
+        for (orden, tipo_problema, resuelto), numero_rp in zip(sorteos_reporte, numeros_rp):
+            op = primera_op[orden.id]
+            resuelto = resuelto or orden.estado in ("LISTA_ENTREGA", "COMPLETADA")
+            reporte = Reportes(
+                n_reporte=numero_rp,
+                orden_produccion_asociada=op,
+                fecha=orden.fecha_creacion + timedelta(days=4),
+                tipo_problema=tipo_problema,
+                informe_reporte="Reporte generado para pruebas de carga.",
+                resuelto=resuelto,
+                fecha_resolucion=orden.fecha_creacion + timedelta(days=5) if resuelto else None,
+                reportado_por=usuarios["produccion"],
+                sector_reporta=op.sector_asignado_op,
+            )
+            reportes.append(reporte)
+            historial.append(
+                HistorialOV(
+                    orden_venta=orden,
+                    fecha_evento=reporte.fecha,
+                    descripcion=(
+                        f"Se creó el reporte N° {reporte.n_reporte} por "
+                        f"'{reporte.tipo_problema}' en la OP {op.numero_op}."
+                    ),
+                    tipo_evento="Reporte de Incidencia",
+                    realizado_por=usuarios["produccion"],
+                )
+            )
+        Reportes.objects.bulk_create(reportes, batch_size=TAMANO_LOTE)
+
+        facturas = []
+        numeros_factura = reservar_numeros_documento(
+            Factura, "FACT", "numero_factura", len(facturables)
+        )
+        for orden, numero in zip(facturables, numeros_factura):
+            factura = Factura(
+                numero_factura=numero,
+                orden_venta=orden,
+                total_facturado=orden.total_ov,
+                fecha_emision=orden.fecha_creacion + timedelta(days=9),
+            )
+            facturas.append(factura)
+            historial.append(
+                HistorialOV(
+                    orden_venta=orden,
+                    fecha_evento=factura.fecha_emision,
+                    descripcion=(
+                        f"Se generó la factura N° {numero} por un total de "
+                        f"${factura.total_facturado:.2f}."
+                    ),
+                    tipo_evento="Facturado",
+                    realizado_por=usuarios["ventas"],
+                )
+            )
+        Factura.objects.bulk_create(facturas, batch_size=TAMANO_LOTE)
+        HistorialOV.objects.bulk_create(historial, batch_size=TAMANO_LOTE)
+
+        self._contar("ordenes_venta", len(ordenes))
+        self._contar("items_ov", len(items))
+        self._contar("ordenes_produccion", len(ops))
+        self._contar("lotes", len(lotes))
+        self._contar("reportes", len(reportes))
+        self._contar("facturas", len(facturas))
+        self._contar("historial_ov", len(historial))
+
+    def _movimientos_lotes(self, lotes):
+        """Ingreso de cada lote por producción y, si ya se envió, su salida."""
+        movimientos = []
+        for lote in lotes:
+            producto, op = lote.producto, lote.op_asociada
+            movimientos.append(
+                MovimientoStock(
+                    producto_terminado=producto,
+                    cantidad=lote.cantidad,
+                    tipo="PRODUCCION",
+                    referencia=op.numero_op,
+                    fecha=lote.fecha_creacion,
+                )
+            )
+            if lote.enviado:
+                movimientos.append(
+                    MovimientoStock(
+                        producto_terminado=producto,
+                        cantidad=-lote.cantidad,
+                        tipo="ENVIO_LOTE",
+                        referencia=f"Lote {lote.id} (OP {op.numero_op})",
+                        fecha=lote.fecha_creacion + timedelta(days=1),
+                    )
+                )
+            else:
+                producto.stock += lote.cantidad
+        self._registrar_movimientos(movimientos)
+        ProductoTerminado.objects.bulk_update(
+            {lote.producto for lote in lotes if not lote.enviado},
+            ["stock"],
+            batch_size=TAMANO_LOTE,
+        )
+
+    # --- Compras ---
+
+    def compras(self):
+        v = self.v
+        self.ofertas_por_proveedor = {}
+        for oferta in self.ofertas:
+            self.ofertas_por_proveedor.setdefault(oferta.proveedor_id, []).append(oferta)
+        self.proveedores_con_ofertas = sorted(self.ofertas_por_proveedor)
+        for indices in _lotes(v.ordenes_compra):
+            with transaction.atomic():
+                self._lote_compras(indices)
+            self.progreso(f"Órdenes de compra: {indices.stop}/{v.ordenes_compra}")
+
+    def _estado_oc(self, fecha):
+        rnd = self.rnd
+        if self._antiguedad(fecha) > DIAS_DOCUMENTO_ABIERTO:
+            return "CANCELADA" if rnd.random() < 0.05 else rnd.choice(("RECIBIDA_TOTAL", "COMPLETADA"))
+        return rnd.choice(ESTADOS_OC_EN_CURSO)
+
+    def _lote_compras(self, indices):
+        rnd, v = self.rnd, self.v
+        ordenes, items = [], []
+        numeros = reservar_numeros_documento(Orden, "OC", "numero_orden", len(indices))
+        for indice, numero in zip(indices, numeros):
+            fecha = self._fecha(indice, v.ordenes_compra)
+            estado = self._estado_oc(fecha)
+            proveedor_id = rnd.choice(self.proveedores_con_ofertas)
+            disponibles = self.ofertas_por_proveedor[proveedor_id]
+            lineas = []
+            for oferta in rnd.sample(disponibles, min(v.lineas_por_oc, len(disponibles))):
+                cantidad = rnd.randrange(1, 50) * oferta.multiplo_pedido
+                if estado in ("RECIBIDA_TOTAL", "COMPLETADA"):
+                    recibida = cantidad
+                elif estado == "RECIBIDA_PARCIAL":
+                    recibida = cantidad // 2
+                else:
+                    recibida = 0
+                lineas.append(
+                    ItemOrdenCompra(
+                        insumo_id=oferta.insumo_id,
+                        cantidad=cantidad,
+                        cantidad_recibida=recibida,
+                        precio_unitario_compra=oferta.precio_unitario_compra,
+                        subtotal=cantidad * oferta.precio_unitario_compra,
+                    )
+                )
+            # bulk_create no pasa por Orden.save(): la línea principal se copia a mano.
+            orden = Orden(
+                numero_orden=numero,
+                proveedor_id=proveedor_id,
+                estado=estado,
+                fecha_creacion=fecha,
+                insumo_principal_id=lineas[0].insumo_id,
+                cantidad_principal=lineas[0].cantidad,
+                precio_unitario_compra=lineas[0].precio_unitario_compra,
+                total_orden_compra=sum(linea.subtotal for linea in lineas),
+                fecha_estimada_entrega=(fecha + timedelta(days=15)).date(),
+                numero_tracking=f"TRK-{numero}" if estado == "EN_TRANSITO" else None,
+            )
+            for linea in lineas:
+                linea.orden = orden
+            ordenes.append(orden)
+            items += lineas
+        Orden.objects.bulk_create(ordenes, batch_size=TAMANO_LOTE)
+        ItemOrdenCompra.objects.bulk_create(items, batch_size=TAMANO_LOTE)
+
+        # Lo recibido entra al stock en la fecha estimada de entrega.
+        recibidos = set()
+        for linea in items:
+            if linea.cantidad_recibida:
+                insumo = self.insumos_por_id[linea.insumo_id]
+                insumo.stock += linea.cantidad_recibida
+                recibidos.add(insumo)
+        self._registrar_movimientos(
+            MovimientoStock(
+                insumo_id=linea.insumo_id,
+                cantidad=linea.cantidad_recibida,
+                tipo="RECEPCION_OC",
+                referencia=linea.orden.numero_orden,
+                fecha=linea.orden.fecha_creacion + timedelta(days=15),
+            )
+            for linea in items
+        )
+        Insumo.objects.bulk_update(recibidos, ["stock"], batch_size=TAMANO_LOTE)
+        self._contar("ordenes_compra", len(ordenes))
+        self._contar("items_oc", len(items))
+
+    # --- Auditoría ---
+
+    def accesos(self, usuarios):
+        rnd, v = self.rnd, self.v
+        lista_usuarios = list(usuarios.values())
+        for indices in _lotes(v.accesos):
+            with transaction.atomic():
+                AuditoriaAcceso.objects.bulk_create(
+                    (
+                        AuditoriaAcceso(
+                            usuario=rnd.choice(lista_usuarios),
+                            accion=rnd.choice((ACCION_INICIO_SESION, ACCION_CIERRE_SESION)),
+                            fecha_hora=self._fecha(indice, v.accesos),
+                            ip_address=f"10.0.{rnd.randrange(256)}.{rnd.randrange(1, 255)}",
+                            user_agent="Mozilla/5.0 (datos sintéticos)",
+                        )
+                        for indice in indices
+                    ),
+                    batch_size=TAMANO_LOTE,
+                )
+            self._contar("accesos", len(indices))
+
+
+def generar_datos_sinteticos(volumenes=None, escala=1, semilla=0, hasta=None, progreso=None):
+    """
+    Carga un conjunto de datos coherente: catálogos, maestros, OVs con sus
+    ítems, OPs, lotes, reportes, facturas e HistorialOV, OCs con sus líneas,
+    el kardex de stock, auditoría de accesos y un usuario por rol. El stock
+    de cada artículo es el saldo de su kardex: saldo inicial, recepciones de
+    OC, ingresos de lotes y envíos. Los documentos se reparten a
+    lo largo de `volumenes.dias` días hasta `hasta`; los anteriores a
+    DIAS_DOCUMENTO_ABIERTO están cerrados.
+
+    Con la misma `semilla`, los mismos volúmenes, la misma fecha `hasta` y
+    la misma base de partida genera exactamente los mismos datos.
+
+    Todo se inserta con bulk_create, de a TAMANO_LOTE documentos por
+    transacción, así que no corren las señales por fila; al final se
+    invalidan los contadores y el dashboard que ellas mantendrían.
+
+    Args:
+        volumenes: Volumenes a escala 1 (default: Volumenes()).
+        escala: Factor sobre los volúmenes (ver Volumenes.escalar).
+        semilla: Semilla del generador de números aleatorios.
+        hasta: Fecha de referencia (date); default, hoy.
+        progreso: Callable opcional que recibe un mensaje por lote.
+
+    Returns:
+        Dict {entidad: filas creadas}, más 'usuarios' con el usuario de cada rol.
+    """
+    volumenes = (volumenes or Volumenes()).escalar(escala)
+    hasta = timezone.make_aware(datetime.combine(hasta or timezone.localdate(), time.min))
+
+    _asegurar_catalogos()
+    usuarios = _crear_usuarios()
+    generador = GeneradorDatos(volumenes, semilla, hasta, progreso)
+    generador.maestros()
+    generador.ventas(usuarios)
+    generador.compras()
+    generador.accesos(usuarios)
+
+    invalidar_contadores_notificaciones()
+    marcar_dashboard_desactualizado(*SECCIONES)
+    return {**generador.creados, "usuarios": usuarios}
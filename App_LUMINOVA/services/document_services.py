@@ -1,4 +1,89 @@
-from django.db.models import Model
+from django.db.models import F, Model
+
+from ..models import SecuenciaDocumento
+from ..utils import atomic_inmediato
+
+
+def formatear_numero_documento(prefix: str, numero: int) -> str:
+    """Devuelve el número con el formato estándar de la app (ej: 'OP-00012')."""
+    return f"{prefix}-{str(numero).zfill(5)}"
+
+
+def _ultimo_numero_existente(model: Model, prefix: str, field_name: str) -> int:
+    """
+    Busca el mayor sufijo numérico ya usado para el prefijo. Solo se ejecuta
+    una vez por prefijo, al inicializar su secuencia.
+    """
+    valores = model.objects.filter(
+        **{f"{field_name}__startswith": f"{prefix}-"}
+    ).values_list(field_name, flat=True)
+
+    ultimo = 0
+    for valor in valores.iterator():
+        sufijo = valor[len(prefix) + 1 :]
+        if sufijo.isdigit():
+            ultimo = max(ultimo, int(sufijo))
+    return ultimo
+
+
+def registrar_numero_documento(prefix: str, numero: str) -> None:
+    """
+    Adelanta la secuencia del prefijo si `numero` (ej: 'OC-00120') quedó por
+    encima de su último valor, como pasa con un número cargado a mano desde
+    el admin o al editar una OC. Así la próxima reserva no choca con él.
+    Si la secuencia todavía no existe no hace nada: al crearla se inicializa
+    con el mayor sufijo existente.
+    """
+    sufijo = numero[len(prefix) + 1 :] if numero and numero.startswith(f"{prefix}-") else ""
+    if sufijo.isdigit():
+        SecuenciaDocumento.objects.filter(
+            prefijo=prefix, ultimo_valor__lt=int(sufijo)
+        ).update(ultimo_valor=int(sufijo))
+
+
+def _obtener_secuencia(model: Model, prefix: str, field_name: str) -> SecuenciaDocumento:
+    secuencia, _ = SecuenciaDocumento.objects.get_or_create(
+        prefijo=prefix,
+        defaults={
+            "ultimo_valor": _ultimo_numero_existente(model, prefix, field_name)
+        },
+    )
+    return secuencia
+
+
+def reservar_numeros_documento(
+    model: Model, prefix: str, field_name: str, cantidad: int
+) -> list[str]:
+    """
+    Reserva `cantidad` números consecutivos para un prefijo con un único UPDATE.
+
+    El UPDATE toma el bloqueo de la fila de la secuencia (o el de escritura en
+    SQLite) hasta el fin de la transacción, así que dos peticiones concurrentes
+    nunca reciben el mismo número. Debe llamarse dentro de la transacción que
+    crea los documentos para que la numeración quede sin huecos.
+
+    Args:
+        model: La clase del modelo de Django (ej: OrdenProduccion).
+        prefix: El prefijo para el número (ej: 'OP').
+        field_name: El nombre del campo que almacena el número (ej: 'numero_op').
+        cantidad: Cuántos números reservar.
+
+    Returns:
+        Lista con los números reservados, en orden (ej: ['OP-00005', 'OP-00006']).
+    """
+    if cantidad < 1:
+        return []
+
+    with atomic_inmediato():
+        secuencia_qs = SecuenciaDocumento.objects.filter(prefijo=prefix)
+        if not secuencia_qs.update(ultimo_valor=F("ultimo_valor") + cantidad):
+            _obtener_secuencia(model, prefix, field_name)
+            secuencia_qs.update(ultimo_valor=F("ultimo_valor") + cantidad)
+        ultimo = secuencia_qs.values_list("ultimo_valor", flat=True).get()
+
+    primero = ultimo - cantidad + 1
+    return [formatear_numero_documento(prefix, n) for n in range(primero, ultimo + 1)]
+
 
 def generar_siguiente_numero_documento(model: Model, prefix: str, field_name: str) -> str:
     """
@@ -12,14 +97,13 @@ def generar_siguiente_numero_documento(model: Model, prefix: str, field_name: st
     Returns:
         Una cadena con el nuevo número de documento único (ej: 'OV-00005').
     """
-    
-    last_item = model.objects.order_by('id').last()
-    next_id = (last_item.id + 1) if last_item else 1
+    return reservar_numeros_documento(model, prefix, field_name, 1)[0]
 
-    while True:
-        # Crea un diccionario para el filtro dinámico
-        filter_kwargs = {f"{field_name}__exact": f"{prefix}-{str(next_id).zfill(5)}"}
 
-        if not model.objects.filter(**filter_kwargs).exists():
-            return f"{prefix}-{str(next_id).zfill(5)}"
-        next_id += 1
\ No newline at end of file
+def sugerir_siguiente_numero_documento(model: Model, prefix: str, field_name: str) -> str:
+    """
+    Devuelve el número que probablemente se asignará, sin reservarlo.
+    Pensado para mostrarlo en formularios; el número definitivo se asigna al guardar.
+    """
+    secuencia = _obtener_secuencia(model, prefix, field_name)
+    return formatear_numero_documento(prefix, secuencia.ultimo_valor + 1)
@@ -0,0 +1,130 @@
+import threading
+
+from django.core.cache import cache
+from django.db import transaction
+
+from ..models import EstadoOrden, SectorAsignado
+
+CACHE_KEY_VERSION_CATALOGOS = "luminova:catalogos:version"
+
+
+class Estados:
+    """Nombres de los estados de OP tal como están cargados en EstadoOrden."""
+
+    PENDIENTE = "Pendiente"
+    CONFIRMADA = "Confirmada"
+    PLANIFICADA = "Planificada"
+    INSUMOS_SOLICITADOS = "Insumos Solicitados"
+    INSUMOS_RECIBIDOS = "Insumos Recibidos"
+    PRODUCCION_INICIADA = "Producción Iniciada"
+    EN_PROCESO = "En Proceso"
+    PRODUCCION_PARCIAL = "Producción Parcial"
+    PAUSADA = "Pausada"
+    RESOLUCION_PENDIENTE = "Resolución Pendiente"
+    LISTA_PARA_ENTREGA = "Lista para Entrega"
+    COMPLETADA = "Completada"
+    CANCELADA = "Cancelada"
+
+    FINALIZADOS = (COMPLETADA, CANCELADA)
+
+
+class RegistroCatalogo:
+    """
+    Copia en memoria (por proceso) de una tabla chica de nombres, como
+    EstadoOrden o SectorAsignado, indexada por nombre sin distinguir mayúsculas.
+
+    Se carga con una consulta la primera vez que se usa. Las señales de esos
+    modelos suben una versión en la caché compartida y cada proceso se recarga
+    cuando ve que su versión quedó vieja.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self._por_nombre = None
+        self._por_id = None
+        self._version = None
+        # Cuenta las recargas; permite a quien derive datos del registro saber si quedaron viejos.
+        self.recargas = 0
+
+    def _cargar(self, version):
+        instancias = list(self.model.objects.order_by("nombre"))
+        self._por_nombre = {i.nombre.strip().lower(): i for i in instancias}
+        self._por_id = {i.id: i for i in instancias}
+        self._version = version
+        self.recargas += 1
+
+    def _datos(self, forzar=False):
+        version = cache.get(CACHE_KEY_VERSION_CATALOGOS, 0)
+        if forzar or self._por_nombre is None or self._version != version:
+            with self._lock:
+                if forzar or self._por_nombre is None or self._version != version:
+                    self._cargar(version)
+        return self._por_nombre
+
+    def generacion(self):
+        """Número que cambia cada vez que el registro se recarga desde la base."""
+        self._datos()
+        return self.recargas
+
+    def invalidar(self):
+        self._por_nombre = None
+
+    def obtener(self, nombre):
+        """Instancia por nombre; lanza model.DoesNotExist como `objects.get()`."""
+        clave = nombre.strip().lower()
+        instancia = self._datos().get(clave)
+        if instancia is None:
+            # Puede haberse creado en otro proceso sin caché compartida: recargamos una vez.
+            instancia = self._datos(forzar=True).get(clave)
+        if instancia is None:
+            raise self.model.DoesNotExist(
+                f"{self.model._meta.verbose_name} '{nombre}' no existe."
+            )
+        return instancia
+
+    def buscar(self, nombre):
+        """Como `obtener`, pero devuelve None si no existe."""
+        try:
+            return self.obtener(nombre)
+        except self.model.DoesNotExist:
+            return None
+
+    def existe(self, nombre):
+        return self.buscar(nombre) is not None
+
+    def ids(self, *nombres):
+        """
+        Ids de los nombres que existen. Pensado para filtros `campo_id__in=...`:
+        si ninguno existe devuelve una lista vacía y el filtro no trae nada.
+        """
+        datos = self._datos()
+        return [datos[n.lower()].id for n in nombres if n.lower() in datos]
+
+    def por_id(self, pk):
+        self._datos()
+        return self._por_id.get(pk)
+
+    def todos(self):
+        """Todas las instancias, ordenadas por nombre."""
+        return list(self._datos().values())
+
+
+estados = RegistroCatalogo(EstadoOrden)
+sectores = RegistroCatalogo(SectorAsignado)
+
+
+def invalidar_catalogos():
+    """Fuerza la recarga de los registros en todos los procesos."""
+
+    def _subir_version():
+        try:
+            cache.incr(CACHE_KEY_VERSION_CATALOGOS)
+        except ValueError:
+            cache.set(CACHE_KEY_VERSION_CATALOGOS, 1, None)
+        estados.invalidar()
+        sectores.invalidar()
+
+    _subir_version()
+    # Se repite al confirmar para que nadie quede con una copia leída antes del commit.
+    transaction.on_commit(_subir_version)
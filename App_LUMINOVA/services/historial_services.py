@@ -0,0 +1,300 @@
+import calendar
+import json
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from ..models import (
+    AuditoriaAcceso,
+    AuditoriaAccesoArchivada,
+    HistorialOV,
+    HistorialOVArchivado,
+)
+from .auditoria_services import ACCION_INICIO_SESION
+
+
+@dataclass(frozen=True)
+class EventoHistorial:
+    fecha_evento: datetime
+    descripcion: str
+    tipo_evento: str = None
+    usuario: str = None  # username de quien lo realizó
+    archivado: bool = False
+
+
+@dataclass(frozen=True)
+class EventoAcceso:
+    fecha_hora: datetime
+    accion: str
+    usuario_id: int = None
+    usuario: str = None
+    ip_address: str = None
+    user_agent: str = ""
+    archivado: bool = False
+
+
+@dataclass
+class ResultadoArchivado:
+    registros: int = 0
+    grupos: int = 0  # OVs o días tocados en el archivo
+
+
+def _comprimir(registros):
+    return zlib.compress(
+        json.dumps(registros, ensure_ascii=False, separators=(",", ":")).encode(), 9
+    )
+
+
+def _descomprimir(datos):
+    return json.loads(zlib.decompress(bytes(datos))) if datos else []
+
+
+def fecha_corte(meses, hoy=None):
+    """Medianoche local del día que cae `meses` meses antes de `hoy`."""
+    hoy = hoy or timezone.localdate()
+    total = hoy.year * 12 + hoy.month - 1 - meses
+    anio, mes = divmod(total, 12)
+    dia = min(hoy.day, calendar.monthrange(anio, mes + 1)[1])
+    return timezone.make_aware(datetime.combine(date(anio, mes + 1, dia), time.min))
+
+
+# --- Historial de OVs ---
+
+
+def _evento_ov(fecha, descripcion, tipo, usuario_id, usuario):
+    return {
+        "f": fecha.isoformat(),
+        "d": descripcion,
+        "t": tipo,
+        "u": usuario_id,
+        "n": usuario,
+    }
+
+
+def archivar_historial_ov(antes_de, lote=500, dry_run=False):
+    """
+    Mueve los eventos de HistorialOV anteriores a `antes_de` al registro
+    comprimido de su OV (HistorialOVArchivado), fusionándolos con lo que ya
+    estaba archivado. Cada lote de OVs se procesa en su propia transacción,
+    así que la tabla caliente nunca queda bloqueada por mucho tiempo.
+    """
+    viejos = HistorialOV.objects.filter(fecha_evento__lt=antes_de)
+    if dry_run:
+        return ResultadoArchivado(
+            registros=viejos.count(),
+            grupos=viejos.order_by().values("orden_venta_id").distinct().count(),
+        )
+
+    ov_ids = list(
+        viejos.order_by("orden_venta_id").values_list("orden_venta_id", flat=True).distinct()
+    )
+    resultado = ResultadoArchivado()
+    for i in range(0, len(ov_ids), lote):
+        ids = ov_ids[i : i + lote]
+        with transaction.atomic():
+            a_mover = viejos.filter(orden_venta_id__in=ids)
+            eventos = {}
+            for ov_id, fecha, descripcion, tipo, usuario_id, usuario in a_mover.order_by(
+                "fecha_evento", "id"
+            ).values_list(
+                "orden_venta_id",
+                "fecha_evento",
+                "descripcion",
+                "tipo_evento",
+                "realizado_por_id",
+                "realizado_por__username",
+            ):
+                eventos.setdefault(ov_id, []).append(
+                    _evento_ov(fecha, descripcion, tipo, usuario_id, usuario)
+                )
+
+            existentes = HistorialOVArchivado.objects.in_bulk(eventos, field_name="orden_venta_id")
+            nuevos, actualizados = [], []
+            for ov_id, nuevos_eventos in eventos.items():
+                archivado = existentes.get(ov_id) or HistorialOVArchivado(orden_venta_id=ov_id)
+                todos = sorted(_descomprimir(archivado.datos) + nuevos_eventos, key=lambda e: e["f"])
+                archivado.datos = _comprimir(todos)
+                archivado.cantidad_eventos = len(todos)
+                archivado.primer_evento = datetime.fromisoformat(todos[0]["f"])
+                archivado.ultimo_evento = datetime.fromisoformat(todos[-1]["f"])
+                archivado.ultimo_tipo_evento = todos[-1]["t"]
+                archivado.fecha_archivado = timezone.now()
+                (actualizados if archivado.pk else nuevos).append(archivado)
+                resultado.registros += len(nuevos_eventos)
+
+            HistorialOVArchivado.objects.bulk_create(nuevos)
+            HistorialOVArchivado.objects.bulk_update(
+                actualizados,
+                [
+                    "datos",
+                    "cantidad_eventos",
+                    "primer_evento",
+                    "ultimo_evento",
+                    "ultimo_tipo_evento",
+                    "fecha_archivado",
+                ],
+            )
+            a_mover.delete()
+            resultado.grupos += len(eventos)
+    return resultado
+
+
+def historial_ov(orden_venta):
+    """
+    Línea de tiempo completa de una OV, del evento más reciente al más
+    antiguo: la tabla caliente más lo archivado. Son dos consultas por
+    índice, sin importar cuántos años de historial tenga la OV.
+    """
+    eventos = [
+        EventoHistorial(fecha, descripcion, tipo, usuario)
+        for fecha, descripcion, tipo, usuario in HistorialOV.objects.filter(
+            orden_venta=orden_venta
+        )
+        .order_by("-fecha_evento", "-id")
+        .values_list("fecha_evento", "descripcion", "tipo_evento", "realizado_por__username")
+    ]
+    datos = (
+        HistorialOVArchivado.objects.filter(orden_venta=orden_venta)
+        .values_list("datos", flat=True)
+        .first()
+    )
+    eventos += [
+        EventoHistorial(
+            datetime.fromisoformat(e["f"]), e["d"], e["t"], e["n"], archivado=True
+        )
+        for e in reversed(_descomprimir(datos))
+    ]
+    return eventos
+
+
+# --- Auditoría de accesos ---
+
+
+def archivar_auditoria(antes_de, lote=31, dry_run=False):
+    """
+    Mueve los registros de AuditoriaAcceso anteriores a `antes_de` a un
+    registro comprimido por día (AuditoriaAccesoArchivada), con sus totales.
+    `lote` es la cantidad de días por transacción.
+    """
+    viejos = AuditoriaAcceso.objects.filter(fecha_hora__lt=antes_de)
+    if dry_run:
+        return ResultadoArchivado(
+            registros=viejos.count(),
+            grupos=viejos.annotate(dia=TruncDate("fecha_hora"))
+            .order_by()
+            .values("dia")
+            .distinct()
+            .count(),
+        )
+
+    dias = list(
+        viejos.annotate(dia=TruncDate("fecha_hora"))
+        .order_by("dia")
+        .values_list("dia", flat=True)
+        .distinct()
+    )
+    resultado = ResultadoArchivado()
+    for i in range(0, len(dias), lote):
+        tramo = dias[i : i + lote]
+        desde = timezone.make_aware(datetime.combine(tramo[0], time.min))
+        with transaction.atomic():
+            a_mover = viejos.filter(fecha_hora__gte=desde)
+            if i + lote < len(dias):
+                hasta = timezone.make_aware(datetime.combine(dias[i + lote], time.min))
+                a_mover = a_mover.filter(fecha_hora__lt=hasta)
+
+            registros = {}
+            for fecha, accion, usuario_id, usuario, ip, user_agent in a_mover.order_by(
+                "fecha_hora", "id"
+            ).values_list(
+                "fecha_hora", "accion", "usuario_id", "usuario__username", "ip_address", "user_agent"
+            ):
+                registros.setdefault(timezone.localdate(fecha), []).append(
+                    {
+                        "f": fecha.isoformat(),
+                        "a": accion,
+                        "u": usuario_id,
+                        "n": usuario,
+                        "ip": ip,
+                        "ua": user_agent or "",
+                    }
+                )
+
+            existentes = AuditoriaAccesoArchivada.objects.in_bulk(registros, field_name="fecha")
+            nuevos, actualizados = [], []
+            for dia, del_dia in registros.items():
+                archivada = existentes.get(dia) or AuditoriaAccesoArchivada(fecha=dia)
+                todos = sorted(_descomprimir(archivada.datos) + del_dia, key=lambda r: r["f"])
+                archivada.datos = _comprimir(todos)
+                archivada.cantidad_registros = len(todos)
+                archivada.inicios_sesion = sum(r["a"] == ACCION_INICIO_SESION for r in todos)
+                archivada.usuarios_distintos = len({r["u"] for r in todos if r["u"]})
+                archivada.fecha_archivado = timezone.now()
+                (actualizados if archivada.pk else nuevos).append(archivada)
+                resultado.registros += len(del_dia)
+
+            AuditoriaAccesoArchivada.objects.bulk_create(nuevos)
+            AuditoriaAccesoArchivada.objects.bulk_update(
+                actualizados,
+                [
+                    "datos",
+                    "cantidad_registros",
+                    "inicios_sesion",
+                    "usuarios_distintos",
+                    "fecha_archivado",
+                ],
+            )
+            a_mover.delete()
+            resultado.grupos += len(registros)
+    return resultado
+
+
+def historial_accesos(usuario=None, desde=None, hasta=None):
+    """
+    Accesos entre `desde` y `hasta` (fechas, inclusive), de la tabla caliente
+    y del archivo, del más reciente al más antiguo. Del archivo solo se
+    descomprimen los días del rango.
+    """
+    calientes = AuditoriaAcceso.objects.all()
+    archivadas = AuditoriaAccesoArchivada.objects.all()
+    if usuario is not None:
+        calientes = calientes.filter(usuario=usuario)
+    if desde is not None:
+        calientes = calientes.filter(
+            fecha_hora__gte=timezone.make_aware(datetime.combine(desde, time.min))
+        )
+        archivadas = archivadas.filter(fecha__gte=desde)
+    if hasta is not None:
+        calientes = calientes.filter(
+            fecha_hora__lt=timezone.make_aware(
+                datetime.combine(hasta + timedelta(days=1), time.min)
+            )
+        )
+        archivadas = archivadas.filter(fecha__lte=hasta)
+
+    accesos = [
+        EventoAcceso(*fila)
+        for fila in calientes.order_by("-fecha_hora", "-id").values_list(
+            "fecha_hora", "accion", "usuario_id", "usuario__username", "ip_address", "user_agent"
+        )
+    ]
+    usuario_id = getattr(usuario, "pk", usuario)
+    for datos in archivadas.order_by("-fecha").values_list("datos", flat=True):
+        accesos += [
+            EventoAcceso(
+                datetime.fromisoformat(r["f"]),
+                r["a"],
+                r["u"],
+                r["n"],
+                r["ip"],
+                r["ua"],
+                archivado=True,
+            )
+            for r in reversed(_descomprimir(datos))
+            if usuario_id is None or r["u"] == usuario_id
+        ]
+    return accesos
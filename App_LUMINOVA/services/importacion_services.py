@@ -0,0 +1,274 @@
+import csv
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.db import DatabaseError
+
+from ..models import Cliente, ProductoTerminado
+from .venta_services import crear_ordenes_venta
+
+COLUMNAS_OBLIGATORIAS = ("referencia", "cliente", "producto", "cantidad")
+
+
+class ArchivoImportacionError(Exception):
+    """El archivo no se puede leer o no tiene las columnas esperadas."""
+
+
+@dataclass
+class ResultadoImportacion:
+    filas_leidas: int = 0
+    ovs_creadas: int = 0
+    lineas_creadas: int = 0
+    numeros_ov: list = field(default_factory=list)
+    # Lista de (número de fila, referencia, mensaje)
+    errores: list = field(default_factory=list)
+
+
+def _normalizar_encabezados(encabezados):
+    columnas = [str(c or "").strip().lower() for c in encabezados]
+    faltantes = [c for c in COLUMNAS_OBLIGATORIAS if c not in columnas]
+    if faltantes:
+        raise ArchivoImportacionError(
+            f"Faltan columnas obligatorias: {', '.join(faltantes)}."
+        )
+    return columnas
+
+
+def _leer_csv(ruta, encoding, delimitador):
+    with open(ruta, newline="", encoding=encoding) as archivo:
+        lector = csv.reader(archivo, delimiter=delimitador)
+        try:
+            columnas = _normalizar_encabezados(next(lector))
+        except StopIteration:
+            raise ArchivoImportacionError("El archivo está vacío.")
+        for numero_fila, valores in enumerate(lector, start=2):
+            if any(v.strip() for v in valores):
+                yield numero_fila, dict(zip(columnas, valores))
+
+
+def _leer_xlsx(ruta):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ArchivoImportacionError(
+            "Para importar archivos .xlsx se necesita openpyxl (pip install openpyxl)."
+        )
+
+    # read_only recorre la hoja en streaming, sin cargar todo el libro en memoria.
+    libro = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        try:
+            columnas = _normalizar_encabezados(next(filas))
+        except StopIteration:
+            raise ArchivoImportacionError("La hoja está vacía.")
+        for numero_fila, valores in enumerate(filas, start=2):
+            if any(v not in (None, "") for v in valores):
+                yield numero_fila, {
+                    c: "" if v is None else str(v) for c, v in zip(columnas, valores)
+                }
+    finally:
+        libro.close()
+
+
+def leer_filas_archivo(ruta, encoding="utf-8-sig", delimitador=","):
+    """
+    Generador de (número de fila, dict columna->valor) para un CSV o XLSX.
+    Lee el archivo fila por fila, así que la memoria no depende de su tamaño.
+    """
+    ruta = Path(ruta)
+    if ruta.suffix.lower() == ".xlsx":
+        return _leer_xlsx(ruta)
+    if ruta.suffix.lower() in (".csv", ".txt"):
+        return _leer_csv(ruta, encoding, delimitador)
+    raise ArchivoImportacionError(f"Formato no soportado: '{ruta.suffix}'. Use .csv o .xlsx.")
+
+
+class _MapasDeBusqueda:
+    """Clientes y productos cargados una sola vez, indexados por id y por nombre."""
+
+    def __init__(self):
+        self.clientes_por_id = {}
+        self.clientes_por_nombre = {}
+        for cliente_id, nombre in Cliente.objects.values_list("id", "nombre"):
+            self.clientes_por_id[cliente_id] = cliente_id
+            # Igual que con los productos: un nombre repetido es ambiguo (None).
+            clave = nombre.strip().lower()
+            self.clientes_por_nombre[clave] = (
+                None if clave in self.clientes_por_nombre else cliente_id
+            )
+
+        self.productos_por_id = {}
+        self.productos_por_descripcion = {}
+        for producto in ProductoTerminado.objects.only(
+            "id", "descripcion", "precio_unitario"
+        ):
+            self.productos_por_id[producto.id] = producto
+            # Descripciones repetidas quedan marcadas como ambiguas (None).
+            clave = producto.descripcion.strip().lower()
+            self.productos_por_descripcion[clave] = (
+                None if clave in self.productos_por_descripcion else producto
+            )
+
+    def cliente(self, valor):
+        valor = valor.strip()
+        if valor.isdigit() and int(valor) in self.clientes_por_id:
+            return int(valor)
+        clave = valor.lower()
+        if clave not in self.clientes_por_nombre:
+            raise ValueError(f"Cliente '{valor}' no encontrado.")
+        cliente_id = self.clientes_por_nombre[clave]
+        if cliente_id is None:
+            raise ValueError(f"Hay varios clientes con el nombre '{valor}'; use el id.")
+        return cliente_id
+
+    def producto(self, valor):
+        valor = valor.strip()
+        if valor.isdigit() and int(valor) in self.productos_por_id:
+            return self.productos_por_id[int(valor)]
+        clave = valor.lower()
+        if clave not in self.productos_por_descripcion:
+            raise ValueError(f"Producto '{valor}' no encontrado.")
+        producto = self.productos_por_descripcion[clave]
+        if producto is None:
+            raise ValueError(
+                f"Hay varios productos con la descripción '{valor}'; use el id."
+            )
+        return producto
+
+
+def _validar_fila(fila, mapas):
+    """Convierte una fila en (cliente_id, línea de OV) o lanza ValueError."""
+    cliente_id = mapas.cliente(fila.get("cliente", ""))
+    producto = mapas.producto(fila.get("producto", ""))
+
+    texto_cantidad = fila.get("cantidad", "").strip()
+    try:
+        cantidad = Decimal(texto_cantidad)
+    except InvalidOperation:
+        raise ValueError(f"Cantidad inválida: '{fila.get('cantidad')}'.")
+    # "2.0" se acepta; "2.5" se rechaza en vez de truncarse a 2.
+    if not cantidad.is_finite() or cantidad != cantidad.to_integral_value():
+        raise ValueError(f"La cantidad debe ser un número entero: '{texto_cantidad}'.")
+    cantidad = int(cantidad)
+    if cantidad < 1:
+        raise ValueError("La cantidad debe ser mayor a cero.")
+
+    linea = {"producto": producto, "cantidad": cantidad}
+    precio = (fila.get("precio_unitario") or "").strip()
+    if precio:
+        try:
+            linea["precio_unitario_venta"] = Decimal(precio.replace(",", "."))
+        except InvalidOperation:
+            raise ValueError(f"Precio inválido: '{precio}'.")
+        if linea["precio_unitario_venta"] < 0:
+            raise ValueError("El precio no puede ser negativo.")
+    return cliente_id, linea
+
+
+def importar_ordenes_venta(filas, lote=1000, dry_run=False, usuario=None, al_procesar_lote=None):
+    """
+    Importa OVs desde un iterable de (número de fila, dict) como el que devuelve
+    `leer_filas_archivo`. Las filas con la misma 'referencia' forman una OV y
+    deben venir consecutivas (archivo ordenado por referencia).
+
+    Las OVs se validan y crean por lotes de unas `lote` líneas, cada lote en su
+    propia transacción con `crear_ordenes_venta`. Una OV con alguna fila
+    inválida no se crea, y todas sus filas quedan en el reporte de errores.
+    En modo `dry_run` solo se valida.
+    """
+    resultado = ResultadoImportacion()
+    mapas = _MapasDeBusqueda()
+    referencias_vistas = set()
+
+    pedidos_lote = []
+    lineas_lote = 0
+    actual = None  # {'referencia', 'cliente', 'lineas', 'filas', 'errores', 'notas'}
+
+    def cerrar_pedido():
+        nonlocal lineas_lote
+        if actual is None:
+            return
+        if actual["errores"]:
+            resultado.errores.extend(actual["errores"])
+            filas_con_error = {f for f, _, _ in actual["errores"]}
+            resultado.errores.extend(
+                (f, actual["referencia"], "OV no importada por errores en otras filas.")
+                for f in actual["filas"]
+                if f not in filas_con_error
+            )
+            return
+        pedidos_lote.append(actual)
+        lineas_lote += len(actual["lineas"])
+
+    def procesar_lote():
+        nonlocal pedidos_lote, lineas_lote
+        if not pedidos_lote:
+            return
+        if dry_run:
+            creadas = [None] * len(pedidos_lote)
+        else:
+            try:
+                creadas = crear_ordenes_venta(
+                    [
+                        {"cliente": p["cliente"], "lineas": p["lineas"], "notas": p["notas"]}
+                        for p in pedidos_lote
+                    ],
+                    usuario=usuario,
+                )
+            except (ValueError, DatabaseError) as e:
+                for pedido in pedidos_lote:
+                    resultado.errores.extend(
+                        (f, pedido["referencia"], f"Lote no importado: {e}")
+                        for f in pedido["filas"]
+                    )
+                creadas = []
+        for pedido, ov in zip(pedidos_lote, creadas):
+            resultado.ovs_creadas += 1
+            resultado.lineas_creadas += len(pedido["lineas"])
+            if ov is not None:
+                resultado.numeros_ov.append(ov.numero_ov)
+        pedidos_lote = []
+        lineas_lote = 0
+        if al_procesar_lote:
+            al_procesar_lote(resultado)
+
+    for numero_fila, fila in filas:
+        resultado.filas_leidas += 1
+        referencia = (fila.get("referencia") or "").strip()
+
+        if actual is None or referencia != actual["referencia"]:
+            cerrar_pedido()
+            if lineas_lote >= lote:
+                procesar_lote()
+            actual = {
+                "referencia": referencia,
+                "cliente": None,
+                "lineas": [],
+                "filas": [],
+                "errores": [],
+                "notas": (fila.get("notas") or "").strip(),
+            }
+            if not referencia:
+                actual["errores"].append((numero_fila, referencia, "Falta la referencia."))
+            elif referencia in referencias_vistas:
+                actual["errores"].append(
+                    (numero_fila, referencia, "Referencia repetida en filas no consecutivas.")
+                )
+            referencias_vistas.add(referencia)
+
+        actual["filas"].append(numero_fila)
+        try:
+            cliente_id, linea = _validar_fila(fila, mapas)
+            if actual["cliente"] is None:
+                actual["cliente"] = cliente_id
+            elif actual["cliente"] != cliente_id:
+                raise ValueError("Cliente distinto al de las demás filas de la OV.")
+            actual["lineas"].append(linea)
+        except ValueError as e:
+            actual["errores"].append((numero_fila, referencia, str(e)))
+
+    cerrar_pedido()
+    procesar_lote()
+    return resultado
@@ -0,0 +1,107 @@
+from dataclasses import dataclass, field
+
+from django.db.models import F, Sum
+
+from ..models import Insumo, OrdenProduccion
+from .estado_services import Estados, estados
+
+
+@dataclass
+class RequerimientoPeriodo:
+    fecha: object  # date, o None para las OPs sin fecha de inicio planificada
+    bruto: int
+    neto: int
+
+
+@dataclass
+class NecesidadInsumo:
+    insumo: Insumo
+    bruto: int = 0
+    neto: int = 0
+    periodos: list = field(default_factory=list)
+
+    @property
+    def disponible(self):
+        return self.insumo.stock + (self.insumo.cantidad_en_pedido or 0)
+
+    @property
+    def fecha_primer_faltante(self):
+        """Primera fecha en la que el disponible ya no cubre lo requerido."""
+        for periodo in self.periodos:
+            if periodo.neto:
+                return periodo.fecha
+        return None
+
+
+def ops_abiertas():
+    """
+    OPs que todavía van a consumir insumos: no finalizadas y sin despacho
+    de depósito (`enviar_insumos_op` es lo único que fija fecha_inicio_real,
+    y a partir de ahí lo que consumen ya salió del stock).
+    """
+    return OrdenProduccion.objects.exclude(
+        estado_op_id__in=estados.ids(*Estados.FINALIZADOS)
+    ).filter(fecha_inicio_real__isnull=True)
+
+
+def _orden_periodo(fecha):
+    # Las OPs sin fecha planificada se consideran necesarias de inmediato.
+    return (fecha is not None, fecha)
+
+
+def calcular_necesidades_mrp(ops=None):
+    """
+    Explosión de materiales de las OPs abiertas, neteada contra el stock y lo
+    ya pedido a proveedores (`cantidad_en_pedido`) y escalonada en el tiempo
+    según `fecha_inicio_planificada`.
+
+    El requerimiento bruto sale de una sola consulta agrupada por insumo y
+    fecha (BOM × cantidad de cada OP), y los insumos de una segunda, así que
+    el costo no depende de cuántas OPs haya abiertas. El disponible se
+    consume en orden de fecha: el neto de un período es lo que falta cubrir
+    en él una vez agotado el disponible por los períodos anteriores.
+
+    Args:
+        ops: QuerySet de OrdenProduccion a considerar (default: `ops_abiertas()`).
+
+    Returns:
+        Dict {insumo_id: NecesidadInsumo} con todos los insumos que tienen
+        requerimiento bruto, tengan o no faltante.
+    """
+    if ops is None:
+        ops = ops_abiertas()
+
+    brutos = {}
+    for insumo_id, fecha, bruto in (
+        ops.filter(producto_a_producir__componentes_requeridos__isnull=False)
+        .order_by()
+        .values("producto_a_producir__componentes_requeridos__insumo_id", "fecha_inicio_planificada")
+        .annotate(
+            bruto=Sum(
+                F("producto_a_producir__componentes_requeridos__cantidad_necesaria")
+                * F("cantidad_a_producir")
+            )
+        )
+        .values_list(
+            "producto_a_producir__componentes_requeridos__insumo_id",
+            "fecha_inicio_planificada",
+            "bruto",
+        )
+    ):
+        brutos.setdefault(insumo_id, []).append((fecha, bruto))
+
+    insumos = Insumo.objects.select_related("categoria").in_bulk(brutos)
+    necesidades = {}
+    for insumo_id, periodos in brutos.items():
+        necesidad = NecesidadInsumo(insumo=insumos[insumo_id])
+        restante = necesidad.disponible
+        for fecha, bruto in sorted(periodos, key=lambda p: _orden_periodo(p[0])):
+            cubierto = min(max(restante, 0), bruto)
+            restante -= cubierto
+            necesidad.periodos.append(
+                RequerimientoPeriodo(fecha=fecha, bruto=bruto, neto=bruto - cubierto)
+            )
+            necesidad.bruto += bruto
+            necesidad.neto += bruto - cubierto
+        necesidades[insumo_id] = necesidad
+    return necesidades
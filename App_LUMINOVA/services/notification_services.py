@@ -0,0 +1,100 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, transaction
+from django.db.models import F
+
+from ..models import Insumo, ItemOrdenCompra, Orden, OrdenProduccion, Reportes
+from .estado_services import Estados, estados
+
+CACHE_KEY_NOTIFICACIONES = "luminova:notificaciones"
+
+ESTADOS_OC_EN_PROCESO = [
+    "APROBADA",
+    "ENVIADA_PROVEEDOR",
+    "EN_TRANSITO",
+    "RECIBIDA_PARCIAL",
+    "RECIBIDA_TOTAL",
+    "COMPLETADA",
+]
+
+
+def _consultas_contadores():
+    """QuerySets cuyo número de filas es cada contador de notificaciones."""
+    # Excluimos los insumos que ya están en alguna línea de una OC "en firme"
+    insumos_con_oc_en_firme = ItemOrdenCompra.objects.filter(
+        orden__tipo="compra", orden__estado__in=ESTADOS_OC_EN_PROCESO
+    ).values("insumo_id")
+
+    return {
+        "ops_con_problemas_count": Reportes.objects.filter(
+            resuelto=False, orden_produccion_asociada__isnull=False
+        )
+        .values("orden_produccion_asociada_id")
+        .distinct(),
+        "solicitudes_insumos_count": OrdenProduccion.objects.filter(
+            estado_op_id__in=estados.ids(Estados.INSUMOS_SOLICITADOS)
+        ).values("id"),
+        "ocs_para_aprobar_count": Orden.objects.filter(
+            tipo="compra", estado="BORRADOR"
+        ).values("id"),
+        "ocs_en_transito_count": Orden.objects.filter(
+            tipo="compra", estado="EN_TRANSITO"
+        ).values("id"),
+        "insumos_stock_bajo_count": Insumo.objects.filter(
+            stock__lt=F("punto_reorden")
+        )
+        .exclude(id__in=insumos_con_oc_en_firme)
+        .values("id"),
+    }
+
+
+def calcular_contadores_notificaciones():
+    """
+    Calcula todos los contadores en una sola consulta: cada QuerySet se compila
+    con el ORM y se envuelve en un SELECT COUNT(*) escalar.
+    """
+    consultas = _consultas_contadores()
+    partes = []
+    params = []
+    for alias, queryset in consultas.items():
+        try:
+            sql, sql_params = queryset.order_by().query.sql_with_params()
+        except EmptyResultSet:
+            # Filtro que no puede traer filas (ej: `__in` vacío si falta un estado).
+            partes.append("0")
+            continue
+        partes.append(f"(SELECT COUNT(*) FROM ({sql}) {alias})")
+        params.extend(sql_params)
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT " + ", ".join(partes), params)
+        fila = cursor.fetchone()
+
+    contadores = dict(zip(consultas.keys(), fila))
+    contadores["total_notificaciones"] = sum(contadores.values())
+    return contadores
+
+
+def obtener_contadores_notificaciones():
+    """
+    Devuelve los contadores desde la caché. Si no están, los calcula
+    y los guarda con NOTIFICACIONES_CACHE_TTL como respaldo ante cambios que no
+    disparan señales (ej: QuerySet.update()).
+    """
+    contadores = cache.get(CACHE_KEY_NOTIFICACIONES)
+    if contadores is None:
+        contadores = calcular_contadores_notificaciones()
+        cache.set(
+            CACHE_KEY_NOTIFICACIONES,
+            contadores,
+            getattr(settings, "NOTIFICACIONES_CACHE_TTL", 60),
+        )
+    return contadores
+
+
+def invalidar_contadores_notificaciones():
+    cache.delete(CACHE_KEY_NOTIFICACIONES)
+    # Se repite al confirmar la transacción para que una petición concurrente
+    # no deje en caché valores leídos antes del commit.
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY_NOTIFICACIONES))
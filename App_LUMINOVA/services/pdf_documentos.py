@@ -0,0 +1,193 @@
+"""
+Dibujo de los documentos PDF a partir de datos planos (dicts con strings y
+números), sin tocar el ORM. Así se pueden renderizar en otros procesos
+(ver `pdf_services.exportar_zip` y `pdf_services.exportar_pdf_unico`):
+este módulo no importa Django.
+"""
+
+import io
+from xml.sax.saxutils import escape
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, Table, TableStyle
+from reportlab.lib import colors
+
+ESTILO_TABLA = [
+    ("BACKGROUND", (0, 0), (-1, 0), colors.darkblue),
+    ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+    ("ALIGN", (1, 1), (1, -1), "LEFT"),
+    ("ALIGN", (0, 1), (0, -1), "RIGHT"),
+    ("ALIGN", (2, 1), (3, -1), "RIGHT"),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
+    ("GRID", (0, 0), (-1, -1), 1, colors.black),
+]
+
+_estilo_normal = None
+
+
+def _estilo():
+    # getSampleStyleSheet() arma todos los estilos; alcanza con hacerlo una vez por proceso.
+    global _estilo_normal
+    if _estilo_normal is None:
+        _estilo_normal = getSampleStyleSheet()["Normal"]
+    return _estilo_normal
+
+
+def _encabezado_empresa(p, height):
+    p.setFont("Helvetica", 10)
+    p.drawString(1 * inch, height - 1.5 * inch, "LUMINOVA S.A.")
+    p.drawString(1 * inch, height - 1.65 * inch, "Calle Falsa 123, Ciudad")
+    p.drawString(1 * inch, height - 1.80 * inch, "CUIT: 30-XXXXXXXX-X")
+
+
+def dibujar_factura(p, datos):
+    """Dibuja una factura en el canvas `p` (una página)."""
+    width, height = letter
+
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(1 * inch, height - 1 * inch, f"FACTURA N°: {datos['numero_factura']}")
+
+    # ... (Datos de la Empresa) ...
+    _encabezado_empresa(p, height)
+
+    p.setFont("Helvetica", 10)
+    p.drawString(
+        width - 3 * inch,
+        height - 1.5 * inch,
+        f"Fecha Emisión: {datos['fecha_emision']}",
+    )
+    p.drawString(width - 3 * inch, height - 1.65 * inch, f"OV N°: {datos['numero_ov']}")
+
+    # ... (Datos del Cliente) ...
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(1 * inch, height - 2.5 * inch, "Cliente:")
+    p.setFont("Helvetica", 10)
+    p.drawString(1 * inch, height - 2.7 * inch, datos["cliente"])
+    p.line(1 * inch, height - 3.5 * inch, width - 1 * inch, height - 3.5 * inch)
+
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(1 * inch, height - 3.8 * inch, "Detalle de Productos/Servicios:")
+
+    data = [["Cant.", "Descripción", "P. Unit.", "Subtotal"]]
+    for cantidad, descripcion, precio, subtotal in datos["items"]:
+        data.append([cantidad, Paragraph(escape(descripcion), _estilo()), precio, subtotal])
+
+    y_position = height - 4.2 * inch
+    if len(data) > 1:
+        table = Table(data, colWidths=[0.5 * inch, 4.5 * inch, 1 * inch, 1 * inch])
+        table.setStyle(TableStyle(ESTILO_TABLA))
+        table.wrapOn(p, width - 2 * inch, y_position)
+        table_height = table._height
+        table.drawOn(p, 1 * inch, y_position - table_height)
+        y_position -= table_height + 0.3 * inch
+
+    p.setFont("Helvetica-Bold", 12)
+    p.drawRightString(width - 1 * inch, y_position, f"TOTAL: {datos['total']}")
+
+    p.showPage()
+
+
+def dibujar_orden_produccion(p, datos):
+    """
+    Dibuja la orden de trabajo de una OP con su lista de retiro de insumos
+    (BOM × cantidad a producir). Si la lista no entra en una página sigue
+    en las siguientes, repitiendo el encabezado de la tabla.
+    """
+    width, height = letter
+
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(1 * inch, height - 1 * inch, f"ORDEN DE TRABAJO N°: {datos['numero_op']}")
+    _encabezado_empresa(p, height)
+
+    p.setFont("Helvetica", 10)
+    columna = width - 3.2 * inch
+    for i, (etiqueta, valor) in enumerate(
+        [
+            ("Estado", datos["estado"]),
+            ("Sector", datos["sector"]),
+            ("Inicio planificado", datos["fecha_inicio"]),
+            ("Fin planificado", datos["fecha_fin"]),
+            ("OV N°", datos["numero_ov"]),
+        ]
+    ):
+        p.drawString(columna, height - (1.5 + 0.15 * i) * inch, f"{etiqueta}: {valor}")
+
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(1 * inch, height - 2.5 * inch, "Producto:")
+    p.setFont("Helvetica", 10)
+    p.drawString(1 * inch, height - 2.7 * inch, f"{datos['producto']} × {datos['cantidad']} u.")
+    if datos["notas"]:
+        p.drawString(1 * inch, height - 2.9 * inch, f"Notas: {datos['notas'][:110]}")
+    p.line(1 * inch, height - 3.2 * inch, width - 1 * inch, height - 3.2 * inch)
+
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(1 * inch, height - 3.5 * inch, "Lista de retiro de insumos:")
+
+    data = [["Retirado", "Insumo", "Por unidad", "Requerido", "Stock"]]
+    for descripcion, por_unidad, requerido, stock in datos["componentes"]:
+        data.append(["[  ]", Paragraph(escape(descripcion), _estilo()), por_unidad, requerido, stock])
+    if len(data) == 1:
+        p.setFont("Helvetica-Oblique", 10)
+        p.drawString(1 * inch, height - 3.8 * inch, "El producto no tiene BOM definido.")
+        p.showPage()
+        return
+
+    table = Table(
+        data,
+        colWidths=[0.8 * inch, 3.6 * inch, 0.9 * inch, 0.9 * inch, 0.8 * inch],
+        repeatRows=1,
+    )
+    table.setStyle(TableStyle(ESTILO_TABLA + [("ALIGN", (2, 1), (4, -1), "RIGHT")]))
+    ancho = width - 2 * inch
+    tope = height - 3.7 * inch  # donde empieza la tabla en la página actual
+    pendiente = [table]
+    while pendiente:
+        parte = pendiente.pop()
+        disponible = tope - 0.75 * inch
+        _, alto = parte.wrapOn(p, ancho, disponible)
+        if alto > disponible:
+            trozos = parte.split(ancho, disponible)
+            if len(trozos) > 1:
+                parte = trozos[0]
+                pendiente.append(trozos[1])
+                _, alto = parte.wrapOn(p, ancho, disponible)
+        parte.drawOn(p, 1 * inch, tope - alto)
+        if pendiente:
+            p.showPage()
+            tope = height - 1 * inch
+
+    p.setFont("Helvetica", 9)
+    p.drawString(
+        1 * inch,
+        max(tope - alto - 0.4 * inch, 0.5 * inch),
+        "Entregó: ____________________    Recibió: ____________________",
+    )
+    p.showPage()
+
+
+DIBUJANTES = {
+    "factura": dibujar_factura,
+    "op": dibujar_orden_produccion,
+}
+
+
+def renderizar_documento(tipo, datos):
+    """PDF de un documento, como bytes. Es lo que corre cada proceso del pool."""
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter, invariant=1)
+    DIBUJANTES[tipo](p, datos)
+    p.save()
+    return buffer.getvalue()
+
+
+def renderizar_documentos_unidos(documentos, destino):
+    """Dibuja todos los (tipo, datos) en un único PDF escrito en `destino`."""
+    p = canvas.Canvas(destino, pagesize=letter, invariant=1)
+    for tipo, datos in documentos:
+        DIBUJANTES[tipo](p, datos)
+    p.save()
@@ -1,113 +1,348 @@
-from django.http import HttpResponse
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph, Table, TableStyle
-from reportlab.lib import colors
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import FileResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 
 # Importante: Usamos importación relativa porque estamos dentro de la misma app.
-from ..models import OrdenVenta, ItemOrdenVenta, OrdenProduccion
+from ..models import Factura, ItemOrdenVenta, OrdenProduccion
+from .mrp_services import ops_abiertas
+from .pdf_documentos import renderizar_documento, renderizar_documentos_unidos
+
+# Subir este número al cambiar el diseño de la factura: `regenerar_pdfs_facturas`
+# vuelve a renderizar las que quedaron con una versión anterior.
+VERSION_PLANTILLA_FACTURA = 1
 
 
-def generar_pdf_factura(factura):
+def datos_factura(factura):
     """
-    Genera un HttpResponse con el contenido de un PDF para una factura.
-    Esta función NO es una vista. Recibe un objeto 'Factura' y devuelve una respuesta HTTP.
+    Lo que necesita el PDF de una factura, como datos planos. Espera la OV
+    con `items_ov` (con su producto) y `ops_generadas` (con su estado)
+    prefetcheados; ver `prefetch_facturas`.
     """
     orden_venta = factura.orden_venta
 
-    # Crear la respuesta HTTP con el tipo de contenido PDF.
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = (
-        f'inline; filename="factura_{factura.numero_factura}.pdf"'
+    # Tu lógica para determinar qué ítems se facturan es correcta.
+    productos_completados_ids = {
+        op.producto_a_producir_id
+        for op in orden_venta.ops_generadas.all()
+        if op.estado_op and op.estado_op.nombre.lower() == "completada"
+    }
+    return {
+        "numero_factura": factura.numero_factura,
+        "fecha_emision": factura.fecha_emision.strftime("%d/%m/%Y"),
+        "numero_ov": orden_venta.numero_ov,
+        "cliente": orden_venta.cliente.nombre,
+        "items": [
+            (
+                str(item.cantidad),
+                item.producto_terminado.descripcion,
+                f"${item.precio_unitario_venta:.2f}",
+                f"${item.subtotal:.2f}",
+            )
+            for item in orden_venta.items_ov.all()
+            if item.producto_terminado_id in productos_completados_ids
+        ],
+        "total": f"${factura.total_facturado:.2f}",
+    }
+
+
+def prefetch_facturas(facturas):
+    prefetch_related_objects(
+        facturas,
+        Prefetch(
+            "orden_venta__items_ov",
+            queryset=ItemOrdenVenta.objects.select_related("producto_terminado"),
+        ),
+        Prefetch(
+            "orden_venta__ops_generadas",
+            queryset=OrdenProduccion.objects.select_related("estado_op"),
+        ),
     )
 
-    p = canvas.Canvas(response, pagesize=letter)
-    styles = getSampleStyleSheet()
-    style_normal = styles["Normal"]
 
-    # --- COMIENZO DEL DIBUJO DEL PDF ---
-    width, height = letter
+def renderizar_pdf_factura(factura):
+    """
+    Dibuja el PDF de una factura y devuelve sus bytes. Se renderiza en modo
+    invariante (sin fecha de creación ni ID aleatorio), así que los mismos
+    datos producen siempre el mismo archivo y el mismo hash.
+    """
+    prefetch_facturas([factura])
+    return renderizar_documento("factura", datos_factura(factura))
+
+
+def datos_orden_produccion(op):
+    """
+    Datos planos de la orden de trabajo de una OP: encabezado y lista de
+    retiro (BOM × cantidad a producir). Espera el producto con
+    `componentes_requeridos__insumo` prefetcheado; ver `ordenes_para_exportar`.
+    """
+
+    def _fecha(fecha):
+        return fecha.strftime("%d/%m/%Y") if fecha else "-"
+
+    return {
+        "numero_op": op.numero_op,
+        "estado": op.get_estado_op_display(),
+        "sector": op.sector_asignado_op.nombre if op.sector_asignado_op else "-",
+        "fecha_inicio": _fecha(op.fecha_inicio_planificada),
+        "fecha_fin": _fecha(op.fecha_fin_planificada),
+        "numero_ov": op.orden_venta_origen.numero_ov if op.orden_venta_origen else "-",
+        "producto": op.producto_a_producir.descripcion,
+        "cantidad": op.cantidad_a_producir,
+        "notas": op.notas or "",
+        "componentes": [
+            (
+                componente.insumo.descripcion,
+                str(componente.cantidad_necesaria),
+                str(componente.cantidad_necesaria * op.cantidad_a_producir),
+                str(componente.insumo.stock),
+            )
+            for componente in sorted(
+                op.producto_a_producir.componentes_requeridos.all(),
+                key=lambda c: c.insumo.descripcion,
+            )
+        ],
+    }
 
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(1 * inch, height - 1 * inch, f"FACTURA N°: {factura.numero_factura}")
 
-    # ... (Datos de la Empresa) ...
-    p.setFont("Helvetica", 10)
-    p.drawString(1 * inch, height - 1.5 * inch, "LUMINOVA S.A.")
-    p.drawString(1 * inch, height - 1.65 * inch, "Calle Falsa 123, Ciudad")
-    p.drawString(1 * inch, height - 1.80 * inch, "CUIT: 30-XXXXXXXX-X")
+def _almacenar_pdf_factura(factura, contenido):
+    sha256 = hashlib.sha256(contenido).hexdigest()
+    ruta_anterior = factura.ruta_pdf
 
-    p.setFont("Helvetica", 10)
-    p.drawString(
-        width - 3 * inch,
-        height - 1.5 * inch,
-        f"Fecha Emisión: {factura.fecha_emision.strftime('%d/%m/%Y')}",
+    factura.pdf_sha256 = sha256
+    if not default_storage.exists(factura.ruta_pdf):
+        default_storage.save(factura.ruta_pdf, ContentFile(contenido))
+    if ruta_anterior and ruta_anterior != factura.ruta_pdf:
+        default_storage.delete(ruta_anterior)
+
+    factura.pdf_version = VERSION_PLANTILLA_FACTURA
+    # Last-Modified solo avanza si el archivo cambió de verdad.
+    if ruta_anterior != factura.ruta_pdf or not factura.pdf_generado:
+        factura.pdf_generado = timezone.now()
+    Factura.objects.filter(pk=factura.pk).update(
+        pdf_sha256=factura.pdf_sha256,
+        pdf_version=factura.pdf_version,
+        pdf_generado=factura.pdf_generado,
     )
-    p.drawString(
-        width - 3 * inch, height - 1.65 * inch, f"OV N°: {orden_venta.numero_ov}"
+    return factura.ruta_pdf
+
+
+def guardar_pdf_factura(factura):
+    """
+    Renderiza el PDF de la factura y lo guarda en el storage bajo el SHA-256
+    de su contenido. Si el contenido no cambió no se reescribe nada; si
+    cambió (nueva versión de la plantilla) se borra el archivo anterior.
+    """
+    return _almacenar_pdf_factura(factura, renderizar_pdf_factura(factura))
+
+
+def pdf_factura_vigente(factura):
+    return factura.pdf_sha256 and factura.pdf_version == VERSION_PLANTILLA_FACTURA
+
+
+def respuesta_pdf_factura(request, factura):
+    """
+    Sirve el PDF guardado de la factura (lo genera si todavía no existe o es
+    de una plantilla vieja). Responde con ETag (el hash) y Last-Modified, así
+    que un navegador que ya lo tiene recibe un 304 sin leer el archivo.
+    """
+    if not pdf_factura_vigente(factura) or not default_storage.exists(factura.ruta_pdf):
+        guardar_pdf_factura(factura)
+
+    etag = f'"{factura.pdf_sha256}"'
+    ultima_modificacion = int(factura.pdf_generado.timestamp())
+    response = get_conditional_response(
+        request, etag=etag, last_modified=ultima_modificacion
     )
+    if response is None:
+        response = FileResponse(
+            default_storage.open(factura.ruta_pdf, "rb"),
+            content_type="application/pdf",
+            filename=f"factura_{factura.numero_factura}.pdf",
+        )
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(ultima_modificacion)
+    # Privado (datos del cliente) y siempre revalidado contra el ETag.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
-    # ... (Datos del Cliente) ...
-    p.setFont("Helvetica-Bold", 12)
-    p.drawString(1 * inch, height - 2.5 * inch, "Cliente:")
-    p.setFont("Helvetica", 10)
-    p.drawString(1 * inch, height - 2.7 * inch, orden_venta.cliente.nombre)
-    p.line(1 * inch, height - 3.5 * inch, width - 1 * inch, height - 3.5 * inch)
 
-    p.setFont("Helvetica-Bold", 12)
-    p.drawString(1 * inch, height - 3.8 * inch, "Detalle de Productos/Servicios:")
+# --- Exportación masiva ---
 
-    data = [["Cant.", "Descripción", "P. Unit.", "Subtotal"]]
+TIPOS_EXPORTACION = ("facturas", "ops")
+LOTE_EXPORTACION = 50
+# Por debajo de esta cantidad no vale la pena levantar procesos.
+MINIMO_DOCUMENTOS_POOL = 20
 
-    # Tu lógica para determinar qué ítems se facturan es correcta.
-    ops_asociadas_a_ov = orden_venta.ops_generadas.all()
-    productos_completados_ids = {
-        op.producto_a_producir_id
-        for op in ops_asociadas_a_ov
-        if op.estado_op and op.estado_op.nombre.lower() == "completada"
-    }
 
-    total_calculado_pdf = 0
-    for item in orden_venta.items_ov.all():
-        if item.producto_terminado_id in productos_completados_ids:
-            data.append(
-                [
-                    str(item.cantidad),
-                    Paragraph(item.producto_terminado.descripcion, style_normal),
-                    f"${item.precio_unitario_venta:.2f}",
-                    f"${item.subtotal:.2f}",
-                ]
-            )
-            total_calculado_pdf += item.subtotal
-
-    y_position = height - 4.2 * inch
-    if len(data) > 1:
-        table = Table(data, colWidths=[0.5 * inch, 4.5 * inch, 1 * inch, 1 * inch])
-        table.setStyle(
-            TableStyle(
-                [
-                    ("BACKGROUND", (0, 0), (-1, 0), colors.darkblue),
-                    ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-                    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                    ("ALIGN", (1, 1), (1, -1), "LEFT"),
-                    ("ALIGN", (0, 1), (0, -1), "RIGHT"),
-                    ("ALIGN", (2, 1), (3, -1), "RIGHT"),
-                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                    ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
-                    ("GRID", (0, 0), (-1, -1), 1, colors.black),
-                ]
-            )
+def facturas_para_exportar(desde=None, hasta=None):
+    """Facturas emitidas entre `desde` y `hasta` (fechas, inclusive)."""
+    facturas = Factura.objects.select_related("orden_venta__cliente")
+    if desde:
+        facturas = facturas.filter(fecha_emision__gte=_inicio_del_dia(desde))
+    if hasta:
+        facturas = facturas.filter(fecha_emision__lt=_inicio_del_dia(hasta, dias=1))
+    return facturas
+
+
+def ordenes_para_exportar(desde=None, hasta=None):
+    """OPs abiertas (ver `mrp_services.ops_abiertas`) por inicio planificado."""
+    ops = ops_abiertas().select_related(
+        "producto_a_producir", "estado_op", "sector_asignado_op", "orden_venta_origen"
+    )
+    if desde:
+        ops = ops.filter(fecha_inicio_planificada__gte=desde)
+    if hasta:
+        ops = ops.filter(fecha_inicio_planificada__lte=hasta)
+    return ops
+
+
+def _inicio_del_dia(fecha, dias=0):
+    return timezone.make_aware(datetime.combine(fecha + timedelta(days=dias), time.min))
+
+
+def _en_lotes(queryset, tamano):
+    """Recorre el QuerySet por id en lotes, sin OFFSET ni cargarlo entero."""
+    ultimo_id = 0
+    while True:
+        lote = list(queryset.filter(id__gt=ultimo_id).order_by("id")[:tamano])
+        if not lote:
+            return
+        yield lote
+        ultimo_id = lote[-1].id
+
+
+def _lotes_de_documentos(tipo, queryset):
+    """
+    Por cada lote, una lista de (nombre_archivo, objeto, datos) con los datos
+    planos del PDF. Dos o tres consultas por lote, sin importar su tamaño.
+    """
+    for lote in _en_lotes(queryset, LOTE_EXPORTACION):
+        if tipo == "facturas":
+            prefetch_facturas(lote)
+            yield [(f"factura_{f.numero_factura}.pdf", f, datos_factura(f)) for f in lote]
+        else:
+            prefetch_related_objects(lote, "producto_a_producir__componentes_requeridos__insumo")
+            yield [(f"op_{op.numero_op}.pdf", op, datos_orden_produccion(op)) for op in lote]
+
+
+def _pool(cantidad, procesos):
+    """
+    Pool de procesos para renderizar, o None si conviene hacerlo acá. Usa
+    'spawn': los workers solo importan `pdf_documentos` (sin Django), y no se
+    hereda por fork el estado del proceso web (conexiones, hilos).
+    """
+    if procesos is None:
+        procesos = min(4, os.cpu_count() or 1)
+    if procesos < 2 or cantidad < MINIMO_DOCUMENTOS_POOL:
+        return None
+    return ProcessPoolExecutor(
+        max_workers=procesos, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def _pdfs_del_lote(tipo, documentos, pool):
+    """
+    Bytes de cada PDF del lote. Las facturas con su PDF ya guardado se leen
+    del storage; el resto se renderiza (en el pool si hay) y, si son
+    facturas, se guardan para la próxima vez.
+    """
+    pdfs = [None] * len(documentos)
+    a_renderizar = []
+    for i, (_, objeto, _) in enumerate(documentos):
+        if (
+            tipo == "facturas"
+            and pdf_factura_vigente(objeto)
+            and default_storage.exists(objeto.ruta_pdf)
+        ):
+            with default_storage.open(objeto.ruta_pdf, "rb") as archivo:
+                pdfs[i] = archivo.read()
+        else:
+            a_renderizar.append(i)
+
+    tipo_documento = "factura" if tipo == "facturas" else "op"
+    datos = [documentos[i][2] for i in a_renderizar]
+    if pool is not None:
+        renderizados = pool.map(
+            renderizar_documento, [tipo_documento] * len(datos), datos, chunksize=4
         )
-        table.wrapOn(p, width - 2 * inch, y_position)
-        table_height = table._height
-        table.drawOn(p, 1 * inch, y_position - table_height)
-        y_position -= table_height + 0.3 * inch
+    else:
+        renderizados = map(renderizar_documento, [tipo_documento] * len(datos), datos)
+    for i, contenido in zip(a_renderizar, renderizados):
+        pdfs[i] = contenido
+        if tipo == "facturas":
+            _almacenar_pdf_factura(documentos[i][1], contenido)
+    return pdfs
+
+
+class _SalidaStreaming:
+    """Destino de escritura que retiene lo escrito hasta que se lo entrega."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
 
-    p.setFont("Helvetica-Bold", 12)
-    p.drawRightString(width - 1 * inch, y_position, f"TOTAL: ${factura.total_facturado:.2f}")
+    def flush(self):
+        pass
 
-    p.showPage()
-    p.save()
-    return response
\ No newline at end of file
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def exportar_zip(tipo, queryset, procesos=None):
+    """
+    Genera, por partes, un ZIP con un PDF por documento. Se arma lote a lote
+    sobre un destino no posicionable, así que en memoria solo está el lote
+    en curso: sirve tanto para un StreamingHttpResponse como para escribir
+    un archivo.
+    """
+    salida = _SalidaStreaming()
+    pool = _pool(queryset.count(), procesos)
+    try:
+        with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_DEFLATED) as archivo_zip:
+            for documentos in _lotes_de_documentos(tipo, queryset):
+                for (nombre, _, _), contenido in zip(
+                    documentos, _pdfs_del_lote(tipo, documentos, pool)
+                ):
+                    archivo_zip.writestr(nombre, contenido)
+                yield salida.vaciar()
+        yield salida.vaciar()  # directorio central del ZIP
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def exportar_pdf_unico(tipo, queryset):
+    """
+    Todos los documentos en un solo PDF. ReportLab arma el documento
+    completo antes de escribirlo, así que acá no hay pool; el resultado va a
+    un temporal que pasa a disco por encima de 10 MB y se devuelve al inicio.
+    """
+    destino = tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+    tipo_documento = "factura" if tipo == "facturas" else "op"
+    renderizar_documentos_unidos(
+        (
+            (tipo_documento, datos)
+            for documentos in _lotes_de_documentos(tipo, queryset)
+            for _, _, datos in documentos
+        ),
+        destino,
+    )
+    destino.seek(0)
+    return destino
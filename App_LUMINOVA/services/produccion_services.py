@@ -0,0 +1,362 @@
+import logging
+import threading
+from dataclasses import dataclass, field
+
+from django.db.models import Case, Count, F, IntegerField, Q, QuerySet, Value, When
+from django.utils import timezone
+
+from ..models import (
+    EstadoOrden,
+    HistorialOV,
+    LoteProductoTerminado,
+    MovimientoStock,
+    OrdenProduccion,
+    OrdenVenta,
+    ProductoTerminado,
+)
+from ..utils import atomic_inmediato, bloquear_en_orden
+from .dashboard_services import (
+    SECCION_ACCIONES,
+    SECCION_ACTIVIDAD,
+    SECCION_RENDIMIENTO,
+    marcar_dashboard_desactualizado,
+)
+from .estado_services import Estados, estados
+from .notification_services import invalidar_contadores_notificaciones
+from .stock_services import registrar_movimientos
+
+logger = logging.getLogger(__name__)
+
+
+# Estados a los que puede pasar una OP desde cada estado (además de quedarse
+# donde está). Los estados que no figuran acá no admiten cambios manuales:
+# 'Pendiente' y 'Planificada' avanzan solicitando insumos, y las finalizadas
+# ya no se mueven. Los nombres que no existan en EstadoOrden se ignoran.
+TRANSICIONES_OP = {
+    Estados.INSUMOS_SOLICITADOS: (Estados.PAUSADA, Estados.CANCELADA),
+    Estados.INSUMOS_RECIBIDOS: (
+        Estados.PRODUCCION_INICIADA,
+        Estados.PAUSADA,
+        Estados.CANCELADA,
+    ),
+    Estados.PRODUCCION_INICIADA: (
+        Estados.EN_PROCESO,
+        Estados.PAUSADA,
+        Estados.COMPLETADA,
+        Estados.CANCELADA,
+    ),
+    Estados.EN_PROCESO: (Estados.PAUSADA, Estados.COMPLETADA, Estados.CANCELADA),
+    Estados.PAUSADA: (
+        Estados.CANCELADA,
+        # Estados a los que se puede reanudar.
+        Estados.INSUMOS_RECIBIDOS,
+        Estados.PRODUCCION_INICIADA,
+        Estados.PENDIENTE,
+    ),
+}
+
+
+class TransicionOPInvalida(ValueError):
+    """La OP no puede pasar de su estado actual al pedido."""
+
+
+@dataclass
+class ResultadoCambioEstadoOP:
+    actualizadas: list = field(default_factory=list)
+    # Lista de (op, motivo)
+    rechazadas: list = field(default_factory=list)
+    lotes_creados: list = field(default_factory=list)
+    ovs_listas_para_entrega: list = field(default_factory=list)
+
+
+class MaquinaEstadosOP:
+    """
+    Motor de estados de las OPs a partir de una tabla declarativa de
+    transiciones.
+
+    La tabla se compila a un mapa id de estado -> ids permitidos usando el
+    registro en memoria de `estados`, así que consultar qué transiciones
+    admite una OP no toca la base. El mapa se recompila solo cuando el
+    registro se recarga (alta, baja o cambio de nombre de un EstadoOrden).
+
+    Los efectos de entrar a un estado (stock, lotes, historial, OV) se
+    registran con `al_entrar` y reciben todas las OPs cambiadas de una vez.
+    """
+
+    def __init__(self, transiciones):
+        self.transiciones = {
+            origen.lower(): tuple(destinos) for origen, destinos in transiciones.items()
+        }
+        self._lock = threading.Lock()
+        self._mapa = None
+        self._generacion = None
+        self._efectos = []  # Lista de (nombres de estado o None, función)
+
+    def _compilar(self):
+        mapa = {}
+        for estado in estados.todos():
+            destinos = self.transiciones.get(estado.nombre.strip().lower(), ())
+            mapa[estado.id] = frozenset([estado.id, *estados.ids(*destinos)])
+        return mapa
+
+    def mapa(self):
+        """Mapa compilado {id de estado: frozenset de ids permitidos}."""
+        generacion = estados.generacion()
+        if self._mapa is None or self._generacion != generacion:
+            with self._lock:
+                if self._mapa is None or self._generacion != generacion:
+                    self._mapa = self._compilar()
+                    self._generacion = estados.generacion()
+        return self._mapa
+
+    def ids_permitidos(self, estado_id):
+        """Ids a los que se puede pasar desde `estado_id`. Sin estado, cualquiera."""
+        if estado_id is None:
+            return frozenset(self.mapa())
+        return self.mapa().get(estado_id, frozenset([estado_id]))
+
+    def permite(self, estado_actual_id, nuevo_estado_id):
+        return nuevo_estado_id in self.ids_permitidos(estado_actual_id)
+
+    def estados_permitidos(self, op):
+        """EstadoOrden a los que puede pasar la OP, ordenados por nombre."""
+        permitidos = self.ids_permitidos(op.estado_op_id)
+        return [e for e in estados.todos() if e.id in permitidos]
+
+    def al_entrar(self, *nombres):
+        """
+        Decorador que registra un efecto para cuando las OPs entran a alguno
+        de los estados indicados (o a cualquiera, si no se indica ninguno).
+        La función recibe (cambios, usuario, resultado), donde `cambios` es
+        una lista de (op, id del estado anterior).
+        """
+
+        def registrar(funcion):
+            self._efectos.append(
+                (frozenset(n.lower() for n in nombres) or None, funcion)
+            )
+            return funcion
+
+        return registrar
+
+    def efectos_para(self, estado):
+        nombre = estado.nombre.strip().lower()
+        return [f for nombres, f in self._efectos if nombres is None or nombre in nombres]
+
+
+maquina_estados_op = MaquinaEstadosOP(TRANSICIONES_OP)
+
+
+def _resolver_estado(estado):
+    if isinstance(estado, EstadoOrden):
+        return estado
+    if isinstance(estado, int):
+        instancia = estados.por_id(estado)
+        if instancia is None:
+            raise EstadoOrden.DoesNotExist(f"Estado de OP con id {estado} no existe.")
+        return instancia
+    return estados.obtener(estado)
+
+
+def _nombre_estado(estado_id):
+    estado = estados.por_id(estado_id) if estado_id else None
+    return estado.nombre if estado else "N/A"
+
+
+@maquina_estados_op.al_entrar()
+def _registrar_cambio_en_historial(cambios, usuario, resultado):
+    HistorialOV.objects.bulk_create(
+        HistorialOV(
+            orden_venta_id=op.orden_venta_origen_id,
+            descripcion=(
+                f"La OP {op.numero_op} ('{op.producto_a_producir.descripcion}') cambió su estado "
+                f"de '{_nombre_estado(estado_anterior_id)}' a '{op.estado_op.nombre}'."
+            ),
+            tipo_evento="Cambio Estado OP",
+            realizado_por=usuario,
+        )
+        for op, estado_anterior_id in cambios
+        if op.orden_venta_origen_id
+    )
+
+
+@maquina_estados_op.al_entrar(Estados.COMPLETADA)
+def _ingresar_producto_terminado(cambios, usuario, resultado):
+    """Suma lo producido al stock de cada producto, genera su lote y lo registra en el kardex."""
+    ops = [op for op, _ in cambios if op.cantidad_a_producir > 0]
+    if not ops:
+        return
+
+    cantidades = {}
+    for op in ops:
+        cantidades[op.producto_a_producir_id] = (
+            cantidades.get(op.producto_a_producir_id, 0) + op.cantidad_a_producir
+        )
+    # Un solo UPDATE para todos los productos, sumando sobre el valor actual.
+    productos = ProductoTerminado.objects.filter(id__in=cantidades)
+    bloquear_en_orden(productos)
+    productos.update(
+        stock=F("stock")
+        + Case(
+            *[When(id=pk, then=Value(c)) for pk, c in cantidades.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    )
+
+    lotes = LoteProductoTerminado.objects.bulk_create(
+        LoteProductoTerminado(
+            producto_id=op.producto_a_producir_id,
+            op_asociada=op,
+            cantidad=op.cantidad_a_producir,
+        )
+        for op in ops
+    )
+    registrar_movimientos(
+        MovimientoStock(
+            producto_terminado_id=op.producto_a_producir_id,
+            cantidad=op.cantidad_a_producir,
+            tipo="PRODUCCION",
+            referencia=op.numero_op,
+            usuario=usuario,
+        )
+        for op in ops
+    )
+    resultado.lotes_creados.extend(lotes)
+    for op in ops:
+        logger.info(
+            f"Stock de '{op.producto_a_producir.descripcion}' incrementado en {op.cantidad_a_producir}."
+        )
+
+
+@maquina_estados_op.al_entrar(*Estados.FINALIZADOS)
+def _marcar_ovs_listas_para_entrega(cambios, usuario, resultado):
+    """Pasa a 'Lista para Entrega' las OVs cuyas OPs están todas finalizadas."""
+    ovs_ids = {op.orden_venta_origen_id for op, _ in cambios if op.orden_venta_origen_id}
+    if not ovs_ids:
+        return
+
+    ids_finalizados = estados.ids(*Estados.FINALIZADOS)
+    ovs_completas = [
+        fila["orden_venta_origen_id"]
+        for fila in OrdenProduccion.objects.filter(orden_venta_origen_id__in=ovs_ids)
+        .values("orden_venta_origen_id")
+        .annotate(
+            total=Count("id"),
+            finalizadas=Count("id", filter=Q(estado_op_id__in=ids_finalizados)),
+        )
+        if fila["total"] == fila["finalizadas"]
+    ]
+    if not ovs_completas:
+        return
+
+    ordenes = list(
+        OrdenVenta.objects.filter(id__in=ovs_completas).exclude(estado="LISTA_ENTREGA")
+    )
+    if not ordenes:
+        return
+
+    historial = [
+        HistorialOV(
+            orden_venta=orden,
+            descripcion=(
+                f"Estado de la OV cambió de '{orden.get_estado_display()}' a 'Lista para Entrega'."
+            ),
+            tipo_evento="Cambio Estado OV",
+            realizado_por=usuario,
+        )
+        for orden in ordenes
+    ]
+    OrdenVenta.objects.filter(id__in=[o.id for o in ordenes]).update(
+        estado="LISTA_ENTREGA"
+    )
+    HistorialOV.objects.bulk_create(historial)
+    for orden in ordenes:
+        orden.estado = "LISTA_ENTREGA"
+        logger.info(
+            f"OV {orden.numero_ov} actualizada a 'LISTA_ENTREGA' porque todas sus OPs han finalizado."
+        )
+    resultado.ovs_listas_para_entrega.extend(ordenes)
+
+
+def cambiar_estado_ops(ops, nuevo_estado, usuario=None):
+    """
+    Pasa varias OPs a `nuevo_estado` respetando TRANSICIONES_OP y aplica los
+    efectos registrados en `maquina_estados_op` con una cantidad fija de
+    sentencias, sin importar cuántas OPs sean.
+
+    Las OPs que ya están en ese estado se dejan como están; las que no pueden
+    hacer la transición quedan en `rechazadas` y no se tocan.
+
+    Args:
+        ops: Lista o QuerySet de OrdenProduccion. Si es una lista, conviene
+            traerla con select_related('producto_a_producir').
+        nuevo_estado: EstadoOrden, su id o su nombre.
+        usuario: Usuario que figura en el historial.
+
+    Returns:
+        ResultadoCambioEstadoOP.
+
+    Raises:
+        EstadoOrden.DoesNotExist: Si el estado pedido no existe.
+    """
+    nuevo_estado = _resolver_estado(nuevo_estado)
+    if isinstance(ops, QuerySet):
+        ops = ops.select_related("producto_a_producir")
+
+    resultado = ResultadoCambioEstadoOP()
+    cambios = []
+    for op in ops:
+        if op.estado_op_id == nuevo_estado.id:
+            continue
+        if not maquina_estados_op.permite(op.estado_op_id, nuevo_estado.id):
+            resultado.rechazadas.append(
+                (
+                    op,
+                    f"La OP {op.numero_op} no puede pasar de "
+                    f"'{_nombre_estado(op.estado_op_id)}' a '{nuevo_estado.nombre}'.",
+                )
+            )
+            continue
+        cambios.append((op, op.estado_op_id))
+    if not cambios:
+        return resultado
+
+    ahora = timezone.now()
+    completando = nuevo_estado.id in estados.ids(Estados.COMPLETADA)
+    with atomic_inmediato():
+        ids = [op.id for op, _ in cambios]
+        OrdenProduccion.objects.filter(id__in=ids).update(estado_op=nuevo_estado)
+        if completando:
+            OrdenProduccion.objects.filter(
+                id__in=ids, fecha_fin_real__isnull=True
+            ).update(fecha_fin_real=ahora)
+        for op, _ in cambios:
+            op.estado_op = nuevo_estado
+            if completando and not op.fecha_fin_real:
+                op.fecha_fin_real = ahora
+
+        for efecto in maquina_estados_op.efectos_para(nuevo_estado):
+            efecto(cambios, usuario, resultado)
+
+        # QuerySet.update() no dispara las señales de OrdenProduccion.
+        invalidar_contadores_notificaciones()
+        marcar_dashboard_desactualizado(
+            SECCION_ACCIONES, SECCION_RENDIMIENTO, SECCION_ACTIVIDAD
+        )
+
+    resultado.actualizadas = [op for op, _ in cambios]
+    return resultado
+
+
+def cambiar_estado_op(op, nuevo_estado, usuario=None):
+    """
+    Pasa una OP a `nuevo_estado`. Ver `cambiar_estado_ops`.
+
+    Raises:
+        TransicionOPInvalida: Si la transición no está permitida.
+    """
+    resultado = cambiar_estado_ops([op], nuevo_estado, usuario=usuario)
+    if resultado.rechazadas:
+        raise TransicionOPInvalida(resultado.rechazadas[0][1])
+    return resultado
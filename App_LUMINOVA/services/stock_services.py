@@ -0,0 +1,340 @@
+from dataclasses import dataclass
+
+from django.db.models import Case, F, IntegerField, Max, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models import (
+    ComponenteProducto,
+    CorteStock,
+    Insumo,
+    MovimientoStock,
+    OrdenProduccion,
+    ProductoTerminado,
+    SaldoStock,
+)
+from ..utils import atomic_inmediato, bloquear_en_orden
+from .dashboard_services import (
+    SECCION_ACCIONES,
+    SECCION_ACTIVIDAD,
+    SECCION_RENDIMIENTO,
+    SECCION_STOCK,
+    marcar_dashboard_desactualizado,
+)
+from .estado_services import Estados, estados
+from .notification_services import invalidar_contadores_notificaciones
+
+
+@dataclass
+class Faltante:
+    insumo_id: int
+    descripcion: str
+    requerido: int
+    disponible: int
+
+    def __str__(self):
+        return (
+            f"Stock insuficiente para '{self.descripcion}'. "
+            f"Requeridos: {self.requerido}, Disponible: {self.disponible}"
+        )
+
+
+class StockInsuficienteError(Exception):
+    """Uno o más insumos no alcanzan; `faltantes` los lista a todos."""
+
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        super().__init__("; ".join(str(f) for f in faltantes))
+
+
+class _ReservaIncompleta(Exception):
+    pass
+
+
+@dataclass
+class DiferenciaStock:
+    articulo: object  # Insumo o ProductoTerminado
+    stock: int
+    saldo_kardex: int
+
+    @property
+    def diferencia(self):
+        return self.stock - self.saldo_kardex
+
+
+# --- Kardex ---
+
+
+def registrar_movimientos(movimientos):
+    """Inserta los movimientos de stock en bloque, salteando los de cantidad cero."""
+    movimientos = [m for m in movimientos if m.cantidad]
+    if movimientos:
+        MovimientoStock.objects.bulk_create(movimientos)
+    return movimientos
+
+
+def registrar_ajuste_stock(articulo, stock_anterior, usuario=None, referencia=""):
+    """
+    Registra en el kardex la edición manual del stock de un Insumo o
+    ProductoTerminado ya guardado. `stock_anterior` es None en un alta.
+    """
+    cantidad = articulo.stock - (stock_anterior or 0)
+    campo = "insumo" if isinstance(articulo, Insumo) else "producto_terminado"
+    return registrar_movimientos(
+        [
+            MovimientoStock(
+                **{campo: articulo},
+                cantidad=cantidad,
+                tipo="SALDO_INICIAL" if stock_anterior is None else "AJUSTE",
+                referencia=referencia,
+                usuario=usuario,
+            )
+        ]
+    )
+
+
+def _clave(insumo_id, producto_terminado_id):
+    return ("insumo", insumo_id) if insumo_id else ("producto", producto_terminado_id)
+
+
+def _ultimo_corte(hasta=None):
+    cortes = CorteStock.objects.order_by("-fecha", "-id")
+    if hasta is not None:
+        cortes = cortes.filter(fecha__lte=hasta)
+    return cortes.first()
+
+
+def saldos_kardex(hasta=None, hasta_movimiento_id=None):
+    """
+    Saldo de cada artículo según el kardex: el saldo del último corte más los
+    movimientos posteriores a él (nunca se recorre el historial completo).
+
+    Returns:
+        Dict {("insumo" | "producto", id): saldo}.
+    """
+    corte = _ultimo_corte(hasta)
+    saldos = {}
+    desde_id = 0
+    if corte:
+        desde_id = corte.ultimo_movimiento_id
+        for insumo_id, producto_id, stock in corte.saldos.values_list(
+            "insumo_id", "producto_terminado_id", "stock"
+        ):
+            saldos[_clave(insumo_id, producto_id)] = stock
+
+    movimientos = MovimientoStock.objects.filter(id__gt=desde_id)
+    if hasta is not None:
+        movimientos = movimientos.filter(fecha__lte=hasta)
+    if hasta_movimiento_id is not None:
+        movimientos = movimientos.filter(id__lte=hasta_movimiento_id)
+    for insumo_id, producto_id, total in (
+        movimientos.order_by()
+        .values("insumo_id", "producto_terminado_id")
+        .annotate(total=Sum("cantidad"))
+        .values_list("insumo_id", "producto_terminado_id", "total")
+    ):
+        clave = _clave(insumo_id, producto_id)
+        saldos[clave] = saldos.get(clave, 0) + total
+    return saldos
+
+
+def stock_en_fecha(articulo, fecha):
+    """Stock de un Insumo o ProductoTerminado en una fecha dada, según el kardex."""
+    campo = "insumo" if isinstance(articulo, Insumo) else "producto_terminado"
+    corte = _ultimo_corte(fecha)
+    saldo = 0
+    movimientos = MovimientoStock.objects.filter(**{campo: articulo}, fecha__lte=fecha)
+    if corte:
+        saldo = (
+            corte.saldos.filter(**{campo: articulo})
+            .values_list("stock", flat=True)
+            .first()
+            or 0
+        )
+        movimientos = movimientos.filter(id__gt=corte.ultimo_movimiento_id)
+    return saldo + (movimientos.aggregate(total=Sum("cantidad"))["total"] or 0)
+
+
+def cerrar_saldos_stock():
+    """
+    Genera un corte con el saldo de cada artículo a partir del corte anterior
+    y los movimientos nuevos. Pensado para correr periódicamente.
+    """
+    with atomic_inmediato():
+        ultimo_id = MovimientoStock.objects.aggregate(ultimo=Max("id"))["ultimo"] or 0
+        saldos = saldos_kardex(hasta_movimiento_id=ultimo_id)
+        corte = CorteStock.objects.create(ultimo_movimiento_id=ultimo_id)
+        SaldoStock.objects.bulk_create(
+            (
+                SaldoStock(
+                    corte=corte,
+                    insumo_id=pk if tipo == "insumo" else None,
+                    producto_terminado_id=pk if tipo == "producto" else None,
+                    stock=saldo,
+                )
+                for (tipo, pk), saldo in saldos.items()
+                if saldo
+            ),
+            batch_size=500,
+        )
+    return corte
+
+
+def conciliar_stock():
+    """Artículos cuyo stock actual no coincide con el saldo del kardex."""
+    saldos = saldos_kardex()
+    diferencias = []
+    for tipo, model in (("insumo", Insumo), ("producto", ProductoTerminado)):
+        for articulo in model.objects.only("id", "descripcion", "stock").order_by("id"):
+            saldo = saldos.get((tipo, articulo.id), 0)
+            if articulo.stock != saldo:
+                diferencias.append(DiferenciaStock(articulo, articulo.stock, saldo))
+    return diferencias
+
+
+def ajustar_diferencias(diferencias, usuario=None):
+    """Agrega los movimientos de ajuste que igualan el kardex al stock actual."""
+    return registrar_movimientos(
+        MovimientoStock(
+            **{
+                "insumo" if isinstance(d.articulo, Insumo) else "producto_terminado": d.articulo
+            },
+            cantidad=d.diferencia,
+            tipo="AJUSTE",
+            referencia="Conciliación",
+            usuario=usuario,
+        )
+        for d in diferencias
+    )
+
+
+# --- Descuento de insumos ---
+
+
+def _faltantes(requeridos):
+    encontrados = {
+        insumo_id: (descripcion, stock)
+        for insumo_id, descripcion, stock in Insumo.objects.filter(
+            id__in=requeridos
+        ).values_list("id", "descripcion", "stock")
+    }
+    faltantes = []
+    for insumo_id, cantidad in sorted(requeridos.items()):
+        descripcion, stock = encontrados.get(insumo_id, (f"Insumo #{insumo_id}", 0))
+        if stock < cantidad:
+            faltantes.append(Faltante(insumo_id, descripcion, cantidad, stock))
+    return faltantes
+
+
+def descontar_insumos(requeridos, tipo="ENVIO_OP", referencia="", usuario=None):
+    """
+    Descuenta del stock todas las cantidades de `requeridos` ({insumo_id:
+    cantidad}) o ninguna, y deja los movimientos en el kardex.
+
+    El chequeo y el descuento van en un único UPDATE condicional: cada fila
+    solo se toca si su stock alcanza en ese momento, así que dos depósitos
+    que despachan a la vez contra los mismos insumos nunca los dejan en
+    negativo. Si alguna fila no se actualizó se revierte el UPDATE completo.
+    En PostgreSQL las filas se bloquean antes en orden de id, para que dos
+    despachos con insumos en común no terminen en un deadlock.
+
+    Raises:
+        StockInsuficienteError: Con todos los insumos que no alcanzan.
+    """
+    requeridos = {i: c for i, c in requeridos.items() if c > 0}
+    if not requeridos:
+        return
+
+    condicion = Q()
+    for insumo_id, cantidad in requeridos.items():
+        condicion |= Q(id=insumo_id, stock__gte=cantidad)
+    try:
+        with atomic_inmediato():
+            bloquear_en_orden(Insumo.objects.filter(id__in=requeridos))
+            actualizados = Insumo.objects.filter(condicion).update(
+                stock=F("stock")
+                - Case(
+                    *[When(id=i, then=Value(c)) for i, c in requeridos.items()],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+            )
+            if actualizados != len(requeridos):
+                raise _ReservaIncompleta
+            registrar_movimientos(
+                MovimientoStock(
+                    insumo_id=insumo_id,
+                    cantidad=-cantidad,
+                    tipo=tipo,
+                    referencia=referencia,
+                    usuario=usuario,
+                )
+                for insumo_id, cantidad in requeridos.items()
+            )
+    except _ReservaIncompleta:
+        raise StockInsuficienteError(_faltantes(requeridos))
+
+    # QuerySet.update() no dispara señales.
+    invalidar_contadores_notificaciones()
+    marcar_dashboard_desactualizado(SECCION_STOCK)
+
+
+def insumos_requeridos_op(op):
+    """{insumo_id: cantidad total} según el BOM del producto de la OP."""
+    requeridos = {}
+    for insumo_id, cantidad in ComponenteProducto.objects.filter(
+        producto_terminado_id=op.producto_a_producir_id
+    ).values_list("insumo_id", "cantidad_necesaria"):
+        requeridos[insumo_id] = (
+            requeridos.get(insumo_id, 0) + cantidad * op.cantidad_a_producir
+        )
+    return requeridos
+
+
+def enviar_insumos_op(op, usuario=None):
+    """
+    Despacha los insumos de una OP en 'Insumos Solicitados': descuenta todo su
+    BOM y la pasa a 'Insumos Recibidos', en la misma transacción.
+
+    La OP se toma con un UPDATE condicionado a su estado, de modo que si dos
+    personas la despachan a la vez solo una descuenta el stock.
+
+    Returns:
+        Dict {insumo_id: cantidad} con lo descontado.
+
+    Raises:
+        ValueError: Si el producto no tiene BOM o la OP ya no está en
+            'Insumos Solicitados'.
+        StockInsuficienteError: Si algún insumo no alcanza (no se descuenta nada).
+        EstadoOrden.DoesNotExist: Si falta alguno de los dos estados.
+    """
+    estado_solicitado = estados.obtener(Estados.INSUMOS_SOLICITADOS)
+    estado_recibido = estados.obtener(Estados.INSUMOS_RECIBIDOS)
+
+    requeridos = insumos_requeridos_op(op)
+    if not requeridos:
+        raise ValueError(
+            f"No se puede procesar: No hay BOM definido para el producto '{op.producto_a_producir.descripcion}'."
+        )
+
+    ahora = timezone.now()
+    with atomic_inmediato():
+        tomada = OrdenProduccion.objects.filter(
+            id=op.id, estado_op=estado_solicitado
+        ).update(
+            estado_op=estado_recibido,
+            fecha_inicio_real=Coalesce(F("fecha_inicio_real"), Value(ahora)),
+        )
+        if not tomada:
+            raise ValueError(
+                f"La OP {op.numero_op} ya no está en estado '{estado_solicitado.nombre}'."
+            )
+        descontar_insumos(requeridos, referencia=op.numero_op, usuario=usuario)
+
+    op.estado_op = estado_recibido
+    if not op.fecha_inicio_real:
+        op.fecha_inicio_real = ahora
+    marcar_dashboard_desactualizado(
+        SECCION_ACCIONES, SECCION_RENDIMIENTO, SECCION_ACTIVIDAD
+    )
+    return requeridos
@@ -0,0 +1,164 @@
+from decimal import Decimal
+
+from ..models import (
+    HistorialOV,
+    ItemOrdenVenta,
+    OrdenProduccion,
+    OrdenVenta,
+    ProductoTerminado,
+)
+from ..utils import atomic_inmediato
+from .dashboard_services import SECCION_ACTIVIDAD, marcar_dashboard_desactualizado
+from .document_services import reservar_numeros_documento
+from .estado_services import Estados, estados
+
+
+def descripcion_creacion_ov(orden_venta):
+    return f"Orden de Venta creada en estado '{orden_venta.get_estado_display()}'."
+
+
+def descripcion_creacion_op(orden_produccion):
+    return (
+        f"Se generó la Orden de Producción {orden_produccion.numero_op} "
+        f"para el producto '{orden_produccion.producto_a_producir.descripcion}'."
+    )
+
+
+def _resolver_productos(pedidos):
+    """Trae en una sola consulta todos los productos referenciados por id."""
+    ids = {
+        linea["producto"]
+        for pedido in pedidos
+        for linea in pedido["lineas"]
+        if not isinstance(linea["producto"], ProductoTerminado)
+    }
+    productos = ProductoTerminado.objects.in_bulk(ids) if ids else {}
+    faltantes = ids - productos.keys()
+    if faltantes:
+        raise ValueError(
+            f"Productos inexistentes: {', '.join(str(i) for i in sorted(faltantes))}."
+        )
+    return productos
+
+
+def crear_ordenes_venta(pedidos, usuario=None):
+    """
+    Crea varias OVs con sus ítems, sus OPs y los eventos de HistorialOV usando
+    una cantidad fija de sentencias (un bulk_create por tabla y una reserva de
+    números por prefijo), sin importar cuántas líneas tenga cada orden.
+
+    Como bulk_create no dispara post_save, los eventos que generan las señales
+    `registrar_creacion_ov` y `registrar_creacion_op` se insertan acá mismo.
+
+    Args:
+        pedidos: Lista de dicts con 'cliente' (instancia o id), 'lineas' y
+            opcionalmente 'notas' y 'estado'. Cada línea es un dict con
+            'producto' (instancia o id), 'cantidad' y opcionalmente
+            'precio_unitario_venta' (por defecto, el precio del producto).
+        usuario: Usuario que figura en el historial de las OPs.
+
+    Returns:
+        Lista de OVs creadas, en el mismo orden que `pedidos`.
+
+    Raises:
+        ValueError: Si una orden no tiene líneas, una cantidad no es positiva
+            o se referencia un producto inexistente.
+        EstadoOrden.DoesNotExist: Si no está configurado el estado 'Pendiente'.
+    """
+    pedidos = list(pedidos)
+    for pedido in pedidos:
+        pedido["lineas"] = list(pedido["lineas"])
+        if not pedido["lineas"]:
+            raise ValueError("Se debe añadir al menos un producto a la orden.")
+    if not pedidos:
+        return []
+
+    with atomic_inmediato():
+        productos = _resolver_productos(pedidos)
+        estado_op_inicial = estados.obtener(Estados.PENDIENTE)
+
+        # 1. Cabeceras de las OVs con su total ya calculado.
+        numeros_ov = reservar_numeros_documento(
+            OrdenVenta, "OV", "numero_ov", len(pedidos)
+        )
+        ordenes = []
+        items = []
+        for pedido, numero_ov in zip(pedidos, numeros_ov):
+            orden = OrdenVenta(
+                numero_ov=numero_ov,
+                estado=pedido.get("estado") or "PENDIENTE",
+                notas=pedido.get("notas") or None,
+                total_ov=Decimal("0.00"),
+            )
+            if isinstance(pedido["cliente"], int):
+                orden.cliente_id = pedido["cliente"]
+            else:
+                orden.cliente = pedido["cliente"]
+            for linea in pedido["lineas"]:
+                producto = linea["producto"]
+                if not isinstance(producto, ProductoTerminado):
+                    producto = productos[producto]
+                cantidad = int(linea["cantidad"])
+                if cantidad < 1:
+                    raise ValueError(
+                        f"La cantidad de '{producto.descripcion}' debe ser mayor a cero."
+                    )
+                precio = linea.get("precio_unitario_venta")
+                precio = producto.precio_unitario if precio is None else Decimal(precio)
+                item = ItemOrdenVenta(
+                    orden_venta=orden,
+                    producto_terminado=producto,
+                    cantidad=cantidad,
+                    precio_unitario_venta=precio,
+                    subtotal=cantidad * precio,
+                )
+                orden.total_ov += item.subtotal
+                items.append(item)
+            ordenes.append(orden)
+
+        OrdenVenta.objects.bulk_create(ordenes)
+
+        # 2. Ítems y OPs (una OP por ítem); bulk_create completa el id de su OV.
+        ItemOrdenVenta.objects.bulk_create(items)
+
+        numeros_op = reservar_numeros_documento(
+            OrdenProduccion, "OP", "numero_op", len(items)
+        )
+        ops = [
+            OrdenProduccion(
+                numero_op=numero_op,
+                orden_venta_origen=item.orden_venta,
+                producto_a_producir=item.producto_terminado,
+                cantidad_a_producir=item.cantidad,
+                estado_op=estado_op_inicial,
+            )
+            for item, numero_op in zip(items, numeros_op)
+        ]
+        OrdenProduccion.objects.bulk_create(ops)
+
+        # 3. Los mismos eventos de historial que generan las señales post_save.
+        historial = [
+            HistorialOV(orden_venta=orden, descripcion=descripcion_creacion_ov(orden))
+            for orden in ordenes
+        ]
+        historial += [
+            HistorialOV(
+                orden_venta=op.orden_venta_origen,
+                descripcion=descripcion_creacion_op(op),
+                realizado_por=usuario,
+            )
+            for op in ops
+        ]
+        HistorialOV.objects.bulk_create(historial)
+
+        marcar_dashboard_desactualizado(SECCION_ACTIVIDAD)
+
+    return ordenes
+
+
+def crear_orden_venta(cliente, lineas, usuario=None, notas=None, estado="PENDIENTE"):
+    """Crea una OV con sus ítems, OPs e historial. Ver `crear_ordenes_venta`."""
+    return crear_ordenes_venta(
+        [{"cliente": cliente, "lineas": lineas, "notas": notas, "estado": estado}],
+        usuario=usuario,
+    )[0]
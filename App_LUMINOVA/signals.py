@@ -1,10 +1,38 @@
 # TP_LUMINOVA-main/App_LUMINOVA/signals.py
 
 from django.contrib.auth.signals import user_logged_in, user_logged_out
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
 
-from .models import AuditoriaAcceso, HistorialOV, OrdenProduccion, OrdenVenta, Reportes
+from .models import (
+    AuditoriaAcceso,
+    EstadoOrden,
+    Factura,
+    HistorialOV,
+    Insumo,
+    Orden,
+    OrdenProduccion,
+    OrdenVenta,
+    Reportes,
+    SectorAsignado,
+)
+from .services.compra_services import (
+    ESTADOS_OC_EDITABLES,
+    sincronizar_linea_principal,
+)
+from .services.dashboard_services import (
+    SECCION_ACCIONES,
+    SECCION_ACTIVIDAD,
+    SECCION_RENDIMIENTO,
+    SECCION_STOCK,
+    marcar_dashboard_desactualizado,
+)
+from .services.document_services import registrar_numero_documento
+from .services.estado_services import invalidar_catalogos
+from .services.notification_services import invalidar_contadores_notificaciones
+from .services.pdf_services import guardar_pdf_factura
+from .services.venta_services import descripcion_creacion_op, descripcion_creacion_ov
 
 
 def get_client_ip(request):
@@ -31,7 +59,7 @@ def registrar_creacion_ov(sender, instance, created, **kwargs):
     if created:
         HistorialOV.objects.create(
             orden_venta=instance,
-            descripcion=f"Orden de Venta creada en estado '{instance.get_estado_display()}'.",
+            descripcion=descripcion_creacion_ov(instance),
         )
 
 
@@ -41,10 +69,26 @@ def registrar_creacion_op(sender, instance, created, **kwargs):
     if created and instance.orden_venta_origen:
         HistorialOV.objects.create(
             orden_venta=instance.orden_venta_origen,
-            descripcion=f"Se generó la Orden de Producción {instance.numero_op} para el producto '{instance.producto_a_producir.descripcion}'.",
+            descripcion=descripcion_creacion_op(instance),
         )
 
 
+# Las OCs de un solo insumo mantienen su línea igual al insumo y cantidad principal.
+@receiver(post_save, sender=Orden)
+def sincronizar_linea_principal_oc(
+    sender, instance, created, raw=False, update_fields=None, **kwargs
+):
+    campos_principales = {"insumo_principal", "cantidad_principal", "precio_unitario_compra"}
+    if raw or (update_fields is not None and not campos_principales & set(update_fields)):
+        return
+    if (
+        (created or instance.estado in ESTADOS_OC_EDITABLES)
+        and instance.insumo_principal_id
+        and instance.cantidad_principal
+    ):
+        sincronizar_linea_principal(instance)
+
+
 # NEW: Signal to log when a report is created for an OP.
 @receiver(post_save, sender=Reportes)
 def registrar_creacion_reporte_en_historial_ov(sender, instance, created, **kwargs):
@@ -68,3 +112,86 @@ def registrar_creacion_reporte_en_historial_ov(sender, instance, created, **kwar
             tipo_evento="Reporte de Incidencia",
             realizado_por=instance.reportado_por,
         )
+
+
+# Invalida los contadores de notificaciones cacheados cuando cambian los modelos que los alimentan.
+@receiver([post_save, post_delete], sender=Reportes)
+@receiver([post_save, post_delete], sender=OrdenProduccion)
+@receiver([post_save, post_delete], sender=Orden)
+@receiver([post_save, post_delete], sender=Insumo)
+def invalidar_notificaciones(sender, **kwargs):
+    invalidar_contadores_notificaciones()
+
+
+# Secciones del DashboardSnapshot que dependen de cada modelo.
+SECCIONES_DASHBOARD_POR_MODELO = {
+    Reportes: (SECCION_ACCIONES, SECCION_ACTIVIDAD),
+    OrdenProduccion: (SECCION_ACCIONES, SECCION_RENDIMIENTO, SECCION_ACTIVIDAD),
+    Orden: (SECCION_ACCIONES,),
+    Insumo: (SECCION_STOCK,),
+    OrdenVenta: (SECCION_ACTIVIDAD,),
+}
+
+
+# Marca como desactualizadas solo las tarjetas del dashboard afectadas por el cambio.
+@receiver([post_save, post_delete], sender=Reportes)
+@receiver([post_save, post_delete], sender=OrdenProduccion)
+@receiver([post_save, post_delete], sender=Orden)
+@receiver([post_save, post_delete], sender=Insumo)
+@receiver([post_save, post_delete], sender=OrdenVenta)
+def marcar_dashboard(sender, **kwargs):
+    marcar_dashboard_desactualizado(*SECCIONES_DASHBOARD_POR_MODELO[sender])
+
+
+# Prefijo y campo del número de cada documento numerado por SecuenciaDocumento.
+NUMERACION_DOCUMENTOS = {
+    OrdenVenta: ("OV", "numero_ov"),
+    OrdenProduccion: ("OP", "numero_op"),
+    Reportes: ("RP", "n_reporte"),
+    Orden: ("OC", "numero_orden"),
+    Factura: ("FACT", "numero_factura"),
+}
+
+
+# Recuerda el número con que se cargó cada documento, para saber al guardarlo
+# si cambió sin volver a leerlo.
+@receiver(post_init, sender=OrdenVenta)
+@receiver(post_init, sender=OrdenProduccion)
+@receiver(post_init, sender=Reportes)
+@receiver(post_init, sender=Orden)
+@receiver(post_init, sender=Factura)
+def recordar_numero_documento(sender, instance, **kwargs):
+    _, campo = NUMERACION_DOCUMENTOS[sender]
+    instance._numero_documento_cargado = instance.__dict__.get(campo)
+
+
+# Un número escrito a mano (admin, edición de OC) adelanta la secuencia. Solo
+# al crear o cambiar el número: los demás guardados (estado, notas) no lo tocan.
+@receiver(post_save, sender=OrdenVenta)
+@receiver(post_save, sender=OrdenProduccion)
+@receiver(post_save, sender=Reportes)
+@receiver(post_save, sender=Orden)
+@receiver(post_save, sender=Factura)
+def adelantar_secuencia_documento(sender, instance, created, update_fields=None, **kwargs):
+    prefijo, campo = NUMERACION_DOCUMENTOS[sender]
+    if update_fields is not None and campo not in update_fields:
+        return
+    numero = getattr(instance, campo)
+    if created or numero != instance._numero_documento_cargado:
+        registrar_numero_documento(prefijo, numero)
+    instance._numero_documento_cargado = numero
+
+
+# Recarga los registros en memoria de estados y sectores.
+@receiver([post_save, post_delete], sender=EstadoOrden)
+@receiver([post_save, post_delete], sender=SectorAsignado)
+def recargar_catalogos(sender, **kwargs):
+    invalidar_catalogos()
+
+
+# La factura es inmutable: su PDF se renderiza una vez, al emitirla, y se
+# guarda para que verla sea leer un archivo. Si falla se genera en el primer pedido.
+@receiver(post_save, sender=Factura)
+def renderizar_pdf_factura_emitida(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        transaction.on_commit(lambda: guardar_pdf_factura(instance), robust=True)
@@ -1,3 +1,2474 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import tempfile
+import threading
+import zipfile
+from datetime import date, datetime, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from Proyecto_LUMINOVA.bases_de_datos import (
+    PRAGMAS_SQLITE,
+    base_desde_entorno,
+    cache_desde_entorno,
+    opciones_sqlite,
+)
+
+from .benchmarks.vistas import Medicion, cargar_base, excesos, medir_rutas, rutas_nombradas
+from .context_processors import notificaciones_context
+from .models import (
+    AuditoriaAcceso,
+    AuditoriaAccesoArchivada,
+    CategoriaInsumo,
+    CategoriaProductoTerminado,
+    Cliente,
+    ComponenteProducto,
+    DashboardSnapshot,
+    EstadoOrden,
+    Factura,
+    HistorialOV,
+    HistorialOVArchivado,
+    Insumo,
+    ItemOrdenCompra,
+    ItemOrdenVenta,
+    LoteProductoTerminado,
+    MovimientoStock,
+    OfertaProveedor,
+    Orden,
+    OrdenProduccion,
+    OrdenVenta,
+    PasswordChangeRequired,
+    ProductoTerminado,
+    Proveedor,
+    Reportes,
+    SecuenciaDocumento,
+)
+from .services.auditoria_services import (
+    ACCION_INICIO_SESION,
+    escritor_auditoria,
+    registrar_acceso,
+    vaciar_auditoria,
+)
+from .services.compra_services import (
+    RecepcionOCError,
+    TransicionOCInvalida,
+    cambiar_estado_ocs,
+    generar_ordenes_compra_sugeridas,
+    recibir_orden_compra,
+    sugerir_ordenes_compra,
+)
+from .services.dashboard_services import obtener_dashboard_snapshot
+from .services import datos_sinteticos_services
+from .services.datos_sinteticos_services import (
+    DIAS_DOCUMENTO_ABIERTO,
+    Volumenes,
+    generar_datos_sinteticos,
+)
+from .services.document_services import (
+    generar_siguiente_numero_documento,
+    reservar_numeros_documento,
+    sugerir_siguiente_numero_documento,
+)
+from .services.estado_services import Estados, estados
+from .services.historial_services import fecha_corte, historial_accesos, historial_ov
+from .services.mrp_services import calcular_necesidades_mrp
+from .services.notification_services import obtener_contadores_notificaciones
+from .services.pdf_services import (
+    VERSION_PLANTILLA_FACTURA,
+    exportar_zip,
+    guardar_pdf_factura,
+    ordenes_para_exportar,
+    renderizar_pdf_factura,
+)
+from .services.produccion_services import (
+    TransicionOPInvalida,
+    cambiar_estado_op,
+    cambiar_estado_ops,
+    maquina_estados_op,
+)
+from .services.stock_services import (
+    StockInsuficienteError,
+    cerrar_saldos_stock,
+    conciliar_stock,
+    descontar_insumos,
+    enviar_insumos_op,
+    registrar_ajuste_stock,
+    stock_en_fecha,
+)
+from .services.venta_services import crear_orden_venta
+from .utils import atomic_inmediato, bloquear_filas
+
+TABLAS_NOTIFICACIONES = (
+    "app_luminova_reportes",
+    "app_luminova_ordenproduccion",
+    "app_luminova_orden",
+    "app_luminova_insumo",
+)
+TABLAS_DASHBOARD = TABLAS_NOTIFICACIONES + ("app_luminova_ordenventa",)
+
+
+class SecuenciaDocumentoTests(TestCase):
+    def _reporte(self, numero):
+        return Reportes.objects.create(n_reporte=numero, tipo_problema="Calidad")
+
+    def test_se_inicializa_con_el_mayor_sufijo_existente(self):
+        for numero in ("RP-00007", "RP-00003", "RP-manual"):
+            self._reporte(numero)
+
+        self.assertEqual(
+            sugerir_siguiente_numero_documento(Reportes, "RP", "n_reporte"), "RP-00008"
+        )
+        self.assertEqual(
+            generar_siguiente_numero_documento(Reportes, "RP", "n_reporte"), "RP-00008"
+        )
+
+    def test_reserva_varios_numeros_con_un_solo_update(self):
+        self.assertEqual(
+            reservar_numeros_documento(Reportes, "RP", "n_reporte", 3),
+            ["RP-00001", "RP-00002", "RP-00003"],
+        )
+        with CaptureQueriesContext(connection) as consultas:
+            numeros = reservar_numeros_documento(Reportes, "RP", "n_reporte", 2)
+        self.assertEqual(numeros, ["RP-00004", "RP-00005"])
+        updates = [q for q in consultas.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(reservar_numeros_documento(Reportes, "RP", "n_reporte", 0), [])
+        self.assertEqual(SecuenciaDocumento.objects.get(prefijo="RP").ultimo_valor, 5)
+
+    def test_un_numero_cargado_a_mano_adelanta_la_secuencia(self):
+        reservar_numeros_documento(Reportes, "RP", "n_reporte", 1)
+        reporte = self._reporte("RP-00050")
+        self.assertEqual(
+            generar_siguiente_numero_documento(Reportes, "RP", "n_reporte"), "RP-00051"
+        )
+
+        # Un número menor o con otro formato no la hace retroceder.
+        reporte.n_reporte = "RP-00010"
+        reporte.save()
+        self._reporte("RP-especial")
+        self.assertEqual(SecuenciaDocumento.objects.get(prefijo="RP").ultimo_valor, 51)
+
+    def test_guardar_sin_cambiar_el_numero_no_toca_la_secuencia(self):
+        reservar_numeros_documento(Reportes, "RP", "n_reporte", 1)
+        reporte = self._reporte("RP-00050")
+        reporte = Reportes.objects.get(id=reporte.id)
+
+        with CaptureQueriesContext(connection) as ctx:
+            reporte.informe_reporte = "Revisado"
+            reporte.save()
+        self.assertFalse(any("secuenciadocumento" in q["sql"].lower() for q in ctx.captured_queries))
+
+        reporte.n_reporte = "RP-00070"
+        reporte.save()
+        self.assertEqual(SecuenciaDocumento.objects.get(prefijo="RP").ultimo_valor, 70)
+
+
+class NumeracionConcurrenteTests(TransactionTestCase):
+    HILOS = 5
+    NUMEROS_POR_HILO = 4
+
+    def test_llamadas_concurrentes_reciben_numeros_distintos(self):
+        numeros = []
+        barrera = threading.Barrier(self.HILOS)
+
+        def vendedor():
+            barrera.wait()
+            try:
+                for _ in range(self.NUMEROS_POR_HILO):
+                    while True:
+                        try:
+                            numeros.append(
+                                generar_siguiente_numero_documento(OrdenVenta, "OV", "numero_ov")
+                            )
+                        except OperationalError:
+                            # La base de tests en memoria devuelve "table is locked"
+                            # en vez de esperar al otro escritor: reintentamos.
+                            continue
+                        break
+            finally:
+                close_old_connections()
+                connection.close()
+
+        hilos = [threading.Thread(target=vendedor) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        total = self.HILOS * self.NUMEROS_POR_HILO
+        self.assertEqual(sorted(numeros), [f"OV-{n:05d}" for n in range(1, total + 1)])
+
+
+# Los conteos de consultas suponen una caché en memoria, no la DatabaseCache.
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests"}}
+)
+class NotificacionesContextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="operador", password="x")
+        self.proveedor = Proveedor.objects.create(nombre="Proveedor Test")
+
+    def test_contadores_en_una_sola_consulta(self):
+        Orden.objects.create(numero_orden="OC-00001", proveedor=self.proveedor)
+        cache.clear()
+        estados.todos()  # el registro de estados se carga una vez por proceso
+
+        with self.assertNumQueries(1):
+            contadores = obtener_contadores_notificaciones()
+
+        self.assertEqual(contadores["ocs_para_aprobar_count"], 1)
+        self.assertEqual(contadores["total_notificaciones"], 1)
+
+    def test_cache_caliente_no_consulta(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        obtener_contadores_notificaciones()
+
+        with self.assertNumQueries(0):
+            notificaciones_context(request)
+
+    def test_render_de_pagina_sin_consultas_de_notificaciones(self):
+        self.client.force_login(self.user)
+        obtener_contadores_notificaciones()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("App_LUMINOVA:control_calidad_view"))
+
+        self.assertEqual(response.status_code, 200)
+        consultas = [q["sql"].lower() for q in ctx.captured_queries]
+        for tabla in TABLAS_NOTIFICACIONES:
+            self.assertFalse(
+                any(f'"{tabla}"' in sql for sql in consultas),
+                f"Se consultó {tabla} con la caché caliente",
+            )
+
+    def test_senal_invalida_la_cache(self):
+        self.assertEqual(obtener_contadores_notificaciones()["ocs_para_aprobar_count"], 0)
+
+        Orden.objects.create(numero_orden="OC-00001", proveedor=self.proveedor)
+
+        self.assertEqual(obtener_contadores_notificaciones()["ocs_para_aprobar_count"], 1)
+
+
+class DashboardSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username="jefe", password="x")
+        self.categoria = CategoriaInsumo.objects.create(nombre="Categoría Test")
+        self.proveedor = Proveedor.objects.create(nombre="Proveedor Test")
+
+    def test_dashboard_lee_una_sola_fila(self):
+        obtener_dashboard_snapshot()
+        obtener_contadores_notificaciones()
+        self.client.force_login(self.admin)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("App_LUMINOVA:dashboard"))
+
+        self.assertEqual(response.status_code, 200)
+        consultas = [q["sql"].lower() for q in ctx.captured_queries]
+        self.assertEqual(
+            sum('"app_luminova_dashboardsnapshot"' in sql for sql in consultas), 1
+        )
+        for tabla in TABLAS_DASHBOARD:
+            self.assertFalse(
+                any(f'"{tabla}"' in sql for sql in consultas),
+                f"El dashboard consultó {tabla} en lugar del snapshot",
+            )
+        self.assertContains(response, "Actualizado hace")
+
+    def test_escribir_no_recalcula_el_snapshot(self):
+        obtener_dashboard_snapshot()
+
+        with CaptureQueriesContext(connection) as ctx:
+            with self.captureOnCommitCallbacks(execute=True):
+                Insumo.objects.create(descripcion="Tornillo", categoria=self.categoria, stock=5)
+
+        consultas = [q["sql"].lower() for q in ctx.captured_queries]
+        self.assertFalse(any("dashboardsnapshot" in sql for sql in consultas))
+        # Ninguna de las consultas de las tarjetas corre dentro de la escritura.
+        self.assertFalse(any(sql.startswith("select") for sql in consultas))
+
+    def test_la_lectura_recalcula_solo_la_seccion_afectada(self):
+        snapshot = obtener_dashboard_snapshot()
+        rendimiento_antes = snapshot.rendimiento_actualizado
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Insumo.objects.create(descripcion="Tornillo", categoria=self.categoria, stock=5)
+            Orden.objects.create(numero_orden="OC-00001", proveedor=self.proveedor)
+
+        snapshot = obtener_dashboard_snapshot()
+        self.assertEqual([i["descripcion"] for i in snapshot.insumos_criticos], ["Tornillo"])
+        self.assertEqual(snapshot.ocs_para_aprobar_count, 1)
+        self.assertEqual(snapshot.rendimiento_actualizado, rendimiento_antes)
+
+    def test_cambios_en_una_transaccion_refrescan_una_vez(self):
+        obtener_dashboard_snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(10):
+                Insumo.objects.create(
+                    descripcion=f"Insumo {i}", categoria=self.categoria, stock=i
+                )
+
+        with CaptureQueriesContext(connection) as ctx:
+            obtener_dashboard_snapshot()
+            obtener_dashboard_snapshot()
+
+        escrituras = [
+            q for q in ctx.captured_queries
+            if q["sql"].lower().startswith("update") and "dashboardsnapshot" in q["sql"].lower()
+        ]
+        self.assertEqual(len(escrituras), 1)
+        self.assertEqual(len(DashboardSnapshot.objects.get().insumos_criticos), 5)
+
+    @override_settings(DASHBOARD_SNAPSHOT_TTL=60)
+    def test_seccion_vencida_se_recalcula_sin_marcas(self):
+        obtener_dashboard_snapshot()
+        hace_un_rato = timezone.now() - timedelta(seconds=120)
+        DashboardSnapshot.objects.update(stock_actualizado=hace_un_rato)
+
+        snapshot = obtener_dashboard_snapshot()
+
+        self.assertGreater(snapshot.stock_actualizado, hace_un_rato)
+
+
+class PasswordChangeMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="nuevo", password="clave-inicial")
+        PasswordChangeRequired.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def _consultas_a(self, tabla, ctx):
+        return [q for q in ctx.captured_queries if f'"{tabla}"' in q["sql"].lower()]
+
+    def test_redirige_sin_ejecutar_la_vista(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("App_LUMINOVA:dashboard"))
+
+        self.assertRedirects(
+            response, reverse("App_LUMINOVA:change_password"), fetch_redirect_response=False
+        )
+        self.assertFalse(self._consultas_a("app_luminova_dashboardsnapshot", ctx))
+
+    def test_marca_cacheada_en_la_sesion(self):
+        self.client.get(reverse("App_LUMINOVA:dashboard"))
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("App_LUMINOVA:dashboard"))
+
+        self.assertFalse(self._consultas_a("app_luminova_passwordchangerequired", ctx))
+
+    def test_cambio_de_password_invalida_la_marca(self):
+        self.client.get(reverse("App_LUMINOVA:dashboard"))
+        self.client.post(
+            reverse("App_LUMINOVA:change_password"),
+            {
+                "old_password": "clave-inicial",
+                "new_password1": "Otra-Clave-Segura-123",
+                "new_password2": "Otra-Clave-Segura-123",
+            },
+        )
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("App_LUMINOVA:dashboard"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self._consultas_a("app_luminova_passwordchangerequired", ctx))
+
+
+class ListaOrdenesVentaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(username="vendedor", password="x")
+        self.client.force_login(self.user)
+        self.cliente = Cliente.objects.create(nombre="Cliente A")
+        self.otro_cliente = Cliente.objects.create(nombre="Cliente B")
+        categoria = CategoriaProductoTerminado.objects.create(nombre="Luminarias")
+        self.producto = ProductoTerminado.objects.create(
+            descripcion="Lámpara", categoria=categoria
+        )
+        self.ahora = timezone.now()
+        self.url = reverse("App_LUMINOVA:ventas_lista_ov")
+
+    def _crear_ovs(self, cantidad, inicio=0, cliente=None):
+        ovs = OrdenVenta.objects.bulk_create(
+            OrdenVenta(
+                numero_ov=f"OV-{inicio + i:05d}",
+                cliente=cliente or self.cliente,
+                fecha_creacion=self.ahora - timedelta(hours=inicio + i),
+            )
+            for i in range(cantidad)
+        )
+        ItemOrdenVenta.objects.bulk_create(
+            ItemOrdenVenta(
+                orden_venta=ov,
+                producto_terminado=self.producto,
+                cantidad=1,
+                precio_unitario_venta=10,
+                subtotal=10,
+            )
+            for ov in ovs
+        )
+        OrdenProduccion.objects.bulk_create(
+            OrdenProduccion(
+                numero_op=f"OP-{inicio + i:05d}",
+                orden_venta_origen=ov,
+                producto_a_producir=self.producto,
+                cantidad_a_producir=1,
+            )
+            for i, ov in enumerate(ovs)
+        )
+        return ovs
+
+    def _contar_consultas(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_consultas_constantes_con_el_historial(self):
+        self._crear_ovs(3)
+        self.client.get(self.url)  # calienta la caché de notificaciones
+        consultas_pocas, _ = self._contar_consultas()
+        self._crear_ovs(60, inicio=3)
+        self.client.get(self.url)
+        consultas_muchas, _ = self._contar_consultas()
+
+        self.assertEqual(consultas_pocas, consultas_muchas)
+
+    def test_paginacion_por_clave_recorre_todo_sin_repetir(self):
+        # Dos OVs con la misma fecha fuerzan el desempate por id.
+        self._crear_ovs(30)
+        OrdenVenta.objects.filter(numero_ov="OV-00025").update(
+            fecha_creacion=self.ahora - timedelta(hours=24)
+        )
+
+        vistos = []
+        params = {}
+        while True:
+            response = self.client.get(self.url, params)
+            vistos.extend(ov.numero_ov for ov in response.context["ordenes_list"])
+            if not response.context["cursor_siguiente"]:
+                break
+            params = {"despues": response.context["cursor_siguiente"]}
+
+        self.assertEqual(len(vistos), 30)
+        self.assertEqual(len(set(vistos)), 30)
+
+        response = self.client.get(self.url, {"antes": response.context["cursor_anterior"]})
+        self.assertEqual(len(response.context["ordenes_list"]), 25)
+        self.assertIsNone(response.context["cursor_anterior"])
+
+    def test_filtros_y_bandera_de_reportes(self):
+        ovs = self._crear_ovs(3)
+        self._crear_ovs(2, inicio=3, cliente=self.otro_cliente)
+        Reportes.objects.create(
+            n_reporte="RP-00001",
+            tipo_problema="Otro",
+            orden_produccion_asociada=ovs[0].ops_generadas.get(),
+        )
+
+        _, response = self._contar_consultas(cliente=self.otro_cliente.id)
+        self.assertEqual(len(response.context["ordenes_list"]), 2)
+
+        _, response = self._contar_consultas(cliente=self.cliente.id)
+        banderas = {
+            ov.numero_ov: ov.tiene_algun_reporte_asociado
+            for ov in response.context["ordenes_list"]
+        }
+        self.assertEqual(banderas, {"OV-00000": True, "OV-00001": False, "OV-00002": False})
+
+        _, response = self._contar_consultas(
+            fecha_desde=(self.ahora + timedelta(days=1)).date().isoformat()
+        )
+        self.assertEqual(response.context["ordenes_list"], [])
+
+
+class CrearOrdenVentaServiceTests(TestCase):
+    def setUp(self):
+        EstadoOrden.objects.create(nombre="Pendiente")
+        self.cliente = Cliente.objects.create(nombre="Cliente A")
+        categoria = CategoriaProductoTerminado.objects.create(nombre="Luminarias")
+        self.productos = ProductoTerminado.objects.bulk_create(
+            ProductoTerminado(descripcion=f"Lámpara {i}", categoria=categoria, precio_unitario=10)
+            for i in range(5)
+        )
+
+    def _lineas(self, cantidad):
+        return [
+            {"producto": self.productos[i % 5].id, "cantidad": 2} for i in range(cantidad)
+        ]
+
+    def test_crea_items_ops_e_historial(self):
+        ov = crear_orden_venta(cliente=self.cliente, lineas=self._lineas(3))
+
+        self.assertEqual(ov.total_ov, 60)
+        self.assertEqual(ov.items_ov.count(), 3)
+        self.assertEqual(ov.ops_generadas.count(), 3)
+        descripciones = list(HistorialOV.objects.filter(orden_venta=ov).values_list("descripcion", flat=True))
+        self.assertEqual(len(descripciones), 4)
+        for op in ov.ops_generadas.all():
+            self.assertTrue(any(op.numero_op in d for d in descripciones))
+
+    def test_cantidad_de_consultas_no_depende_de_las_lineas(self):
+        crear_orden_venta(cliente=self.cliente, lineas=self._lineas(1))  # inicializa las secuencias
+        with CaptureQueriesContext(connection) as pocas:
+            crear_orden_venta(cliente=self.cliente, lineas=self._lineas(5))
+        with CaptureQueriesContext(connection) as muchas:
+            crear_orden_venta(cliente=self.cliente, lineas=self._lineas(60))
+
+        self.assertEqual(len(pocas.captured_queries), len(muchas.captured_queries))
+
+    def test_error_revierte_todo(self):
+        lineas = self._lineas(2) + [{"producto": self.productos[0].id, "cantidad": 0}]
+
+        with self.assertRaises(ValueError):
+            crear_orden_venta(cliente=self.cliente, lineas=lineas)
+
+        self.assertFalse(OrdenVenta.objects.exists())
+        self.assertFalse(OrdenProduccion.objects.exists())
+
+
+class ImportarOVsCommandTests(TestCase):
+    def setUp(self):
+        EstadoOrden.objects.create(nombre="Pendiente")
+        Cliente.objects.create(nombre="Cliente A")
+        categoria = CategoriaProductoTerminado.objects.create(nombre="Luminarias")
+        self.producto = ProductoTerminado.objects.create(
+            descripcion="Lámpara LED", categoria=categoria, precio_unitario=10
+        )
+
+    def _archivo(self, filas):
+        fd, ruta = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as archivo:
+            escritor = csv.writer(archivo)
+            escritor.writerow(["referencia", "cliente", "producto", "cantidad"])
+            escritor.writerows(filas)
+        self.addCleanup(os.remove, ruta)
+        return ruta
+
+    def test_importa_por_lotes_y_reporta_errores_por_fila(self):
+        ruta = self._archivo(
+            [
+                ["EXT-1", "Cliente A", "Lámpara LED", "2"],
+                ["EXT-1", "cliente a", str(self.producto.id), "1"],
+                ["EXT-2", "Cliente A", "Lámpara LED", "0"],
+                ["EXT-2", "Cliente A", "Lámpara LED", "1"],
+                ["EXT-3", "Cliente Z", "Lámpara LED", "1"],
+                ["EXT-4", "Cliente A", "Lámpara LED", "3"],
+            ]
+        )
+        _, ruta_reporte = tempfile.mkstemp(suffix=".csv")
+        self.addCleanup(os.remove, ruta_reporte)
+
+        call_command("importar_ovs", ruta, lote=1, reporte=ruta_reporte, stdout=io.StringIO())
+
+        self.assertEqual(OrdenVenta.objects.count(), 2)
+        self.assertEqual(OrdenProduccion.objects.count(), 3)
+        with open(ruta_reporte, encoding="utf-8") as archivo:
+            filas_con_error = [int(f["fila"]) for f in csv.DictReader(archivo)]
+        self.assertEqual(filas_con_error, [4, 5, 6])
+
+    def test_rechaza_cantidades_fraccionarias_y_clientes_ambiguos(self):
+        Cliente.objects.create(nombre="Cliente B")
+        Cliente.objects.create(nombre="cliente b")
+        ruta = self._archivo(
+            [
+                ["EXT-1", "Cliente A", "Lámpara LED", "2.5"],
+                ["EXT-2", "Cliente B", "Lámpara LED", "1"],
+                ["EXT-3", "Cliente A", "Lámpara LED", "2.0"],
+            ]
+        )
+        _, ruta_reporte = tempfile.mkstemp(suffix=".csv")
+        self.addCleanup(os.remove, ruta_reporte)
+
+        call_command("importar_ovs", ruta, reporte=ruta_reporte, stdout=io.StringIO())
+
+        self.assertEqual(
+            list(ItemOrdenVenta.objects.values_list("orden_venta__cliente__nombre", "cantidad")),
+            [("Cliente A", 2)],
+        )
+        with open(ruta_reporte, encoding="utf-8") as archivo:
+            errores = {int(f["fila"]): f["error"] for f in csv.DictReader(archivo)}
+        self.assertEqual(sorted(errores), [2, 3])
+        self.assertIn("número entero", errores[2])
+        self.assertIn("varios clientes", errores[3])
+
+    def test_dry_run_no_guarda(self):
+        ruta = self._archivo([["EXT-1", "Cliente A", "Lámpara LED", "2"]])
+
+        salida = io.StringIO()
+        call_command("importar_ovs", ruta, dry_run=True, stdout=salida)
+
+        self.assertFalse(OrdenVenta.objects.exists())
+        self.assertIn("OVs válidas", salida.getvalue())
+
+
+class RegistroEstadosTests(TestCase):
+    def setUp(self):
+        self.pendiente = EstadoOrden.objects.create(nombre="Pendiente")
+
+    def test_resuelve_sin_consultas_una_vez_cargado(self):
+        estados.todos()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(estados.obtener("pendiente"), self.pendiente)
+            self.assertEqual(estados.ids(Estados.PENDIENTE, Estados.PAUSADA), [self.pendiente.id])
+
+    def test_se_recarga_cuando_cambia_la_tabla(self):
+        estados.todos()
+        pausada = EstadoOrden.objects.create(nombre="Pausada")
+
+        self.assertEqual(estados.ids(Estados.PAUSADA), [pausada.id])
+
+        pausada.delete()
+        with self.assertRaises(EstadoOrden.DoesNotExist):
+            estados.obtener(Estados.PAUSADA)
+
+
+class MaquinaEstadosOPTests(TestCase):
+    def setUp(self):
+        for nombre in (Estados.PENDIENTE, Estados.EN_PROCESO, Estados.PAUSADA, Estados.CANCELADA):
+            EstadoOrden.objects.create(nombre=nombre)
+        self.completada = EstadoOrden.objects.create(nombre=Estados.COMPLETADA)
+        self.user = User.objects.create_superuser(username="jefe", password="x")
+        cliente = Cliente.objects.create(nombre="Cliente A")
+        categoria = CategoriaProductoTerminado.objects.create(nombre="Luminarias")
+        self.producto = ProductoTerminado.objects.create(
+            descripcion="Lámpara", categoria=categoria, precio_unitario=10, stock=1
+        )
+        self.ov = crear_orden_venta(
+            cliente=cliente,
+            lineas=[{"producto": self.producto, "cantidad": 2}, {"producto": self.producto, "cantidad": 3}],
+        )
+        self.ops = list(self.ov.ops_generadas.order_by("id"))
+        OrdenProduccion.objects.filter(id__in=[op.id for op in self.ops]).update(
+            estado_op=estados.obtener(Estados.EN_PROCESO)
+        )
+        self.ops = list(self.ov.ops_generadas.order_by("id"))
+
+    def test_transiciones_permitidas_sin_consultas(self):
+        maquina_estados_op.mapa()
+
+        with self.assertNumQueries(0):
+            permitidos = maquina_estados_op.ids_permitidos(self.ops[0].estado_op_id)
+
+        self.assertEqual(
+            permitidos,
+            {self.ops[0].estado_op_id, self.completada.id, *estados.ids(Estados.PAUSADA, Estados.CANCELADA)},
+        )
+        self.assertEqual(
+            maquina_estados_op.ids_permitidos(self.completada.id), {self.completada.id}
+        )
+
+    def test_completar_todas_las_ops_actualiza_stock_lotes_y_ov(self):
+        resultado = cambiar_estado_ops(
+            OrdenProduccion.objects.filter(orden_venta_origen=self.ov),
+            Estados.COMPLETADA,
+            usuario=self.user,
+        )
+
+        self.assertEqual(len(resultado.actualizadas), 2)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 6)
+        self.assertEqual(LoteProductoTerminado.objects.filter(producto=self.producto).count(), 2)
+        self.ov.refresh_from_db()
+        self.assertEqual(self.ov.estado, "LISTA_ENTREGA")
+        self.assertEqual(
+            HistorialOV.objects.filter(orden_venta=self.ov, tipo_evento="Cambio Estado OP").count(), 2
+        )
+        self.assertTrue(
+            HistorialOV.objects.filter(orden_venta=self.ov, tipo_evento="Cambio Estado OV").exists()
+        )
+        self.assertFalse(OrdenProduccion.objects.filter(fecha_fin_real__isnull=True).exists())
+
+    def test_transicion_invalida_no_cambia_nada(self):
+        cambiar_estado_op(self.ops[0], Estados.COMPLETADA)
+
+        with self.assertRaises(TransicionOPInvalida):
+            cambiar_estado_op(self.ops[0], Estados.PAUSADA)
+
+        self.ops[0].refresh_from_db()
+        self.assertEqual(self.ops[0].estado_op, self.completada)
+        self.ov.refresh_from_db()
+        self.assertNotEqual(self.ov.estado, "LISTA_ENTREGA")
+
+    def test_detalle_op_completa_desde_el_formulario(self):
+        self.client.force_login(self.user)
+        op = self.ops[0]
+
+        respuesta = self.client.post(
+            reverse("App_LUMINOVA:produccion_detalle_op", args=[op.id]),
+            {"estado_op": self.completada.id, "cantidad_a_producir": op.cantidad_a_producir},
+        )
+
+        self.assertEqual(respuesta.status_code, 302)
+        op.refresh_from_db()
+        self.assertEqual(op.estado_op, self.completada)
+        self.assertTrue(LoteProductoTerminado.objects.filter(op_asociada=op).exists())
+
+
+class DepositoStockBajoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(username="deposito", password="x")
+        self.client.force_login(self.user)
+        self.proveedor = Proveedor.objects.create(nombre="Proveedor Test")
+        self.categoria = CategoriaInsumo.objects.create(nombre="LEDs")
+        self.url = reverse("App_LUMINOVA:deposito_view")
+
+    def _crear_insumos(self, cantidad, inicio=0):
+        insumos = Insumo.objects.bulk_create(
+            Insumo(descripcion=f"Insumo {inicio + i}", categoria=self.categoria, stock=5, punto_reorden=10)
+            for i in range(cantidad)
+        )
+        # Una OC en firme para la mitad de ellos.
+        ordenes = Orden.objects.bulk_create(
+            Orden(
+                numero_orden=f"OC-{inicio + i:05d}",
+                proveedor=self.proveedor,
+                insumo_principal=insumo,
+                cantidad_principal=10,
+                estado="APROBADA",
+            )
+            for i, insumo in enumerate(insumos)
+            if i % 2 == 0
+        )
+        ItemOrdenCompra.objects.bulk_create(
+            ItemOrdenCompra(orden=orden, insumo=orden.insumo_principal, cantidad=10)
+            for orden in ordenes
+        )
+        return insumos
+
+    def test_separa_a_gestionar_y_en_pedido_segun_punto_de_reorden(self):
+        pedido, sin_pedido = self._crear_insumos(2)
+        Insumo.objects.create(descripcion="Con stock", categoria=self.categoria, stock=50, punto_reorden=10)
+        Insumo.objects.create(descripcion="Reorden alto", categoria=self.categoria, stock=50, punto_reorden=100)
+
+        response = self.client.get(self.url)
+
+        en_pedido = response.context["insumos_en_pedido_list"]
+        self.assertEqual([i["insumo"] for i in en_pedido], [pedido])
+        self.assertEqual(en_pedido[0]["oc"].numero_orden, "OC-00000")
+        self.assertEqual(
+            sorted(i["insumo"].descripcion for i in response.context["insumos_a_gestionar_list"]),
+            ["Insumo 1", "Reorden alto"],
+        )
+
+    def test_consultas_no_dependen_de_los_insumos(self):
+        self._crear_insumos(2)
+        self.client.get(self.url)  # calienta caché de notificaciones y registro de estados
+        with CaptureQueriesContext(connection) as pocas:
+            self.client.get(self.url)
+
+        self._crear_insumos(20, inicio=2)
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as muchas:
+            self.client.get(self.url)
+
+        self.assertEqual(len(pocas.captured_queries), len(muchas.captured_queries))
+
+
+class EnvioInsumosTests(TestCase):
+    def setUp(self):
+        EstadoOrden.objects.create(nombre=Estados.PENDIENTE)
+        self.solicitados = EstadoOrden.objects.create(nombre=Estados.INSUMOS_SOLICITADOS)
+        self.recibidos = EstadoOrden.objects.create(nombre=Estados.INSUMOS_RECIBIDOS)
+        categoria = CategoriaInsumo.objects.create(nombre="LEDs")
+        self.insumos = Insumo.objects.bulk_create(
+            Insumo(descripcion=f"Insumo {i}", categoria=categoria, stock=100) for i in range(3)
+        )
+        producto = ProductoTerminado.objects.create(
+            descripcion="Lámpara",
+            categoria=CategoriaProductoTerminado.objects.create(nombre="Luminarias"),
+        )
+        ComponenteProducto.objects.bulk_create(
+            ComponenteProducto(producto_terminado=producto, insumo=insumo, cantidad_necesaria=i + 1)
+            for i, insumo in enumerate(self.insumos)
+        )
+        self.op = OrdenProduccion.objects.create(
+            numero_op="OP-00001",
+            producto_a_producir=producto,
+            cantidad_a_producir=10,
+            estado_op=self.solicitados,
+        )
+
+    def _stocks(self):
+        return list(Insumo.objects.order_by("id").values_list("stock", flat=True))
+
+    def test_descuenta_todo_el_bom_y_avanza_la_op(self):
+        enviar_insumos_op(self.op)
+
+        self.assertEqual(self._stocks(), [90, 80, 70])
+        self.op.refresh_from_db()
+        self.assertEqual(self.op.estado_op, self.recibidos)
+        self.assertIsNotNone(self.op.fecha_inicio_real)
+
+    def test_faltantes_se_informan_juntos_y_no_se_descuenta_nada(self):
+        Insumo.objects.filter(id__in=[self.insumos[1].id, self.insumos[2].id]).update(stock=5)
+
+        with self.assertRaises(StockInsuficienteError) as ctx:
+            enviar_insumos_op(self.op)
+
+        self.assertEqual(
+            [(f.insumo_id, f.requerido, f.disponible) for f in ctx.exception.faltantes],
+            [(self.insumos[1].id, 20, 5), (self.insumos[2].id, 30, 5)],
+        )
+        self.assertEqual(self._stocks(), [100, 5, 5])
+        self.op.refresh_from_db()
+        self.assertEqual(self.op.estado_op, self.solicitados)
+
+    def test_una_op_no_se_despacha_dos_veces(self):
+        enviar_insumos_op(self.op)
+        self.op.estado_op = self.solicitados  # copia vieja de la OP
+
+        with self.assertRaises(ValueError):
+            enviar_insumos_op(self.op)
+
+        self.assertEqual(self._stocks(), [90, 80, 70])
+
+    def test_descuento_en_sentencias_fijas(self):
+        with CaptureQueriesContext(connection) as ctx:
+            descontar_insumos({insumo.id: 1 for insumo in self.insumos})
+
+        consultas = [q["sql"].split()[0] for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]]
+        # Un UPDATE para el stock y un INSERT para el kardex, sin importar cuántos
+        # insumos; en PostgreSQL antes un SELECT ... FOR UPDATE que los bloquea en orden.
+        bloqueo = ["SELECT"] if connection.features.has_select_for_update else []
+        self.assertEqual(consultas, bloqueo + ["UPDATE", "INSERT"])
+
+
+class DescuentoInsumosConcurrenteTests(TransactionTestCase):
+    OPERARIOS = 6
+    DESPACHOS_POR_OPERARIO = 5
+
+    def setUp(self):
+        categoria = CategoriaInsumo.objects.create(nombre="LEDs")
+        self.insumos = Insumo.objects.bulk_create(
+            Insumo(descripcion=f"Insumo {i}", categoria=categoria, stock=20) for i in range(3)
+        )
+
+    def test_varios_depositos_no_dejan_stock_negativo(self):
+        # 30 despachos de 1 unidad de cada insumo contra un stock de 20.
+        requeridos = {insumo.id: 1 for insumo in self.insumos}
+        exitos = []
+        rechazos = []
+        barrera = threading.Barrier(self.OPERARIOS)
+
+        def operario():
+            barrera.wait()
+            try:
+                for _ in range(self.DESPACHOS_POR_OPERARIO):
+                    while True:
+                        try:
+                            descontar_insumos(requeridos)
+                            exitos.append(1)
+                        except StockInsuficienteError:
+                            rechazos.append(1)
+                        except OperationalError:
+                            # La base de tests en memoria devuelve "table is locked"
+                            # en vez de esperar al otro escritor: reintentamos.
+                            continue
+                        break
+            finally:
+                close_old_connections()
+                connection.close()
+
+        hilos = [threading.Thread(target=operario) for _ in range(self.OPERARIOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(len(exitos), 20)
+        self.assertEqual(len(rechazos), 10)
+        self.assertEqual(
+            list(Insumo.objects.values_list("stock", flat=True).distinct()), [0]
+        )
+
+
+class KardexStockTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="deposito", password="x")
+        categoria = CategoriaInsumo.objects.create(nombre="LEDs")
+        self.insumo = Insumo.objects.create(descripcion="LED 10W", categoria=categoria, stock=100)
+        registrar_ajuste_stock(self.insumo, None)
+        self.proveedor = Proveedor.objects.create(nombre="Proveedor Test")
+
+    def test_recepcion_y_despacho_quedan_en_el_kardex(self):
+        self.client.force_login(self.user)
+        Insumo.objects.filter(id=self.insumo.id).update(cantidad_en_pedido=40)
+        oc = Orden.objects.create(
+            numero_orden="OC-00001",
+            proveedor=self.proveedor,
+            insumo_principal=self.insumo,
+            cantidad_principal=40,
+            estado="EN_TRANSITO",
+        )
+        self.client.post(reverse("App_LUMINOVA:deposito_recibir_pedido", args=[oc.id]))
+        descontar_insumos({self.insumo.id: 30}, referencia="OP-00001")
+
+        self.insumo.refresh_from_db()
+        self.assertEqual(self.insumo.stock, 110)
+        self.assertEqual(
+            list(
+                MovimientoStock.objects.filter(insumo=self.insumo)
+                .order_by("id")
+                .values_list("tipo", "cantidad")
+            ),
+            [("SALDO_INICIAL", 100), ("RECEPCION_OC", 40), ("ENVIO_OP", -30)],
+        )
+        self.assertEqual(conciliar_stock(), [])
+
+    def test_stock_en_fecha_usa_el_ultimo_corte(self):
+        antes = timezone.now()
+        descontar_insumos({self.insumo.id: 10})
+        corte = cerrar_saldos_stock()
+        descontar_insumos({self.insumo.id: 5})
+
+        self.assertEqual(corte.saldos.get(insumo=self.insumo).stock, 90)
+        self.assertEqual(stock_en_fecha(self.insumo, antes), 100)
+        self.assertEqual(stock_en_fecha(self.insumo, corte.fecha), 90)
+        with self.assertNumQueries(3):
+            self.assertEqual(stock_en_fecha(self.insumo, timezone.now()), 85)
+
+    def test_conciliar_detecta_y_ajusta_diferencias(self):
+        Insumo.objects.filter(id=self.insumo.id).update(stock=95)  # cambio sin movimiento
+
+        with self.assertRaises(CommandError):
+            call_command("conciliar_stock", stdout=io.StringIO())
+        call_command("conciliar_stock", "--ajustar", stdout=io.StringIO())
+
+        self.assertEqual(conciliar_stock(), [])
+        self.assertEqual(MovimientoStock.objects.filter(tipo="AJUSTE").get().cantidad, -5)
+
+    def test_movimientos_no_se_modifican(self):
+        movimiento = MovimientoStock.objects.get()
+        movimiento.cantidad = 1
+
+        with self.assertRaises(ValidationError):
+            movimiento.save()
+        with self.assertRaises(ValidationError):
+            movimiento.delete()
+
+    def test_articulo_con_historial_no_se_elimina(self):
+        self.client.force_login(self.user)
+        url = reverse("App_LUMINOVA:insumo_delete", args=[self.insumo.id])
+
+        response = self.client.get(url)
+        self.assertTrue(response.context["tiene_historial_stock"])
+        self.assertContains(response, "tiene movimientos de stock")
+
+        response = self.client.post(url, follow=True)
+        self.assertTrue(Insumo.objects.filter(id=self.insumo.id).exists())
+        self.assertIn("historial del kardex", " ".join(str(m) for m in response.context["messages"]))
+
+    def test_articulo_sin_movimientos_se_elimina(self):
+        self.client.force_login(self.user)
+        categoria = CategoriaProductoTerminado.objects.create(nombre="Luminarias")
+        producto = ProductoTerminado.objects.create(descripcion="Lámpara sin stock", categoria=categoria)
+        url = reverse("App_LUMINOVA:producto_terminado_delete", args=[producto.id])
+
+        self.assertFalse(self.client.get(url).context["tiene_historial_stock"])
+        self.client.post(url)
+        self.assertFalse(ProductoTerminado.objects.filter(id=producto.id).exists())
+
+
+class NecesidadesMRPTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.pendiente = EstadoOrden.objects.create(nombre=Estados.PENDIENTE)
+        self.completada = EstadoOrden.objects.create(nombre=Estados.COMPLETADA)
+        categoria = CategoriaInsumo.objects.create(nombre="LEDs")
+        self.led = Insumo.objects.create(
+            descripcion="LED", categoria=categoria, stock=30, cantidad_en_pedido=10, punto_reorden=0
+        )
+        self.driver = Insumo.objects.create(
+            descripcion="Driver", categoria=categoria, stock=100, punto_reorden=0
+        )
+        self.producto = ProductoTerminado.objects.create(
+            descripcion="Lámpara",
+            categoria=CategoriaProductoTerminado.objects.create(nombre="Luminarias"),
+        )
+        ComponenteProducto.objects.create(producto_terminado=self.producto, insumo=self.led, cantidad_necesaria=2)
+        ComponenteProducto.objects.create(producto_terminado=self.producto, insumo=self.driver, cantidad_necesaria=1)
+        self.hoy = timezone.localdate()
+        self.numero = 0
+
+    def _op(self, cantidad, fecha=None, estado=None, **extra):
+        self.numero += 1
+        return OrdenProduccion.objects.create(
+            numero_op=f"OP-{self.numero:05d}",
+            producto_a_producir=self.producto,
+            cantidad_a_producir=cantidad,
+            estado_op=estado or self.pendiente,
+            fecha_inicio_planificada=fecha,
+            **extra,
+        )
+
+    def test_netea_contra_stock_y_pedido_escalonado_por_fecha(self):
+        manana = self.hoy + timedelta(days=1)
+        self._op(5, fecha=manana)  # 10 LEDs
+        self._op(10, fecha=self.hoy)  # 20 LEDs
+        self._op(10, fecha=manana)  # 20 LEDs
+        self._op(50, estado=self.completada)  # finalizada: no cuenta
+        self._op(50, fecha_inicio_real=timezone.now())  # insumos ya despachados
+
+        necesidades = calcular_necesidades_mrp()
+
+        led = necesidades[self.led.id]
+        self.assertEqual((led.bruto, led.neto), (50, 10))
+        self.assertEqual(
+            [(p.fecha, p.bruto, p.neto) for p in led.periodos],
+            [(self.hoy, 20, 0), (manana, 30, 10)],
+        )
+        self.assertEqual(led.fecha_primer_faltante, manana)
+        self.assertEqual((necesidades[self.driver.id].bruto, necesidades[self.driver.id].neto), (25, 0))
+
+    def test_ops_sin_fecha_planificada_van_primero(self):
+        self._op(10, fecha=self.hoy)
+        self._op(15)
+
+        led = calcular_necesidades_mrp()[self.led.id]
+
+        self.assertEqual(
+            [(p.fecha, p.neto) for p in led.periodos], [(None, 0), (self.hoy, 10)]
+        )
+
+    def test_consultas_constantes_con_muchas_ops(self):
+        OrdenProduccion.objects.bulk_create(
+            OrdenProduccion(
+                numero_op=f"OP-M{i:05d}",
+                producto_a_producir=self.producto,
+                cantidad_a_producir=1,
+                estado_op=self.pendiente,
+                fecha_inicio_planificada=self.hoy + timedelta(days=i % 30),
+            )
+            for i in range(1000)
+        )
+        estados.ids(*Estados.FINALIZADOS)  # calienta el registro de estados
+
+        with self.assertNumQueries(2):
+            necesidades = calcular_necesidades_mrp()
+
+        self.assertEqual(necesidades[self.led.id].bruto, 2000)
+        self.assertEqual(necesidades[self.led.id].neto, 2000 - 40)
+        self.assertEqual(len(necesidades[self.led.id].periodos), 30)
+
+    def test_desglose_de_compras_incluye_faltantes_de_ops(self):
+        self.client.force_login(User.objects.create_superuser(username="compras", password="x"))
+        Orden.objects.create(
+            numero_orden="OC-00001",
+            proveedor=Proveedor.objects.create(nombre="Proveedor Test"),
+            insumo_principal=self.led,
+            estado="APROBADA",
+        )
+        self._op(25, fecha=self.hoy)
+
+        response = self.client.get(reverse("App_LUMINOVA:compras_desglose"))
+
+        insumos = response.context["insumos_criticos_list_con_estado"]
+        self.assertEqual(insumos, [self.led])
+        self.assertEqual(insumos[0].necesidad_mrp.neto, 10)
+        self.assertContains(response, self.hoy.strftime("%d/%m/%Y"))
+
+
+class SugerenciaOrdenesCompraTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.pendiente = EstadoOrden.objects.create(nombre=Estados.PENDIENTE)
+        self.categoria = CategoriaInsumo.objects.create(nombre="LEDs")
+        self.barato = Proveedor.objects.create(nombre="Barato")
+        self.rapido = Proveedor.objects.create(nombre="Rápido")
+        self.hoy = timezone.localdate()
+
+    def _insumo(self, descripcion, stock=0, punto_reorden=0, ofertas=()):
+        insumo = Insumo.objects.create(
+            descripcion=descripcion, categoria=self.categoria, stock=stock, punto_reorden=punto_reorden
+        )
+        for proveedor, precio, dias, multiplo in ofertas:
+            OfertaProveedor.objects.create(
+                insumo=insumo,
+                proveedor=proveedor,
+                precio_unitario_compra=precio,
+                tiempo_entrega_estimado_dias=dias,
+                multiplo_pedido=multiplo,
+            )
+        return insumo
+
+    def _op_que_consume(self, insumo, cantidad, dias):
+        producto = ProductoTerminado.objects.create(
+            descripcion=f"Producto {insumo.descripcion}",
+            categoria=CategoriaProductoTerminado.objects.get_or_create(nombre="Luminarias")[0],
+        )
+        ComponenteProducto.objects.create(producto_terminado=producto, insumo=insumo, cantidad_necesaria=1)
+        OrdenProduccion.objects.create(
+            numero_op=f"OP-{producto.id:05d}",
+            producto_a_producir=producto,
+            cantidad_a_producir=cantidad,
+            estado_op=self.pendiente,
+            fecha_inicio_planificada=self.hoy + timedelta(days=dias),
+        )
+
+    def test_elige_la_oferta_mas_barata_que_llega_a_tiempo(self):
+        ofertas = [(self.barato, 5, 10, 1), (self.rapido, 8, 2, 1)]
+        a_tiempo = self._insumo("Con margen", ofertas=ofertas)
+        urgente = self._insumo("Urgente", ofertas=ofertas)
+        sin_llegar = self._insumo("Imposible", ofertas=ofertas)
+        self._op_que_consume(a_tiempo, 10, dias=15)
+        self._op_que_consume(urgente, 10, dias=3)
+        self._op_que_consume(sin_llegar, 10, dias=1)
+
+        propuestas = {p.insumo: p for p in sugerir_ordenes_compra().propuestas}
+
+        self.assertEqual(propuestas[a_tiempo].oferta.proveedor, self.barato)
+        self.assertEqual(propuestas[urgente].oferta.proveedor, self.rapido)
+        self.assertFalse(propuestas[urgente].atrasada)
+        self.assertEqual(propuestas[sin_llegar].oferta.proveedor, self.rapido)
+        self.assertTrue(propuestas[sin_llegar].atrasada)
+
+    def test_redondea_al_multiplo_y_repone_punto_de_reorden(self):
+        insumo = self._insumo("Cinta", stock=30, punto_reorden=20, ofertas=[(self.barato, 1, 0, 25)])
+        self._op_que_consume(insumo, 40, dias=5)  # 30 - 40 + 20 -> faltan 30
+        reposicion = self._insumo("Tornillos", stock=5, punto_reorden=12, ofertas=[(self.barato, 1, 30, 1)])
+        self._insumo("Sin proveedor", punto_reorden=5)
+
+        sugerencia = sugerir_ordenes_compra()
+
+        propuestas = {p.insumo: p for p in sugerencia.propuestas}
+        self.assertEqual((propuestas[insumo].faltante, propuestas[insumo].cantidad), (30, 50))
+        self.assertEqual(propuestas[insumo].fecha_necesaria, self.hoy + timedelta(days=5))
+        self.assertEqual(propuestas[reposicion].cantidad, 7)
+        self.assertIsNone(propuestas[reposicion].fecha_necesaria)
+        self.assertFalse(propuestas[reposicion].atrasada)
+        self.assertEqual([i.descripcion for i in sugerencia.sin_oferta], ["Sin proveedor"])
+
+    def test_genera_borradores_y_actualiza_cantidad_en_pedido(self):
+        cinta = self._insumo("Cinta", punto_reorden=10, ofertas=[(self.barato, 2, 0, 4)])
+        led = self._insumo("LED", punto_reorden=5, ofertas=[(self.rapido, 3, 0, 1)])
+
+        sugerencia = generar_ordenes_compra_sugeridas()
+
+        ordenes = Orden.objects.order_by("numero_orden")
+        self.assertEqual(
+            [(o.numero_orden, o.estado, o.insumo_principal, o.cantidad_principal, o.total_orden_compra) for o in ordenes],
+            [("OC-00001", "BORRADOR", cinta, 12, 24), ("OC-00002", "BORRADOR", led, 5, 15)],
+        )
+        self.assertEqual(sugerencia.propuestas[0].orden, ordenes[0])
+        cinta.refresh_from_db()
+        led.refresh_from_db()
+        self.assertEqual((cinta.cantidad_en_pedido, led.cantidad_en_pedido), (12, 5))
+        # Una segunda corrida no duplica los borradores.
+        self.assertEqual(sugerir_ordenes_compra().propuestas, [])
+
+    def test_consultas_no_dependen_de_los_insumos(self):
+        def crear(cantidad, inicio):
+            for i in range(inicio, inicio + cantidad):
+                insumo = self._insumo(f"Insumo {i}", punto_reorden=10, ofertas=[(self.barato, 1, 0, 1)])
+                self._op_que_consume(insumo, 5, dias=i)
+
+        crear(1, 0)
+        generar_ordenes_compra_sugeridas()  # crea la secuencia de OC y calienta el registro de estados
+        crear(2, 1)
+        with CaptureQueriesContext(connection) as pocas:
+            generar_ordenes_compra_sugeridas()
+        crear(20, 3)
+        with CaptureQueriesContext(connection) as muchas:
+            generar_ordenes_compra_sugeridas()
+
+        self.assertEqual(Orden.objects.count(), 23)
+        self.assertEqual(len(pocas), len(muchas))
+
+    def test_vista_genera_todas_las_ocs_con_un_post(self):
+        self.client.force_login(User.objects.create_superuser(username="compras", password="x"))
+        self._insumo("Cinta", punto_reorden=10, ofertas=[(self.barato, 2, 0, 1)])
+        self._insumo("LED", punto_reorden=5, ofertas=[(self.rapido, 3, 0, 1)])
+        url = reverse("App_LUMINOVA:compras_sugerencias_oc")
+
+        response = self.client.get(url)
+        self.assertEqual(len(response.context["propuestas"]), 2)
+        self.assertFalse(Orden.objects.exists())
+
+        response = self.client.post(url)
+
+        self.assertRedirects(response, reverse("App_LUMINOVA:compras_lista_oc"))
+        self.assertEqual(Orden.objects.filter(estado="BORRADOR").count(), 2)
+
+
+class CambioEstadoOCsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.proveedor = Proveedor.objects.create(nombre="Proveedor Test")
+        self.insumo = Insumo.objects.create(
+            descripcion="LED", categoria=CategoriaInsumo.objects.create(nombre="LEDs")
+        )
+
+    def _ocs(self, cantidad, estado, inicio=0, **extra):
+        return Orden.objects.bulk_create(
+            Orden(
+                numero_orden=f"OC-{inicio + i:05d}",
+                proveedor=self.proveedor,
+                insumo_principal=self.insumo,
+                cantidad_principal=10,
+                estado=estado,
+                **extra,
+            )
+            for i in range(cantidad)
+        )
+
+    def test_avanza_las_validas_y_reporta_cada_rechazo(self):
+        enviadas = self._ocs(2, "ENVIADA_PROVEEDOR", numero_tracking="TRK-1")
+        sin_tracking = self._ocs(1, "ENVIADA_PROVEEDOR", inicio=2)[0]
+        borrador = self._ocs(1, "BORRADOR", inicio=3)[0]
+
+        resultado = cambiar_estado_ocs(Orden.objects.all(), "EN_TRANSITO")
+
+        self.assertEqual(resultado.actualizadas, ["OC-00000", "OC-00001"])
+        self.assertEqual(
+            resultado.rechazadas,
+            [
+                (sin_tracking.numero_orden, "No tiene número de tracking."),
+                (borrador.numero_orden, "Está en 'Borrador'; debe estar en 'Enviada al Proveedor'."),
+            ],
+        )
+        self.assertEqual(
+            set(Orden.objects.filter(estado="EN_TRANSITO").values_list("id", flat=True)),
+            {o.id for o in enviadas},
+        )
+
+    def test_circuito_completo_y_estado_fuera_del_circuito(self):
+        oc = self._ocs(1, "BORRADOR", numero_tracking="TRK-1")[0]
+        for estado in ("APROBADA", "ENVIADA_PROVEEDOR", "EN_TRANSITO"):
+            self.assertEqual(cambiar_estado_ocs([oc.id], estado).actualizadas, [oc.numero_orden])
+        with self.assertRaises(TransicionOCInvalida):
+            cambiar_estado_ocs([oc.id], "COMPLETADA")
+
+    def test_validacion_y_update_en_una_consulta_cada_uno(self):
+        self._ocs(300, "BORRADOR")
+
+        with CaptureQueriesContext(connection) as ctx:
+            resultado = cambiar_estado_ocs(Orden.objects.all(), "APROBADA")
+
+        self.assertEqual(len(resultado.actualizadas), 300)
+        sentencias = [
+            q["sql"].split()[0] for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]
+        ]
+        self.assertEqual(sentencias, ["SELECT", "UPDATE"])
+
+    def test_endpoint_formulario_y_json(self):
+        self.client.force_login(User.objects.create_superuser(username="compras", password="x"))
+        borradores = self._ocs(3, "BORRADOR")
+        url = reverse("App_LUMINOVA:compras_cambiar_estado_ocs")
+
+        response = self.client.post(
+            url, {"nuevo_estado": "APROBADA", "oc_ids": [borradores[0].id, borradores[1].id]}
+        )
+        self.assertRedirects(response, reverse("App_LUMINOVA:compras_lista_oc"))
+        self.assertEqual(Orden.objects.filter(estado="APROBADA").count(), 2)
+
+        response = self.client.post(
+            url,
+            {"nuevo_estado": "ENVIADA_PROVEEDOR", "filtro": {"proveedor_id": self.proveedor.id}},
+            content_type="application/json",
+        )
+        self.assertEqual(
+            response.json(),
+            {
+                "success": True,
+                "actualizadas": ["OC-00000", "OC-00001"],
+                "rechazadas": [
+                    {
+                        "numero_orden": "OC-00002",
+                        "motivo": "Está en 'Borrador'; debe estar en 'Aprobada'.",
+                    }
+                ],
+            },
+        )
+
+        response = self.client.post(
+            url, {"nuevo_estado": "CANCELADA", "oc_ids": [1]}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_json_con_tipos_invalidos_responde_400(self):
+        self.client.force_login(User.objects.create_superuser(username="compras", password="x"))
+        oc = self._ocs(1, "BORRADOR")[0]
+        url = reverse("App_LUMINOVA:compras_cambiar_estado_ocs")
+
+        for cuerpo in (
+            {"nuevo_estado": "APROBADA", "filtro": {"proveedor_id": "abc"}},
+            {"nuevo_estado": ["APROBADA"], "oc_ids": [oc.id]},
+            {"nuevo_estado": "APROBADA", "oc_ids": str(oc.id)},
+            {"nuevo_estado": "APROBADA", "oc_ids": [True]},
+            {"nuevo_estado": "APROBADA", "filtro": ["BORRADOR"]},
+            ["APROBADA"],
+        ):
+            with self.subTest(cuerpo=cuerpo):
+                response = self.client.post(url, cuerpo, content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()["success"])
+        self.assertFalse(Orden.objects.filter(estado="APROBADA").exists())
+
+
+class RecepcionOrdenCompraTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(username="deposito", password="x")
+        self.proveedor = Proveedor.objects.create(nombre="Proveedor Test")
+        self.categoria = CategoriaInsumo.objects.create(nombre="LEDs")
+        self.numero = 0
+
+    def _oc(self, lineas, estado="EN_TRANSITO"):
+        """OC con una línea por cantidad de `lineas`, cada una con su insumo en pedido."""
+        self.numero += 1
+        insumos = Insumo.objects.bulk_create(
+            Insumo(
+                descripcion=f"Insumo {self.numero}-{i}",
+                categoria=self.categoria,
+                stock=10,
+                cantidad_en_pedido=cantidad,
+            )
+            for i, cantidad in enumerate(lineas)
+        )
+        oc = Orden.objects.create(
+            numero_orden=f"OC-{self.numero:05d}", proveedor=self.proveedor, estado=estado
+        )
+        items = ItemOrdenCompra.objects.bulk_create(
+            ItemOrdenCompra(orden=oc, insumo=insumo, cantidad=cantidad, precio_unitario_compra=2)
+            for insumo, cantidad in zip(insumos, lineas)
+        )
+        return oc, insumos, items
+
+    def test_recepcion_parcial_y_luego_completa(self):
+        oc, (led, driver, cinta), (item_led, item_driver, item_cinta) = self._oc([40, 20, 5])
+
+        resultado = recibir_orden_compra(
+            oc, {item_led.id: 40, item_driver.id: 15}, usuario=self.user
+        )
+
+        self.assertEqual(resultado.nuevo_estado, "RECIBIDA_PARCIAL")
+        oc.refresh_from_db()
+        self.assertEqual(oc.estado, "RECIBIDA_PARCIAL")
+        self.assertEqual(
+            list(Insumo.objects.order_by("id").values_list("stock", "cantidad_en_pedido")),
+            [(50, 0), (25, 5), (10, 5)],
+        )
+        self.assertEqual(
+            list(MovimientoStock.objects.order_by("id").values_list("insumo_id", "cantidad", "tipo")),
+            [(led.id, 40, "RECEPCION_OC"), (driver.id, 15, "RECEPCION_OC")],
+        )
+
+        resultado = recibir_orden_compra(oc)  # el resto de lo pendiente
+
+        self.assertTrue(resultado.completa)
+        self.assertEqual({i.id: c for i, c in resultado.recibido.items()}, {item_driver.id: 5, item_cinta.id: 5})
+        self.assertEqual(Orden.objects.get(id=oc.id).estado, "COMPLETADA")
+        self.assertEqual(
+            list(ItemOrdenCompra.objects.order_by("id").values_list("cantidad_recibida", flat=True)),
+            [40, 20, 5],
+        )
+
+    def test_rechaza_recibir_mas_de_lo_pendiente_sin_tocar_nada(self):
+        oc, _, (item_a, item_b) = self._oc([10, 10])
+
+        with self.assertRaises(RecepcionOCError) as ctx:
+            recibir_orden_compra(oc, {item_a.id: 5, item_b.id: 11})
+
+        self.assertEqual(len(ctx.exception.errores), 1)
+        self.assertEqual(sum(ItemOrdenCompra.objects.values_list("cantidad_recibida", flat=True)), 0)
+        self.assertFalse(MovimientoStock.objects.exists())
+        with self.assertRaises(RecepcionOCError):
+            recibir_orden_compra(self._oc([10], estado="APROBADA")[0])
+
+    def test_consultas_no_dependen_de_las_lineas(self):
+        chica = self._oc([5] * 2)[0]
+        grande = self._oc([5] * 30)[0]
+
+        with CaptureQueriesContext(connection) as pocas:
+            recibir_orden_compra(chica)
+        with CaptureQueriesContext(connection) as muchas:
+            recibir_orden_compra(grande)
+
+        self.assertEqual(len(pocas), len(muchas))
+        self.assertEqual(Insumo.objects.filter(stock=15).count(), 32)
+
+    def test_vistas_de_listado_no_dependen_de_las_lineas(self):
+        self.client.force_login(self.user)
+        urls = [
+            reverse("App_LUMINOVA:compras_lista_oc"),
+            reverse("App_LUMINOVA:compras_seguimiento"),
+            reverse("App_LUMINOVA:compras_desglose"),
+            reverse("App_LUMINOVA:deposito_recepcion_pedidos"),
+        ]
+        self._oc([5] * 2)
+        for url in urls:
+            self.client.get(url)  # calienta cachés de notificaciones y estados
+
+        consultas = {}
+        for lineas in (1, 25):
+            self._oc([5] * lineas)
+            for url in urls:
+                with CaptureQueriesContext(connection) as ctx:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                consultas.setdefault(url, []).append(len(ctx))
+        for url, (pocas, muchas) in consultas.items():
+            self.assertEqual(pocas, muchas, url)
+
+    def test_vista_recibe_las_cantidades_del_formulario(self):
+        self.client.force_login(self.user)
+        oc, (led, driver), (item_led, item_driver) = self._oc([40, 20])
+
+        response = self.client.post(
+            reverse("App_LUMINOVA:deposito_recibir_pedido", args=[oc.id]),
+            {f"cantidad_{item_led.id}": "40", f"cantidad_{item_driver.id}": "0"},
+        )
+
+        self.assertRedirects(response, reverse("App_LUMINOVA:deposito_recepcion_pedidos"))
+        self.assertEqual(Orden.objects.get(id=oc.id).estado, "RECIBIDA_PARCIAL")
+        led.refresh_from_db()
+        driver.refresh_from_db()
+        self.assertEqual((led.stock, driver.stock), (50, 10))
+
+    def test_oc_de_un_insumo_mantiene_su_linea(self):
+        insumo = Insumo.objects.create(descripcion="LED", categoria=self.categoria)
+        otro = Insumo.objects.create(descripcion="Driver", categoria=self.categoria)
+        oc = Orden.objects.create(
+            numero_orden="OC-00099",
+            proveedor=self.proveedor,
+            insumo_principal=insumo,
+            cantidad_principal=10,
+            precio_unitario_compra=3,
+        )
+        self.assertEqual(
+            list(oc.items_oc.values_list("insumo_id", "cantidad", "subtotal")), [(insumo.id, 10, 30)]
+        )
+
+        oc.insumo_principal = otro
+        oc.cantidad_principal = 4
+        oc.save()
+
+        self.assertEqual(list(oc.items_oc.values_list("insumo_id", "cantidad")), [(otro.id, 4)])
+        self.assertEqual(Orden.objects.get(id=oc.id).total_orden_compra, 12)
+
+
+class OrdenCompraAdminTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(username="admin", password="x")
+        self.client.force_login(self.user)
+        categoria = CategoriaInsumo.objects.create(nombre="LEDs")
+        self.led, self.driver = Insumo.objects.bulk_create(
+            Insumo(descripcion=nombre, categoria=categoria, stock=0, cantidad_en_pedido=en_pedido)
+            for nombre, en_pedido in (("LED", 10), ("Driver", 4))
+        )
+        self.oc = Orden.objects.create(
+            numero_orden="OC-00001",
+            proveedor=Proveedor.objects.create(nombre="Proveedor Test"),
+            estado="BORRADOR",
+        )
+        self.item_led, self.item_driver = ItemOrdenCompra.objects.bulk_create(
+            ItemOrdenCompra(orden=self.oc, insumo=insumo, cantidad=cantidad, precio_unitario_compra=2)
+            for insumo, cantidad in ((self.led, 10), (self.driver, 4))
+        )
+        self.url = reverse("admin:App_LUMINOVA_orden_change", args=[self.oc.id])
+
+    def _datos_formulario(self):
+        """POST que reenvía el formulario de cambio tal como lo muestra el admin."""
+        response = self.client.get(self.url)
+        formularios = [response.context["adminform"].form]
+        for inline in response.context["inline_admin_formsets"]:
+            formularios += [inline.formset.management_form, *inline.formset.forms]
+        datos = {}
+        for formulario in formularios:
+            for nombre in formulario.fields:
+                valor = formulario[nombre].value()
+                if valor is not None:
+                    datos[formulario.add_prefix(nombre)] = valor
+        return datos
+
+    def test_editar_lineas_ajusta_cantidad_en_pedido(self):
+        datos = self._datos_formulario()
+        datos["items_oc-0-cantidad"] = 15
+        datos["items_oc-1-DELETE"] = "on"
+
+        response = self.client.post(self.url, datos)
+
+        self.assertEqual(response.status_code, 302)
+        self.led.refresh_from_db()
+        self.driver.refresh_from_db()
+        self.assertEqual((self.led.cantidad_en_pedido, self.driver.cantidad_en_pedido), (15, 0))
+
+    def test_cantidad_menor_a_lo_recibido_es_error_del_formulario(self):
+        ItemOrdenCompra.objects.filter(id=self.item_led.id).update(cantidad_recibida=6)
+        datos = self._datos_formulario()
+        datos["items_oc-0-cantidad"] = 5
+
+        response = self.client.post(self.url, datos)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "No puede ser menor a lo ya recibido (6).")
+        self.item_led.refresh_from_db()
+        self.assertEqual(self.item_led.cantidad, 10)
+
+    def test_lineas_de_solo_lectura_fuera_de_borrador(self):
+        Orden.objects.filter(id=self.oc.id).update(estado="EN_TRANSITO")
+
+        response = self.client.get(self.url)
+
+        inline = response.context["inline_admin_formsets"][0]
+        self.assertIn("cantidad", inline.readonly_fields)
+        self.assertFalse(inline.has_add_permission)
+        self.assertFalse(inline.has_delete_permission)
+
+
+@override_settings(AUDITORIA_ESCRITURA={"ASINCRONA": True, "TAMANO_LOTE": 1000, "INTERVALO": 3600})
+class AuditoriaAccesoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        vaciar_auditoria()
+        self.admin = User.objects.create_superuser(username="admin", password="clave-segura-1")
+        self.operario = User.objects.create_user(username="operario", password="x")
+
+    def test_login_no_escribe_la_auditoria_en_el_request(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                reverse("App_LUMINOVA:login"),
+                {"username": "admin", "password": "clave-segura-1"},
+                HTTP_USER_AGENT="Navegador de prueba",
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(any("auditoriaacceso" in q["sql"].lower() for q in ctx.captured_queries))
+        self.assertEqual(escritor_auditoria.pendientes, 1)
+        antes_de_escribir = timezone.now()
+
+        self.assertEqual(vaciar_auditoria(), 1)
+
+        registro = AuditoriaAcceso.objects.get()
+        self.assertEqual(
+            (registro.usuario, registro.accion, registro.user_agent),
+            (self.admin, ACCION_INICIO_SESION, "Navegador de prueba"),
+        )
+        # Conserva la hora del evento, no la del INSERT en lote.
+        self.assertLessEqual(registro.fecha_hora, antes_de_escribir)
+
+    def test_los_pendientes_se_insertan_en_un_solo_lote(self):
+        for i in range(120):
+            registrar_acceso(self.operario, ACCION_INICIO_SESION, ip_address=f"10.0.0.{i}")
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(vaciar_auditoria(), 120)
+
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(AuditoriaAcceso.objects.count(), 120)
+
+    def test_lote_fallido_por_base_caida_vuelve_a_la_cola(self):
+        for i in range(3):
+            registrar_acceso(self.operario, ACCION_INICIO_SESION, ip_address=f"10.0.0.{i}")
+
+        with mock.patch.object(
+            AuditoriaAcceso.objects, "bulk_create", side_effect=OperationalError("sin conexión")
+        ), self.assertLogs("App_LUMINOVA.services.auditoria_services", "ERROR"):
+            self.assertEqual(vaciar_auditoria(), 0)
+        self.assertEqual(escritor_auditoria.pendientes, 3)
+
+        self.assertEqual(vaciar_auditoria(), 3)
+        self.assertEqual(AuditoriaAcceso.objects.count(), 3)
+
+    @override_settings(
+        AUDITORIA_ESCRITURA={"ASINCRONA": True, "TAMANO_LOTE": 1000, "INTERVALO": 3600, "MAXIMO_PENDIENTES": 2}
+    )
+    def test_la_cola_de_reintentos_tiene_tope(self):
+        for i in range(3):
+            registrar_acceso(self.operario, ACCION_INICIO_SESION, ip_address=f"10.0.0.{i}")
+
+        with mock.patch.object(
+            AuditoriaAcceso.objects, "bulk_create", side_effect=OperationalError("sin conexión")
+        ), self.assertLogs("App_LUMINOVA.services.auditoria_services", "ERROR"):
+            vaciar_auditoria()
+
+        self.assertEqual(vaciar_auditoria(), 2)
+        self.assertEqual(
+            sorted(AuditoriaAcceso.objects.values_list("ip_address", flat=True)),
+            ["10.0.0.1", "10.0.0.2"],
+        )
+
+    def test_registro_invalido_no_descarta_el_resto_del_lote(self):
+        registrar_acceso(self.operario, ACCION_INICIO_SESION, ip_address="10.0.0.1")
+        registrar_acceso(self.operario, None)
+        registrar_acceso(self.operario, ACCION_INICIO_SESION, ip_address="10.0.0.3")
+
+        with self.assertLogs("App_LUMINOVA.services.auditoria_services", "ERROR"):
+            self.assertEqual(vaciar_auditoria(), 2)
+
+        self.assertEqual(escritor_auditoria.pendientes, 0)
+        self.assertEqual(
+            sorted(AuditoriaAcceso.objects.values_list("ip_address", flat=True)),
+            ["10.0.0.1", "10.0.0.3"],
+        )
+
+    def _registros(self, cantidad):
+        inicio = timezone.now() - timedelta(days=30)
+        AuditoriaAcceso.objects.bulk_create(
+            AuditoriaAcceso(
+                usuario=self.operario if i % 3 else self.admin,
+                accion=ACCION_INICIO_SESION,
+                ip_address="192.168.0.10" if i % 2 else "192.168.0.20",
+                fecha_hora=inicio + timedelta(minutes=i // 2),  # fechas repetidas de a pares
+            )
+            for i in range(cantidad)
+        )
+
+    def test_paginacion_por_clave_recorre_todo_sin_repetir(self):
+        self._registros(130)
+        self.client.force_login(self.admin)
+        url = reverse("App_LUMINOVA:auditoria")
+
+        vistos, cursor, consultas = [], None, []
+        while True:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, {"despues": cursor} if cursor else {})
+            consultas.append(len(ctx))
+            vistos += [r.id for r in response.context["auditorias"]]
+            cursor = response.context["cursor_siguiente"]
+            if not cursor:
+                break
+
+        self.assertEqual(len(vistos), 130)
+        self.assertEqual(len(set(vistos)), 130)
+        self.assertEqual(
+            vistos, list(AuditoriaAcceso.objects.order_by("-fecha_hora", "-id").values_list("id", flat=True))
+        )
+        self.assertEqual(len(set(consultas[1:])), 1)
+
+    def test_filtros_por_usuario_ip_y_fecha(self):
+        self._registros(60)
+        self.client.force_login(self.admin)
+
+        response = self.client.get(
+            reverse("App_LUMINOVA:auditoria"),
+            {"usuario": self.admin.id, "ip_address": "192.168.0.20"},
+        )
+
+        registros = response.context["auditorias"]
+        esperados = AuditoriaAcceso.objects.filter(usuario=self.admin, ip_address="192.168.0.20")
+        self.assertEqual({r.id for r in registros}, set(esperados.values_list("id", flat=True)))
+        self.assertIn("usuario=", response.context["filtros_query"])
+
+        response = self.client.get(
+            reverse("App_LUMINOVA:auditoria"),
+            {"fecha_desde": (timezone.localdate() + timedelta(days=1)).isoformat()},
+        )
+        self.assertEqual(list(response.context["auditorias"]), [])
+
+
+class ArchivadoHistorialTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="ventas", password="x")
+        self.cliente = Cliente.objects.create(nombre="Cliente A")
+        self.ahora = timezone.now()
+        self.ovs = OrdenVenta.objects.bulk_create(
+            OrdenVenta(numero_ov=f"OV-{i:05d}", cliente=self.cliente) for i in range(3)
+        )
+
+    def _eventos(self, ov, dias_atras):
+        eventos = HistorialOV.objects.bulk_create(
+            HistorialOV(
+                orden_venta=ov, descripcion=f"Evento de hace {d} días", realizado_por=self.user
+            )
+            for d in dias_atras
+        )
+        for evento, d in zip(eventos, dias_atras):
+            HistorialOV.objects.filter(id=evento.id).update(
+                fecha_evento=self.ahora - timedelta(days=d)
+            )
+
+    def test_fecha_corte_respeta_fin_de_mes(self):
+        from datetime import date
+
+        corte = timezone.localtime(fecha_corte(1, hoy=date(2025, 3, 31)))
+        self.assertEqual((corte.date(), corte.hour), (date(2025, 2, 28), 0))
+        self.assertEqual(
+            timezone.localtime(fecha_corte(14, hoy=date(2025, 1, 15))).date(), date(2023, 11, 15)
+        )
+
+    def test_comando_archiva_y_la_linea_de_tiempo_sigue_completa(self):
+        ov, otra, sin_viejos = self.ovs
+        self._eventos(ov, [900, 500, 400, 10, 1])
+        self._eventos(otra, [380])
+        self._eventos(sin_viejos, [5])
+        antes = [(e.fecha_evento, e.descripcion) for e in historial_ov(ov)]
+
+        out = io.StringIO()
+        call_command(
+            "archivar_historial", "--meses", "12", "--solo", "historial", "--lote", "1", stdout=out
+        )
+
+        self.assertIn("4 eventos archivados (2 OVs)", out.getvalue())
+        self.assertEqual(HistorialOV.objects.count(), 3)
+        resumen = HistorialOVArchivado.objects.get(orden_venta=ov)
+        self.assertEqual(resumen.cantidad_eventos, 3)
+        self.assertEqual(resumen.primer_evento, self.ahora - timedelta(days=900))
+        self.assertFalse(HistorialOVArchivado.objects.filter(orden_venta=sin_viejos).exists())
+
+        historial = historial_ov(ov)
+        self.assertEqual([(e.fecha_evento, e.descripcion) for e in historial], antes)
+        self.assertEqual([e.archivado for e in historial], [False, False, True, True, True])
+        self.assertEqual({e.usuario for e in historial}, {"ventas"})
+
+        # Una segunda corrida fusiona con lo ya archivado de la OV.
+        HistorialOV.objects.filter(orden_venta=ov).update(fecha_evento=self.ahora - timedelta(days=1000))
+        call_command("archivar_historial", "--solo", "historial", stdout=io.StringIO())
+        resumen.refresh_from_db()
+        self.assertEqual(resumen.cantidad_eventos, 5)
+        self.assertEqual(
+            [e.fecha_evento for e in historial_ov(ov)],
+            [self.ahora - timedelta(days=d) for d in (400, 500, 900, 1000, 1000)],
+        )
+        self.assertFalse(HistorialOV.objects.filter(orden_venta=ov).exists())
+
+    def test_detalle_ov_muestra_lo_archivado_con_consultas_constantes(self):
+        ov = self.ovs[0]
+        self._eventos(ov, [800, 2])
+        call_command("archivar_historial", "--solo", "historial", stdout=io.StringIO())
+        self.client.force_login(self.user)
+        url = reverse("App_LUMINOVA:ventas_detalle_ov", args=[ov.id])
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as pocos:
+            response = self.client.get(url)
+        self.assertContains(response, "Evento de hace 800 días")
+        self.assertContains(response, "Evento de hace 2 días")
+
+        self._eventos(ov, range(300, 700))
+        call_command("archivar_historial", "--solo", "historial", stdout=io.StringIO())
+        with CaptureQueriesContext(connection) as muchos:
+            self.client.get(url)
+        self.assertEqual(len(pocos), len(muchos))
+
+    def test_auditoria_archivada_por_dia_y_consultable(self):
+        otro = User.objects.create_user(username="operario", password="x")
+        registros = AuditoriaAcceso.objects.bulk_create(
+            AuditoriaAcceso(
+                usuario=self.user if i % 2 else otro,
+                accion="Inicio de sesión" if i % 3 else "Cierre de sesión",
+                ip_address="10.0.0.1",
+                fecha_hora=self.ahora - timedelta(days=400 + i // 4),
+            )
+            for i in range(12)
+        )
+        AuditoriaAcceso.objects.create(usuario=self.user, accion="Inicio de sesión")
+        antes = historial_accesos(usuario=self.user)
+
+        call_command("archivar_historial", "--solo", "auditoria", "--dry-run", stdout=io.StringIO())
+        self.assertEqual(AuditoriaAcceso.objects.count(), 13)
+        out = io.StringIO()
+        call_command("archivar_historial", "--solo", "auditoria", stdout=out)
+
+        self.assertIn("12 registros archivados", out.getvalue())
+        self.assertEqual(AuditoriaAcceso.objects.count(), 1)
+        dias = AuditoriaAccesoArchivada.objects.all()
+        self.assertEqual(sum(d.cantidad_registros for d in dias), 12)
+        self.assertEqual(sum(d.inicios_sesion for d in dias), 8)
+        self.assertTrue(all(d.usuarios_distintos == 2 for d in dias))
+
+        despues = historial_accesos(usuario=self.user)
+        self.assertEqual(
+            [(a.fecha_hora, a.accion) for a in despues], [(a.fecha_hora, a.accion) for a in antes]
+        )
+        self.assertEqual(sum(a.archivado for a in despues), 6)
+        ultimo_dia = timezone.localtime(registros[0].fecha_hora).date()
+        self.assertEqual(len(historial_accesos(desde=ultimo_dia, hasta=ultimo_dia)), 4)
+
+
+class FacturaPDFTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        ajuste = override_settings(MEDIA_ROOT=self.media.name)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+        self.user = User.objects.create_superuser(username="ventas", password="x")
+        self.client.force_login(self.user)
+        cliente = Cliente.objects.create(nombre="Cliente A")
+        categoria = CategoriaProductoTerminado.objects.create(nombre="Luminarias")
+        producto = ProductoTerminado.objects.create(descripcion="Lámpara", categoria=categoria)
+        self.ov = OrdenVenta.objects.create(numero_ov="OV-00001", cliente=cliente, total_ov=100)
+        ItemOrdenVenta.objects.create(
+            orden_venta=self.ov,
+            producto_terminado=producto,
+            cantidad=2,
+            precio_unitario_venta=50,
+            subtotal=100,
+        )
+
+    def _emitir(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            factura = Factura.objects.create(
+                numero_factura="FACT-00001", orden_venta=self.ov, total_facturado=100
+            )
+        factura.refresh_from_db()
+        return factura
+
+    def _ruta(self, factura):
+        return os.path.join(self.media.name, factura.ruta_pdf)
+
+    def test_el_pdf_se_guarda_al_emitir_la_factura_bajo_su_hash(self):
+        factura = self._emitir()
+
+        self.assertEqual(factura.pdf_version, VERSION_PLANTILLA_FACTURA)
+        with open(self._ruta(factura), "rb") as archivo:
+            contenido = archivo.read()
+        self.assertTrue(contenido.startswith(b"%PDF"))
+        self.assertTrue(factura.ruta_pdf.endswith(f"{factura.pdf_sha256}.pdf"))
+        # Renderizado invariante: mismos datos, mismos bytes.
+        self.assertEqual(renderizar_pdf_factura(factura), contenido)
+
+    def test_ver_la_factura_lee_el_archivo_y_revalida_por_etag(self):
+        factura = self._emitir()
+        url = reverse("App_LUMINOVA:ventas_ver_factura_pdf", args=[factura.id])
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        contenido = b"".join(response.streaming_content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(response["ETag"], f'"{factura.pdf_sha256}"')
+        self.assertIn("private", response["Cache-Control"])
+        with open(self._ruta(factura), "rb") as archivo:
+            self.assertEqual(contenido, archivo.read())
+        # Sesión, usuario, chequeo de contraseña y la factura: nada de ítems ni OPs.
+        self.assertFalse(any("itemordenventa" in q["sql"].lower() for q in ctx.captured_queries))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f'"{factura.pdf_sha256}"')
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_factura_sin_pdf_se_renderiza_en_el_primer_pedido(self):
+        factura = Factura.objects.create(
+            numero_factura="FACT-00002", orden_venta=self.ov, total_facturado=100
+        )  # sin ejecutar on_commit
+        self.assertEqual(Factura.objects.get(id=factura.id).pdf_sha256, "")
+
+        response = self.client.get(reverse("App_LUMINOVA:ventas_ver_factura_pdf", args=[factura.id]))
+
+        self.assertEqual(response.status_code, 200)
+        factura.refresh_from_db()
+        self.assertTrue(os.path.exists(self._ruta(factura)))
+
+    def test_comando_regenera_versiones_viejas_y_archivos_faltantes(self):
+        factura = self._emitir()
+        generado = factura.pdf_generado
+        Factura.objects.filter(id=factura.id).update(pdf_version=0)
+
+        out = io.StringIO()
+        call_command("regenerar_pdfs_facturas", stdout=out)
+
+        self.assertIn("PDFs regenerados: 1", out.getvalue())
+        regenerada = Factura.objects.get(id=factura.id)
+        self.assertEqual(regenerada.pdf_version, VERSION_PLANTILLA_FACTURA)
+        # Mismo contenido: mismo hash y el Last-Modified no se mueve.
+        self.assertEqual((regenerada.pdf_sha256, regenerada.pdf_generado), (factura.pdf_sha256, generado))
+
+        os.remove(self._ruta(factura))
+        out = io.StringIO()
+        call_command("regenerar_pdfs_facturas", stdout=out)
+        self.assertIn("PDFs regenerados: 0", out.getvalue())
+        call_command("regenerar_pdfs_facturas", "--verificar-archivos", stdout=out)
+        self.assertTrue(os.path.exists(self._ruta(factura)))
+
+
+class ExportacionPDFsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        ajuste = override_settings(MEDIA_ROOT=self.media.name)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+        self.user = User.objects.create_superuser(username="contable", password="x")
+        self.client.force_login(self.user)
+        self.pendiente = EstadoOrden.objects.create(nombre=Estados.PENDIENTE)
+        cliente = Cliente.objects.create(nombre="Cliente & Hijos")
+        self.producto = ProductoTerminado.objects.create(
+            descripcion="Lámpara <LED>",
+            categoria=CategoriaProductoTerminado.objects.create(nombre="Luminarias"),
+        )
+        categoria = CategoriaInsumo.objects.create(nombre="LEDs")
+        for i in range(60):  # BOM larga: la lista de retiro ocupa varias páginas
+            ComponenteProducto.objects.create(
+                producto_terminado=self.producto,
+                insumo=Insumo.objects.create(
+                    descripcion=f"Insumo {i:02d}", categoria=categoria, stock=i
+                ),
+                cantidad_necesaria=2,
+            )
+        self.ahora = timezone.now()
+        self.facturas = []
+        for i in range(3):
+            ov = OrdenVenta.objects.create(numero_ov=f"OV-{i:05d}", cliente=cliente, total_ov=10)
+            self.facturas.append(
+                Factura.objects.create(
+                    numero_factura=f"FACT-{i:05d}",
+                    orden_venta=ov,
+                    total_facturado=10,
+                    fecha_emision=self.ahora - timedelta(days=40 * i),
+                )
+            )
+        self.ops = [
+            OrdenProduccion.objects.create(
+                numero_op=f"OP-{i:05d}",
+                producto_a_producir=self.producto,
+                cantidad_a_producir=5,
+                estado_op=self.pendiente,
+                fecha_inicio_planificada=timezone.localdate() + timedelta(days=i),
+            )
+            for i in range(2)
+        ]
+
+    def _zip(self, response):
+        return zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+
+    def test_zip_de_facturas_reusa_los_pdfs_guardados_y_guarda_los_nuevos(self):
+        guardada = self.facturas[0]
+        guardar_pdf_factura(guardada)
+        guardada.refresh_from_db()
+        url = reverse("App_LUMINOVA:exportar_documentos_pdf")
+
+        response = self.client.get(url, {"tipo": "facturas"})
+
+        self.assertEqual(response["Content-Type"], "application/zip")
+        self.assertTrue(response.streaming)
+        archivo_zip = self._zip(response)
+        self.assertEqual(
+            sorted(archivo_zip.namelist()),
+            ["factura_FACT-00000.pdf", "factura_FACT-00001.pdf", "factura_FACT-00002.pdf"],
+        )
+        with open(os.path.join(self.media.name, guardada.ruta_pdf), "rb") as archivo:
+            self.assertEqual(archivo_zip.read("factura_FACT-00000.pdf"), archivo.read())
+        self.assertFalse(Factura.objects.filter(pdf_sha256="").exists())
+
+        desde = (timezone.localdate() - timedelta(days=50)).isoformat()
+        response = self.client.get(url, {"tipo": "facturas", "fecha_desde": desde})
+        self.assertEqual(len(self._zip(response).namelist()), 2)
+
+    def test_ordenes_de_trabajo_en_un_solo_pdf(self):
+        response = self.client.get(
+            reverse("App_LUMINOVA:exportar_documentos_pdf"), {"tipo": "ops", "formato": "pdf"}
+        )
+
+        contenido = b"".join(response.streaming_content)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertIn("attachment", response["Content-Disposition"])
+        self.assertTrue(contenido.startswith(b"%PDF"))
+        # Dos OPs con una lista de retiro de 60 insumos: más de una página cada una.
+        self.assertGreaterEqual(contenido.count(b"/Type /Page\n"), 4)
+
+    def test_consultas_por_lote_no_por_documento(self):
+        def consultas(cantidad):
+            with CaptureQueriesContext(connection) as ctx:
+                ops = ordenes_para_exportar().filter(id__in=[op.id for op in self.ops[:cantidad]])
+                partes = list(exportar_zip("ops", ops, procesos=1))
+            self.assertTrue(zipfile.ZipFile(io.BytesIO(b"".join(partes))).namelist())
+            return len(ctx)
+
+        consultas(1)  # carga el registro de estados
+        self.assertEqual(consultas(1), consultas(2))
+
+    def test_filtros_invalidos_o_vacios_vuelven_con_mensaje(self):
+        url = reverse("App_LUMINOVA:exportar_documentos_pdf")
+        response = self.client.get(
+            url, {"tipo": "facturas", "fecha_desde": "2030-01-02", "fecha_hasta": "2030-01-01"}
+        )
+        self.assertRedirects(response, reverse("App_LUMINOVA:ventas_lista_ov"))
+        response = self.client.get(url, {"tipo": "facturas", "fecha_desde": "2030-01-01"}, follow=True)
+        self.assertContains(response, "No hay documentos para exportar")
+
+    def test_comando_renderiza_en_un_pool_de_procesos(self):
+        for i in range(3, 25):
+            ov = OrdenVenta.objects.create(
+                numero_ov=f"OV-{i:05d}", cliente=self.facturas[0].orden_venta.cliente
+            )
+            Factura.objects.create(
+                numero_factura=f"FACT-{i:05d}", orden_venta=ov, total_facturado=1
+            )
+        salida = os.path.join(self.media.name, "facturas.zip")
+
+        out = io.StringIO()
+        call_command("exportar_pdfs", "facturas", salida, "--procesos", "2", stdout=out)
+
+        self.assertIn("25 documentos exportados", out.getvalue())
+        with zipfile.ZipFile(salida) as archivo_zip:
+            self.assertEqual(len(archivo_zip.namelist()), 25)
+            self.assertEqual(
+                archivo_zip.read("factura_FACT-00007.pdf"),
+                renderizar_pdf_factura(Factura.objects.get(numero_factura="FACT-00007")),
+            )
+
+
+class BenchmarkVistasTests(TestCase):
+    """Presupuesto de consultas por vista, contra la línea base del benchmark."""
+
+    def setUp(self):
+        cache.clear()
+        self.base = cargar_base()
+        self.datos = generar_datos_sinteticos(
+            escala=self.base["escala"], semilla=self.base["semilla"]
+        )
+
+    def test_todas_las_rutas_tienen_linea_base(self):
+        self.assertEqual(
+            sorted(r.nombre for r in rutas_nombradas()), sorted(self.base["rutas"])
+        )
+
+    def test_ninguna_vista_supera_su_presupuesto_de_consultas(self):
+        # Un rol con acceso a todo y otro que choca con los controles de permisos;
+        # `benchmark_vistas --verificar` recorre los cinco.
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            mediciones = medir_rutas(
+                self.datos["usuarios"],
+                repeticiones=1,
+                memoria=False,
+                roles=["administrador", "ventas"],
+            )
+            # Los PDFs del recorrido no quedan en el MEDIA_ROOT configurado.
+            self.assertEqual(os.listdir(media), [])
+
+        self.assertEqual(len(mediciones), 2 * len(self.base["rutas"]))
+        self.assertEqual(excesos(mediciones, self.base), [])
+
+    def test_excesos_detecta_consultas_de_mas(self):
+        medicion = Medicion(
+            ruta="ventas_lista_ov",
+            rol="ventas",
+            url="/",
+            estado=200,
+            consultas=self.base["rutas"]["ventas_lista_ov"]["ventas"]["consultas"] + 1,
+            p50_ms=1,
+            p95_ms=1,
+        )
+        (mensaje,) = excesos([medicion], self.base)
+        self.assertIn("ventas_lista_ov [ventas]", mensaje)
+
+
+class GeneracionDatosSinteticosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hasta = date(2026, 6, 30)
+        self.volumenes = Volumenes(
+            insumos=30, productos=6, clientes=8, ordenes_venta=40, ordenes_compra=12, accesos=30
+        )
+
+    def _generar_y_revertir(self, **kwargs):
+        """Genera, toma una foto sin ids y revierte, para volver a generar sobre la misma base."""
+        with transaction.atomic():
+            generar_datos_sinteticos(self.volumenes, semilla=7, hasta=self.hasta, **kwargs)
+            foto = {
+                "ovs": list(
+                    OrdenVenta.objects.order_by("numero_ov").values_list(
+                        "numero_ov", "cliente__nombre", "estado", "total_ov", "fecha_creacion"
+                    )
+                ),
+                "ops": list(
+                    OrdenProduccion.objects.order_by("numero_op").values_list(
+                        "numero_op", "estado_op__nombre", "producto_a_producir__descripcion"
+                    )
+                ),
+                "historial": list(
+                    HistorialOV.objects.order_by("orden_venta__numero_ov", "fecha_evento", "descripcion")
+                    .values_list("orden_venta__numero_ov", "fecha_evento", "descripcion")
+                ),
+                "ocs": list(
+                    ItemOrdenCompra.objects.order_by("orden__numero_orden", "insumo__descripcion")
+                    .values_list("orden__numero_orden", "orden__estado", "insumo__descripcion", "cantidad")
+                ),
+            }
+            transaction.set_rollback(True)
+        return foto
+
+    def test_misma_semilla_mismos_datos_sin_importar_el_tamano_de_lote(self):
+        primera = self._generar_y_revertir()
+
+        tamano_original = datos_sinteticos_services.TAMANO_LOTE
+        datos_sinteticos_services.TAMANO_LOTE = 7
+        try:
+            segunda = self._generar_y_revertir()
+        finally:
+            datos_sinteticos_services.TAMANO_LOTE = tamano_original
+
+        self.assertEqual(len(primera["ovs"]), 40)
+        self.assertEqual(primera, segunda)
+
+    def test_historia_de_anios_con_documentos_viejos_cerrados(self):
+        creados = generar_datos_sinteticos(self.volumenes, semilla=3, hasta=self.hasta)
+
+        limite = timezone.make_aware(datetime(2026, 6, 30)) - timedelta(days=730)
+        self.assertGreaterEqual(OrdenVenta.objects.earliest("fecha_creacion").fecha_creacion, limite)
+        # Las fechas de historial y lotes son las del documento, no la de la carga.
+        self.assertLess(
+            HistorialOV.objects.earliest("fecha_evento").fecha_evento,
+            limite + timedelta(days=60),
+        )
+        self.assertFalse(
+            LoteProductoTerminado.objects.filter(fecha_creacion__gte=timezone.now() - timedelta(days=1)).exists()
+        )
+        self.assertTrue(HistorialOV._meta.get_field("fecha_evento").auto_now_add)
+
+        viejas = OrdenVenta.objects.filter(
+            fecha_creacion__lt=limite + timedelta(days=730 - DIAS_DOCUMENTO_ABIERTO)
+        )
+        self.assertEqual(
+            set(viejas.values_list("estado", flat=True)) - {"COMPLETADA", "CANCELADA"}, set()
+        )
+        self.assertEqual(
+            Factura.objects.count(),
+            OrdenVenta.objects.filter(estado__in=["LISTA_ENTREGA", "COMPLETADA"]).count(),
+        )
+        self.assertEqual(creados["ordenes_produccion"], 40 * 3)
+        self.assertEqual(
+            OfertaProveedor.objects.count(), 30 * self.volumenes.ofertas_por_insumo
+        )
+
+    def test_stock_generado_coincide_con_el_kardex(self):
+        generar_datos_sinteticos(self.volumenes, semilla=5, hasta=self.hasta)
+
+        self.assertEqual(conciliar_stock(), [])
+        tipos = set(MovimientoStock.objects.values_list("tipo", flat=True))
+        self.assertEqual(tipos, {"SALDO_INICIAL", "RECEPCION_OC", "PRODUCCION", "ENVIO_LOTE"})
+
+        despues = timezone.make_aware(datetime(2026, 6, 30)) + timedelta(days=30)
+        antes = timezone.make_aware(datetime(2026, 6, 30)) - timedelta(days=731)
+        for articulo in (
+            Insumo.objects.filter(stock__gt=0).first(),
+            ProductoTerminado.objects.filter(stock__gt=0).first(),
+        ):
+            self.assertEqual(stock_en_fecha(articulo, despues), articulo.stock)
+            self.assertEqual(stock_en_fecha(articulo, antes), 0)
+
+    def test_comando_escala_y_fija_volumenes(self):
+        out = io.StringIO()
+        call_command(
+            "generar_datos",
+            "--escala", "0.5",
+            "--ordenes-venta", "7",
+            "--hasta", "2026-01-15",
+            stdout=out,
+        )
+
+        self.assertEqual(OrdenVenta.objects.count(), 7)
+        self.assertEqual(Insumo.objects.count(), 30)  # 60 a escala 1
+        self.assertIn("filas creadas", out.getvalue())
+        self.assertTrue(User.objects.filter(username="deposito_sintetico", groups__name="deposito").exists())
+
+
+@skipUnless(connection.vendor == "sqlite", "PRAGMA y BEGIN IMMEDIATE son propios de SQLite.")
+class PerfilSQLiteTests(TransactionTestCase):
+    def test_la_conexion_aplica_los_pragmas_del_perfil(self):
+        # El perfil optimizado no es el default; se prueba sobre un archivo
+        # propio para no convertir a WAL la base de los tests.
+        with tempfile.TemporaryDirectory() as carpeta:
+            conexion = connection.copy()
+            conexion.settings_dict["NAME"] = os.path.join(carpeta, "perfil.sqlite3")
+            conexion.settings_dict["OPTIONS"] = opciones_sqlite(PRAGMAS_SQLITE)
+            try:
+                with conexion.cursor() as cursor:
+                    valores = {}
+                    for pragma in ("journal_mode", "busy_timeout", "synchronous", "temp_store"):
+                        cursor.execute(f"PRAGMA {pragma}")
+                        valores[pragma] = cursor.fetchone()[0]
+            finally:
+                conexion.close()
+        # synchronous=NORMAL es 1 y temp_store=MEMORY es 2.
+        self.assertEqual(
+            valores, {"journal_mode": "wal", "busy_timeout": 5000, "synchronous": 1, "temp_store": 2}
+        )
+
+    def _begins(self, consultas):
+        return [q["sql"] for q in consultas.captured_queries if q["sql"].startswith("BEGIN")]
+
+    def test_atomic_inmediato_toma_el_lock_de_escritura_al_empezar(self):
+        with CaptureQueriesContext(connection) as consultas:
+            with atomic_inmediato():
+                Cliente.objects.create(nombre="Cliente A", email="a@test.com")
+            with transaction.atomic():
+                Cliente.objects.count()
+        self.assertEqual(self._begins(consultas), ["BEGIN IMMEDIATE", "BEGIN"])
+
+    def test_anidado_es_un_savepoint_del_atomic_externo(self):
+        with CaptureQueriesContext(connection) as consultas:
+            with transaction.atomic():
+                with atomic_inmediato():
+                    Cliente.objects.create(nombre="Cliente A", email="a@test.com")
+        self.assertEqual(self._begins(consultas), ["BEGIN"])
+        self.assertTrue(Cliente.objects.exists())
+
+    def test_error_revierte_y_restaura_el_modo(self):
+        with self.assertRaises(ValueError):
+            with atomic_inmediato():
+                Cliente.objects.create(nombre="Cliente A", email="a@test.com")
+                raise ValueError
+        self.assertFalse(Cliente.objects.exists())
+        self.assertIsNone(connection.transaction_mode)
+
+    def test_vistas_usan_begin_immediate_solo_al_escribir(self):
+        usuario = User.objects.create_superuser(username="admin", password="x")
+        cliente = Cliente.objects.create(nombre="Cliente A", email="a@test.com")
+        self.client.force_login(usuario)
+        url = reverse("App_LUMINOVA:eliminar_cliente", args=[cliente.id])
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(url)
+        self.assertNotIn("BEGIN IMMEDIATE", self._begins(consultas))
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.post(url)
+        self.assertIn("BEGIN IMMEDIATE", self._begins(consultas))
+        self.assertFalse(Cliente.objects.exists())
+
+
+class BaseDeDatosDesdeEntornoTests(TestCase):
+    def test_sin_variables_usa_sqlite_sin_wal(self):
+        # WAL cambia el encabezado del db.sqlite3 versionado: solo si se pide.
+        config = base_desde_entorno({}, "/tmp/luminova.sqlite3")
+        self.assertEqual(config["ENGINE"], "django.db.backends.sqlite3")
+        self.assertEqual(config["NAME"], "/tmp/luminova.sqlite3")
+        self.assertEqual(config["OPTIONS"], {})
+        self.assertEqual(config["CONN_MAX_AGE"], 0)
+
+    def test_perfil_optimizado_explicito(self):
+        config = base_desde_entorno({"LUMINOVA_DB_PERFIL": "optimizado"}, "/tmp/luminova.sqlite3")
+        self.assertIn("PRAGMA journal_mode=WAL", config["OPTIONS"]["init_command"])
+        self.assertEqual(config["CONN_MAX_AGE"], 600)
+
+    def test_postgresql_desde_variables(self):
+        config = base_desde_entorno(
+            {
+                "LUMINOVA_DB_MOTOR": "PostgreSQL",
+                "LUMINOVA_DB_NOMBRE": "luminova",
+                "LUMINOVA_DB_USUARIO": "app",
+                "LUMINOVA_DB_HOST": "db.interna",
+                "LUMINOVA_DB_CONN_MAX_AGE": "0",
+            },
+            "/tmp/luminova.sqlite3",
+        )
+        self.assertEqual(config["ENGINE"], "django.db.backends.postgresql")
+        self.assertEqual(
+            (config["NAME"], config["USER"], config["HOST"], config["PORT"]),
+            ("luminova", "app", "db.interna", "5432"),
+        )
+        self.assertEqual(config["CONN_MAX_AGE"], 0)
+
+    def test_valores_invalidos(self):
+        for entorno in (
+            {"LUMINOVA_DB_MOTOR": "oracle"},
+            {"LUMINOVA_DB_PERFIL": "turbo"},
+            {"LUMINOVA_DB_CONN_MAX_AGE": "siempre"},
+        ):
+            with self.subTest(entorno=entorno), self.assertRaises(ImproperlyConfigured):
+                base_desde_entorno(entorno, "/tmp/luminova.sqlite3")
+
+    def test_cache_desde_variables(self):
+        self.assertEqual(
+            cache_desde_entorno({})["BACKEND"], "django.core.cache.backends.locmem.LocMemCache"
+        )
+        self.assertEqual(
+            cache_desde_entorno({"LUMINOVA_CACHE": "DB"}),
+            {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "luminova_cache"},
+        )
+        config = cache_desde_entorno(
+            {"LUMINOVA_CACHE": "redis", "LUMINOVA_CACHE_UBICACION": "redis://cache.interna:6379/1"}
+        )
+        self.assertEqual(config["LOCATION"], "redis://cache.interna:6379/1")
+        with self.assertRaises(ImproperlyConfigured):
+            cache_desde_entorno({"LUMINOVA_CACHE": "memcached"})
+
+
+class EnvioLotePTTests(TransactionTestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_superuser(username="deposito", password="x")
+        self.producto = ProductoTerminado.objects.create(
+            descripcion="Lámpara",
+            categoria=CategoriaProductoTerminado.objects.create(nombre="Luminarias"),
+            stock=10,
+        )
+        op = OrdenProduccion.objects.create(
+            numero_op="OP-00001",
+            producto_a_producir=self.producto,
+            cantidad_a_producir=6,
+            estado_op=EstadoOrden.objects.create(nombre=Estados.COMPLETADA),
+        )
+        self.lote = LoteProductoTerminado.objects.create(
+            producto=self.producto, op_asociada=op, cantidad=6
+        )
+        self.url = reverse("App_LUMINOVA:deposito_enviar_lote_pt", args=[self.lote.id])
+        self.client.force_login(self.usuario)
+
+    def _estado(self):
+        self.lote.refresh_from_db()
+        self.producto.refresh_from_db()
+        return self.lote.enviado, self.producto.stock
+
+    def test_envio_descuenta_stock_una_sola_vez(self):
+        self.client.post(self.url)
+        self.client.post(self.url)
+        self.assertEqual(self._estado(), (True, 4))
+
+    def test_sin_stock_suficiente_no_envia(self):
+        ProductoTerminado.objects.filter(id=self.producto.id).update(stock=5)
+        self.client.post(self.url)
+        self.assertEqual(self._estado(), (False, 5))
+
+    def test_bloquear_filas_segun_el_motor(self):
+        queryset = bloquear_filas(LoteProductoTerminado.objects.all(), nowait=True)
+        soportado = connection.features.has_select_for_update
+        self.assertEqual(queryset.query.select_for_update, soportado)
+        self.assertEqual(
+            queryset.query.select_for_update_nowait,
+            soportado and connection.features.has_select_for_update_nowait,
+        )
+
+    @skipUnless(connection.features.has_select_for_update_nowait, "Requiere bloqueo por fila con NOWAIT.")
+    def test_lote_tomado_por_otra_sesion_no_espera(self):
+        tomado = threading.Event()
+        liberar = threading.Event()
+
+        def otra_sesion():
+            try:
+                with transaction.atomic():
+                    LoteProductoTerminado.objects.select_for_update().get(id=self.lote.id)
+                    tomado.set()
+                    liberar.wait(10)
+            finally:
+                connection.close()
+
+        hilo = threading.Thread(target=otra_sesion)
+        hilo.start()
+        try:
+            tomado.wait(10)
+            respuesta = self.client.post(self.url, follow=True)
+        finally:
+            liberar.set()
+            hilo.join()
+
+        self.assertContains(respuesta, "se está enviando desde otra sesión")
+        self.assertEqual(self._estado(), (False, 10))
+
+
+class IndicesConsultasFrecuentesTests(TestCase):
+    """
+    Cada consulta frecuente de las vistas (listas, contadores, dashboard) se
+    resuelve con un índice sobre los datos sintéticos, con estadísticas
+    actualizadas. En PostgreSQL se desalientan los Seq Scan para que el plan
+    muestre si el índice es utilizable y no solo si conviene con pocas filas.
+    """
+
+    # Línea del plan que recorre la tabla entera, sin índice.
+    RECORRIDO_COMPLETO = {
+        "sqlite": r"SCAN {tabla}$",
+        "postgresql": r'Seq Scan on "{tabla}"',
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        generar_datos_sinteticos(escala=5, semilla=0)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsaIndice(self, queryset, tabla):
+        plan = queryset.explain()
+        self.assertIn(tabla, plan)
+        completo = self.RECORRIDO_COMPLETO[connection.vendor].format(tabla=tabla)
+        for linea in plan.splitlines():
+            self.assertNotRegex(linea.rstrip(), completo)
+
+    def test_listas_de_ordenes_de_venta(self):
+        tabla = OrdenVenta._meta.db_table
+        self.assertUsaIndice(OrdenVenta.objects.order_by("-fecha_creacion", "-id")[:26], tabla)
+        self.assertUsaIndice(
+            OrdenVenta.objects.filter(estado="CONFIRMADA").order_by("-fecha_creacion", "-id")[:26],
+            tabla,
+        )
+
+    def test_listas_y_contadores_de_ordenes_de_compra(self):
+        tabla = Orden._meta.db_table
+        self.assertUsaIndice(
+            Orden.objects.filter(tipo="compra").order_by("-fecha_creacion"), tabla
+        )
+        self.assertUsaIndice(
+            Orden.objects.filter(
+                tipo="compra", estado__in=["ENVIADA_PROVEEDOR", "EN_TRANSITO", "RECIBIDA_PARCIAL"]
+            ).order_by("-fecha_creacion"),
+            tabla,
+        )
+        self.assertUsaIndice(
+            Orden.objects.filter(tipo="compra", estado="BORRADOR").values("id"), tabla
+        )
+
+    def test_insumos_bajo_punto_de_reorden(self):
+        self.assertUsaIndice(
+            Insumo.objects.filter(stock__lt=F("punto_reorden")).order_by("stock"),
+            Insumo._meta.db_table,
+        )
+
+    def test_reportes_abiertos_y_resueltos(self):
+        tabla = Reportes._meta.db_table
+        self.assertUsaIndice(
+            Reportes.objects.filter(resuelto=False, orden_produccion_asociada__isnull=False)
+            .values("orden_produccion_asociada_id")
+            .distinct(),
+            tabla,
+        )
+        self.assertUsaIndice(Reportes.objects.filter(resuelto=False).order_by("-fecha"), tabla)
+        self.assertUsaIndice(
+            Reportes.objects.filter(resuelto=True).order_by("-fecha_resolucion"), tabla
+        )
+
+    def test_ordenes_de_produccion_por_estado(self):
+        tabla = OrdenProduccion._meta.db_table
+        self.assertUsaIndice(
+            OrdenProduccion.objects.filter(
+                estado_op_id__in=estados.ids(Estados.INSUMOS_SOLICITADOS)
+            ).order_by("fecha_solicitud"),
+            tabla,
+        )
+        self.assertUsaIndice(
+            OrdenProduccion.objects.filter(
+                estado_op_id__in=estados.ids(Estados.COMPLETADA),
+                fecha_fin_real__gte=timezone.now() - timedelta(days=30),
+            ),
+            tabla,
+        )
+
+    def test_lotes_sin_enviar_e_historial_de_ov(self):
+        self.assertUsaIndice(
+            LoteProductoTerminado.objects.filter(enviado=False).order_by("-fecha_creacion"),
+            LoteProductoTerminado._meta.db_table,
+        )
+        self.assertUsaIndice(
+            HistorialOV.objects.filter(orden_venta=OrdenVenta.objects.first()),
+            HistorialOV._meta.db_table,
+        )
@@ -5,6 +5,7 @@ from ..views import (
     change_password_view,
     custom_logout_view,
     dashboard_view,
+    exportar_documentos_pdf_view,
 )
 
 # Rutas base
@@ -14,4 +15,9 @@ urlpatterns = [
     path("change-password/", change_password_view, name="change_password"),
     path("logout/", custom_logout_view, name="logout"),
     path("dashboard/", dashboard_view, name="dashboard"),
+    path(
+        "documentos/exportar/",
+        exportar_documentos_pdf_view,
+        name="exportar_documentos_pdf",
+    ),
 ]
\ No newline at end of file
@@ -6,7 +6,9 @@ from ..views import (
     compras_detalle_oc_view,
     compras_editar_oc_view,
     compras_aprobar_oc_directamente_view,
+    compras_cambiar_estado_ocs_view,
     compras_desglose_view,
+    compras_sugerencias_oc_view,
     compras_seguimiento_view,
     compras_tracking_pedido_view,
     compras_desglose_detalle_oc_view,
@@ -20,6 +22,11 @@ urlpatterns = [
         "compras/", compras_lista_oc_view, name="compras_lista_oc"
     ),  # Vista principal de compras
     path("compras/desglose/", compras_desglose_view, name="compras_desglose"),
+    path(
+        "compras/sugerencias/",
+        compras_sugerencias_oc_view,
+        name="compras_sugerencias_oc",
+    ),
     path("compras/seguimiento/", compras_seguimiento_view, name="compras_seguimiento"),
     path(
         "compras/tracking/<int:oc_id>/",
@@ -57,6 +64,11 @@ urlpatterns = [
         compras_aprobar_oc_directamente_view,
         name="compras_aprobar_oc_directamente",
     ),
+    path(
+        "compras/ordenes/cambiar-estado/",
+        compras_cambiar_estado_ocs_view,
+        name="compras_cambiar_estado_ocs",
+    ),
     path(
         "ajax/get-oferta-proveedor/",
         get_oferta_proveedor_ajax,
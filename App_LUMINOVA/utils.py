@@ -1,3 +1,10 @@
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+from django.db import connections, transaction
+from django.db.models import Q
+
 def es_admin(user):
     """Verifica si un usuario es superusuario o pertenece al grupo 'administrador'."""
     return user.groups.filter(name='administrador').exists() or user.is_superuser
@@ -11,4 +18,144 @@ def es_admin_o_rol(user, roles_permitidos=None):
     # Agregamos 'administrador' a los roles permitidos por defecto
     if 'administrador' not in roles_permitidos:
         roles_permitidos.append('administrador')
-    return user.groups.filter(name__in=[rol.lower() for rol in roles_permitidos]).exists()
\ No newline at end of file
+    return user.groups.filter(name__in=[rol.lower() for rol in roles_permitidos]).exists()
+
+
+@contextmanager
+def atomic_inmediato(using=None):
+    """
+    transaction.atomic para transacciones que escriben.
+
+    En SQLite la transacción más externa se abre con BEGIN IMMEDIATE: toma el
+    lock de escritura al empezar y, si otra conexión lo tiene, espera el
+    busy_timeout. Con el BEGIN por defecto (DEFERRED) una transacción que lee
+    y después escribe puede fallar en el medio con "database is locked" sin
+    esperar, porque otro escritor se adelantó. Anidada en otro atomic, o con
+    otros motores, es un atomic común. Sirve también como decorador.
+    """
+    conexion = transaction.get_connection(using)
+    if conexion.vendor != "sqlite" or conexion.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    # Al conectar, el backend lee transaction_mode de OPTIONS: conectamos antes.
+    conexion.ensure_connection()
+    modo = conexion.transaction_mode
+    conexion.transaction_mode = "IMMEDIATE"
+    try:
+        with transaction.atomic(using=using):
+            conexion.transaction_mode = modo
+            yield
+    finally:
+        conexion.transaction_mode = modo
+
+
+def atomic_en_escrituras(vista):
+    """
+    Decorador de vistas: atomic_inmediato para POST y demás métodos que
+    modifican datos, atomic común para GET/HEAD, que solo leen y no deben
+    tomar el lock de escritura mientras se renderiza la página.
+    """
+
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if request.method in ("GET", "HEAD", "OPTIONS"):
+            with transaction.atomic():
+                return vista(request, *args, **kwargs)
+        with atomic_inmediato():
+            return vista(request, *args, **kwargs)
+
+    return envoltura
+
+
+def bloquear_filas(queryset, nowait=False):
+    """
+    select_for_update() en motores con bloqueo por fila (PostgreSQL), con
+    NOWAIT si se pide: la consulta falla con OperationalError en vez de
+    esperar a otra transacción que ya tiene la fila. Solo bloquea la tabla
+    del modelo, no las de select_related.
+
+    En SQLite devuelve el queryset sin cambios: no hay bloqueo por fila y
+    atomic_inmediato ya serializa a los escritores.
+    """
+    features = connections[queryset.db].features
+    if not features.has_select_for_update:
+        return queryset
+    return queryset.select_for_update(
+        nowait=nowait and features.has_select_for_update_nowait,
+        of=("self",) if features.has_select_for_update_of else (),
+    )
+
+
+def bloquear_en_orden(queryset):
+    """
+    Bloquea las filas del queryset en orden de pk hasta el fin de la
+    transacción. Dos transacciones que actualizan varias filas en común las
+    toman en el mismo orden, así que una espera a la otra en lugar de
+    terminar en un deadlock. Sin bloqueo por fila no hace ninguna consulta.
+    """
+    if connections[queryset.db].features.has_select_for_update:
+        list(bloquear_filas(queryset.order_by("pk")).values_list("pk", flat=True))
+
+
+def codificar_cursor(valor, pk):
+    """Cursor de paginación por clave: '<fecha ISO>_<id>'."""
+    return f"{valor.isoformat()}_{pk}"
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (fecha, id) o None si el cursor no es válido."""
+    try:
+        valor, pk = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(valor), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def paginar_por_clave(queryset, campo, despues=None, antes=None, tamano=25):
+    """
+    Paginación por clave (keyset) en orden descendente por (campo, id).
+    A diferencia de OFFSET, el costo de cada página no crece con el historial:
+    siempre se lee un tramo del índice a partir del último registro visto.
+
+    Args:
+        queryset: QuerySet ya filtrado.
+        campo: Campo de fecha por el que se ordena (ej: 'fecha_creacion').
+        despues: Cursor del último registro de la página anterior (avanzar).
+        antes: Cursor del primer registro de la página siguiente (retroceder).
+        tamano: Registros por página.
+
+    Returns:
+        (registros, cursor_anterior, cursor_siguiente); los cursores son None
+        cuando no hay más páginas en esa dirección.
+    """
+    clave_despues = decodificar_cursor(despues) if despues else None
+    clave_antes = decodificar_cursor(antes) if antes and not clave_despues else None
+
+    if clave_antes:
+        valor, pk = clave_antes
+        qs = queryset.filter(Q(**{f"{campo}__gt": valor}) | Q(**{campo: valor, "id__gt": pk}))
+        registros = list(qs.order_by(campo, "id")[: tamano + 1])
+        hay_anteriores = len(registros) > tamano
+        registros = registros[:tamano][::-1]
+        hay_siguientes = True
+    else:
+        qs = queryset
+        if clave_despues:
+            valor, pk = clave_despues
+            qs = qs.filter(Q(**{f"{campo}__lt": valor}) | Q(**{campo: valor, "id__lt": pk}))
+        registros = list(qs.order_by(f"-{campo}", "-id")[: tamano + 1])
+        hay_siguientes = len(registros) > tamano
+        registros = registros[:tamano]
+        hay_anteriores = clave_despues is not None
+
+    cursor_anterior = cursor_siguiente = None
+    if registros:
+        if hay_anteriores:
+            primero = registros[0]
+            cursor_anterior = codificar_cursor(getattr(primero, campo), primero.pk)
+        if hay_siguientes:
+            ultimo = registros[-1]
+            cursor_siguiente = codificar_cursor(getattr(ultimo, campo), ultimo.pk)
+    return registros, cursor_anterior, cursor_siguiente
@@ -1,3 +1,4 @@
+import json
 import logging
 from datetime import timedelta
 
@@ -11,11 +12,23 @@ from django.contrib.auth.forms import PasswordChangeForm
 # Django Contrib Imports
 from django.contrib.auth.models import Group, Permission, User
 from django.db import IntegrityError as DjangoIntegrityError
+from django.db import OperationalError
 from django.db import transaction
-from django.db.models import Exists, F, OuterRef, Prefetch, ProtectedError, Q, Sum
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    ProtectedError,
+    Q,
+    Subquery,
+    Sum,
+    prefetch_related_objects,
+)
 
 # Django Core Imports
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.utils import timezone
@@ -43,6 +56,9 @@ from Proyecto_LUMINOVA import settings
 from .forms import (
     ClienteForm,
     FacturaForm,
+    ExportacionDocumentosForm,
+    FiltroAuditoriaForm,
+    FiltroOrdenVentaForm,
     ItemOrdenVentaFormSet,
     ItemOrdenVentaFormSetCreacion,
     OrdenCompraForm,
@@ -66,8 +82,10 @@ from .models import (
     Factura,
     HistorialOV,
     Insumo,
+    ItemOrdenCompra,
     ItemOrdenVenta,
     LoteProductoTerminado,
+    MovimientoStock,
     OfertaProveedor,
     Orden,
     OrdenProduccion,
@@ -79,14 +97,66 @@ from .models import (
     RolDescripcion,
     SectorAsignado,
 )
+from .middleware import debe_cambiar_password, marcar_password_cambiado
 from .signals import get_client_ip
 
-from .services.document_services import generar_siguiente_numero_documento
-from .services.pdf_services import generar_pdf_factura
-from .utils import es_admin, es_admin_o_rol
+from .services.auditoria_services import (
+    ACCION_CIERRE_SESION,
+    ACCION_INICIO_SESION,
+    registrar_acceso,
+)
+from .services.dashboard_services import obtener_dashboard_snapshot
+from .services.compra_services import (
+    ESTADOS_OC_EN_RECEPCION,
+    TRANSICIONES_OC,
+    RecepcionOCError,
+    TransicionOCInvalida,
+    cambiar_estado_ocs,
+    generar_ordenes_compra_sugeridas,
+    insumos_con_oc,
+    recibir_orden_compra,
+    sugerir_ordenes_compra,
+)
+from .services.document_services import (
+    generar_siguiente_numero_documento,
+    reservar_numeros_documento,
+    sugerir_siguiente_numero_documento,
+)
+from .services.estado_services import Estados, estados, sectores
+from .services.historial_services import historial_ov
+from .services.mrp_services import calcular_necesidades_mrp
+from .services.pdf_services import (
+    exportar_pdf_unico,
+    exportar_zip,
+    facturas_para_exportar,
+    ordenes_para_exportar,
+    respuesta_pdf_factura,
+)
+from .services.produccion_services import (
+    TransicionOPInvalida,
+    cambiar_estado_op,
+    maquina_estados_op,
+)
+from .services.stock_services import (
+    StockInsuficienteError,
+    enviar_insumos_op,
+    registrar_ajuste_stock,
+    registrar_movimientos,
+)
+from .services.venta_services import crear_orden_venta
+from .utils import (
+    atomic_en_escrituras,
+    bloquear_filas,
+    es_admin,
+    es_admin_o_rol,
+    paginar_por_clave,
+)
 
 logger = logging.getLogger(__name__)
 
+OV_POR_PAGINA = 25
+AUDITORIA_POR_PAGINA = 50
+
 
 # --- GENERAL VIEWS & AUTHENTICATION ---
 def inicio(
@@ -119,10 +189,11 @@ def login_view(request):
 
             # --- LÓGICA CLAVE DE AUDITORÍA ---
             # Ahora que el usuario está logueado y tenemos el 'request' completo,
-            # registramos el evento.
-            AuditoriaAcceso.objects.create(
-                usuario=user,
-                accion="Inicio de sesión",
+            # registramos el evento. Se encola y se inserta en lote fuera del
+            # request, así el login no depende del tamaño de la tabla.
+            registrar_acceso(
+                user,
+                ACCION_INICIO_SESION,
                 ip_address=get_client_ip(request),  # Obtendrá la IP
                 user_agent=request.META.get(
                     "HTTP_USER_AGENT", ""
@@ -146,9 +217,9 @@ def custom_logout_view(request):
     user = request.user
 
     # Registrar el evento de cierre de sesión con toda la información disponible
-    AuditoriaAcceso.objects.create(
-        usuario=user,
-        accion="Cierre de sesión",
+    registrar_acceso(
+        user if user.is_authenticated else None,
+        ACCION_CIERRE_SESION,
         ip_address=get_client_ip(request),
         user_agent=request.META.get("HTTP_USER_AGENT", ""),
     )
@@ -165,86 +236,45 @@ def custom_logout_view(request):
 
 @login_required
 def dashboard_view(request):
-    # --- 1. Tarjeta: Acciones Urgentes ---
-    # Contamos OPs cuyo estado refleje un problema o pausa por incidencia
-    # estados_problematicos_op = ['Producción con Problemas', 'Pausada']
-    ops_con_problemas_reportados_count = (
-        Reportes.objects.filter(resuelto=False, orden_produccion_asociada__isnull=False)
-        .values("orden_produccion_asociada_id")
-        .distinct()
-        .count()
-    )
-
-    solicitudes_insumos_pendientes = OrdenProduccion.objects.filter(
-        estado_op__nombre__iexact="Insumos Solicitados"
-    ).count()
-    ocs_para_aprobar = Orden.objects.filter(tipo="compra", estado="BORRADOR").count()
-
-    # --- 2. Tarjeta: Stock Crítico ---
-    UMBRAL_STOCK_BAJO = 15000
-    insumos_criticos_query = Insumo.objects.filter(
-        stock__lt=UMBRAL_STOCK_BAJO
-    ).order_by("stock")[:5]
-    insumos_criticos_con_porcentaje = []
-    for insumo in insumos_criticos_query:
-        porcentaje_stock = (
-            int((insumo.stock / UMBRAL_STOCK_BAJO) * 100)
-            if UMBRAL_STOCK_BAJO > 0
-            else 0
-        )
-        insumos_criticos_con_porcentaje.append(
-            {"insumo": insumo, "porcentaje_stock": min(100, porcentaje_stock)}
-        )
-
-    # --- 3. Tarjeta: Rendimiento de Producción ---
-    hace_30_dias = timezone.now() - timedelta(days=30)
-    ops_completadas_recientemente = OrdenProduccion.objects.filter(
-        estado_op__nombre__iexact="Completada", fecha_fin_real__gte=hace_30_dias
-    )
-    total_luminarias_ensambladas = (
-        ops_completadas_recientemente.aggregate(total=Sum("cantidad_a_producir"))[
-            "total"
-        ]
-        or 0
-    )
-    total_ops_completadas = ops_completadas_recientemente.count()
-    ops_a_tiempo = ops_completadas_recientemente.filter(
-        fecha_fin_real__date__lte=F("fecha_fin_planificada")
-    ).count()
-    ops_con_retraso = total_ops_completadas - ops_a_tiempo
-    tasa_cumplimiento = (
-        (ops_a_tiempo / total_ops_completadas * 100) if total_ops_completadas > 0 else 0
-    )
-
-    # --- 4. Tarjeta: Actividad Reciente ---
-    try:
-        ultima_ov = OrdenVenta.objects.latest("fecha_creacion")
-    except OrdenVenta.DoesNotExist:
-        ultima_ov = None
-    try:
-        ultima_op_completada = OrdenProduccion.objects.filter(
-            estado_op__nombre__iexact="Completada"
-        ).latest("fecha_fin_real")
-    except OrdenProduccion.DoesNotExist:
-        ultima_op_completada = None
-    try:
-        ultimo_reporte = Reportes.objects.latest("fecha")
-    except Reportes.DoesNotExist:
-        ultimo_reporte = None
+    # Las métricas se leen precalculadas de una sola fila; las señales de los
+    # modelos marcan las tarjetas que cambiaron, que se recalculan al leerlas,
+    # y `reconstruir_dashboard` la rehace completa.
+    snapshot = obtener_dashboard_snapshot()
+
+    ultima_ov = None
+    if snapshot.ultima_ov_pk:
+        ultima_ov = {
+            "id": snapshot.ultima_ov_pk,
+            "numero_ov": snapshot.ultima_ov_numero,
+            "fecha_creacion": snapshot.ultima_ov_fecha,
+        }
+    ultima_op_completada = None
+    if snapshot.ultima_op_completada_pk:
+        ultima_op_completada = {
+            "id": snapshot.ultima_op_completada_pk,
+            "numero_op": snapshot.ultima_op_completada_numero,
+            "fecha_fin_real": snapshot.ultima_op_completada_fecha,
+        }
+    ultimo_reporte = None
+    if snapshot.ultimo_reporte_numero:
+        ultimo_reporte = {
+            "n_reporte": snapshot.ultimo_reporte_numero,
+            "fecha": snapshot.ultimo_reporte_fecha,
+        }
 
     context = {
-        "ops_con_problemas_count": ops_con_problemas_reportados_count,
-        "solicitudes_insumos_pendientes_count": solicitudes_insumos_pendientes,
-        "ocs_para_aprobar_count": ocs_para_aprobar,
-        "insumos_criticos_list": insumos_criticos_con_porcentaje,
-        "umbral_stock_bajo": UMBRAL_STOCK_BAJO,
-        "total_luminarias_ensambladas": total_luminarias_ensambladas,
-        "ops_a_tiempo": ops_a_tiempo,
-        "ops_con_retraso": ops_con_retraso,
-        "tasa_cumplimiento": tasa_cumplimiento,
+        "ops_con_problemas_count": snapshot.ops_con_problemas_count,
+        "solicitudes_insumos_pendientes_count": snapshot.solicitudes_insumos_pendientes_count,
+        "ocs_para_aprobar_count": snapshot.ocs_para_aprobar_count,
+        "insumos_criticos_list": snapshot.insumos_criticos,
+        "total_luminarias_ensambladas": snapshot.total_luminarias_ensambladas,
+        "ops_a_tiempo": snapshot.ops_a_tiempo,
+        "ops_con_retraso": snapshot.ops_con_retraso,
+        "tasa_cumplimiento": snapshot.tasa_cumplimiento,
         "ultima_ov": ultima_ov,
         "ultima_op_completada": ultima_op_completada,
         "ultimo_reporte": ultimo_reporte,
+        "snapshot": snapshot,
     }
     return render(request, "admin/dashboard.html", context)
 
@@ -344,6 +374,7 @@ def change_password_view(request):
             update_session_auth_hash(request, user)
 
             PasswordChangeRequired.objects.filter(user=request.user).delete()
+            marcar_password_cambiado(request)
 
             messages.success(
                 request,
@@ -359,7 +390,7 @@ def change_password_view(request):
             form.fields["new_password2"].widget.attrs["autocomplete"] = "new-password"
             messages.error(request, "Por favor, corrige los errores a continuación.")
     else:
-        if not PasswordChangeRequired.objects.filter(user=request.user).exists():
+        if not debe_cambiar_password(request):
             return redirect("App_LUMINOVA:dashboard")
 
         form = PasswordChangeForm(request.user)
@@ -374,7 +405,7 @@ def change_password_view(request):
 
 @login_required
 @user_passes_test(es_admin)
-@transaction.atomic
+@atomic_en_escrituras
 @require_POST
 def editar_usuario(request, id):
     usuario = get_object_or_404(User, id=id)
@@ -406,7 +437,7 @@ def editar_usuario(request, id):
 
 @login_required
 @user_passes_test(es_admin)
-@transaction.atomic
+@atomic_en_escrituras
 @require_POST
 def eliminar_usuario(request, id):
     usuario = get_object_or_404(User, id=id)
@@ -436,18 +467,28 @@ def roles_permisos_view(request):
 
 @login_required
 def auditoria_view(request):
-    auditorias = AuditoriaAcceso.objects.select_related("usuario").order_by(
-        "-fecha_hora"
+    filtro_form = FiltroAuditoriaForm(request.GET or None)
+
+    # Paginación por clave (fecha_hora, id) sobre los índices de la tabla:
+    # cada página cuesta lo mismo aunque haya años de turnos registrados.
+    auditorias, cursor_anterior, cursor_siguiente = paginar_por_clave(
+        filtro_form.filtrar(AuditoriaAcceso.objects.select_related("usuario")),
+        "fecha_hora",
+        despues=request.GET.get("despues"),
+        antes=request.GET.get("antes"),
+        tamano=AUDITORIA_POR_PAGINA,
     )
 
-    from django.core.paginator import Paginator
-
-    paginator = Paginator(auditorias, 25)  # 25 registros por página
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    filtros_query = request.GET.copy()
+    filtros_query.pop("despues", None)
+    filtros_query.pop("antes", None)
 
     context = {
-        "auditorias": auditorias,  # O 'page_obj': page_obj si usas paginación
+        "auditorias": auditorias,
+        "filtro_form": filtro_form,
+        "filtros_query": filtros_query.urlencode(),
+        "cursor_anterior": cursor_anterior,
+        "cursor_siguiente": cursor_siguiente,
         "titulo_seccion": "Auditoría de Acceso",
     }
     return render(request, "admin/auditoria.html", context)
@@ -687,7 +728,7 @@ def lista_clientes_view(request):
 
 
 @login_required
-@transaction.atomic
+@atomic_en_escrituras
 def crear_cliente_view(request):
     if not es_admin_o_rol(request.user, ["ventas", "administrador"]):
         messages.error(request, "Acción no permitida.")
@@ -719,7 +760,7 @@ def crear_cliente_view(request):
 
 # ... (editar_cliente_view y eliminar_cliente_view pueden permanecer similares a como estaban) ...
 @login_required
-@transaction.atomic
+@atomic_en_escrituras
 def editar_cliente_view(request, cliente_id):
     if not es_admin_o_rol(request.user, ["ventas", "administrador"]):
         messages.error(request, "Acción no permitida.")
@@ -749,7 +790,7 @@ def editar_cliente_view(request, cliente_id):
 
 
 @login_required
-@transaction.atomic
+@atomic_en_escrituras
 def eliminar_cliente_view(request, cliente_id):
     if not es_admin_o_rol(request.user, ["ventas", "administrador"]):
         messages.error(request, "Acción no permitida.")
@@ -772,54 +813,72 @@ def eliminar_cliente_view(request, cliente_id):
 
 @login_required
 def ventas_lista_ov_view(request):
-    ordenes_de_venta_query = (
-        OrdenVenta.objects.select_related("cliente")
-        .prefetch_related(
-            "items_ov__producto_terminado",
-            Prefetch(
-                "ops_generadas",
-                queryset=OrdenProduccion.objects.select_related(
-                    "estado_op", "producto_a_producir"
-                )
-                .prefetch_related(
-                    Prefetch(
-                        "reportes_incidencia",
-                        queryset=Reportes.objects.select_related(
-                            "reportado_por", "sector_reporta"
-                        ).order_by("-fecha"),
-                    )
+    filtro_form = FiltroOrdenVentaForm(request.GET or None)
+
+    # La bandera de reportes se calcula en la base con Exists(), sin recorrer OPs en Python.
+    ordenes_de_venta_query = filtro_form.filtrar(
+        OrdenVenta.objects.select_related("cliente").annotate(
+            tiene_algun_reporte_asociado=Exists(
+                Reportes.objects.filter(
+                    orden_produccion_asociada__orden_venta_origen=OuterRef("pk")
                 )
-                .order_by("numero_op"),
-                to_attr="lista_ops_con_reportes_y_estado",  # Usamos un nombre claro para el resultado del prefetch
-            ),
+            )
         )
-        .order_by("-fecha_creacion")
     )
 
-    # Procesar para añadir la bandera
-    ordenes_list_con_info_reporte = []
-    for ov in ordenes_de_venta_query:
-        ov.tiene_algun_reporte_asociado = False  # Inicializar bandera
-        if hasattr(
-            ov, "lista_ops_con_reportes_y_estado"
-        ):  # Verificar que el prefetch funcionó
-            for op in ov.lista_ops_con_reportes_y_estado:
-                if (
-                    op.reportes_incidencia.all().exists()
-                ):  # Si alguna de las OPs de esta OV tiene reportes...
-                    ov.tiene_algun_reporte_asociado = True
-                    break  # Salimos del bucle interior, ya sabemos que hay al menos un reporte.
-        ordenes_list_con_info_reporte.append(ov)
+    # Paginación por clave (fecha_creacion, id): cada página cuesta lo mismo
+    # sin importar cuántos años de OVs haya en la base.
+    ordenes_list, cursor_anterior, cursor_siguiente = paginar_por_clave(
+        ordenes_de_venta_query,
+        "fecha_creacion",
+        despues=request.GET.get("despues"),
+        antes=request.GET.get("antes"),
+        tamano=OV_POR_PAGINA,
+    )
+
+    # Los prefetch se hacen solo sobre las OVs de la página.
+    prefetch_related_objects(
+        ordenes_list,
+        Prefetch(
+            "items_ov",
+            queryset=ItemOrdenVenta.objects.select_related("producto_terminado"),
+        ),
+        Prefetch(
+            "ops_generadas",
+            queryset=OrdenProduccion.objects.select_related(
+                "estado_op", "producto_a_producir"
+            )
+            .prefetch_related(
+                Prefetch(
+                    "reportes_incidencia",
+                    queryset=Reportes.objects.select_related(
+                        "reportado_por", "sector_reporta"
+                    ).order_by("-fecha"),
+                )
+            )
+            .order_by("numero_op"),
+            to_attr="lista_ops_con_reportes_y_estado",  # Usamos un nombre claro para el resultado del prefetch
+        ),
+    )
+
+    # Los links de paginación conservan los filtros aplicados.
+    filtros_query = request.GET.copy()
+    filtros_query.pop("despues", None)
+    filtros_query.pop("antes", None)
 
     context = {
-        "ordenes_list": ordenes_list_con_info_reporte,  # Pasamos la lista procesada a la plantilla
+        "ordenes_list": ordenes_list,
+        "filtro_form": filtro_form,
+        "filtros_query": filtros_query.urlencode(),
+        "cursor_anterior": cursor_anterior,
+        "cursor_siguiente": cursor_siguiente,
         "titulo_seccion": "Órdenes de Venta",
     }
     return render(request, "ventas/ventas_lista_ov.html", context)
 
 
 @login_required
-@transaction.atomic
+@atomic_en_escrituras
 def ventas_crear_ov_view(request):
     """
     Gestiona la creación de una nueva Orden de Venta y sus ítems asociados.
@@ -834,44 +893,22 @@ def ventas_crear_ov_view(request):
         formset_items = ItemOrdenVentaFormSetCreacion(request.POST, prefix="items")
 
         if form_ov.is_valid() and formset_items.is_valid():
+            lineas = [
+                {
+                    'producto': form.cleaned_data['producto_terminado'],
+                    'cantidad': form.cleaned_data['cantidad'],
+                }
+                for form in formset_items
+                if form.cleaned_data and not form.cleaned_data.get('DELETE')
+            ]
             try:
-                ov_instance = form_ov.save(commit=False)
-                ov_instance.estado = "PENDIENTE"
-                ov_instance.save() # Se necesita ID para la relación
-
-                items_a_procesar = []
-                total_ov = 0
-                for form in formset_items:
-                    if form.is_valid() and form.cleaned_data and not form.cleaned_data.get('DELETE'):
-                        item = form.save(commit=False)
-                        item.orden_venta = ov_instance
-                        item.subtotal = item.cantidad * item.producto_terminado.precio_unitario
-                        total_ov += item.subtotal
-                        items_a_procesar.append(item)
-                
-                if not items_a_procesar:
-                    raise ValueError("Se debe añadir al menos un producto a la orden.")
-
-                ItemOrdenVenta.objects.bulk_create(items_a_procesar)
-                ov_instance.total_ov = total_ov
-                ov_instance.save(update_fields=['total_ov'])
-
-                estado_op_inicial = EstadoOrden.objects.get(nombre__iexact="Pendiente")
-                
-                ops_a_crear = []
-                for item_procesado in items_a_procesar:
-                    next_op_number = generar_siguiente_numero_documento(OrdenProduccion, 'OP', 'numero_op')
-                    ops_a_crear.append(
-                        OrdenProduccion(
-                            numero_op=next_op_number,
-                            orden_venta_origen=ov_instance,
-                            producto_a_producir=item_procesado.producto_terminado,
-                            cantidad_a_producir=item_procesado.cantidad,
-                            estado_op=estado_op_inicial,
-                        )
-                    )
-                OrdenProduccion.objects.bulk_create(ops_a_crear)
-
+                # La OV, sus ítems, sus OPs y el historial se crean con inserciones masivas.
+                ov_instance = crear_orden_venta(
+                    cliente=form_ov.cleaned_data['cliente'],
+                    lineas=lineas,
+                    usuario=request.user,
+                    notas=form_ov.cleaned_data.get('notas'),
+                )
                 messages.success(request, f'Orden de Venta "{ov_instance.numero_ov}" y sus OPs asociadas se crearon exitosamente.')
                 return redirect('App_LUMINOVA:ventas_detalle_ov', ov_id=ov_instance.id)
 
@@ -886,7 +923,7 @@ def ventas_crear_ov_view(request):
                 logger.exception("Error grave en la creación de OV/OPs")
                 # La transacción se revertirá.
     else: # GET
-        initial_data = {'numero_ov': generar_siguiente_numero_documento(OrdenVenta, 'OV', 'numero_ov')}
+        initial_data = {'numero_ov': sugerir_siguiente_numero_documento(OrdenVenta, 'OV', 'numero_ov')}
         form_ov = OrdenVentaForm(prefix="ov", initial=initial_data)
         formset_items = ItemOrdenVentaFormSetCreacion(prefix="items", queryset=ItemOrdenVenta.objects.none())
 
@@ -923,10 +960,10 @@ def ventas_detalle_ov_view(request, ov_id):
             puede_facturar = True  # O cambiar estado a LISTA_ENTREGA primero
         elif ops_asociadas.exists():
             ops_completadas = ops_asociadas.filter(
-                estado_op__nombre__iexact="Completada"
+                estado_op_id__in=estados.ids(Estados.COMPLETADA)
             ).count()
             ops_canceladas = ops_asociadas.filter(
-                estado_op__nombre__iexact="Cancelada"
+                estado_op_id__in=estados.ids(Estados.CANCELADA)
             ).count()
             ops_totales = ops_asociadas.count()
 
@@ -955,6 +992,8 @@ def ventas_detalle_ov_view(request, ov_id):
     context = {
         "ov": orden_venta,
         "items_ov": orden_venta.items_ov.all(),
+        # Incluye los eventos ya archivados (ver `archivar_historial`).
+        "historial": historial_ov(orden_venta),
         "factura_form": factura_form,
         "puede_facturar": puede_facturar,  # Para la plantilla
         "detalle_cancelacion_factura": detalle_cancelacion_factura,  # Para la plantilla
@@ -964,7 +1003,7 @@ def ventas_detalle_ov_view(request, ov_id):
 
 
 @login_required
-@transaction.atomic
+@atomic_en_escrituras
 def ventas_generar_factura_view(request, ov_id):
     """
     Gestiona la creación de una factura para una Orden de Venta.
@@ -1000,10 +1039,10 @@ def ventas_generar_factura_view(request, ov_id):
             puede_facturar_ahora = True
         elif ops_asociadas.exists():
             ops_completadas_count = ops_asociadas.filter(
-                estado_op__nombre__iexact="Completada"
+                estado_op_id__in=estados.ids(Estados.COMPLETADA)
             ).count()
             ops_canceladas_count = ops_asociadas.filter(
-                estado_op__nombre__iexact="Cancelada"
+                estado_op_id__in=estados.ids(Estados.CANCELADA)
             ).count()
             if ops_completadas_count > 0 and (
                 ops_completadas_count + ops_canceladas_count == ops_asociadas.count()
@@ -1025,6 +1064,9 @@ def ventas_generar_factura_view(request, ov_id):
         if form.is_valid():
             try:
                 factura = form.save(commit=False)
+                factura.numero_factura = generar_siguiente_numero_documento(
+                    Factura, "FACT", "numero_factura"
+                )
                 factura.orden_venta = orden_venta
                 # El total a facturar es el total de la OV, ya que solo se factura cuando todo está listo.
                 factura.total_facturado = orden_venta.total_ov
@@ -1076,7 +1118,7 @@ def ventas_generar_factura_view(request, ov_id):
 
 
 @login_required
-@transaction.atomic
+@atomic_en_escrituras
 def ventas_editar_ov_view(request, ov_id):
     orden_venta = get_object_or_404(
         OrdenVenta.objects.prefetch_related(
@@ -1136,8 +1178,9 @@ def ventas_editar_ov_view(request, ov_id):
                         ov_actualizada = form_ov.save(commit=False)
 
                         ops_a_revisar_o_eliminar = orden_venta.ops_generadas.filter(
-                            Q(estado_op__nombre__iexact="Pendiente")
-                            | Q(estado_op__nombre__iexact="Insumos Solicitados")
+                            estado_op_id__in=estados.ids(
+                                Estados.PENDIENTE, Estados.INSUMOS_SOLICITADOS
+                            )
                         )
                         if ops_a_revisar_o_eliminar.exists():
                             logger.info(
@@ -1153,9 +1196,7 @@ def ventas_editar_ov_view(request, ov_id):
                         ov_actualizada.actualizar_total()
                         ov_actualizada.save()
 
-                        estado_op_inicial = EstadoOrden.objects.filter(
-                            nombre__iexact="Pendiente"
-                        ).first()
+                        estado_op_inicial = estados.buscar(Estados.PENDIENTE)
                         if not estado_op_inicial:
                             messages.error(
                                 request,
@@ -1163,10 +1204,15 @@ def ventas_editar_ov_view(request, ov_id):
                             )
                         else:
                             # --- INICIO DE LA CORRECCIÓN ---
-                            for item_guardado in ov_actualizada.items_ov.all():
-                                # Lógica correcta para generar número de OP secuencial
-                                next_op_number = generar_siguiente_numero_documento(OrdenProduccion, 'OP', 'numero_op')
-
+                            items_guardados = list(
+                                ov_actualizada.items_ov.select_related("producto_terminado")
+                            )
+                            numeros_op = reservar_numeros_documento(
+                                OrdenProduccion, "OP", "numero_op", len(items_guardados)
+                            )
+                            for item_guardado, next_op_number in zip(
+                                items_guardados, numeros_op
+                            ):
                                 OrdenProduccion.objects.create(
                                     numero_op=next_op_number,
                                     orden_venta_origen=ov_actualizada,
@@ -1239,7 +1285,7 @@ def ventas_editar_ov_view(request, ov_id):
 
 
 @login_required
-@transaction.atomic
+@atomic_en_escrituras
 @require_POST  # Esta acción solo debe ser por POST desde el modal
 def ventas_cancelar_ov_view(request, ov_id):
     # if not es_admin_o_rol(request.user, ['ventas', 'administrador']):
@@ -1255,10 +1301,8 @@ def ventas_cancelar_ov_view(request, ov_id):
         )
         return redirect("App_LUMINOVA:ventas_detalle_ov", ov_id=ov_id)
 
-    estado_op_cancelada = EstadoOrden.objects.filter(nombre__iexact="Cancelada").first()
-    estado_op_completada = EstadoOrden.objects.filter(
-        nombre__iexact="Completada"
-    ).first()  # O 'Terminado'
+    estado_op_cancelada = estados.buscar(Estados.CANCELADA)
+    estado_op_completada = estados.buscar(Estados.COMPLETADA)  # O 'Terminado'
 
     if not estado_op_cancelada:
         messages.error(
@@ -1307,6 +1351,7 @@ def compras_lista_oc_view(request):
             "proveedor",  # Si el campo se llama 'proveedor' en el modelo Orden
             "insumo_principal",  # Si el campo se llama 'insumo' en el modelo Orden
         )
+        .annotate(cantidad_lineas=Count("items_oc"))
         .order_by("-fecha_creacion")
     )
 
@@ -1317,9 +1362,14 @@ def compras_lista_oc_view(request):
     # next_oc_number = f"OC-{str(oc_count + 1).zfill(4)}"
     # form_oc.fields['numero_orden'].initial = next_oc_number
 
+    etiquetas_estado = dict(Orden.ESTADO_ORDEN_COMPRA_CHOICES)
     context = {
         "ordenes_list": ordenes_compra,  # Nombre genérico para la plantilla
         "titulo_seccion": "Listado de Órdenes de Compra",
+        # Destinos del cambio de estado en bloque, en el orden del circuito.
+        "estados_cambio_masivo": [
+            (estado, etiquetas_estado[estado]) for estado in TRANSICIONES_OC
+        ],
         # 'form_orden': form_oc, # Para el modal de creación
         # 'tipo_orden_actual': 'compra',
     }
@@ -1331,8 +1381,6 @@ def compras_lista_oc_view(request):
 def compras_desglose_view(request):
     logger.info("--- compras_desglose_view: INICIO ---")
 
-    UMBRAL_STOCK_BAJO_INSUMOS = 15000
-
     # --- LÓGICA CORREGIDA ---
     # Un insumo necesita gestión si su OC o no existe, o si está SOLAMENTE en estado 'BORRADOR'.
     # Si ya está 'APROBADA' o más allá, el equipo de compras ya hizo su parte principal.
@@ -1346,42 +1394,80 @@ def compras_desglose_view(request):
         "RECIBIDA_TOTAL",
         "COMPLETADA",
     ]
-    insumos_ya_gestionados_ids = (
-        Orden.objects.filter(
-            tipo="compra",
-            estado__in=ESTADOS_OC_POST_BORRADOR,
-            insumo_principal__isnull=False,
-        )
-        .values_list("insumo_principal_id", flat=True)
-        .distinct()
-    )
+    insumos_ya_gestionados_ids = insumos_con_oc(ESTADOS_OC_POST_BORRADOR)
 
     logger.info(
-        f"IDs de insumos que ya tienen OC post-borrador: {list(insumos_ya_gestionados_ids)}"
+        f"IDs de insumos que ya tienen OC post-borrador: {list(insumos_ya_gestionados_ids.values_list('insumo_id', flat=True))}"
     )
 
     # 2. Buscamos insumos críticos, EXCLUYENDO los que ya están gestionados.
     #    La lista resultante solo contendrá insumos sin OC o con OC en 'BORRADOR'.
-    insumos_criticos_para_gestionar = (
-        Insumo.objects.filter(stock__lt=UMBRAL_STOCK_BAJO_INSUMOS)
-        .exclude(id__in=insumos_ya_gestionados_ids)
+    #    Se suman los insumos que no alcanzan para las OPs abiertas aunque ya
+    #    tengan OC: el MRP ya descuenta lo pedido, así que lo que falta es extra.
+    necesidades = calcular_necesidades_mrp()
+    insumos_con_faltante_ids = [i for i, n in necesidades.items() if n.neto > 0]
+    insumos_criticos_para_gestionar = list(
+        Insumo.objects.filter(
+            (
+                Q(stock__lt=F("punto_reorden"))
+                & ~Q(id__in=insumos_ya_gestionados_ids)
+            )
+            | Q(id__in=insumos_con_faltante_ids)
+        )
         .select_related("categoria")
         .order_by("categoria__nombre", "stock", "descripcion")
     )
+    for insumo in insumos_criticos_para_gestionar:
+        insumo.necesidad_mrp = necesidades.get(insumo.id)
 
     logger.info(
-        f"Insumos críticos que requieren acción de Compras: {insumos_criticos_para_gestionar.count()}"
+        f"Insumos críticos que requieren acción de Compras: {len(insumos_criticos_para_gestionar)} "
+        f"({len(insumos_con_faltante_ids)} con faltante para OPs abiertas)"
     )
 
     # La variable pasada a la plantilla necesita un nombre consistente
     context = {
         "insumos_criticos_list_con_estado": insumos_criticos_para_gestionar,
-        "umbral_stock_bajo": UMBRAL_STOCK_BAJO_INSUMOS,
         "titulo_seccion": "Gestionar Compra por Stock Bajo",
     }
     return render(request, "compras/compras_desglose.html", context)
 
 
+@login_required
+def compras_sugerencias_oc_view(request):
+    """
+    Propone una OC en Borrador por cada insumo con faltante neto (oferta más
+    barata que llega a tiempo, cantidad redondeada al múltiplo de pedido).
+    Con POST las genera todas de una vez.
+    """
+    if request.method == "POST":
+        sugerencia = generar_ordenes_compra_sugeridas()
+        if sugerencia.propuestas:
+            messages.success(
+                request,
+                f"Se generaron {len(sugerencia.propuestas)} Órdenes de Compra en Borrador "
+                f"por un total de ${sugerencia.total:.2f}.",
+            )
+        else:
+            messages.info(request, "No hay insumos que requieran una nueva Orden de Compra.")
+        if sugerencia.sin_oferta:
+            messages.warning(
+                request,
+                "Sin ofertas de proveedor (gestionar manualmente): "
+                + ", ".join(i.descripcion for i in sugerencia.sin_oferta),
+            )
+        return redirect("App_LUMINOVA:compras_lista_oc")
+
+    sugerencia = sugerir_ordenes_compra()
+    context = {
+        "propuestas": sugerencia.propuestas,
+        "insumos_sin_oferta": sugerencia.sin_oferta,
+        "total_sugerido": sugerencia.total,
+        "titulo_seccion": "Sugerencia de Órdenes de Compra",
+    }
+    return render(request, "compras/compras_sugerencias_oc.html", context)
+
+
 @login_required
 def compras_seguimiento_view(request):
     """
@@ -1392,6 +1478,11 @@ def compras_seguimiento_view(request):
     ordenes = (
         Orden.objects.filter(tipo="compra", estado__in=estados_en_seguimiento)
         .select_related("proveedor")
+        .annotate(
+            cantidad_lineas=Count("items_oc"),
+            unidades_pedidas=Sum("items_oc__cantidad"),
+            unidades_recibidas=Sum("items_oc__cantidad_recibida"),
+        )
         .order_by("-fecha_creacion")
     )
 
@@ -1504,13 +1595,12 @@ def compras_seleccionar_proveedor_para_insumo_view(request, insumo_id):
     if not ofertas.exists():
         proveedores_fallback = Proveedor.objects.all().order_by("nombre")[:5]
 
-    UMBRAL_STOCK_BAJO_INSUMOS = 15000
     context = {
         "insumo_objetivo": insumo_objetivo,
         "ofertas_proveedores": ofertas,
         "proveedores_fallback": proveedores_fallback,
         "titulo_seccion": f"Seleccionar Oferta para: {insumo_objetivo.descripcion}",
-        "umbral_stock_bajo": UMBRAL_STOCK_BAJO_INSUMOS,
+        "umbral_stock_bajo": insumo_objetivo.punto_reorden,
     }
     return render(request, "compras/compras_seleccionar_proveedor.html", context)
 
@@ -1522,14 +1612,18 @@ def compras_detalle_oc_view(request, oc_id):
     #     return redirect('App_LUMINOVA:compras_lista_oc')
 
     orden_compra = get_object_or_404(
-        Orden.objects.select_related("proveedor", "insumo_principal__categoria"),
+        Orden.objects.select_related(
+            "proveedor", "insumo_principal__categoria"
+        ).prefetch_related(
+            Prefetch(
+                "items_oc",
+                queryset=ItemOrdenCompra.objects.select_related("insumo").order_by("id"),
+            )
+        ),
         id=oc_id,
         tipo="compra",  # Asegurar que sea una OC
     )
 
-    # Si tuvieras ItemsOrdenCompra, los prefetch aquí:
-    # .prefetch_related('items_oc__insumo')
-
     context = {
         "oc": orden_compra,
         "titulo_seccion": f"Detalle OC: {orden_compra.numero_orden}",
@@ -1538,7 +1632,7 @@ def compras_detalle_oc_view(request, oc_id):
 
 
 @login_required
-@transaction.atomic
+@atomic_en_escrituras
 def compras_crear_oc_view(request, insumo_id=None, proveedor_id=None):
     insumo_preseleccionado_obj = None
     proveedor_preseleccionado_obj = None
@@ -1550,8 +1644,10 @@ def compras_crear_oc_view(request, insumo_id=None, proveedor_id=None):
         initial_data['insumo_principal'] = insumo_preseleccionado_obj
         form_kwargs['insumo_fijado'] = insumo_preseleccionado_obj
 
-        UMBRAL_STOCK_BAJO = 15000
-        cantidad_sugerida = max(10, UMBRAL_STOCK_BAJO - insumo_preseleccionado_obj.stock)
+        cantidad_sugerida = max(
+            10,
+            insumo_preseleccionado_obj.punto_reorden - insumo_preseleccionado_obj.stock,
+        )
         initial_data['cantidad_principal'] = cantidad_sugerida
 
         if proveedor_id:
@@ -1595,7 +1691,7 @@ def compras_crear_oc_view(request, insumo_id=None, proveedor_id=None):
 
 
 @login_required
-@transaction.atomic
+@atomic_en_escrituras
 def compras_editar_oc_view(request, oc_id):
     orden_compra_instance = get_object_or_404(Orden, id=oc_id, tipo="compra")
     logger.info(
@@ -1739,7 +1835,6 @@ def compras_editar_oc_view(request, oc_id):
 
 @login_required
 @require_POST  # Esta acción debería ser un POST, ya que modifica datos
-@transaction.atomic
 def compras_aprobar_oc_directamente_view(request, oc_id):  # Nuevo nombre
     # if not es_admin_o_rol(request.user, ['compras_manager', 'administrador']): # Permisos
     #     messages.error(request, "No tiene permiso para aprobar Órdenes de Compra.")
@@ -1747,42 +1842,136 @@ def compras_aprobar_oc_directamente_view(request, oc_id):  # Nuevo nombre
 
     orden_compra = get_object_or_404(Orden, id=oc_id, tipo="compra")
 
-    if orden_compra.estado == "BORRADOR":  # Solo aprobar desde borrador
+    # cantidad_en_pedido ya se suma al crear el borrador; aprobar solo cambia el estado.
+    resultado = cambiar_estado_ocs([orden_compra.id], "APROBADA")
+    if resultado.actualizadas:
+        messages.success(
+            request,
+            f"Orden de Compra '{orden_compra.numero_orden}' ha sido APROBADA.",
+        )
+        logger.info(
+            f"OC {orden_compra.numero_orden} (ID: {oc_id}) cambió estado a APROBADA por {request.user.username}"
+        )
+    for numero, motivo in resultado.rechazadas:
+        messages.warning(request, f"La OC '{numero}' no se aprobó: {motivo}")
+
+    return redirect("App_LUMINOVA:compras_lista_oc")
+
+
+def _es_entero(valor):
+    # bool es subclase de int, pero true/false no son ids.
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+
+def _error_json_cambio_estado_ocs(datos):
+    """Mensaje de error si el cuerpo JSON no tiene los tipos esperados, o None."""
+    if not isinstance(datos, dict):
+        return "Se esperaba un objeto JSON."
+    if not isinstance(datos.get("nuevo_estado"), str):
+        return "'nuevo_estado' debe ser un texto."
+    oc_ids = datos.get("oc_ids")
+    if oc_ids is not None and not (
+        isinstance(oc_ids, list) and all(_es_entero(i) for i in oc_ids)
+    ):
+        return "'oc_ids' debe ser una lista de ids numéricos."
+    filtro = datos.get("filtro")
+    if filtro is None:
+        return None
+    if not isinstance(filtro, dict):
+        return "'filtro' debe ser un objeto."
+    if filtro.get("estado") is not None and not isinstance(filtro["estado"], str):
+        return "'filtro.estado' debe ser un texto."
+    if filtro.get("proveedor_id") is not None and not _es_entero(filtro["proveedor_id"]):
+        return "'filtro.proveedor_id' debe ser un id numérico."
+    return None
+
+
+@login_required
+@require_POST
+def compras_cambiar_estado_ocs_view(request):
+    """
+    Mueve en bloque un conjunto de OCs por el circuito Borrador → Aprobada →
+    Enviada al Proveedor → En Tránsito.
+
+    Acepta el formulario del listado (`oc_ids` y `nuevo_estado`) o un cuerpo
+    JSON con `nuevo_estado` y `oc_ids` o, en su lugar, un `filtro` por
+    `estado` y/o `proveedor_id` para tomar todas las OCs que coincidan. En
+    JSON responde con las OCs actualizadas y el motivo de cada rechazo.
+    """
+    es_json = request.content_type == "application/json"
+    if es_json:
         try:
-            orden_compra.estado = "APROBADA"
-            # Aquí es un buen lugar para confirmar/actualizar la cantidad_en_pedido del insumo
-            # si no se hizo al crear el borrador, o si quieres que solo las aprobadas la afecten.
-            if (
-                orden_compra.insumo_principal
-                and orden_compra.cantidad_principal
-                and orden_compra.cantidad_principal > 0
-            ):
-                # Asegúrate que esta lógica no duplique si ya lo hiciste en la creación del borrador.
-                # Si la cantidad_en_pedido se suma al crear el BORRADOR, no necesitas hacerlo de nuevo aquí.
-                # Si solo se suma al APROBAR, entonces este es el lugar:
-                # Insumo.objects.filter(id=orden_compra.insumo_principal.id).update(
-                #     cantidad_en_pedido=F('cantidad_en_pedido') + orden_compra.cantidad_principal
-                # )
-                # logger.info(f"OC {orden_compra.numero_orden} aprobada. Incrementada cantidad_en_pedido para {orden_compra.insumo_principal.descripcion}.")
-                pass  # Asumimos que cantidad_en_pedido ya se actualizó al crear el borrador
-
-            orden_compra.save(update_fields=["estado"])
-            messages.success(
-                request,
-                f"Orden de Compra '{orden_compra.numero_orden}' ha sido APROBADA.",
-            )
-            logger.info(
-                f"OC {orden_compra.numero_orden} (ID: {oc_id}) cambió estado a APROBADA por {request.user.username}"
-            )
-        except Exception as e:
-            messages.error(request, f"Error al aprobar la OC: {e}")
-            logger.error(f"Error al cambiar estado de OC {oc_id} a APROBADA: {e}")
+            datos = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({"success": False, "error": "JSON inválido."}, status=400)
+        error_tipos = _error_json_cambio_estado_ocs(datos)
+        if error_tipos:
+            return JsonResponse({"success": False, "error": error_tipos}, status=400)
+        nuevo_estado = datos.get("nuevo_estado")
+        oc_ids = datos.get("oc_ids")
+        filtro = datos.get("filtro") or {}
     else:
-        messages.warning(
-            request,
-            f"La OC '{orden_compra.numero_orden}' no está en estado 'Borrador'. Estado actual: {orden_compra.get_estado_display()}",
+        nuevo_estado = request.POST.get("nuevo_estado")
+        oc_ids = request.POST.getlist("oc_ids")
+        filtro = {}
+
+    if oc_ids:
+        try:
+            ordenes = Orden.objects.filter(id__in=[int(i) for i in oc_ids])
+        except (TypeError, ValueError):
+            ordenes = None
+    elif filtro.get("estado") or filtro.get("proveedor_id"):
+        ordenes = Orden.objects.filter(
+            **{
+                campo: filtro[clave]
+                for clave, campo in (("estado", "estado"), ("proveedor_id", "proveedor_id"))
+                if filtro.get(clave)
+            }
+        )
+    else:
+        ordenes = None
+
+    error = None
+    if ordenes is None:
+        error = "Seleccione al menos una Orden de Compra."
+    else:
+        try:
+            resultado = cambiar_estado_ocs(ordenes, nuevo_estado)
+        except TransicionOCInvalida as e:
+            error = str(e)
+
+    if es_json:
+        if error:
+            return JsonResponse({"success": False, "error": error}, status=400)
+        return JsonResponse(
+            {
+                "success": True,
+                "actualizadas": resultado.actualizadas,
+                "rechazadas": [
+                    {"numero_orden": numero, "motivo": motivo}
+                    for numero, motivo in resultado.rechazadas
+                ],
+            }
         )
 
+    if error:
+        messages.error(request, error)
+        return redirect("App_LUMINOVA:compras_lista_oc")
+    if resultado.actualizadas:
+        messages.success(
+            request,
+            f"{len(resultado.actualizadas)} Órdenes de Compra pasaron a "
+            f"'{dict(Orden.ESTADO_ORDEN_COMPRA_CHOICES)[nuevo_estado]}'.",
+        )
+        logger.info(
+            f"{request.user.username} pasó a {nuevo_estado} las OCs: {', '.join(resultado.actualizadas)}"
+        )
+    for numero, motivo in resultado.rechazadas[:20]:
+        messages.warning(request, f"{numero}: {motivo}")
+    if len(resultado.rechazadas) > 20:
+        messages.warning(
+            request, f"... y {len(resultado.rechazadas) - 20} OCs más no se actualizaron."
+        )
     return redirect("App_LUMINOVA:compras_lista_oc")
 
 
@@ -1902,7 +2091,7 @@ def produccion_lista_op_view(request):
     """
 
     # Estados que consideramos "finalizados" y que irán a la pestaña de historial.
-    ESTADOS_FINALIZADOS = ["Completada", "Cancelada"]
+    ids_finalizados = estados.ids(*Estados.FINALIZADOS)
 
     # Creamos una consulta base para no repetir el código.
     # Esta consulta ya incluye las optimizaciones de select_related y prefetch_related.
@@ -1924,13 +2113,13 @@ def produccion_lista_op_view(request):
     # 1. Lista de OPs "Activas": todas aquellas cuyo estado NO está en la lista de finalizados.
     #    Se ordenan por las más antiguas primero para darles prioridad.
     ops_activas = base_query.exclude(
-        estado_op__nombre__in=ESTADOS_FINALIZADOS
+        estado_op_id__in=ids_finalizados
     ).order_by("fecha_solicitud")
 
     # 2. Lista de OPs "Finalizadas": todas aquellas cuyo estado SÍ está en la lista.
     #    Se ordenan por las más recientes primero para ver lo último que se terminó.
     ops_finalizadas = base_query.filter(
-        estado_op__nombre__in=ESTADOS_FINALIZADOS
+        estado_op_id__in=ids_finalizados
     ).order_by("-fecha_solicitud")
 
     context = {
@@ -1981,9 +2170,9 @@ def planificacion_produccion_view(request):
 
     # --- LÓGICA GET MEJORADA ---
     # Obtener todas las OPs que no estén en un estado final
-    estados_finales = ["Completada", "Cancelada"]
+    estados_finales = estados.ids(*Estados.FINALIZADOS)
     ops_para_planificar = (
-        OrdenProduccion.objects.exclude(estado_op__nombre__in=estados_finales)
+        OrdenProduccion.objects.exclude(estado_op_id__in=estados_finales)
         .select_related(
             "producto_a_producir",
             "orden_venta_origen__cliente",
@@ -1993,11 +2182,9 @@ def planificacion_produccion_view(request):
         .order_by("estado_op__id", "fecha_solicitud")
     )  # Ordenar por estado y luego por fecha
 
-    sectores = SectorAsignado.objects.all().order_by("nombre")
-
     context = {
         "ops_para_planificar_list": ops_para_planificar,
-        "sectores_list": sectores,
+        "sectores_list": sectores.todos(),
         "titulo_seccion": "Planificación de Órdenes de Producción",
     }
     return render(request, "produccion/planificacion.html", context)
@@ -2005,7 +2192,7 @@ def planificacion_produccion_view(request):
 
 @login_required
 @require_POST
-@transaction.atomic
+@atomic_en_escrituras
 def solicitar_insumos_op_view(request, op_id):
     op = get_object_or_404(
         OrdenProduccion.objects.select_related(
@@ -2024,9 +2211,7 @@ def solicitar_insumos_op_view(request, op_id):
         return redirect("App_LUMINOVA:produccion_detalle_op", op_id=op.id)
 
     try:
-        estado_insumos_solicitados_op = EstadoOrden.objects.get(
-            nombre__iexact="Insumos Solicitados"
-        )
+        estado_insumos_solicitados_op = estados.obtener(Estados.INSUMOS_SOLICITADOS)
 
         # Log de cambio de estado de OP antes de guardar
         if (
@@ -2085,7 +2270,7 @@ def solicitar_insumos_op_view(request, op_id):
 
 
 @login_required
-@transaction.atomic
+@atomic_en_escrituras
 def produccion_detalle_op_view(request, op_id):
     op = get_object_or_404(
         OrdenProduccion.objects.select_related(
@@ -2127,76 +2312,14 @@ def produccion_detalle_op_view(request, op_id):
     else:
         todos_los_insumos_disponibles = False
 
-    puede_solicitar_insumos = False
-    mostrar_boton_reportar = False
-    estado_op_queryset_para_form = EstadoOrden.objects.all().order_by("nombre")
-
-    ESTADO_OP_PENDIENTE_LOWER = "pendiente"
-    ESTADO_OP_PLANIFICADA_LOWER = "planificada"
-    ESTADO_OP_INSUMOS_SOLICITADOS_LOWER = "insumos solicitados"
-    ESTADO_OP_INSUMOS_RECIBIDOS_LOWER = "insumos recibidos"
-    ESTADO_OP_PRODUCCION_INICIADA_LOWER = "producción iniciada"
-    ESTADO_OP_EN_PROCESO_LOWER = "en proceso"
-    ESTADO_OP_PAUSADA_LOWER = "pausada"
-    NOMBRE_ESTADO_OP_COMPLETADA_CONST = "Completada"
-    ESTADO_OP_COMPLETADA_LOWER = NOMBRE_ESTADO_OP_COMPLETADA_CONST.lower()
-    ESTADO_OP_CANCELADA_LOWER = "cancelada"
-
-    if op.estado_op:
-        estado_actual_nombre_lower = op.estado_op.nombre.lower()
-        estado_actual_nombre_original = op.estado_op.nombre
-        nombres_permitidos_dropdown = [estado_actual_nombre_original]
-
-        if (
-            estado_actual_nombre_lower
-            in [ESTADO_OP_PENDIENTE_LOWER, ESTADO_OP_PLANIFICADA_LOWER]
-            and op.sector_asignado_op
-        ):
-            puede_solicitar_insumos = True
-        elif estado_actual_nombre_lower == ESTADO_OP_INSUMOS_SOLICITADOS_LOWER:
-            nombres_permitidos_dropdown.extend(["Pausada", "Cancelada"])
-        elif estado_actual_nombre_lower == ESTADO_OP_INSUMOS_RECIBIDOS_LOWER:
-            nombres_permitidos_dropdown.extend(
-                ["Producción Iniciada", "Pausada", "Cancelada"]
-            )
-        elif estado_actual_nombre_lower == ESTADO_OP_PRODUCCION_INICIADA_LOWER:
-            nombres_permitidos_dropdown.extend(
-                ["En Proceso", "Pausada", "Completada", "Cancelada"]
-            )
-        elif estado_actual_nombre_lower == ESTADO_OP_EN_PROCESO_LOWER:
-            nombres_permitidos_dropdown.extend(["Pausada", "Completada", "Cancelada"])
-        elif estado_actual_nombre_lower == ESTADO_OP_PAUSADA_LOWER:
-            nombres_permitidos_dropdown.extend(["Cancelada"])
-            if EstadoOrden.objects.filter(
-                nombre__iexact=ESTADO_OP_INSUMOS_RECIBIDOS_LOWER
-            ).exists():
-                nombres_permitidos_dropdown.append("Insumos Recibidos")
-            if EstadoOrden.objects.filter(
-                nombre__iexact=ESTADO_OP_PRODUCCION_INICIADA_LOWER
-            ).exists():
-                nombres_permitidos_dropdown.append("Producción Iniciada")
-            if EstadoOrden.objects.filter(
-                nombre__iexact=ESTADO_OP_PENDIENTE_LOWER
-            ).exists():
-                nombres_permitidos_dropdown.append("Pendiente")
-
-        if estado_actual_nombre_lower not in [
-            ESTADO_OP_COMPLETADA_LOWER,
-            ESTADO_OP_CANCELADA_LOWER,
-        ]:
-            mostrar_boton_reportar = True
-
-        q_permitidos = Q()
-        for n in list(set(nombres_permitidos_dropdown)):
-            q_permitidos |= Q(nombre__iexact=n)
-        if q_permitidos:
-            estado_op_queryset_para_form = EstadoOrden.objects.filter(
-                q_permitidos
-            ).order_by("nombre")
-        elif op.estado_op:
-            estado_op_queryset_para_form = EstadoOrden.objects.filter(
-                id=op.estado_op.id
-            )
+    puede_solicitar_insumos = bool(
+        op.sector_asignado_op
+        and op.estado_op_id in estados.ids(Estados.PENDIENTE, Estados.PLANIFICADA)
+    )
+    # Las transiciones permitidas salen del mapa compilado en memoria.
+    estado_op_queryset_para_form = EstadoOrden.objects.filter(
+        id__in=maquina_estados_op.ids_permitidos(op.estado_op_id)
+    ).order_by("nombre")
 
     if request.method == "POST":
         form_update = OrdenProduccionUpdateForm(
@@ -2205,107 +2328,37 @@ def produccion_detalle_op_view(request, op_id):
         if form_update.is_valid():
             nuevo_estado_op_obj = form_update.cleaned_data.get("estado_op")
 
-            # Log de cambio de estado de OP
-            if op.orden_venta_origen and estado_op_anterior_obj != nuevo_estado_op_obj:
-                descripcion_op = (
-                    f"La OP {op.numero_op} ('{op.producto_a_producir.descripcion}') cambió su estado "
-                    f"de '{estado_op_anterior_obj.nombre if estado_op_anterior_obj else 'N/A'}' "
-                    f"a '{nuevo_estado_op_obj.nombre if nuevo_estado_op_obj else 'N/A'}'."
-                )
-                HistorialOV.objects.create(
-                    orden_venta=op.orden_venta_origen,
-                    descripcion=descripcion_op,
-                    tipo_evento="Cambio Estado OP",
-                    realizado_por=request.user,
-                )
-
+            # Guardamos los demás campos y dejamos el cambio de estado al motor.
             op_actualizada = form_update.save(commit=False)
-            se_esta_completando_op_ahora = False
-            if (
-                nuevo_estado_op_obj
-                and nuevo_estado_op_obj.nombre.lower() == ESTADO_OP_COMPLETADA_LOWER
-            ):
-                if (
-                    not estado_op_anterior_obj
-                    or estado_op_anterior_obj.nombre.lower()
-                    != ESTADO_OP_COMPLETADA_LOWER
-                ):
-                    se_esta_completando_op_ahora = True
-                    op_actualizada.fecha_fin_real = (
-                        timezone.now()
-                        if not op_actualizada.fecha_fin_real
-                        else op_actualizada.fecha_fin_real
-                    )
-
-            if se_esta_completando_op_ahora:
-                producto_terminado_obj = op_actualizada.producto_a_producir
-                cantidad_producida = op_actualizada.cantidad_a_producir
-                if producto_terminado_obj and cantidad_producida > 0:
+            op_actualizada.estado_op = estado_op_anterior_obj
+            op_actualizada.save()
 
-                    # 1. Actualizar el stock principal del ProductoTerminado
-                    producto_terminado_obj.stock = F("stock") + cantidad_producida
-                    producto_terminado_obj.save(update_fields=["stock"])
-                    logger.info(
-                        f"Stock de '{producto_terminado_obj.descripcion}' incrementado en {cantidad_producida}."
+            if nuevo_estado_op_obj:
+                try:
+                    resultado = cambiar_estado_op(
+                        op_actualizada, nuevo_estado_op_obj, usuario=request.user
+                    )
+                except TransicionOPInvalida as e:
+                    messages.error(request, str(e))
+                    return redirect(
+                        "App_LUMINOVA:produccion_detalle_op", op_id=op_actualizada.id
                     )
 
-                    # 2. Crear el lote para registro y envío
-                    LoteProductoTerminado.objects.create(
-                        producto=producto_terminado_obj,
-                        op_asociada=op_actualizada,
-                        cantidad=cantidad_producida,
+                for lote in resultado.lotes_creados:
+                    messages.info(
+                        request,
+                        f"Lote de {lote.cantidad} x '{op_actualizada.producto_a_producir.descripcion}' generado y stock actualizado.",
                     )
+                for orden_venta_asociada in resultado.ovs_listas_para_entrega:
                     messages.info(
                         request,
-                        f"Lote de {cantidad_producida} x '{producto_terminado_obj.descripcion}' generado y stock actualizado.",
+                        f"Todos los ítems de la OV {orden_venta_asociada.numero_ov} están listos. El estado de la OV se ha actualizado a 'Lista para Entrega'.",
                     )
 
-            op_actualizada.save()
             messages.success(
                 request,
                 f"Orden de Producción {op_actualizada.numero_op} actualizada a '{op_actualizada.get_estado_op_display()}'.",
             )
-
-            if op_actualizada.orden_venta_origen:
-                orden_venta_asociada = op_actualizada.orden_venta_origen
-                ops_de_la_ov = OrdenProduccion.objects.filter(
-                    orden_venta_origen=orden_venta_asociada
-                )
-
-                total_ops_en_ov = ops_de_la_ov.count()
-                count_completada = ops_de_la_ov.filter(
-                    estado_op__nombre__iexact=ESTADO_OP_COMPLETADA_LOWER
-                ).count()
-                count_cancelada = ops_de_la_ov.filter(
-                    estado_op__nombre__iexact=ESTADO_OP_CANCELADA_LOWER
-                ).count()
-
-                if total_ops_en_ov > 0 and (
-                    count_completada + count_cancelada == total_ops_en_ov
-                ):
-                    if orden_venta_asociada.estado != "LISTA_ENTREGA":
-                        estado_ov_anterior_str = (
-                            orden_venta_asociada.get_estado_display()
-                        )
-                        orden_venta_asociada.estado = "LISTA_ENTREGA"
-                        orden_venta_asociada.save(update_fields=["estado"])
-
-                        descripcion_ov = f"Estado de la OV cambió de '{estado_ov_anterior_str}' a 'Lista para Entrega'."
-                        HistorialOV.objects.create(
-                            orden_venta=orden_venta_asociada,
-                            descripcion=descripcion_ov,
-                            tipo_evento="Cambio Estado OV",
-                            realizado_por=request.user,
-                        )
-
-                        messages.info(
-                            request,
-                            f"Todos los ítems de la OV {orden_venta_asociada.numero_ov} están listos. El estado de la OV se ha actualizado a 'Lista para Entrega'.",
-                        )
-                        logger.info(
-                            f"OV {orden_venta_asociada.numero_ov} actualizada a 'LISTA_ENTREGA' porque todas sus OPs han finalizado."
-                        )
-
             return redirect(
                 "App_LUMINOVA:produccion_detalle_op", op_id=op_actualizada.id
             )
@@ -2317,11 +2370,6 @@ def produccion_detalle_op_view(request, op_id):
             logger.warning(
                 f"Formulario OrdenProduccionUpdateForm inválido para OP {op.id}: {form_update.errors.as_json()}"
             )
-            if op.estado_op and op.estado_op.nombre.lower() in [
-                ESTADO_OP_PAUSADA_LOWER,
-                ESTADO_OP_CANCELADA_LOWER,
-            ]:
-                mostrar_boton_reportar = True
     else:
         form_update = OrdenProduccionUpdateForm(
             instance=op, estado_op_queryset=estado_op_queryset_para_form
@@ -2369,9 +2417,7 @@ def reportes_produccion_view(request, reporte_id=None, resolver=False):
             ):
                 try:
                     # Intenta volver al estado 'En Proceso' que es lo más lógico.
-                    estado_reanudado = EstadoOrden.objects.get(
-                        nombre__iexact="En Proceso"
-                    )
+                    estado_reanudado = estados.obtener(Estados.EN_PROCESO)
                     op_asociada.estado_op = estado_reanudado
                     op_asociada.save()
                     messages.success(
@@ -2413,7 +2459,7 @@ def reportes_produccion_view(request, reporte_id=None, resolver=False):
 
 
 @login_required
-@transaction.atomic
+@atomic_en_escrituras
 def crear_reporte_produccion_view(request, op_id):
     orden_produccion = get_object_or_404(OrdenProduccion, id=op_id)
 
@@ -2459,7 +2505,7 @@ def crear_reporte_produccion_view(request, op_id):
 
 # --- DEPÓSITO VIEWS ---
 @login_required
-@transaction.atomic
+@atomic_en_escrituras
 def deposito_enviar_insumos_op_view(request, op_id):
     op = get_object_or_404(
         OrdenProduccion.objects.select_related(
@@ -2481,9 +2527,6 @@ def deposito_enviar_insumos_op_view(request, op_id):
             )
             return redirect("App_LUMINOVA:deposito_detalle_solicitud_op", op_id=op.id)
 
-        insumos_descontados_correctamente = True
-        errores_stock = []
-
         if not op.producto_a_producir:
             messages.error(
                 request,
@@ -2491,105 +2534,40 @@ def deposito_enviar_insumos_op_view(request, op_id):
             )
             return redirect("App_LUMINOVA:deposito_detalle_solicitud_op", op_id=op.id)
 
-        componentes_requeridos = ComponenteProducto.objects.filter(
-            producto_terminado=op.producto_a_producir
-        ).select_related("insumo")
-
-        if not componentes_requeridos.exists():
+        try:
+            # Descuenta todo el BOM (o nada) y pasa la OP a "Insumos Recibidos".
+            enviar_insumos_op(op, usuario=request.user)
+        except StockInsuficienteError as e:
+            for faltante in e.faltantes:
+                messages.error(request, str(faltante))
+            logger.warning(
+                f"Errores de stock al procesar OP {op.numero_op}. Redirigiendo a detalle de solicitud."
+            )
+            return redirect("App_LUMINOVA:deposito_detalle_solicitud_op", op_id=op.id)
+        except ValueError as e:
+            messages.error(request, str(e))
+            logger.error(f"No se pudieron enviar los insumos de la OP {op.numero_op}: {e}")
+            return redirect("App_LUMINOVA:deposito_detalle_solicitud_op", op_id=op.id)
+        except EstadoOrden.DoesNotExist as e:
             messages.error(
                 request,
-                f"No se puede procesar: No hay BOM definido para el producto '{op.producto_a_producir.descripcion}'.",
-            )
-            logger.error(
-                f"BOM no definido para producto {op.producto_a_producir.id} en OP {op.numero_op}"
+                f"Error de Configuración: {e} No se descontaron insumos. Por favor, cree este estado en el panel de administración.",
             )
+            logger.error(f"CRÍTICO: {e} OP {op.numero_op} sin procesar.")
             return redirect("App_LUMINOVA:deposito_detalle_solicitud_op", op_id=op.id)
 
-        for comp in componentes_requeridos:
-            cantidad_a_descontar = comp.cantidad_necesaria * op.cantidad_a_producir
-            try:
-                # Bloquear la fila del insumo para evitar condiciones de carrera (si tu DB lo soporta bien)
-                # insumo_a_actualizar = Insumo.objects.select_for_update().get(id=comp.insumo.id)
-                insumo_a_actualizar = Insumo.objects.get(
-                    id=comp.insumo.id
-                )  # Versión más simple
-
-                if insumo_a_actualizar.stock >= cantidad_a_descontar:
-                    # Usar F() expression para una actualización atómica es preferible
-                    Insumo.objects.filter(id=insumo_a_actualizar.id).update(
-                        stock=F("stock") - cantidad_a_descontar
-                    )
-                    logger.info(
-                        f"Stock de '{insumo_a_actualizar.descripcion}' (ID: {insumo_a_actualizar.id}) descontado en {cantidad_a_descontar}."
-                    )
-                else:
-                    errores_stock.append(
-                        f"Stock insuficiente para '{insumo_a_actualizar.descripcion}'. Requeridos: {cantidad_a_descontar}, Disponible: {insumo_a_actualizar.stock}"
-                    )
-                    insumos_descontados_correctamente = False
-                    # Aquí podrías decidir si continuar verificando otros insumos o hacer break.
-                    # Si haces break, solo se reportará el primer error de stock.
-            except Insumo.DoesNotExist:
-                errores_stock.append(
-                    f"Insumo '{comp.insumo.descripcion}' (ID: {comp.insumo.id}) no encontrado durante el descuento. Error de datos."
-                )
-                insumos_descontados_correctamente = False
-                break  # Error crítico, no continuar si un insumo del BOM no existe
-
-        if errores_stock:  # Si hubo algún error de stock
-            for error_msg in errores_stock:
-                messages.error(request, error_msg)
-            # No es necesario reasignar insumos_descontados_correctamente = False aquí, ya se hizo.
-
-        if insumos_descontados_correctamente:
-            try:
-                # Estado al que pasa la OP DESPUÉS de que Depósito envía los insumos
-                nombre_estado_op_post_deposito = (
-                    "Insumos Recibidos"  # ESTE ES EL NUEVO ESTADO OBJETIVO
-                )
-
-                estado_siguiente_op_obj = EstadoOrden.objects.get(
-                    nombre__iexact=nombre_estado_op_post_deposito
-                )
-
-                op.estado_op = estado_siguiente_op_obj
-                # Considera si fecha_inicio_real se debe setear aquí o cuando producción realmente empieza.
-                # Si es cuando depósito entrega, está bien.
-                if (
-                    not op.fecha_inicio_real
-                ):  # O un nuevo campo como 'fecha_insumos_entregados'
-                    op.fecha_inicio_real = timezone.now()
-                op.save(update_fields=["estado_op", "fecha_inicio_real"])
-
-                messages.success(
-                    request,
-                    f"Insumos para OP {op.numero_op} marcados como enviados/recibidos. OP ahora en estado '{estado_siguiente_op_obj.nombre}'.",
-                )
-                logger.info(
-                    f"OP {op.numero_op} actualizada a estado '{estado_siguiente_op_obj.nombre}' por Depósito."
-                )
-
-                # La OV podría seguir en "INSUMOS_SOLICITADOS" o pasar a un estado intermedio si lo tienes.
-                # La transición a "PRODUCCION_INICIADA" para la OV debería ocurrir cuando Producción
-                # explícitamente inicia la OP (cambiándola de "Insumos Recibidos" a "Producción Iniciada").
-                # No hay cambio directo de estado de OV aquí, se deja a la lógica de produccion_detalle_op_view.
-
-            except EstadoOrden.DoesNotExist:
-                messages.error(
-                    request,
-                    f"Error de Configuración: El estado de OP '{nombre_estado_op_post_deposito}' no fue encontrado. Insumos descontados, pero el estado de la OP no se actualizó correctamente. Por favor, cree este estado en el panel de administración.",
-                )
-                logger.error(
-                    f"CRÍTICO: Estado OP '{nombre_estado_op_post_deposito}' no encontrado. OP {op.numero_op} podría quedar en estado incorrecto."
-                )
-            return redirect(
-                "App_LUMINOVA:deposito_solicitudes_insumos"
-            )  # Vuelve a la lista de solicitudes pendientes
-        else:  # Hubo errores de stock
-            logger.warning(
-                f"Errores de stock al procesar OP {op.numero_op}. Redirigiendo a detalle de solicitud."
-            )
-            return redirect("App_LUMINOVA:deposito_detalle_solicitud_op", op_id=op.id)
+        messages.success(
+            request,
+            f"Insumos para OP {op.numero_op} marcados como enviados/recibidos. OP ahora en estado '{op.estado_op.nombre}'.",
+        )
+        logger.info(
+            f"OP {op.numero_op} actualizada a estado '{op.estado_op.nombre}' por Depósito."
+        )
+        # La transición a "Producción Iniciada" ocurre cuando Producción inicia la OP
+        # desde produccion_detalle_op_view.
+        return redirect(
+            "App_LUMINOVA:deposito_solicitudes_insumos"
+        )  # Vuelve a la lista de solicitudes pendientes
 
     # Si es GET
     messages.info(
@@ -2611,9 +2589,9 @@ def deposito_solicitudes_insumos_view(request):
 
     try:
         # 1. OBTENER OPs QUE ESTÁN SOLICITANDO INSUMOS
-        estado_insumos_solicitados_obj = EstadoOrden.objects.filter(
-            nombre__iexact="Insumos Solicitados"
-        ).first()  # Renombrado para claridad
+        estado_insumos_solicitados_obj = estados.buscar(
+            Estados.INSUMOS_SOLICITADOS
+        )  # Renombrado para claridad
 
         if estado_insumos_solicitados_obj:
             logger.info(
@@ -2642,9 +2620,9 @@ def deposito_solicitudes_insumos_view(request):
 
         # 2. OBTENER OPs A LAS QUE YA SE LES ENVIARON INSUMOS (AHORA EN ESTADO "En Proceso")
         estado_en_proceso_nombre_buscado = "En Proceso"
-        estado_en_proceso_obj = EstadoOrden.objects.filter(
-            nombre__iexact=estado_en_proceso_nombre_buscado
-        ).first()  # Renombrado
+        estado_en_proceso_obj = estados.buscar(
+            estado_en_proceso_nombre_buscado
+        )  # Renombrado
 
         if estado_en_proceso_obj:
             logger.info(
@@ -2693,15 +2671,22 @@ def deposito_solicitudes_insumos_view(request):
 @login_required
 def recepcion_pedidos_view(request):
     """
-    Muestra una lista de Órdenes de Compra que están "En Tránsito" y listas para ser recibidas.
+    Muestra las Órdenes de Compra "En Tránsito" o recibidas en parte, con sus
+    líneas, listas para registrar lo que llega.
     """
     # if not es_admin_o_rol(request.user, ['deposito', 'administrador']):
     #     messages.error(request, "Acceso no permitido.")
     #     return redirect('App_LUMINOVA:dashboard')
 
     ocs_en_transito = (
-        Orden.objects.filter(tipo="compra", estado="EN_TRANSITO")
-        .select_related("proveedor", "insumo_principal")
+        Orden.objects.filter(tipo="compra", estado__in=ESTADOS_OC_EN_RECEPCION)
+        .select_related("proveedor")
+        .prefetch_related(
+            Prefetch(
+                "items_oc",
+                queryset=ItemOrdenCompra.objects.select_related("insumo").order_by("id"),
+            )
+        )
         .order_by("fecha_estimada_entrega")
     )
 
@@ -2714,44 +2699,53 @@ def recepcion_pedidos_view(request):
 
 @login_required
 @require_POST
-@transaction.atomic
 def recibir_pedido_oc_view(request, oc_id):
     """
-    Procesa la recepción de una Orden de Compra.
+    Procesa la recepción de una Orden de Compra, total o parcial.
+
+    Cada línea llega como `cantidad_<id de línea>`; si el formulario no trae
+    ninguna se recibe todo lo pendiente.
     """
     # if not es_admin_o_rol(request.user, ['deposito', 'administrador']):
     #     messages.error(request, "Acción no permitida.")
     #     return redirect('App_LUMINOVA:deposito_recepcion_pedidos')
 
-    orden_a_recibir = get_object_or_404(Orden, id=oc_id, estado="EN_TRANSITO")
-
-    insumo_recibido = orden_a_recibir.insumo_principal
-    cantidad_recibida = orden_a_recibir.cantidad_principal
-
-    if insumo_recibido and cantidad_recibida:
-        # 1. Incrementar el stock del insumo
-        insumo_recibido.stock = F("stock") + cantidad_recibida
-
-        # 2. Decrementar la cantidad en pedido
-        insumo_recibido.cantidad_en_pedido = F("cantidad_en_pedido") - cantidad_recibida
+    orden_a_recibir = get_object_or_404(
+        Orden, id=oc_id, tipo="compra", estado__in=ESTADOS_OC_EN_RECEPCION
+    )
 
-        insumo_recibido.save(update_fields=["stock", "cantidad_en_pedido"])
-        logger.info(
-            f"Stock de '{insumo_recibido.descripcion}' actualizado (+{cantidad_recibida}) y 'en pedido' actualizado (-{cantidad_recibida})."
-        )
+    cantidades = None
+    campos = {k: v for k, v in request.POST.items() if k.startswith("cantidad_")}
+    if campos:
+        try:
+            cantidades = {
+                int(k.removeprefix("cantidad_")): int(v or 0) for k, v in campos.items()
+            }
+        except ValueError:
+            messages.error(request, "Las cantidades recibidas deben ser números enteros.")
+            return redirect("App_LUMINOVA:deposito_recepcion_pedidos")
 
-        # 3. Actualizar el estado de la OC a "Completada" (o "Recibida Totalmente")
-        orden_a_recibir.estado = "COMPLETADA"
-        orden_a_recibir.save(update_fields=["estado"])
+    try:
+        resultado = recibir_orden_compra(orden_a_recibir, cantidades, usuario=request.user)
+    except RecepcionOCError as e:
+        for error in e.errores:
+            messages.error(request, f"OC {orden_a_recibir.numero_orden}: {error}")
+        return redirect("App_LUMINOVA:deposito_recepcion_pedidos")
 
+    unidades = sum(resultado.recibido.values())
+    logger.info(
+        f"OC {orden_a_recibir.numero_orden}: recibidas {unidades} unidades en "
+        f"{len(resultado.recibido)} líneas por {request.user.username}; estado {resultado.nuevo_estado}."
+    )
+    if resultado.completa:
         messages.success(
             request,
-            f"Pedido {orden_a_recibir.numero_orden} recibido exitosamente. Se agregaron {cantidad_recibida} unidades de '{insumo_recibido.descripcion}' al stock.",
+            f"Pedido {orden_a_recibir.numero_orden} recibido completo. Se agregaron {unidades} unidades al stock.",
         )
     else:
-        messages.error(
+        messages.success(
             request,
-            f"Error: La OC {orden_a_recibir.numero_orden} no tiene un insumo o cantidad principal válidos.",
+            f"Recepción parcial del pedido {orden_a_recibir.numero_orden}: se agregaron {unidades} unidades al stock; el resto sigue pendiente.",
         )
 
     return redirect("App_LUMINOVA:deposito_recepcion_pedidos")
@@ -2767,9 +2761,7 @@ def deposito_view(request):
     ops_pendientes_deposito_list = OrdenProduccion.objects.none()
     ops_pendientes_deposito_count = 0
     try:
-        estado_sol = EstadoOrden.objects.filter(
-            nombre__iexact="Insumos Solicitados"
-        ).first()
+        estado_sol = estados.buscar(Estados.INSUMOS_SOLICITADOS)
         if estado_sol:
             ops_pendientes_deposito_list = (
                 OrdenProduccion.objects.filter(estado_op=estado_sol)
@@ -2786,14 +2778,6 @@ def deposito_view(request):
         .order_by("-fecha_creacion")
     )
 
-    # --- INICIO DE LA CORRECCIÓN DE LÓGICA ---
-    UMBRAL_STOCK_BAJO_INSUMOS = 15000
-    insumos_con_stock_bajo = Insumo.objects.filter(stock__lt=UMBRAL_STOCK_BAJO_INSUMOS)
-
-    # Estados que consideramos como "pedido en firme" (ya no es tarea del depósito)
-    UMBRAL_STOCK_BAJO_INSUMOS = 15000
-    insumos_con_stock_bajo = Insumo.objects.filter(stock__lt=UMBRAL_STOCK_BAJO_INSUMOS)
-
     # Estados que consideramos como "pedido en firme" (ya no es tarea del depósito/compras iniciar)
     ESTADOS_OC_EN_PROCESO = [
         "APROBADA",
@@ -2802,27 +2786,33 @@ def deposito_view(request):
         "RECIBIDA_PARCIAL",
     ]
 
+    # OC en firme más reciente de cada insumo, resuelta en la misma consulta.
+    oc_en_proceso = ItemOrdenCompra.objects.filter(
+        insumo=OuterRef("pk"), orden__estado__in=ESTADOS_OC_EN_PROCESO
+    ).order_by("-orden__fecha_creacion")
+    insumos_con_stock_bajo = Insumo.objects.filter(
+        stock__lt=F("punto_reorden")
+    ).annotate(
+        oc_en_proceso_id=Subquery(oc_en_proceso.values("orden_id")[:1]),
+        oc_en_proceso_numero=Subquery(oc_en_proceso.values("orden__numero_orden")[:1]),
+        oc_en_proceso_estado=Subquery(oc_en_proceso.values("orden__estado")[:1]),
+    )
+
     insumos_a_gestionar = []
     insumos_en_pedido = []
-
     for insumo in insumos_con_stock_bajo:
-        # Buscamos si existe una OC que ya está aprobada y en proceso
-        oc_en_proceso = (
-            Orden.objects.filter(
-                insumo_principal=insumo, estado__in=ESTADOS_OC_EN_PROCESO
-            )
-            .order_by("-fecha_creacion")
-            .first()
-        )
-
-        if oc_en_proceso:
+        if insumo.oc_en_proceso_id:
             # Si ya está en proceso, va a la tabla "En Pedido"
-            insumos_en_pedido.append({"insumo": insumo, "oc": oc_en_proceso})
+            oc = Orden(
+                id=insumo.oc_en_proceso_id,
+                numero_orden=insumo.oc_en_proceso_numero,
+                estado=insumo.oc_en_proceso_estado,
+            )
+            insumos_en_pedido.append({"insumo": insumo, "oc": oc})
         else:
             # Si no hay OC en proceso (puede no existir o estar solo en Borrador),
             # es una acción pendiente.
             insumos_a_gestionar.append({"insumo": insumo})
-    # --- FIN DE LA CORRECCIÓN DE LÓGICA ---
 
     context = {
         "categorias_I": categorias_I,
@@ -2832,7 +2822,6 @@ def deposito_view(request):
         "lotes_productos_terminados_en_stock": lotes_en_stock,
         "insumos_a_gestionar_list": insumos_a_gestionar,  # Nueva lista para la primera tabla
         "insumos_en_pedido_list": insumos_en_pedido,  # Nueva lista para la segunda tabla
-        "umbral_stock_bajo": UMBRAL_STOCK_BAJO_INSUMOS,
     }
 
     return render(request, "deposito/deposito.html", context)
@@ -2849,7 +2838,7 @@ def deposito_solicitudes_insumos_view(request):
     )  # Inicializar con un queryset vacío
 
     try:
-        estado_objetivo = EstadoOrden.objects.get(nombre__iexact="Insumos Solicitados")
+        estado_objetivo = estados.obtener(Estados.INSUMOS_SOLICITADOS)
         ops_necesitan_insumos = (
             OrdenProduccion.objects.filter(  # ASIGNACIÓN AQUÍ (Camino A)
                 estado_op=estado_objetivo
@@ -2934,7 +2923,7 @@ def deposito_detalle_solicitud_op_view(request, op_id):
 
 @login_required
 @require_POST
-@transaction.atomic
+@atomic_en_escrituras
 def deposito_enviar_lote_pt_view(request, lote_id):
     """
     Procesa el envío de un lote de producto terminado.
@@ -2942,12 +2931,25 @@ def deposito_enviar_lote_pt_view(request, lote_id):
     - Marca el lote como enviado.
     - Actualiza el estado de la OV si corresponde.
     """
-    lote = get_object_or_404(
-        LoteProductoTerminado.objects.select_related(
-            "producto", "op_asociada__orden_venta_origen"
-        ),
-        id=lote_id,
-    )
+    try:
+        # En PostgreSQL, NOWAIT: si otra sesión está enviando este lote,
+        # avisamos en lugar de esperarla (y de enviarlo dos veces).
+        lote = get_object_or_404(
+            bloquear_filas(
+                LoteProductoTerminado.objects.select_related(
+                    "producto", "op_asociada__orden_venta_origen"
+                ),
+                nowait=True,
+            ),
+            id=lote_id,
+        )
+    except OperationalError:
+        transaction.set_rollback(True)
+        messages.warning(
+            request,
+            "El lote se está enviando desde otra sesión. Verifique su estado en unos segundos.",
+        )
+        return redirect("App_LUMINOVA:deposito_view")
 
     if lote.enviado:
         messages.warning(
@@ -2959,15 +2961,28 @@ def deposito_enviar_lote_pt_view(request, lote_id):
     producto_terminado = lote.producto
     cantidad_a_enviar = lote.cantidad
 
-    if producto_terminado.stock < cantidad_a_enviar:
+    # Descuento condicionado al stock actual: otro envío del mismo producto
+    # pudo descontarlo después de que leímos el lote.
+    if not ProductoTerminado.objects.filter(
+        id=producto_terminado.id, stock__gte=cantidad_a_enviar
+    ).update(stock=F("stock") - cantidad_a_enviar):
+        producto_terminado.refresh_from_db(fields=["stock"])
         messages.error(
             request,
             f"Error de consistencia de datos: No hay stock suficiente para '{producto_terminado.descripcion}' para enviar el lote. Stock actual: {producto_terminado.stock}, se necesita: {cantidad_a_enviar}.",
         )
         return redirect("App_LUMINOVA:deposito_view")
-
-    producto_terminado.stock -= cantidad_a_enviar
-    producto_terminado.save(update_fields=["stock"])
+    registrar_movimientos(
+        [
+            MovimientoStock(
+                producto_terminado=producto_terminado,
+                cantidad=-cantidad_a_enviar,
+                tipo="ENVIO_LOTE",
+                referencia=f"Lote {lote.id} (OP {lote.op_asociada.numero_op})",
+                usuario=request.user,
+            )
+        ]
+    )
     logger.info(
         f"Stock de '{producto_terminado.descripcion}' descontado en {cantidad_a_enviar}."
     )
@@ -3197,7 +3212,42 @@ class InsumoDetailView(DetailView):
     context_object_name = "insumo"
 
 
-class InsumoCreateView(CreateView):
+class KardexFormMixin:
+    """Registra en el kardex el cambio de stock hecho desde el formulario."""
+
+    def form_valid(self, form):
+        stock_anterior = form.initial.get("stock") if form.instance.pk else None
+        respuesta = super().form_valid(form)
+        registrar_ajuste_stock(self.object, stock_anterior, usuario=self.request.user)
+        return respuesta
+
+
+class HistorialStockDeleteMixin:
+    """
+    Un insumo o producto con movimientos en el kardex no se elimina: el kardex
+    es de sólo agregado y lo referencia con PROTECT, así que el artículo queda
+    como histórico. La confirmación lo avisa y el borrado se rechaza antes de
+    intentar el DELETE.
+    """
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["tiene_historial_stock"] = self.object.movimientos_stock.exists()
+        return context
+
+    def delete(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        if self.object.movimientos_stock.exists():
+            messages.error(
+                request,
+                f"No se puede eliminar '{self.object.descripcion}' porque tiene movimientos de stock "
+                "registrados; se conserva para mantener el historial del kardex.",
+            )
+            return redirect(self.get_success_url())
+        return super().delete(request, *args, **kwargs)
+
+
+class InsumoCreateView(KardexFormMixin, CreateView):
     model = Insumo
     template_name = "deposito/insumo_crear.html"
     # Define los campos que SÍ están en el modelo Insumo y quieres en el formulario de creación
@@ -3246,7 +3296,7 @@ class InsumoCreateView(CreateView):
         return reverse_lazy("App_LUMINOVA:deposito_view")
 
 
-class InsumoUpdateView(UpdateView):
+class InsumoUpdateView(KardexFormMixin, UpdateView):
     model = Insumo
     template_name = "deposito/insumo_editar.html"  # Asegúrate que sea el nombre correcto de tu plantilla
     fields = [
@@ -3292,7 +3342,7 @@ class InsumoUpdateView(UpdateView):
         return super().form_invalid(form)
 
 
-class InsumoDeleteView(DeleteView):
+class InsumoDeleteView(HistorialStockDeleteMixin, DeleteView):
     model = Insumo
     template_name = "deposito/insumo_confirm_delete.html"
     context_object_name = "insumo"
@@ -3335,7 +3385,11 @@ class InsumoDeleteView(DeleteView):
             if hasattr(
                 e, "protected_objects"
             ):  # e.protected_objects contiene los objetos que causan la protección
+                if any(isinstance(obj, MovimientoStock) for obj in e.protected_objects):
+                    protecting_objects.append("su historial de movimientos de stock")
                 for obj in e.protected_objects:
+                    if isinstance(obj, MovimientoStock):
+                        continue
                     if isinstance(obj, ComponenteProducto):
                         protecting_objects.append(
                             f"el producto terminado '{obj.producto_terminado.descripcion}' (usa {obj.cantidad_necesaria} unidades)"
@@ -3383,14 +3437,14 @@ class ProductoTerminadoDetailView(DetailView):
     context_object_name = "producto_terminado"
 
 
-class ProductoTerminadoCreateView(CreateView):
+class ProductoTerminadoCreateView(KardexFormMixin, CreateView):
     model = ProductoTerminado
     template_name = "deposito/productoterminado_crear.html"
     fields = "__all__"
     success_url = reverse_lazy("App_LUMINOVA:deposito_view")
 
 
-class ProductoTerminadoUpdateView(UpdateView):
+class ProductoTerminadoUpdateView(KardexFormMixin, UpdateView):
     model = ProductoTerminado
     template_name = "deposito/productoterminado_editar.html"
     fields = "__all__"
@@ -3399,7 +3453,7 @@ class ProductoTerminadoUpdateView(UpdateView):
     success_url = reverse_lazy("App_LUMINOVA:deposito_view")
 
 
-class ProductoTerminadoDeleteView(DeleteView):
+class ProductoTerminadoDeleteView(HistorialStockDeleteMixin, DeleteView):
     model = ProductoTerminado
     template_name = "deposito/productoterminado_confirm_delete.html"
     context_object_name = "producto_terminado"
@@ -3433,7 +3487,11 @@ class ProductoTerminadoDeleteView(DeleteView):
         except ProtectedError as e:
             protecting_objects_details = []
             if hasattr(e, "protected_objects"):
+                if any(isinstance(obj, MovimientoStock) for obj in e.protected_objects):
+                    protecting_objects_details.append("su historial de movimientos de stock")
                 for obj in e.protected_objects:
+                    if isinstance(obj, MovimientoStock):
+                        continue
                     if isinstance(obj, ItemOrdenVenta):
                         protecting_objects_details.append(
                             f"la Orden de Venta N° {obj.orden_venta.numero_ov}"
@@ -3536,29 +3594,59 @@ class FabricanteDeleteView(DeleteView):
 @login_required
 def ventas_ver_factura_pdf_view(request, factura_id):
     """
-    Vista que obtiene los datos de una factura y delega la generación
-    del PDF a un servicio dedicado.
+    Sirve el PDF de una factura. Se renderiza una sola vez (al emitirla o en
+    el primer pedido) y después es la lectura de un archivo estático.
     """
-    try:
-        # Esta consulta optimizada busca todo lo necesario de una vez
-        factura = (
-            Factura.objects.select_related(
-                "orden_venta__cliente"
-            )
-            .prefetch_related(
-                Prefetch(
-                    "orden_venta__items_ov",
-                    queryset=ItemOrdenVenta.objects.select_related("producto_terminado"),
-                )
-            )
-            .get(id=factura_id)
-        )
-    except Factura.DoesNotExist:
+    # Solo lo que hace falta para servir el archivo guardado; si hay que
+    # renderizarlo, el servicio trae los ítems y las OPs.
+    factura = (
+        Factura.objects.select_related("orden_venta__cliente").filter(id=factura_id).first()
+    )
+    if factura is None:
         messages.error(request, "La factura solicitada no existe.")
         return redirect("App_LUMINOVA:ventas_lista_ov")
 
-    # Llamamos a nuestro servicio y retornamos directamente su respuesta
-    return generar_pdf_factura(factura)
+    return respuesta_pdf_factura(request, factura)
+
+
+@login_required
+def exportar_documentos_pdf_view(request):
+    """
+    Descarga masiva de PDFs: facturas por fecha de emisión u órdenes de
+    trabajo de las OPs abiertas por inicio planificado, en un ZIP que se
+    arma y envía por partes o en un solo PDF.
+    """
+    form = ExportacionDocumentosForm(request.GET)
+    if not form.is_valid():
+        for errores in form.errors.values():
+            for error in errores:
+                messages.error(request, error)
+        return redirect(request.META.get("HTTP_REFERER") or "App_LUMINOVA:ventas_lista_ov")
+
+    datos = form.cleaned_data
+    tipo = datos["tipo"]
+    buscar = facturas_para_exportar if tipo == "facturas" else ordenes_para_exportar
+    documentos = buscar(datos["fecha_desde"], datos["fecha_hasta"])
+    if not documentos.exists():
+        messages.warning(request, "No hay documentos para exportar con esos filtros.")
+        return redirect(request.META.get("HTTP_REFERER") or "App_LUMINOVA:ventas_lista_ov")
+
+    periodo = "_".join(
+        f"{fecha:%Y%m%d}" for fecha in (datos["fecha_desde"], datos["fecha_hasta"]) if fecha
+    )
+    nombre = f"{tipo}_{periodo or timezone.localdate().strftime('%Y%m%d')}"
+    if datos["formato"] == "pdf":
+        return FileResponse(
+            exportar_pdf_unico(tipo, documentos),
+            as_attachment=True,
+            filename=f"{nombre}.pdf",
+            content_type="application/pdf",
+        )
+    response = StreamingHttpResponse(
+        exportar_zip(tipo, documentos), content_type="application/zip"
+    )
+    response["Content-Disposition"] = f'attachment; filename="{nombre}.zip"'
+    return response
 
 
 # --- CONTROL DE CALIDAD (Placeholder) ---
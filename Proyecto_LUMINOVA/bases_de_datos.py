@@ -0,0 +1,182 @@
+"""
+Perfiles de conexión a la base de datos, usados desde settings.DATABASES.
+
+El perfil "optimizado" de SQLite aplica estos PRAGMA a cada conexión nueva:
+
+- journal_mode=WAL: los lectores no bloquean al escritor ni el escritor a los
+  lectores; solo las escrituras se serializan entre sí.
+- synchronous=NORMAL: con WAL sigue siendo consistente ante una caída del
+  proceso; solo una caída del sistema operativo puede perder el último commit.
+- busy_timeout: cuánto espera una conexión el lock de escritura antes de
+  fallar con "database is locked".
+- mmap_size, cache_size, temp_store: lecturas por memoria mapeada, caché de
+  páginas más grande y tablas temporales (ORDER BY, DISTINCT) en memoria.
+
+El perfil "basico" deja los valores por defecto de SQLite y de Django; sirve
+como punto de comparación en el benchmark de escritores concurrentes.
+
+`base_desde_entorno` usa "basico" salvo que LUMINOVA_DB_PERFIL pida otro:
+journal_mode=WAL queda grabado en el encabezado del archivo, y db.sqlite3
+está versionado en el repositorio; abrirlo con WAL lo modificaría aunque
+no se escriba ningún dato.
+
+`base_desde_entorno` elige el motor con variables de entorno, así la misma
+configuración sirve para desarrollo (SQLite) y para un servidor PostgreSQL:
+
+    LUMINOVA_DB_MOTOR           sqlite (default) | postgresql
+    LUMINOVA_DB_NOMBRE          archivo SQLite o nombre de la base
+    LUMINOVA_DB_PERFIL          perfil SQLite (default: basico)
+    LUMINOVA_DB_USUARIO         usuario (solo PostgreSQL)
+    LUMINOVA_DB_CONTRASENA      contraseña (solo PostgreSQL)
+    LUMINOVA_DB_HOST            host o directorio del socket (solo PostgreSQL)
+    LUMINOVA_DB_PUERTO          puerto (solo PostgreSQL, default: 5432)
+    LUMINOVA_DB_CONN_MAX_AGE    segundos de reutilización de la conexión
+
+`cache_desde_entorno` hace lo mismo con settings.CACHES:
+
+    LUMINOVA_CACHE              locmem (default) | db | redis
+    LUMINOVA_CACHE_UBICACION    tabla (db) o URL (redis)
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+
+PRAGMAS_SQLITE = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,  # ms
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negativo = KiB (64 MiB por conexión)
+    "temp_store": "MEMORY",
+}
+
+PERFILES_SQLITE = {
+    "basico": {"pragmas": {}, "conn_max_age": 0},
+    "optimizado": {"pragmas": PRAGMAS_SQLITE, "conn_max_age": 600},
+}
+
+
+def opciones_sqlite(pragmas):
+    """OPTIONS del backend sqlite3 que ejecutan los PRAGMA al abrir cada conexión."""
+    if not pragmas:
+        return {}
+    return {
+        "init_command": ";".join(
+            f"PRAGMA {nombre}={valor}" for nombre, valor in pragmas.items()
+        )
+    }
+
+
+def base_sqlite(nombre, perfil="optimizado", conn_max_age=None):
+    """
+    Entrada de settings.DATABASES para un archivo SQLite con el perfil dado.
+
+    Args:
+        nombre: Ruta del archivo de la base.
+        perfil: Clave de PERFILES_SQLITE.
+        conn_max_age: Segundos que una conexión se reutiliza entre peticiones
+            (None toma el del perfil; 0 la cierra al final de cada petición).
+    """
+    config = PERFILES_SQLITE[perfil]
+    return {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": nombre,
+        "OPTIONS": opciones_sqlite(config["pragmas"]),
+        "CONN_MAX_AGE": config["conn_max_age"] if conn_max_age is None else conn_max_age,
+        # Verifica la conexión reutilizada antes de la primera consulta de cada petición.
+        "CONN_HEALTH_CHECKS": True,
+    }
+
+
+def base_postgresql(
+    nombre, usuario="", contrasena="", host="localhost", puerto="5432", conn_max_age=600
+):
+    """
+    Entrada de settings.DATABASES para PostgreSQL (requiere psycopg).
+
+    A diferencia de SQLite, PostgreSQL bloquea por fila: los servicios de
+    stock usan select_for_update() en este motor (ver utils.bloquear_filas).
+    """
+    return {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": nombre,
+        "USER": usuario,
+        "PASSWORD": contrasena,
+        "HOST": host,
+        "PORT": puerto,
+        "CONN_MAX_AGE": conn_max_age,
+        "CONN_HEALTH_CHECKS": True,
+    }
+
+
+CACHES_DISPONIBLES = {
+    # Propia de cada proceso: con varios workers las señales solo invalidan la
+    # del proceso que hizo el cambio.
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "luminova"),
+    # Compartida; la tabla se crea con `python manage.py createcachetable`.
+    "db": ("django.core.cache.backends.db.DatabaseCache", "luminova_cache"),
+    # Compartida; requiere el paquete redis.
+    "redis": ("django.core.cache.backends.redis.RedisCache", "redis://127.0.0.1:6379/0"),
+}
+
+
+def cache_desde_entorno(entorno):
+    """
+    Entrada de settings.CACHES según LUMINOVA_CACHE y LUMINOVA_CACHE_UBICACION.
+
+    Raises:
+        ImproperlyConfigured: Si el backend no es uno de CACHES_DISPONIBLES.
+    """
+    nombre = entorno.get("LUMINOVA_CACHE", "locmem").lower()
+    if nombre not in CACHES_DISPONIBLES:
+        raise ImproperlyConfigured(
+            f"LUMINOVA_CACHE '{nombre}' no soportado; use uno de: "
+            f"{', '.join(sorted(CACHES_DISPONIBLES))}."
+        )
+    backend, ubicacion = CACHES_DISPONIBLES[nombre]
+    return {
+        "BACKEND": backend,
+        "LOCATION": entorno.get("LUMINOVA_CACHE_UBICACION", ubicacion),
+    }
+
+
+def base_desde_entorno(entorno, sqlite_por_defecto):
+    """
+    Entrada de settings.DATABASES según las variables LUMINOVA_DB_*.
+
+    Args:
+        entorno: Diccionario de variables (normalmente os.environ).
+        sqlite_por_defecto: Archivo SQLite si no se indica LUMINOVA_DB_NOMBRE.
+
+    Raises:
+        ImproperlyConfigured: Si el motor, el perfil o CONN_MAX_AGE no son válidos.
+    """
+    motor = entorno.get("LUMINOVA_DB_MOTOR", "sqlite").lower()
+    conn_max_age = entorno.get("LUMINOVA_DB_CONN_MAX_AGE")
+    if conn_max_age is not None:
+        try:
+            conn_max_age = int(conn_max_age)
+        except ValueError:
+            raise ImproperlyConfigured("LUMINOVA_DB_CONN_MAX_AGE debe ser un número de segundos.")
+
+    if motor == "sqlite":
+        perfil = entorno.get("LUMINOVA_DB_PERFIL", "basico")
+        if perfil not in PERFILES_SQLITE:
+            raise ImproperlyConfigured(
+                f"LUMINOVA_DB_PERFIL '{perfil}' no existe; use uno de: "
+                f"{', '.join(sorted(PERFILES_SQLITE))}."
+            )
+        return base_sqlite(
+            entorno.get("LUMINOVA_DB_NOMBRE", sqlite_por_defecto), perfil, conn_max_age
+        )
+    if motor == "postgresql":
+        return base_postgresql(
+            entorno.get("LUMINOVA_DB_NOMBRE", "luminova"),
+            usuario=entorno.get("LUMINOVA_DB_USUARIO", ""),
+            contrasena=entorno.get("LUMINOVA_DB_CONTRASENA", ""),
+            host=entorno.get("LUMINOVA_DB_HOST", "localhost"),
+            puerto=entorno.get("LUMINOVA_DB_PUERTO", "5432"),
+            conn_max_age=600 if conn_max_age is None else conn_max_age,
+        )
+    raise ImproperlyConfigured(
+        f"LUMINOVA_DB_MOTOR '{motor}' no soportado; use 'sqlite' o 'postgresql'."
+    )
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 
+from .bases_de_datos import base_desde_entorno, cache_desde_entorno
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -78,11 +80,48 @@ WSGI_APPLICATION = "Proyecto_LUMINOVA.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Por defecto SQLite con el perfil "basico"; LUMINOVA_DB_PERFIL=optimizado activa
+# WAL y demás PRAGMA con conexiones persistentes (convierte el archivo a WAL, por
+# eso no se aplica sin pedirlo). Con LUMINOVA_DB_MOTOR=postgresql y las demás variables
+# LUMINOVA_DB_* se usa un servidor PostgreSQL. Ver Proyecto_LUMINOVA/bases_de_datos.py.
+
 DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+    "default": base_desde_entorno(os.environ, BASE_DIR / "db.sqlite3"),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Por defecto LocMemCache, que es propia de cada proceso: con varios workers
+# (gunicorn) las señales solo invalidan la caché del worker que hizo el cambio
+# y los demás muestran contadores viejos hasta que vence el TTL. Con
+# LUMINOVA_CACHE=db o LUMINOVA_CACHE=redis la caché se comparte entre procesos.
+# Ver Proyecto_LUMINOVA/bases_de_datos.py.
+
+CACHES = {
+    "default": cache_desde_entorno(os.environ),
+}
+
+# Segundos que los contadores de notificaciones pueden vivir en caché sin ser
+# invalidados. Con LocMemCache es también la demora máxima con que otro worker
+# ve un cambio, por eso es más corto que con una caché compartida.
+NOTIFICACIONES_CACHE_TTL = (
+    15 if CACHES["default"]["BACKEND"].endswith("LocMemCache") else 60
+)
+
+# Segundos que una tarjeta del dashboard se sirve sin recalcular si no recibió
+# marcas de cambio (None: solo por marcas). Las marcas viajan por la caché, así
+# que con LocMemCache otro worker ve un cambio recién cuando vence este plazo.
+DASHBOARD_SNAPSHOT_TTL = 300
+
+# Auditoría de accesos: los registros se acumulan en memoria y un hilo los
+# inserta en lotes fuera del request. Con ASINCRONA=False se escriben en el momento.
+# Si la base no responde, los lotes esperan en memoria hasta MAXIMO_PENDIENTES.
+AUDITORIA_ESCRITURA = {
+    "ASINCRONA": True,
+    "TAMANO_LOTE": 50,
+    "INTERVALO": 2.0,
+    "MAXIMO_PENDIENTES": 10000,
 }
 
 